@@ -0,0 +1,127 @@
+# benchmark_mmr.py
+# -*- coding: utf-8 -*-
+"""
+MMR 重排基准测试
+在由近似重复片段组成的模拟向量库（每个场景若干条几乎相同的片段）上，对 k = 4..20 输出：
+    mmr_select 单独耗时、检索（向量 + BM25 + MMR）端到端耗时与不做 MMR 时的对比，
+    以及结果中近似重复片段所占比例（两两余弦相似度 > 0.95 视为重复）。
+
+用法：
+    python benchmark_mmr.py --segments 3000 --dim 1024 --lambda 0.7
+    python benchmark_mmr.py --json mmr_result.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Dict, Any, List
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from novel_generator.mmr import mmr_select, get_mmr_fetch_factor
+from novel_generator.vector_backends import open_vector_backend
+from novel_generator.vectorstore_utils import _search_store
+
+K_VALUES = (4, 8, 12, 16, 20)
+
+
+def _p50_p95(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {"p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3)}
+
+
+def _timed(func, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, _p50_p95(samples)
+
+
+def _duplicate_ratio(vectors: Dict[str, np.ndarray], hits: List[Dict[str, Any]]) -> float:
+    """结果中与排在前面的某条片段近似重复的条数占比"""
+    duplicates = 0
+    for i, hit in enumerate(hits):
+        if any(float(vectors[hit["id"]] @ vectors[prev["id"]]) > 0.95 for prev in hits[:i]):
+            duplicates += 1
+    return duplicates / len(hits) if hits else 0.0
+
+
+def build_store(store_dir: str, segments: int, dim: int, cluster_size: int):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(segments // cluster_size + 1, dim)).astype(np.float32)
+    vectors = np.repeat(centers, cluster_size, axis=0)[:segments]
+    vectors += rng.normal(scale=0.05, size=vectors.shape).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"seg-{i}" for i in range(segments)]
+    texts = [f"场景{i // cluster_size}的第{i % cluster_size}个版本：林默走进钟楼。" for i in range(segments)]
+    store = open_vector_backend(store_dir, None, "numpy")
+    for offset in range(0, segments, 500):
+        store.add_embeddings(ids[offset:offset + 500], texts[offset:offset + 500],
+                             vectors[offset:offset + 500].tolist(), [{} for _ in ids[offset:offset + 500]])
+    return store, dict(zip(ids, vectors)), centers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MMR 重排基准测试")
+    parser.add_argument("--segments", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--cluster-size", type=int, default=5, help="每个场景的近似重复片段数")
+    parser.add_argument("--lambda", dest="lambda_mult", type=float, default=0.7)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", default="", help="把结果写入指定的 JSON 文件")
+    args = parser.parse_args()
+
+    store_dir = tempfile.mkdtemp(prefix="bench_mmr_")
+    store, vectors, centers = build_store(store_dir, args.segments, args.dim, args.cluster_size)
+    rng = np.random.default_rng(1)
+    query = (centers[0] + rng.normal(scale=0.3, size=args.dim)).astype(np.float32)
+    query = (query / np.linalg.norm(query)).tolist()
+    fetch_factor = get_mmr_fetch_factor()
+
+    results = []
+    for k in K_VALUES:
+        candidates = np.stack(list(vectors.values())[:k * fetch_factor])
+        relevance = np.linspace(1.0, 0.0, len(candidates))
+        _, select_stats = _timed(lambda: mmr_select(candidates, k, args.lambda_mult, relevance=relevance), args.repeat)
+        plain, plain_stats = _timed(lambda: _search_store(store, ["林默 钟楼"], [query], k, None, 1.0)[0], args.repeat)
+        diverse, mmr_stats = _timed(
+            lambda: _search_store(store, ["林默 钟楼"], [query], k, None, args.lambda_mult)[0], args.repeat
+        )
+        results.append({
+            "k": k,
+            "candidates": k * fetch_factor,
+            "mmr_select": select_stats,
+            "search_plain": plain_stats,
+            "search_mmr": mmr_stats,
+            "duplicate_ratio_plain": round(_duplicate_ratio(vectors, plain), 3),
+            "duplicate_ratio_mmr": round(_duplicate_ratio(vectors, diverse), 3),
+        })
+    store.close()
+    shutil.rmtree(store_dir, ignore_errors=True)
+
+    print(f"片段数 {args.segments}，维度 {args.dim}，每场景 {args.cluster_size} 条近似重复，lambda={args.lambda_mult}")
+    print(f"{'k':>4}{'候选':>6}{'MMR p50':>10}{'MMR p95':>10}{'检索p50':>10}{'检索+MMR p50':>14}{'重复率':>8}{'MMR后':>8}")
+    for r in results:
+        print(f"{r['k']:>4}{r['candidates']:>6}{r['mmr_select']['p50_ms']:>10}{r['mmr_select']['p95_ms']:>10}"
+              f"{r['search_plain']['p50_ms']:>10}{r['search_mmr']['p50_ms']:>14}"
+              f"{r['duplicate_ratio_plain']:>8}{r['duplicate_ratio_mmr']:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
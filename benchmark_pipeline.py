@@ -0,0 +1,224 @@
+# benchmark_pipeline.py
+# -*- coding: utf-8 -*-
+"""
+生成流水线端到端基准测试（离线）
+启动 mock_llm_server 模拟服务，依次执行：
+    Novel_architecture_generate → Chapter_blueprint_generate
+    → N × (build_chapter_prompt, generate_chapter_draft, finalize_chapter)
+并按阶段输出耗时、请求数与收发字节，便于比较优化前后的数值。
+
+用法：
+    python benchmark_pipeline.py --chapters 3 --latency 0.2 --tokens-per-second 400
+    python benchmark_pipeline.py --error-rate 0.1 --json benchmark_result.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import traceback
+from typing import Dict, Any, List, Callable
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockLLMServer, DEFAULT_SETTINGS
+from novel_generator import (
+    Novel_architecture_generate,
+    Chapter_blueprint_generate,
+    build_chapter_prompt,
+    generate_chapter_draft,
+    finalize_chapter,
+)
+from retry_policy import get_retry_stats, reset_retry_stats
+from llm_telemetry import get_telemetry
+
+_STAT_FIELDS = ("requests", "bytes_in", "bytes_out", "errors_injected")
+
+
+class PipelineBenchmark:
+    """在模拟服务上执行一次完整的生成流程并记录每个阶段的数据"""
+
+    def __init__(self, server: MockLLMServer, filepath: str, chapters: int = 3, word_number: int = 800,
+                 embedding_interface_format: str = "Ollama"):
+        self.server = server
+        self.filepath = filepath
+        self.chapters = chapters
+        self.word_number = word_number
+        self.embedding_interface_format = embedding_interface_format
+        self.results: List[Dict[str, Any]] = []
+
+    @property
+    def _llm_kwargs(self) -> Dict[str, Any]:
+        return {
+            "interface_format": "OpenAI",
+            "api_key": "sk-mock",
+            "base_url": self.server.base_url,
+            "temperature": 0.7,
+            "max_tokens": 4096,
+            "timeout": 60,
+        }
+
+    @property
+    def _embedding_kwargs(self) -> Dict[str, Any]:
+        fmt = self.embedding_interface_format
+        return {
+            "embedding_api_key": "sk-mock",
+            "embedding_url": self.server.ollama_url if fmt.lower() == "ollama" else self.server.base_url,
+            "embedding_interface_format": fmt,
+            "embedding_model_name": "mock-embedding",
+        }
+
+    def _chapter_kwargs(self, novel_number: int) -> Dict[str, Any]:
+        return {
+            "filepath": self.filepath,
+            "novel_number": novel_number,
+            "word_number": self.word_number,
+            "user_guidance": "",
+            "characters_involved": "",
+            "key_items": "",
+            "scene_location": "",
+            "time_constraint": "",
+        }
+
+    def run_stage(self, name: str, func: Callable, **kwargs) -> Any:
+        """执行一个阶段，记录耗时与该阶段内模拟服务收到的请求"""
+        before = self.server.get_stats()
+        start = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = func(**kwargs)
+        except Exception as e:
+            message = str(e).strip().splitlines()
+            error = f"{type(e).__name__}: {message[0] if message else ''}"
+            traceback.print_exc()
+        elapsed = time.perf_counter() - start
+        after = self.server.get_stats()
+        record = {"stage": name, "seconds": round(elapsed, 4), "ok": error is None, "error": error}
+        for field in _STAT_FIELDS:
+            record[field] = after[field] - before[field]
+        if isinstance(result, dict) and name.startswith("finalize"):
+            # finalize_chapter 返回各子步骤耗时
+            record["steps"] = result
+        self.results.append(record)
+        return result
+
+    def run(self) -> List[Dict[str, Any]]:
+        llm = self._llm_kwargs
+        embedding = self._embedding_kwargs
+
+        self.run_stage(
+            "architecture", Novel_architecture_generate,
+            llm_model="mock-architect", topic="旧案重启", genre="悬疑",
+            number_of_chapters=self.chapters, word_number=self.word_number, filepath=self.filepath, **llm
+        )
+        self.run_stage(
+            "blueprint", Chapter_blueprint_generate,
+            llm_model="mock-planner", filepath=self.filepath, number_of_chapters=self.chapters, **llm
+        )
+        llm_model_kwargs = dict(llm, model_name="mock-writer")
+        llm_model_kwargs.pop("interface_format")
+        for n in range(1, self.chapters + 1):
+            prompt = self.run_stage(
+                f"prompt[{n}]", build_chapter_prompt,
+                interface_format="OpenAI", **llm_model_kwargs, **embedding, **self._chapter_kwargs(n)
+            )
+            self.run_stage(
+                f"draft[{n}]", generate_chapter_draft,
+                interface_format="OpenAI", custom_prompt_text=prompt or None,
+                **llm_model_kwargs, **embedding, **self._chapter_kwargs(n)
+            )
+            self.run_stage(
+                f"finalize[{n}]", finalize_chapter,
+                novel_number=n, word_number=self.word_number, filepath=self.filepath,
+                interface_format="OpenAI", **llm_model_kwargs, **embedding
+            )
+        return self.results
+
+    def summary(self) -> Dict[str, Any]:
+        """按阶段类型（去掉章节号）汇总"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record in self.results:
+            kind = record["stage"].split("[", 1)[0]
+            total = totals.setdefault(kind, {"runs": 0, "seconds": 0.0, "failures": 0,
+                                             **{field: 0 for field in _STAT_FIELDS}})
+            total["runs"] += 1
+            total["seconds"] = round(total["seconds"] + record["seconds"], 4)
+            total["failures"] += 0 if record["ok"] else 1
+            for field in _STAT_FIELDS:
+                total[field] += record[field]
+        return totals
+
+
+def _print_table(results: List[Dict[str, Any]], summary: Dict[str, Any]):
+    header = f"{'阶段':<16}{'耗时(s)':>10}{'请求数':>8}{'请求字节':>12}{'响应字节':>12}{'注入错误':>8}  状态"
+    print(header)
+    print("-" * 90)
+    for r in results:
+        status = "OK" if r["ok"] else f"失败 {r['error']}"
+        print(f"{r['stage']:<16}{r['seconds']:>10.3f}{r['requests']:>8}{r['bytes_in']:>12}{r['bytes_out']:>12}"
+              f"{r['errors_injected']:>8}  {status}")
+    print()
+    print("按阶段汇总:")
+    for kind, t in summary.items():
+        print(f"{kind:<16}{t['seconds']:>10.3f}{t['requests']:>8}{t['bytes_in']:>12}{t['bytes_out']:>12}"
+              f"{t['errors_injected']:>8}  运行 {t['runs']} 次，失败 {t['failures']} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成流水线端到端基准测试（离线模拟服务）")
+    parser.add_argument("--chapters", type=int, default=3, help="生成的章节数")
+    parser.add_argument("--word-number", type=int, default=800)
+    parser.add_argument("--latency", type=float, default=DEFAULT_SETTINGS['latency'])
+    parser.add_argument("--latency-jitter", type=float, default=DEFAULT_SETTINGS['latency_jitter'])
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_SETTINGS['tokens_per_second'])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_SETTINGS['error_rate'])
+    parser.add_argument("--reply-chars", type=int, default=DEFAULT_SETTINGS['reply_chars'])
+    parser.add_argument("--embedding", default="Ollama", help="Embedding 接口格式（Ollama / ML Studio / OpenAI 等）")
+    parser.add_argument("--workdir", default="", help="项目输出目录；默认使用临时目录并在结束后删除")
+    parser.add_argument("--json", default="", help="把结果写入指定的 JSON 文件")
+    args = parser.parse_args()
+
+    filepath = args.workdir or tempfile.mkdtemp(prefix="novel_bench_")
+    os.makedirs(filepath, exist_ok=True)
+    reset_retry_stats()
+    get_telemetry().aggregator.clear()
+
+    with MockLLMServer(
+        latency=args.latency, latency_jitter=args.latency_jitter, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, reply_chars=args.reply_chars
+    ) as server:
+        benchmark = PipelineBenchmark(server, filepath, args.chapters, args.word_number, args.embedding)
+        start = time.perf_counter()
+        results = benchmark.run()
+        total_seconds = time.perf_counter() - start
+        summary = benchmark.summary()
+        server_stats = server.get_stats()
+
+    _print_table(results, summary)
+    print(f"\n总耗时: {total_seconds:.3f}s，总请求数: {server_stats['requests']}")
+
+    if args.json:
+        report = {
+            "settings": vars(args),
+            "total_seconds": round(total_seconds, 4),
+            "stages": results,
+            "summary": summary,
+            "server": server_stats,
+            "retries": get_retry_stats(),
+            "telemetry": get_telemetry().aggregator.summary(),
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+    if not args.workdir:
+        shutil.rmtree(filepath, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
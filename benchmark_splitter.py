@@ -0,0 +1,138 @@
+# benchmark_splitter.py
+# -*- coding: utf-8 -*-
+"""
+分句/分段基准测试：novel_generator.text_splitter 与原 NLTK punkt 分段路径对比
+输出每种方法的耗时、片段数、每秒片段数与片段长度分布（最小 / p50 / p90 / 最大 / 平均，超长片段数）。
+
+用法：
+    python benchmark_splitter.py --file 某部小说.txt
+    python benchmark_splitter.py --chars 100000 --max-length 500 --json splitter_result.json
+未指定 --file 时用 mock_llm_server 的确定性中文文本拼出约 --chars 字的样本（仅用于冒烟测试，
+结论应以真实小说为准）。本机没有 punkt 数据时 NLTK 路径会标记为不可用，不会尝试下载。
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+from typing import Callable, Dict, Any, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from novel_generator.text_splitter import split_text_segments
+
+
+def nltk_split(text: str, max_length: int = 500) -> List[str]:
+    """原 split_text_for_vectorstore / advanced_split_content 的分段逻辑（nltk.sent_tokenize + 按长度合并）"""
+    import nltk
+    sentences = nltk.sent_tokenize(text)
+    final_segments = []
+    current_segment = []
+    current_length = 0
+    for sentence in sentences:
+        sentence_length = len(sentence)
+        if current_length + sentence_length > max_length:
+            if current_segment:
+                final_segments.append(" ".join(current_segment))
+            current_segment = [sentence]
+            current_length = sentence_length
+        else:
+            current_segment.append(sentence)
+            current_length += sentence_length
+    if current_segment:
+        final_segments.append(" ".join(current_segment))
+    return final_segments
+
+
+def sample_text(chars: int) -> str:
+    """用模拟服务的确定性文本拼出带段落换行的中文样本"""
+    from mock_llm_server import canned_reply
+    paragraphs = []
+    total = 0
+    n = 0
+    while total < chars:
+        n += 1
+        paragraph = canned_reply(f"第{n}段正文", 180 + (n * 37) % 400)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 1
+    return "\n".join(paragraphs)[:chars]
+
+
+def _percentile(sorted_values: List[int], q: float) -> int:
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(name: str, func: Callable[[str, int], List[str]], text: str, max_length: int, repeat: int) -> Dict[str, Any]:
+    try:
+        func(text[:1000], max_length)
+    except LookupError as e:
+        # NLTK 的 LookupError 信息以一行星号开头，取第一行有内容的说明
+        message = re.sub(r"\x1b\[[0-9;]*m", "", str(e))
+        lines = [line.strip() for line in message.splitlines() if line.strip().strip("*")]
+        return {"method": name, "available": False, "error": lines[0] if lines else "LookupError"}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        segments = func(text, max_length)
+    elapsed = (time.perf_counter() - start) / repeat
+    sizes = sorted(len(s) for s in segments) or [0]
+    return {
+        "method": name,
+        "available": True,
+        "seconds": round(elapsed, 6),
+        "segments": len(segments),
+        "segments_per_second": round(len(segments) / elapsed, 1) if elapsed else None,
+        "min": sizes[0],
+        "p50": _percentile(sizes, 0.5),
+        "p90": _percentile(sizes, 0.9),
+        "max": sizes[-1],
+        "mean": round(sum(sizes) / len(sizes), 1),
+        "over_max_length": sum(1 for size in sizes if size > max_length),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分句/分段基准测试")
+    parser.add_argument("--file", default="", help="用于测试的小说文本（UTF-8）")
+    parser.add_argument("--chars", type=int, default=100000, help="未指定 --file 时生成的样本字数")
+    parser.add_argument("--max-length", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", default="", help="把结果写入指定的 JSON 文件")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+        source = args.file
+    else:
+        text = sample_text(args.chars)
+        source = f"synthetic({args.chars})"
+
+    results = [
+        measure("text_splitter", lambda t, m: split_text_segments(t, m, args.overlap), text, args.max_length, args.repeat),
+        measure("nltk_punkt", nltk_split, text, args.max_length, args.repeat),
+    ]
+
+    print(f"文本: {source}，{len(text)} 字，max_length={args.max_length}, overlap={args.overlap}")
+    print(f"{'方法':<16}{'耗时(s)':>10}{'片段数':>8}{'片段/秒':>12}{'最小':>6}{'p50':>6}{'p90':>6}{'最大':>8}{'超长':>6}")
+    for r in results:
+        if not r["available"]:
+            print(f"{r['method']:<16}不可用: {r['error']}")
+            continue
+        print(f"{r['method']:<16}{r['seconds']:>10.4f}{r['segments']:>8}{r['segments_per_second']:>12}"
+              f"{r['min']:>6}{r['p50']:>6}{r['p90']:>6}{r['max']:>8}{r['over_max_length']:>6}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "chars": len(text), "settings": vars(args), "results": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# benchmark_vector_store.py
+# -*- coding: utf-8 -*-
+"""
+向量库后端基准测试：内置 NumPy 内存映射后端与 Chroma 后端对比
+对同一批随机单位向量（模拟一部小说的片段）分别建库，输出：
+    建库耗时、冷启动耗时（新进程中导入后端 + 打开 + 首次检索）、
+    单查询/批量查询/带元数据过滤查询的延迟（p50 / p95）与磁盘占用。
+
+用法：
+    python benchmark_vector_store.py --segments 3000 --dim 1024
+    python benchmark_vector_store.py --dtype float16 --json vector_store_result.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, Any, List
+
+import numpy as np
+
+# 添加项目根目录到路径
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from novel_generator.vector_backends import open_vector_backend, VECTOR_BACKENDS
+
+# 在新进程中测量冷启动；按文件路径加载后端模块，不计入 novel_generator 包其余模块的导入
+_COLD_OPEN_SCRIPT = """
+import sys, json, time, importlib.util
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+spec = importlib.util.spec_from_file_location("vector_backends", {module!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+store = module.open_vector_backend({store_dir!r}, None, {backend!r})
+opened = time.perf_counter()
+store.query_by_vectors([{query!r}], {k})
+done = time.perf_counter()
+print(json.dumps({{"open": opened - start, "first_query": done - opened}}))
+"""
+
+
+def _unit_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _latency(func, repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2], 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)}
+
+
+def run_backend(backend: str, vectors: np.ndarray, queries: np.ndarray, args) -> Dict[str, Any]:
+    store_dir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    count = len(vectors)
+    ids = [f"seg-{i}" for i in range(count)]
+    texts = [f"第{i // 20 + 1}章片段{i}：" + "字" * 480 for i in range(count)]
+    metadatas = [{"source": "chapter", "chapter_number": i // 20 + 1, "segment_index": i % 20} for i in range(count)]
+    latest_chapter = count // 20 + 1
+    where = {"$or": [{"source": {"$eq": "knowledge"}}, {"chapter_number": {"$lt": latest_chapter - 2}}]}
+
+    previous_dtype = os.environ.get("VECTOR_STORE_DTYPE")
+    os.environ["VECTOR_STORE_DTYPE"] = args.dtype
+    try:
+        start = time.perf_counter()
+        store = open_vector_backend(store_dir, None, backend)
+        # 按章节分批写入，与实际定稿时的追加方式一致
+        for offset in range(0, count, 20):
+            store.add_embeddings(ids[offset:offset + 20], texts[offset:offset + 20],
+                                 vectors[offset:offset + 20].tolist(), metadatas[offset:offset + 20])
+        build_seconds = time.perf_counter() - start
+    finally:
+        if previous_dtype is None:
+            os.environ.pop("VECTOR_STORE_DTYPE", None)
+        else:
+            os.environ["VECTOR_STORE_DTYPE"] = previous_dtype
+
+    query_list = queries.tolist()
+    single = _latency(lambda: store.query_by_vectors([query_list[0]], args.k), args.repeat)
+    batch = _latency(lambda: store.query_by_vectors(query_list[:5], args.k), args.repeat)
+    filtered = _latency(lambda: store.query_by_vectors(query_list[:5], args.k, where=where), args.repeat)
+    store.close()
+
+    cold = subprocess.run(
+        [sys.executable, "-c", _COLD_OPEN_SCRIPT.format(
+            root=ROOT, module=os.path.join(ROOT, "novel_generator", "vector_backends.py"),
+            store_dir=store_dir, backend=backend, query=query_list[0], k=args.k
+        )],
+        capture_output=True, text=True, check=True
+    )
+    cold_stats = json.loads(cold.stdout.strip().splitlines()[-1])
+    result = {
+        "backend": backend,
+        "build_s": round(build_seconds, 3),
+        "cold_open_s": round(cold_stats["open"], 3),
+        "cold_first_query_ms": round(cold_stats["first_query"] * 1000, 3),
+        "query_1": single,
+        "query_5": batch,
+        "query_5_where": filtered,
+        "disk_mb": round(_dir_size(store_dir) / 1024 / 1024, 2),
+    }
+    shutil.rmtree(store_dir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量库后端基准测试")
+    parser.add_argument("--segments", type=int, default=3000, help="片段数")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=50, help="每种查询重复次数")
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32", help="NumPy 后端的向量精度")
+    parser.add_argument("--backends", default=",".join(VECTOR_BACKENDS), help="逗号分隔的后端列表")
+    parser.add_argument("--json", default="", help="把结果写入指定的 JSON 文件")
+    args = parser.parse_args()
+
+    vectors = _unit_vectors(args.segments, args.dim, seed=0)
+    queries = _unit_vectors(5, args.dim, seed=1)
+    results: List[Dict[str, Any]] = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            results.append(run_backend(backend, vectors, queries, args))
+        except Exception as e:
+            results.append({"backend": backend, "error": str(e)})
+
+    print(f"片段数 {args.segments}，维度 {args.dim}，k={args.k}，NumPy 精度 {args.dtype}")
+    print(f"{'后端':<10}{'建库(s)':>9}{'冷启动(s)':>11}{'首查(ms)':>10}"
+          f"{'单查p50':>9}{'单查p95':>9}{'5查p50':>9}{'过滤p50':>9}{'磁盘(MB)':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<10}失败: {r['error']}")
+            continue
+        print(f"{r['backend']:<10}{r['build_s']:>9}{r['cold_open_s']:>11}{r['cold_first_query_ms']:>10}"
+              f"{r['query_1']['p50_ms']:>9}{r['query_1']['p95_ms']:>9}{r['query_5']['p50_ms']:>9}"
+              f"{r['query_5_where']['p50_ms']:>9}{r['disk_mb']:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,7 @@ from advanced_logger import main_logger, llm_logger, embedding_logger, log_llm_r
 
 from llm_adapters import create_llm_adapter
 from embedding_adapters import create_embedding_adapter
+from network_manager import apply_network_config
 
 
 def is_uv_environment():
@@ -47,14 +48,18 @@ def load_config(config_file: str) -> dict:
         # 根据文件扩展名确定格式
         if config_file.endswith('.yaml') or config_file.endswith('.yml'):
             with open(config_file, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f) or {}
+                config = yaml.safe_load(f) or {}
         else:
             with open(config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                config = json.load(f)
     except Exception as e:
         main_logger.error(f"加载配置文件时出错: {e}")
         return {}
 
+    # 应用进程级网络治理配置（限流等）
+    apply_network_config(config)
+    return config
+
 
 def replace_env_vars(config: Dict[Any, Any]) -> Dict[Any, Any]:
     """替换配置中的环境变量占位符"""
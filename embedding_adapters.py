@@ -1,14 +1,32 @@
 # embedding_adapters.py
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
 import traceback
-from typing import List
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Callable, Optional
 import requests
 from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
 
 # 导入高级日志系统
 from advanced_logger import embedding_logger, log_embedding_request, log_embedding_response
 
+# 导入网络管理器（线程本地会话，代理策略挂在会话上，不修改 os.environ）
+try:
+    from network_manager import get_http_session, get_embedding_batching
+except ImportError:
+    def get_http_session(use_proxy: bool = False) -> requests.Session:
+        session = requests.Session()
+        session.trust_env = use_proxy
+        return session
+
+    def get_embedding_batching() -> dict:
+        return {"batch_size": 32, "max_workers": 4}
+
+# Gemini batchEmbedContents 单次最多 100 条
+GEMINI_MAX_BATCH_SIZE = 100
+
 def ensure_openai_base_url_has_v1(url: str) -> str:
     """
     若用户输入的 url 不包含 '/v1'，则在末尾追加 '/v1'。
@@ -22,6 +40,66 @@ def ensure_openai_base_url_has_v1(url: str) -> str:
             url = url.rstrip('/') + '/v1'
     return url
 
+def _ordered_map(func: Callable[[Any], Any], items: list, max_workers: int) -> list:
+    """在有界线程池中并发执行 func，结果顺序与 items 一致；只有一项时直接在当前线程调用"""
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="embedding") as executor:
+        # 在当前上下文的副本中运行，阶段截止时间随之传递
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+def _embed_in_batches(embed_batch: Callable[[List[str]], List[List[float]]], texts: List[str],
+                      max_batch_size: Optional[int] = None) -> List[List[float]]:
+    """
+    按 embedding_batching 配置把 texts 切分成批次，批次之间并发请求，结果按原顺序拼接。
+    某个批次返回的向量数与文本数不一致时，该批次全部记为空向量。
+    """
+    settings = get_embedding_batching()
+    batch_size = settings["batch_size"]
+    if max_batch_size:
+        batch_size = min(batch_size, max_batch_size)
+    texts = list(texts)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def run(batch: List[str]) -> List[List[float]]:
+        vectors = embed_batch(batch)
+        if not isinstance(vectors, list) or len(vectors) != len(batch):
+            logging.error(f"Embedding 批量响应数量不匹配: 期望 {len(batch)} 条")
+            return [[] for _ in batch]
+        return vectors
+
+    results = _ordered_map(run, batches, settings["max_workers"])
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+def _fan_out(embed_single: Callable[[str], List[float]], texts: List[str]) -> List[List[float]]:
+    """只支持单条输入的接口：在有界线程池中逐条并发请求，结果顺序与 texts 一致"""
+    return _ordered_map(embed_single, list(texts), get_embedding_batching()["max_workers"])
+
+def _post_openai_style_batch(url: str, headers: dict, payload: dict, batch: List[str], provider: str) -> List[List[float]]:
+    """
+    OpenAI 兼容的 /embeddings 接口，input 传入列表；失败时返回与 batch 等长的空向量。
+    """
+    try:
+        # 不使用系统代理的会话
+        session = get_http_session(use_proxy=False)
+        response = session.post(url, json=dict(payload, input=batch), headers=headers)
+        response.raise_for_status()
+        result = response.json()
+        data = result.get("data") if isinstance(result, dict) else None
+        if not data:
+            logging.error(f"Invalid response format from {provider} API: {result}")
+            return [[] for _ in batch]
+        if all(isinstance(item, dict) and "index" in item for item in data):
+            data = sorted(data, key=lambda item: item["index"])
+        return [item.get("embedding", []) for item in data]
+    except requests.exceptions.RequestException as e:
+        logging.error(f"{provider} API request failed: {str(e)}")
+        return [[] for _ in batch]
+    except (KeyError, IndexError, ValueError, TypeError, AttributeError) as e:
+        logging.error(f"Error parsing {provider} API response: {str(e)}")
+        return [[] for _ in batch]
+
 class BaseEmbeddingAdapter:
     """
     Embedding 接口统一基类
@@ -32,11 +110,20 @@ class BaseEmbeddingAdapter:
     def embed_query(self, query: str) -> List[float]:
         raise NotImplementedError
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步批量嵌入，默认在线程池中执行同步实现"""
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """异步查询嵌入，默认在线程池中执行同步实现"""
+        return await asyncio.to_thread(self.embed_query, query)
+
 class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     """
     基于 OpenAIEmbeddings（或兼容接口）的适配器
     """
     def __init__(self, api_key: str, base_url: str, model_name: str):
+        self.model_name = model_name
         # 忽略类型检查错误，因为实际运行时可以正常工作
         self._embedding = OpenAIEmbeddings(
             api_key=api_key,  # type: ignore
@@ -66,6 +153,28 @@ class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
             embedding_logger.error(f"OpenAI Embedding调用失败: {str(e)}")
             return []
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        embedding_logger.info(f"异步调用OpenAI Embedding模型: {self._embedding.model}")
+        log_embedding_request(f"批量文档嵌入 ({len(texts)}个)", self._embedding.model, "OpenAI")
+        try:
+            result = await self._embedding.aembed_documents(texts)
+            log_embedding_response(result[0] if result else [], self._embedding.model, "OpenAI")
+            return result
+        except Exception as e:
+            embedding_logger.error(f"OpenAI Embedding异步调用失败: {str(e)}")
+            return [[]] * len(texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        embedding_logger.info(f"异步调用OpenAI Embedding模型: {self._embedding.model}")
+        log_embedding_request(query, self._embedding.model, "OpenAI")
+        try:
+            result = await self._embedding.aembed_query(query)
+            log_embedding_response(result, self._embedding.model, "OpenAI")
+            return result
+        except Exception as e:
+            embedding_logger.error(f"OpenAI Embedding异步调用失败: {str(e)}")
+            return []
+
 class AzureOpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     """
     基于 AzureOpenAIEmbeddings（或兼容接口）的适配器
@@ -79,6 +188,7 @@ class AzureOpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
             self.api_version = match.group(3)
         else:
             raise ValueError("Invalid Azure OpenAI base_url format")
+        self.model_name = model_name or self.azure_deployment
         
         self._embedding = AzureOpenAIEmbeddings(
             azure_endpoint=self.azure_endpoint,
@@ -109,29 +219,91 @@ class AzureOpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
             embedding_logger.error(f"Azure OpenAI Embedding调用失败: {str(e)}")
             return []
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        embedding_logger.info(f"异步调用Azure OpenAI Embedding模型: {self.azure_deployment}")
+        log_embedding_request(f"批量文档嵌入 ({len(texts)}个)", self.azure_deployment, "Azure OpenAI")
+        try:
+            result = await self._embedding.aembed_documents(texts)
+            log_embedding_response(result[0] if result else [], self.azure_deployment, "Azure OpenAI")
+            return result
+        except Exception as e:
+            embedding_logger.error(f"Azure OpenAI Embedding异步调用失败: {str(e)}")
+            return [[]] * len(texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        embedding_logger.info(f"异步调用Azure OpenAI Embedding模型: {self.azure_deployment}")
+        log_embedding_request(query, self.azure_deployment, "Azure OpenAI")
+        try:
+            result = await self._embedding.aembed_query(query)
+            log_embedding_response(result, self.azure_deployment, "Azure OpenAI")
+            return result
+        except Exception as e:
+            embedding_logger.error(f"Azure OpenAI Embedding异步调用失败: {str(e)}")
+            return []
+
 class OllamaEmbeddingAdapter(BaseEmbeddingAdapter):
     """
-    其接口路径为 /api/embeddings
+    批量接口为 /api/embed（input 为列表）；旧版 Ollama 不支持时回退到逐条的 /api/embeddings
     """
     def __init__(self, model_name: str, base_url: str):
         self.model_name = model_name
         self.base_url = base_url.rstrip("/")
+        self._batch_supported = True
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embedding_logger.info(f"调用Ollama Embedding模型: {self.model_name}")
-        embeddings = []
-        for text in texts:
-            vec = self._embed_single(text)
-            embeddings.append(vec)
-        return embeddings
+        log_embedding_request(f"批量文档嵌入 ({len(texts)}个)", self.model_name, "Ollama")
+        if not self._batch_supported:
+            return _fan_out(self._embed_single, texts)
+        return _embed_in_batches(self._embed_batch, texts)
 
     def embed_query(self, query: str) -> List[float]:
         embedding_logger.info(f"调用Ollama Embedding模型: {self.model_name}")
         log_embedding_request(query, self.model_name, "Ollama")
-        result = self._embed_single(query)
+        # 查询与文档使用同一接口，保证向量尺度一致（/api/embed 返回归一化向量）
+        if self._batch_supported:
+            result = self._embed_batch([query])[0]
+        else:
+            result = self._embed_single(query)
         log_embedding_response(result, self.model_name, "Ollama")
         return result
 
+    def _batch_url(self) -> str:
+        url = self.base_url
+        if "/api" in url:
+            url = url[:url.index("/api")]
+        elif "/v1" in url:
+            url = url[:url.index("/v1")]
+        return f"{url}/api/embed"
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """
+        调用 Ollama /api/embed 批量接口；接口不存在（旧版本）时改为逐条调用
+        """
+        if self._batch_supported:
+            data = {
+                "model": self.model_name,
+                "input": batch
+            }
+            try:
+                response = get_http_session(use_proxy=True).post(self._batch_url(), json=data)
+                if response.status_code in (404, 405):
+                    logging.info("Ollama 不支持 /api/embed，改为逐条调用 /api/embeddings")
+                    self._batch_supported = False
+                else:
+                    response.raise_for_status()
+                    embeddings = response.json().get("embeddings")
+                    if not isinstance(embeddings, list):
+                        raise ValueError("No 'embeddings' field in Ollama response.")
+                    return embeddings
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Ollama embed request error: {e}\n{traceback.format_exc()}")
+                return [[] for _ in batch]
+            except (ValueError, AttributeError) as e:
+                logging.error(f"Ollama embed parse error: {e}")
+                return [[] for _ in batch]
+        return [self._embed_single(text) for text in batch]
+
     def _embed_single(self, text: str) -> List[float]:
         """
         调用 Ollama 本地服务 /api/embeddings 接口，获取文本 embedding
@@ -150,7 +322,7 @@ class OllamaEmbeddingAdapter(BaseEmbeddingAdapter):
             "prompt": text
         }
         try:
-            response = requests.post(url, json=data)
+            response = get_http_session(use_proxy=True).post(url, json=data)
             response.raise_for_status()
             result = response.json()
             if "embedding" not in result:
@@ -182,7 +354,7 @@ class MLStudioEmbeddingAdapter(BaseEmbeddingAdapter):
                 "input": texts,
                 "model": self.model_name
             }
-            response = requests.post(self.url, json=payload, headers=self.headers)
+            response = get_http_session(use_proxy=True).post(self.url, json=payload, headers=self.headers)
             response.raise_for_status()
             result = response.json()
             if "data" not in result:
@@ -207,7 +379,7 @@ class MLStudioEmbeddingAdapter(BaseEmbeddingAdapter):
                 "input": query,
                 "model": self.model_name
             }
-            response = requests.post(self.url, json=payload, headers=self.headers)
+            response = get_http_session(use_proxy=True).post(self.url, json=payload, headers=self.headers)
             response.raise_for_status()
             result = response.json()
             if "data" not in result or not result["data"]:
@@ -241,11 +413,32 @@ class GeminiEmbeddingAdapter(BaseEmbeddingAdapter):
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embedding_logger.info(f"调用Gemini Embedding模型: {self.model_name}")
-        embeddings = []
-        for text in texts:
-            vec = self._embed_single(text)
-            embeddings.append(vec)
-        return embeddings
+        log_embedding_request(f"批量文档嵌入 ({len(texts)}个)", self.model_name, "Gemini")
+        return _embed_in_batches(self._embed_batch, texts, max_batch_size=GEMINI_MAX_BATCH_SIZE)
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """
+        调用 batchEmbedContents 接口，一次请求嵌入多条文本
+        """
+        url = f"{self.base_url}/{self.model_name}:batchEmbedContents?key={self.api_key}"
+        model = self.model_name if self.model_name.startswith("models/") else f"models/{self.model_name}"
+        payload = {
+            "requests": [
+                {"model": model, "content": {"parts": [{"text": text}]}}
+                for text in batch
+            ]
+        }
+        try:
+            response = get_http_session(use_proxy=True).post(url, json=payload)
+            response.raise_for_status()
+            result = response.json()
+            return [item.get("values", []) for item in result.get("embeddings", [])]
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Gemini batchEmbedContents request error: {e}\n{traceback.format_exc()}")
+            return [[] for _ in batch]
+        except Exception as e:
+            logging.error(f"Gemini batchEmbedContents parse error: {e}\n{traceback.format_exc()}")
+            return [[] for _ in batch]
 
     def embed_query(self, query: str) -> List[float]:
         embedding_logger.info(f"调用Gemini Embedding模型: {self.model_name}")
@@ -269,7 +462,7 @@ class GeminiEmbeddingAdapter(BaseEmbeddingAdapter):
         }
 
         try:
-            response = requests.post(url, json=payload)
+            response = get_http_session(use_proxy=True).post(url, json=payload)
             print(response.text)
             response.raise_for_status()
             result = response.json()
@@ -316,39 +509,20 @@ class SiliconFlowEmbeddingAdapter(BaseEmbeddingAdapter):
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embedding_logger.info(f"调用SiliconFlow Embedding模型: {self.payload['model']}")
-        embeddings = []
-        for text in texts:
-            try:
-                self.payload["input"] = text
-                # 创建一个不使用系统代理的会话
-                session = requests.Session()
-                session.trust_env = False
-                response = session.post(self.url, json=self.payload, headers=self.headers)
-                response.raise_for_status()
-                result = response.json()
-                if not result or "data" not in result or not result["data"]:
-                    logging.error(f"Invalid response format from SiliconFlow API: {result}")
-                    embeddings.append([])
-                    continue
-                emb = result["data"][0].get("embedding", [])
-                embeddings.append(emb)
-            except requests.exceptions.RequestException as e:
-                logging.error(f"SiliconFlow API request failed: {str(e)}")
-                embeddings.append([])
-            except (KeyError, IndexError, ValueError, TypeError) as e:
-                logging.error(f"Error parsing SiliconFlow API response: {str(e)}")
-                embeddings.append([])
-        return embeddings
+        log_embedding_request(f"批量文档嵌入 ({len(texts)}个)", self.payload['model'], "SiliconFlow")
+        return _embed_in_batches(
+            lambda batch: _post_openai_style_batch(self.url, self.headers, self.payload, batch, "SiliconFlow"),
+            texts
+        )
 
     def embed_query(self, query: str) -> List[float]:
         embedding_logger.info(f"调用SiliconFlow Embedding模型: {self.payload['model']}")
         log_embedding_request(query, self.payload['model'], "SiliconFlow")
         try:
-            self.payload["input"] = query
-            # 创建一个不使用系统代理的会话
-            session = requests.Session()
-            session.trust_env = False
-            response = session.post(self.url, json=self.payload, headers=self.headers)
+            payload = dict(self.payload, input=query)
+            # 不使用系统代理的会话
+            session = get_http_session(use_proxy=False)
+            response = session.post(self.url, json=payload, headers=self.headers)
             response.raise_for_status()
             result = response.json()
 
@@ -397,32 +571,11 @@ class GiteeAIEmbeddingAdapter(BaseEmbeddingAdapter):
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         embedding_logger.info(f"调用Gitee AI Embedding模型: {self.model_name}")
-        embeddings = []
-        for text in texts:
-            try:
-                payload = {
-                    "input": text,
-                    "model": self.model_name
-                }
-                # 创建一个不使用系统代理的会话
-                session = requests.Session()
-                session.trust_env = False
-                response = session.post(self.url, json=payload, headers=self.headers)
-                response.raise_for_status()
-                result = response.json()
-                if not result or "data" not in result or not result["data"]:
-                    logging.error(f"Invalid response format from Gitee AI API: {result}")
-                    embeddings.append([])
-                    continue
-                emb = result["data"][0].get("embedding", [])
-                embeddings.append(emb)
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Gitee AI API request failed: {str(e)}")
-                embeddings.append([])
-            except (KeyError, IndexError, ValueError, TypeError) as e:
-                logging.error(f"Error parsing Gitee AI API response: {str(e)}")
-                embeddings.append([])
-        return embeddings
+        log_embedding_request(f"批量文档嵌入 ({len(texts)}个)", self.model_name, "Gitee AI")
+        return _embed_in_batches(
+            lambda batch: _post_openai_style_batch(self.url, self.headers, {"model": self.model_name}, batch, "Gitee AI"),
+            texts
+        )
 
     def embed_query(self, query: str) -> List[float]:
         embedding_logger.info(f"调用Gitee AI Embedding模型: {self.model_name}")
@@ -432,9 +585,8 @@ class GiteeAIEmbeddingAdapter(BaseEmbeddingAdapter):
                 "input": query,
                 "model": self.model_name
             }
-            # 创建一个不使用系统代理的会话
-            session = requests.Session()
-            session.trust_env = False
+            # 不使用系统代理的会话
+            session = get_http_session(use_proxy=False)
             response = session.post(self.url, json=payload, headers=self.headers)
             response.raise_for_status()
             result = response.json()
@@ -463,18 +615,21 @@ def create_embedding_adapter(
     """
     fmt = interface_format.strip().lower()
     if fmt == "openai":
-        return OpenAIEmbeddingAdapter(api_key, base_url, model_name)
+        adapter = OpenAIEmbeddingAdapter(api_key, base_url, model_name)
     elif fmt == "azure openai":
-        return AzureOpenAIEmbeddingAdapter(api_key, base_url, model_name)
+        adapter = AzureOpenAIEmbeddingAdapter(api_key, base_url, model_name)
     elif fmt == "ollama":
-        return OllamaEmbeddingAdapter(model_name, base_url)
+        adapter = OllamaEmbeddingAdapter(model_name, base_url)
     elif fmt == "ml studio":
-        return MLStudioEmbeddingAdapter(api_key, base_url, model_name)
+        adapter = MLStudioEmbeddingAdapter(api_key, base_url, model_name)
     elif fmt == "gemini":
-        return GeminiEmbeddingAdapter(api_key, model_name, base_url)
+        adapter = GeminiEmbeddingAdapter(api_key, model_name, base_url)
     elif fmt == "siliconflow":
-        return SiliconFlowEmbeddingAdapter(api_key, base_url, model_name)
+        adapter = SiliconFlowEmbeddingAdapter(api_key, base_url, model_name)
     elif fmt == "gitee ai":
-        return GiteeAIEmbeddingAdapter(api_key, base_url, model_name)
+        adapter = GiteeAIEmbeddingAdapter(api_key, base_url, model_name)
     else:
-        raise ValueError(f"Unknown embedding interface_format: {interface_format}")
\ No newline at end of file
+        raise ValueError(f"Unknown embedding interface_format: {interface_format}")
+    # 接口格式与模型名一起标识向量空间（Embedding 缓存按此区分）
+    adapter.interface_format = fmt
+    return adapter
\ No newline at end of file
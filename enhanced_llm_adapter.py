@@ -7,12 +7,15 @@
 
 import os
 import time
+import asyncio
 import logging
 import requests
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Union, Iterator
 from openai import OpenAI
 import httpx
 
+from retry_policy import RetryPolicy, clamp_timeout
+
 # 导入高级日志系统
 try:
     from advanced_logger import llm_logger, log_llm_request, log_llm_response
@@ -21,9 +24,16 @@ except ImportError:
     ADVANCED_LOGGING = False
     llm_logger = logging.getLogger("enhanced_llm_adapter")
 
+# 导入调用遥测
+try:
+    from llm_telemetry import report_usage
+except ImportError:
+    def report_usage(response):
+        pass
+
 # 导入网络管理器
 try:
-    from network_manager import get_connection_manager, NetworkError
+    from network_manager import get_connection_manager, get_async_http_client, get_rate_limiter, NetworkError
     NETWORK_MANAGER_AVAILABLE = True
 except ImportError:
     NETWORK_MANAGER_AVAILABLE = False
@@ -136,82 +146,174 @@ class EnhancedLLMAdapter:
                     f"{self.base_url}/chat/completions",
                     headers=headers,
                     json=data,
-                    use_proxy=False
+                    use_proxy=False,
+                    endpoint=self.base_url,
+                    limiter=get_rate_limiter(self.base_url, self.api_key)
                 )
             else:
                 response = requests.post(
                     f"{self.base_url}/chat/completions",
                     headers=headers,
                     json=data,
-                    timeout=self.timeout
+                    timeout=clamp_timeout(self.timeout)
                 )
 
             if response.status_code == 200:
                 result = response.json()
+                report_usage(result)
                 content = result['choices'][0]['message']['content']
                 return content
             else:
-                raise Exception(f"API错误: {response.status_code} - {response.text}")
+                # 携带 response，便于上层识别 429 并读取 Retry-After
+                raise requests.HTTPError(f"API错误: {response.status_code} - {response.text}", response=response)
 
         except Exception as e:
             if ADVANCED_LOGGING:
                 llm_logger.error(f"直接API调用失败: {e}")
             raise
 
+    def _make_client_request(self, messages: list) -> str:
+        """使用OpenAI客户端调用"""
+        start_time = time.time()
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            timeout=clamp_timeout(self.timeout)
+        )
+        if self.network_manager:
+            self.network_manager.record_latency(self.base_url, time.time() - start_time)
+        if not response or not response.choices:
+            raise ValueError("OpenAI客户端返回空响应")
+        report_usage(response)
+        return response.choices[0].message.content
+
     def invoke(self, prompt: str) -> str:
-        """调用LLM，支持多种方法回退"""
+        """
+        调用LLM，支持多种方法回退：OpenAI客户端 → 直接API调用 → 最小化请求。
+        回退链按统一重试策略计数：遇到不可重试的错误（如认证失败）或阶段截止时间已到时不再尝试后续方法。
+        """
         messages = [{"role": "user", "content": prompt}]
 
         if ADVANCED_LOGGING:
             llm_logger.info(f"调用增强LLM: {self.model_name}")
             log_llm_request(prompt, self.model_name, self.interface_format)
 
-        try:
-            # 方法1: 使用OpenAI客户端
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens
-                )
+        methods = [
+            ("OpenAI客户端调用", lambda: self._make_client_request(messages)),
+            ("直接API调用", lambda: self._make_direct_request(messages)),
+            ("最小化请求", lambda: self._make_minimal_request(prompt)),
+        ]
+        policy = RetryPolicy("enhanced_fallback", max_attempts=len(methods), base_delay=0)
 
-                if response and response.choices:
-                    content = response.choices[0].message.content
+        try:
+            for attempt, (label, method) in enumerate(methods, 1):
+                policy.begin_attempt(attempt)
+                try:
+                    content = method()
+                except Exception as e:
                     if ADVANCED_LOGGING:
-                        log_llm_response(content, self.model_name, self.interface_format)
-                    return content
-
-            except Exception as e:
-                if ADVANCED_LOGGING:
-                    llm_logger.warning(f"OpenAI客户端调用失败，尝试直接API调用: {e}")
-
-            # 方法2: 直接API调用
-            try:
-                content = self._make_direct_request(messages)
+                        llm_logger.warning(f"{label}失败: {e}")
+                    if policy.next_delay(attempt, e) is None:
+                        raise Exception(f"所有调用方法都失败了: {e}") from e
+                    continue
+                policy.record_success()
                 if ADVANCED_LOGGING:
                     log_llm_response(content, self.model_name, self.interface_format)
                 return content
 
-            except Exception as e:
+        except Exception as e:
+            error_msg = f"增强LLM调用失败: {str(e)}"
+            if ADVANCED_LOGGING:
+                llm_logger.error(error_msg)
+            return f"[错误] {error_msg}"
+
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        """流式调用LLM；首个片段前失败时回退到 invoke 的多方法回退链"""
+        messages = [{"role": "user", "content": prompt}]
+
+        if ADVANCED_LOGGING:
+            llm_logger.info(f"流式调用增强LLM: {self.model_name}")
+            log_llm_request(prompt, self.model_name, self.interface_format)
+
+        parts = []
+        stream = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            if parts:
                 if ADVANCED_LOGGING:
-                    llm_logger.error(f"直接API调用也失败: {e}")
+                    llm_logger.error(f"流式输出中断: {e}")
+                raise
+            if ADVANCED_LOGGING:
+                llm_logger.warning(f"流式调用失败，回退为普通调用: {e}")
+            content = self.invoke(prompt)
+            if content:
+                yield content
+            return
+        finally:
+            if stream is not None:
+                stream.close()
 
-                # 方法3: 最小化请求
-                try:
-                    content = self._make_minimal_request(prompt)
-                    if ADVANCED_LOGGING:
-                        log_llm_response(content, self.model_name, self.interface_format)
-                    return content
+        if ADVANCED_LOGGING:
+            log_llm_response("".join(parts), self.model_name, self.interface_format)
 
-                except Exception as final_e:
-                    raise Exception(f"所有调用方法都失败了: {final_e}")
+    async def ainvoke(self, prompt: str) -> str:
+        """异步调用LLM；原生异步请求失败时在线程池中回退到 invoke 的多方法回退链"""
+        if not NETWORK_MANAGER_AVAILABLE:
+            return await asyncio.to_thread(self.invoke, prompt)
 
+        if ADVANCED_LOGGING:
+            llm_logger.info(f"异步调用增强LLM: {self.model_name}")
+            log_llm_request(prompt, self.model_name, self.interface_format)
+
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        data = {
+            'model': self.model_name,
+            'messages': [{"role": "user", "content": prompt}],
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens
+        }
+
+        try:
+            client = get_async_http_client()
+            start_time = time.time()
+            response = await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=data,
+                timeout=clamp_timeout(self.timeout)
+            )
+            response.raise_for_status()
+            if self.network_manager:
+                self.network_manager.record_latency(self.base_url, time.time() - start_time)
+            result = response.json()
+            report_usage(result)
+            content = result['choices'][0]['message']['content']
+            if ADVANCED_LOGGING:
+                log_llm_response(content, self.model_name, self.interface_format)
+            return content
         except Exception as e:
-            error_msg = f"增强LLM调用失败: {str(e)}"
             if ADVANCED_LOGGING:
-                llm_logger.error(error_msg)
-            return f"[错误] {error_msg}"
+                llm_logger.warning(f"异步调用失败，回退为同步调用: {e}")
+            return await asyncio.to_thread(self.invoke, prompt)
 
     def _make_minimal_request(self, prompt: str) -> str:
         """最小化的请求，仅用于最后回退"""
@@ -230,7 +332,7 @@ class EnhancedLLMAdapter:
             f"{self.base_url}/chat/completions",
             headers=headers,
             json=data,
-            timeout=30  # 更短的超时
+            timeout=clamp_timeout(30)  # 更短的超时
         )
 
         if response.status_code == 200:
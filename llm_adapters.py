@@ -1,8 +1,14 @@
 # llm_adapters.py
 # -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import contextvars
 import logging
+import threading
 import time
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, Callable, Tuple, Iterator
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
 import google.generativeai as genai
 from google.generativeai.types import GenerationConfig
@@ -12,6 +18,8 @@ from azure.ai.inference.models import SystemMessage, UserMessage
 from openai import OpenAI
 import requests
 
+from retry_policy import clamp_timeout
+
 # 导入高级日志系统
 try:
     from advanced_logger import llm_logger, log_llm_request, log_llm_response
@@ -20,13 +28,27 @@ except ImportError:
     ADVANCED_LOGGING = False
     llm_logger = logging.getLogger("llm_adapters")
 
+# 导入调用遥测
+try:
+    from llm_telemetry import get_telemetry, report_usage
+    TELEMETRY_AVAILABLE = True
+except ImportError:
+    TELEMETRY_AVAILABLE = False
+
+    def report_usage(response):
+        pass
+
 # 导入BMAD网络管理器
 try:
-    from network_manager import get_connection_manager, NetworkError
+    from network_manager import (
+        get_connection_manager, get_async_http_client, get_rate_limiter, estimate_tokens,
+        get_circuit_breaker, get_failover_chain, get_hedge_policy, NetworkError, CircuitOpenError
+    )
     NETWORK_MANAGER_AVAILABLE = True
 except ImportError:
     NETWORK_MANAGER_AVAILABLE = False
     NetworkError = Exception
+    CircuitOpenError = Exception
 
 def check_base_url(url: str) -> str:
     """
@@ -54,6 +76,116 @@ class BaseLLMAdapter:
     def invoke(self, prompt: str) -> str:
         raise NotImplementedError("Subclasses must implement .invoke(prompt) method.")
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        """
+        流式调用：逐段产出模型输出的文本片段。
+        不支持原生流式的后端回退为一次完整调用，整体作为单个片段产出。
+        """
+        result = self.invoke(prompt)
+        if result:
+            yield result
+
+    async def ainvoke(self, prompt: str) -> str:
+        """
+        异步调用。默认在线程池中执行同步 invoke；
+        OpenAI 兼容接口的适配器覆盖为基于共享 httpx.AsyncClient 的原生实现。
+        """
+        return await asyncio.to_thread(self.invoke, prompt)
+
+async def _openai_compatible_ainvoke(adapter: BaseLLMAdapter, prompt: str, adapter_type: str, system_prompt: Optional[str] = None, **params) -> str:
+    """
+    通过当前事件循环共享的 httpx.AsyncClient 直接请求 OpenAI 兼容的 /chat/completions 接口。
+    params 为额外的采样参数（temperature、max_tokens 等），与各适配器同步调用时的参数保持一致。
+    """
+    if not NETWORK_MANAGER_AVAILABLE:
+        return await asyncio.to_thread(adapter.invoke, prompt)
+
+    llm_logger.info(f"异步调用{adapter_type}模型: {adapter.model_name}")
+    log_llm_request(prompt, adapter.model_name, adapter_type)
+
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    payload = {"model": adapter.model_name, "messages": messages}
+    payload.update(params)
+    headers = {
+        "Authorization": f"Bearer {adapter.api_key}",
+        "Content-Type": "application/json"
+    }
+
+    try:
+        client = get_async_http_client()
+        start_time = time.time()
+        response = await client.post(
+            f"{adapter.base_url.rstrip('/')}/chat/completions",
+            json=payload,
+            headers=headers,
+            timeout=clamp_timeout(adapter.timeout)
+        )
+        response.raise_for_status()
+        get_connection_manager().record_latency(adapter.base_url, time.time() - start_time)
+        data = response.json()
+        report_usage(data)
+        content = data["choices"][0]["message"].get("content")
+        result = content if content is not None else ""
+        log_llm_response(result, adapter.model_name, adapter_type)
+        return result
+    except Exception as e:
+        logging.error(f"{adapter_type} 异步调用失败: {e}")
+        return ""
+
+def _guarded_stream(adapter: BaseLLMAdapter, prompt: str, stream_factory: Callable[[], Iterator[str]], adapter_type: str) -> Iterator[str]:
+    """
+    包装原生流式输出：
+    - 首个片段之前出错时回退为普通 invoke（复用其重试与错误处理）
+    - 已输出部分内容后出错则向上抛出，避免静默返回残缺文本
+    - 调用方提前停止迭代时关闭底层流，及时释放连接、停止计费
+    """
+    llm_logger.info(f"流式调用{adapter_type}模型: {adapter.model_name}")
+    log_llm_request(prompt, adapter.model_name, adapter_type)
+    parts = []
+    stream = None
+    try:
+        stream = stream_factory()
+        for piece in stream:
+            if piece:
+                parts.append(piece)
+                yield piece
+    except Exception as e:
+        if parts:
+            llm_logger.error(f"{adapter_type}流式输出中断: {e}")
+            raise
+        llm_logger.warning(f"{adapter_type}流式调用失败，回退为普通调用: {e}")
+        result = adapter.invoke(prompt)
+        if result:
+            yield result
+        return
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    log_llm_response("".join(parts), adapter.model_name, adapter_type)
+
+def _iter_langchain_chunks(client, prompt: str) -> Iterator[str]:
+    """迭代 langchain ChatModel.stream 的文本片段"""
+    for chunk in client.stream(prompt):
+        content = chunk.content
+        if content:
+            yield content if isinstance(content, str) else str(content)
+
+def _iter_openai_chunks(client, **kwargs) -> Iterator[str]:
+    """迭代 openai SDK chat.completions 流式响应的文本片段"""
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    finally:
+        stream.close()
+
 class DeepSeekAdapter(BaseLLMAdapter):
     """
     增强的DeepSeek适配器 - 使用增强的LLM适配器确保连接稳定
@@ -124,6 +256,7 @@ class DeepSeekAdapter(BaseLLMAdapter):
                 response = self._client.invoke(prompt)
                 if not response:
                     raise ValueError("No response from DeepSeekAdapter")
+                report_usage(response)
                 content = response.content
                 result = content if isinstance(content, str) else str(content)
                 return result
@@ -131,7 +264,9 @@ class DeepSeekAdapter(BaseLLMAdapter):
             try:
                 # 使用BMAD网络管理器执行请求
                 if self.network_manager:
-                    result = self.network_manager.make_request_with_retry(_make_request)
+                    result = self.network_manager.make_request_with_retry(
+                        _make_request, endpoint=self.base_url, limiter=get_rate_limiter(self.base_url, self.api_key)
+                    )
                 else:
                     # 回退到原始方法
                     result = _make_request()
@@ -151,6 +286,16 @@ class DeepSeekAdapter(BaseLLMAdapter):
                 logging.error(error_msg)
                 return f"[API错误] {error_msg}"
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        if self.use_enhanced:
+            return self.enhanced_adapter.invoke_stream(prompt)
+        return _guarded_stream(self, prompt, lambda: _iter_langchain_chunks(self._client, prompt), "DeepSeek")
+
+    async def ainvoke(self, prompt: str) -> str:
+        if self.use_enhanced:
+            return await self.enhanced_adapter.ainvoke(prompt)
+        return await _openai_compatible_ainvoke(self, prompt, "DeepSeek", temperature=self.temperature)
+
 class OpenAIAdapter(BaseLLMAdapter):
     """
     适配官方/OpenAI兼容接口（使用 langchain.ChatOpenAI）
@@ -193,6 +338,7 @@ class OpenAIAdapter(BaseLLMAdapter):
             response = self._client.invoke(prompt)
             if not response:
                 raise ValueError("No response from OpenAIAdapter")
+            report_usage(response)
             content = response.content
             result = content if isinstance(content, str) else str(content)
             return result
@@ -200,7 +346,9 @@ class OpenAIAdapter(BaseLLMAdapter):
         try:
             # 使用BMAD网络管理器执行请求
             if self.network_manager:
-                result = self.network_manager.make_request_with_retry(_make_request)
+                result = self.network_manager.make_request_with_retry(
+                    _make_request, endpoint=self.base_url, limiter=get_rate_limiter(self.base_url, self.api_key)
+                )
             else:
                 # 回退到原始方法
                 result = _make_request()
@@ -220,6 +368,12 @@ class OpenAIAdapter(BaseLLMAdapter):
             logging.error(error_msg)
             return f"[API错误] {error_msg}"
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_langchain_chunks(self._client, prompt), "OpenAI")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(self, prompt, "OpenAI", temperature=self.temperature)
+
 class GeminiAdapter(BaseLLMAdapter):
     """
     适配 Google Gemini (Google Generative AI) 接口
@@ -266,6 +420,27 @@ class GeminiAdapter(BaseLLMAdapter):
             logging.error(f"Gemini API 调用失败: {e}")
             return ""
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        def _iter_chunks():
+            generation_config = GenerationConfig(
+                max_output_tokens=self.max_tokens,
+                temperature=self.temperature,
+            )
+            response = self._model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # 被安全策略拦截等情况下片段不含文本
+                    continue
+                if text:
+                    yield text
+        return _guarded_stream(self, prompt, _iter_chunks, "Gemini")
+
 class AzureOpenAIAdapter(BaseLLMAdapter):
     """
     适配 Azure OpenAI 接口（使用 langchain.ChatOpenAI）
@@ -302,6 +477,7 @@ class AzureOpenAIAdapter(BaseLLMAdapter):
         if not response:
             logging.warning("No response from AzureOpenAIAdapter.")
             return ""
+        report_usage(response)
         content = response.content
         result = content if isinstance(content, str) else str(content)
         log_llm_response(result, self.model_name, "Azure OpenAI")
@@ -337,11 +513,18 @@ class OllamaAdapter(BaseLLMAdapter):
         if not response:
             logging.warning("No response from OllamaAdapter.")
             return ""
+        report_usage(response)
         content = response.content
         result = content if isinstance(content, str) else str(content)
         log_llm_response(result, self.model_name, "Ollama")
         return result
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_langchain_chunks(self._client, prompt), "Ollama")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(self, prompt, "Ollama", temperature=self.temperature)
+
 class MLStudioAdapter(BaseLLMAdapter):
     """
     适配 LM Studio 的 /v1/chat/completions 接口
@@ -369,11 +552,18 @@ class MLStudioAdapter(BaseLLMAdapter):
         if not response:
             logging.warning("No response from MLStudioAdapter.")
             return ""
+        report_usage(response)
         content = response.content
         result = content if isinstance(content, str) else str(content)
         log_llm_response(result, self.model_name, "ML Studio")
         return result
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_langchain_chunks(self._client, prompt), "ML Studio")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(self, prompt, "ML Studio", temperature=self.temperature)
+
 class AzureAIAdapter(BaseLLMAdapter):
     """
     适配 Azure AI Inference API (非 Azure OpenAI)
@@ -407,6 +597,7 @@ class AzureAIAdapter(BaseLLMAdapter):
             )
             
             if response and response.choices:
+                report_usage(response)
                 content = response.choices[0].message.content
                 result = content if content is not None else ""
                 log_llm_response(result, self.model_name, "Azure AI")
@@ -448,6 +639,7 @@ class VolcanoEngineAIAdapter(BaseLLMAdapter):
             if not response:
                 logging.warning("No response from DeepSeekAdapter.")
                 return ""
+            report_usage(response)
             content = response.choices[0].message.content
             result = content if content is not None else ""
             log_llm_response(result, self.model_name, "火山引擎")
@@ -456,6 +648,20 @@ class VolcanoEngineAIAdapter(BaseLLMAdapter):
             logging.error(f"火山引擎API调用超时或失败: {e}")
             return ""
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_openai_chunks(
+            self._client,
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "你是DeepSeek，是一个 AI 人工智能助手"},
+                {"role": "user", "content": prompt},
+            ],
+            timeout=self.timeout
+        ), "火山引擎")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(self, prompt, "火山引擎", system_prompt="你是DeepSeek，是一个 AI 人工智能助手")
+
 class SiliconFlowAdapter(BaseLLMAdapter):
     def __init__(self, api_key: str, base_url: str, model_name: str, max_tokens: int, temperature: float = 0.7, timeout: Optional[int] = 600):
         self.base_url = check_base_url(base_url)
@@ -485,6 +691,7 @@ class SiliconFlowAdapter(BaseLLMAdapter):
             if not response:
                 logging.warning("No response from DeepSeekAdapter.")
                 return ""
+            report_usage(response)
             content = response.choices[0].message.content
             result = content if content is not None else ""
             log_llm_response(result, self.model_name, "硅基流动")
@@ -492,6 +699,20 @@ class SiliconFlowAdapter(BaseLLMAdapter):
         except Exception as e:
             logging.error(f"硅基流动API调用超时或失败: {e}")
             return ""
+
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_openai_chunks(
+            self._client,
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "你是DeepSeek，是一个 AI 人工智能助手"},
+                {"role": "user", "content": prompt},
+            ],
+            timeout=self.timeout
+        ), "硅基流动")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(self, prompt, "硅基流动", system_prompt="你是DeepSeek，是一个 AI 人工智能助手")
 # grok實現
 class GrokAdapter(BaseLLMAdapter):
     """
@@ -526,6 +747,7 @@ class GrokAdapter(BaseLLMAdapter):
                 timeout=self.timeout
             )
             if response and response.choices:
+                report_usage(response)
                 content = response.choices[0].message.content
                 result = content if content is not None else ""
                 log_llm_response(result, self.model_name, "Grok")
@@ -537,6 +759,25 @@ class GrokAdapter(BaseLLMAdapter):
             logging.error(f"Grok API 调用失败: {e}")
             return ""
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_openai_chunks(
+            self._client,
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "You are Grok, created by xAI."},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            timeout=self.timeout
+        ), "Grok")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(
+            self, prompt, "Grok", system_prompt="You are Grok, created by xAI.",
+            max_tokens=self.max_tokens, temperature=self.temperature
+        )
+
 # 智谱AI实现
 class ZhipuAIAdapter(BaseLLMAdapter):
     """
@@ -571,6 +812,7 @@ class ZhipuAIAdapter(BaseLLMAdapter):
                 timeout=self.timeout
             )
             if response and response.choices:
+                report_usage(response)
                 content = response.choices[0].message.content
                 # 修复：确保content不为None
                 result = content if content is not None else ""
@@ -590,6 +832,25 @@ class ZhipuAIAdapter(BaseLLMAdapter):
             logging.error(f"异常追踪: {traceback.format_exc()}")
             return ""
 
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        return _guarded_stream(self, prompt, lambda: _iter_openai_chunks(
+            self._client,
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": "你是一个AI助手"},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            timeout=self.timeout
+        ), "智谱")
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await _openai_compatible_ainvoke(
+            self, prompt, "智谱", system_prompt="你是一个AI助手",
+            max_tokens=self.max_tokens, temperature=self.temperature
+        )
+
     def get_model_list(self):
         """
         获取智谱AI支持的模型列表
@@ -622,7 +883,513 @@ class ZhipuAIAdapter(BaseLLMAdapter):
             logging.error(f"获取智谱AI模型列表时出错: {e}")
             return []
 
+# 适配器以字符串形式返回的错误结果前缀
+_ERROR_RESULT_PREFIXES = ("[网络错误]", "[API错误]", "[错误]")
+
+def _is_error_result(result: Optional[str]) -> bool:
+    return not result or result.startswith(_ERROR_RESULT_PREFIXES)
+
+class ManagedLLMAdapter(BaseLLMAdapter):
+    """
+    create_llm_adapter 返回的统一包装：在具体适配器外层套上进程级的调用治理，
+    包括按 (主机, api_key) 共享的限流器和按端点（主机 + 模型）的熔断器；
+    model_name、temperature、base_url 保存创建时的配置（部分内部适配器不设置这些属性），
+    其余属性透明转发给内部适配器。
+    """
+    def __init__(self, adapter: BaseLLMAdapter, base_url: str, api_key: str,
+                 model_name: Optional[str] = None, temperature: Optional[float] = None):
+        self.adapter = adapter
+        self.base_url = base_url
+        self.model_name = model_name if model_name is not None else getattr(adapter, "model_name", "")
+        self.temperature = temperature if temperature is not None else getattr(adapter, "temperature", None)
+        self._limit_api_key = api_key
+
+    def __getattr__(self, name):
+        return getattr(self.adapter, name)
+
+    def _limiter(self):
+        # 每次调用时查找，配置变更后立即生效
+        if not NETWORK_MANAGER_AVAILABLE:
+            return None
+        return get_rate_limiter(self.base_url, self._limit_api_key)
+
+    @property
+    def breaker(self):
+        if not NETWORK_MANAGER_AVAILABLE:
+            return None
+        return get_circuit_breaker(self.base_url, self.model_name)
+
+    def _check_breaker(self):
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow_request():
+            raise CircuitOpenError(f"端点熔断中，暂不发送请求: {breaker.name}")
+        return breaker
+
+    def _track(self, prompt: str):
+        if not TELEMETRY_AVAILABLE:
+            return contextlib.nullcontext({})
+        return get_telemetry().track("llm", self.model_name, self.base_url, prompt)
+
+    @staticmethod
+    def _finish_record(record: dict, result: str):
+        record["output"] = result
+        if _is_error_result(result):
+            record["outcome"] = "empty" if not result else "error"
+            record["error"] = (result or "")[:200]
+
+    @staticmethod
+    def _record_outcome(breaker, failed: bool, latency: float):
+        if breaker is None:
+            return
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success(latency)
+
+    def invoke(self, prompt: str) -> str:
+        with self._track(prompt) as record:
+            result = self._invoke(prompt)
+            self._finish_record(record, result)
+        return result
+
+    def _invoke(self, prompt: str) -> str:
+        breaker = self._check_breaker()
+        limiter = self._limiter()
+        start_time = time.monotonic()
+        try:
+            if limiter is None:
+                result = self.adapter.invoke(prompt)
+            else:
+                with limiter.limit(estimate_tokens(prompt)):
+                    result = self.adapter.invoke(prompt)
+                    limiter.consume_tokens(estimate_tokens(result))
+        except Exception:
+            self._record_outcome(breaker, True, 0.0)
+            raise
+        self._record_outcome(breaker, _is_error_result(result), time.monotonic() - start_time)
+        return result
+
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        # 流式调用跨越多次 yield，不能依赖上下文变量，遥测记录在这里手动开始和结束
+        telemetry = get_telemetry() if TELEMETRY_AVAILABLE else None
+        record = telemetry.start_record("llm", self.model_name, self.base_url) if telemetry else {}
+        parts = []
+        breaker = None
+        limiter = None
+        try:
+            breaker = self._check_breaker()
+            limiter = self._limiter()
+            start_time = time.monotonic()
+            first_latency = None
+            if limiter is not None:
+                limiter.acquire(estimate_tokens(prompt))
+            stream = self.adapter.invoke_stream(prompt)
+            try:
+                for piece in stream:
+                    if first_latency is None:
+                        # 流式调用按首个片段的延迟计入熔断器，避免长文本被误判为慢调用
+                        first_latency = time.monotonic() - start_time
+                    if limiter is not None:
+                        limiter.consume_tokens(estimate_tokens(piece))
+                    parts.append(piece)
+                    yield piece
+            except GeneratorExit:
+                raise
+            except Exception:
+                self._record_outcome(breaker, True, 0.0)
+                breaker = None
+                raise
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+                if limiter is not None:
+                    limiter.release()
+                if breaker is not None:
+                    # 没有任何片段，或唯一的输出是被吞掉的错误字符串，都按失败计入熔断器
+                    failed = first_latency is None or _is_error_result("".join(parts))
+                    self._record_outcome(breaker, failed, first_latency or 0.0)
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            record["outcome"] = "error"
+            record["error"] = f"{type(e).__name__}: {str(e)[:200]}"
+            raise
+        finally:
+            if telemetry is not None:
+                output = "".join(parts)
+                if not output and record["outcome"] == "ok":
+                    record["outcome"] = "empty"
+                telemetry.finish_record(record, prompt, output)
+
+    async def ainvoke(self, prompt: str) -> str:
+        with self._track(prompt) as record:
+            result = await self._ainvoke(prompt)
+            self._finish_record(record, result)
+        return result
+
+    async def _ainvoke(self, prompt: str) -> str:
+        breaker = self._check_breaker()
+        limiter = self._limiter()
+        start_time = time.monotonic()
+        if limiter is not None:
+            await limiter.aacquire(estimate_tokens(prompt))
+        try:
+            result = await self.adapter.ainvoke(prompt)
+            if limiter is not None:
+                limiter.consume_tokens(estimate_tokens(result))
+        except Exception:
+            self._record_outcome(breaker, True, 0.0)
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release()
+        self._record_outcome(breaker, _is_error_result(result), time.monotonic() - start_time)
+        return result
+
+class FailoverLLMAdapter(BaseLLMAdapter):
+    """
+    按流水线角色配置的故障转移适配器。
+    候选端点中跳过熔断中的端点，并优先选择观测延迟最低的端点；
+    某个端点失败（异常、空结果或错误字符串）时依次尝试下一个。
+    """
+    def __init__(self, candidates: list, role: str = ""):
+        # candidates: [(名称, ManagedLLMAdapter), ...]，顺序即未知延迟时的优先级
+        self.candidates = candidates
+        self.role = role
+        self.adapter = candidates[0][1]
+
+    def __getattr__(self, name):
+        return getattr(self.adapter, name)
+
+    def _ordered(self) -> list:
+        def sort_key(item):
+            index, (_, adapter) = item
+            breaker = getattr(adapter, "breaker", None)
+            available = breaker.is_available() if breaker is not None else True
+            latency = breaker.latency_ewma if breaker is not None and breaker.latency_ewma is not None else float("inf")
+            return (not available, latency, index)
+        return [candidate for _, candidate in sorted(enumerate(self.candidates), key=sort_key)]
+
+    def _log_failover(self, name: str, reason: str):
+        llm_logger.warning(f"[{self.role}] 端点 {name} 不可用，尝试下一个候选: {reason}")
+
+    def invoke(self, prompt: str) -> str:
+        result, last_error = "", None
+        for name, adapter in self._ordered():
+            try:
+                result = adapter.invoke(prompt)
+            except Exception as e:
+                last_error = e
+                self._log_failover(name, str(e))
+                continue
+            if not _is_error_result(result):
+                return result
+            self._log_failover(name, result[:100] if result else "空响应")
+        if last_error is not None and not result:
+            raise last_error
+        return result
+
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        last_error = None
+        for name, adapter in self._ordered():
+            started = False
+            try:
+                for piece in adapter.invoke_stream(prompt):
+                    started = True
+                    yield piece
+                if started:
+                    return
+                self._log_failover(name, "空响应")
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                self._log_failover(name, str(e))
+        if last_error is not None:
+            raise last_error
+
+    async def ainvoke(self, prompt: str) -> str:
+        result, last_error = "", None
+        for name, adapter in self._ordered():
+            try:
+                result = await adapter.ainvoke(prompt)
+            except Exception as e:
+                last_error = e
+                self._log_failover(name, str(e))
+                continue
+            if not _is_error_result(result):
+                return result
+            self._log_failover(name, result[:100] if result else "空响应")
+        if last_error is not None and not result:
+            raise last_error
+        return result
+
+# 对冲请求共用的线程池：主请求与对冲请求都在其中执行，落败方的结果直接丢弃
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+class HedgedLLMAdapter(BaseLLMAdapter):
+    """
+    对冲请求适配器（仅对 config.json 中 hedging.roles 指定角色的短提示词生效）。
+    主请求超过端点观测的 p90 延迟仍未返回时，向备用端点（未配置故障转移时为同一端点）
+    再发一个相同请求，取先成功返回的结果；额外请求数受 HedgePolicy 的预算比例约束。
+    同步调用无法中断已发出的 HTTP 请求，落败方在后台跑完后结果被丢弃；异步调用会直接取消落败的任务。
+    """
+    def __init__(self, adapter: BaseLLMAdapter, secondary: BaseLLMAdapter, role: str, endpoint: str):
+        self.adapter = adapter
+        self.secondary = secondary
+        self.role = role
+        self.endpoint = endpoint
+
+    def __getattr__(self, name):
+        return getattr(self.adapter, name)
+
+    def _policy(self, prompt: str):
+        if not NETWORK_MANAGER_AVAILABLE:
+            return None
+        policy = get_hedge_policy()
+        return policy if policy.is_eligible(self.role, prompt) else None
+
+    def _observe_primary(self, policy, start_time: float):
+        # 主请求自身的耗时（被取消时为取消时刻，即真实耗时的下界），用于估计 p90 与未对冲时的 p99
+        return lambda _: policy.observe(self.endpoint, time.monotonic() - start_time)
+
+    def invoke(self, prompt: str) -> str:
+        policy = self._policy(prompt)
+        if policy is None:
+            return self.adapter.invoke(prompt)
+
+        start_time = time.monotonic()
+        delay = policy.hedge_delay(self.endpoint)
+        # 在线程池中沿用调用方的上下文（阶段截止时间等）
+        primary = _hedge_executor.submit(contextvars.copy_context().run, self.adapter.invoke, prompt)
+        primary.add_done_callback(self._observe_primary(policy, start_time))
+        futures = {primary: "primary"}
+        if delay is not None:
+            done, _ = wait([primary], timeout=delay)
+            if not done and policy.try_spend():
+                llm_logger.info(f"[{self.role}] 主请求超过 {delay:.2f}s 未返回，发出对冲请求")
+                futures[_hedge_executor.submit(contextvars.copy_context().run, self.secondary.invoke, prompt)] = "hedge"
+
+        result, winner, last_error = "", None, None
+        pending = set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    value = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                result = value
+                if not _is_error_result(value):
+                    winner = futures[future]
+                    break
+        for future in pending:
+            future.cancel()
+
+        policy.record_call(time.monotonic() - start_time, hedge_won=winner == "hedge")
+        if last_error is not None and not result:
+            raise last_error
+        return result
+
+    def invoke_stream(self, prompt: str) -> Iterator[str]:
+        # 流式输出已经按片段返回，对冲收益有限，直接透传
+        return self.adapter.invoke_stream(prompt)
+
+    async def ainvoke(self, prompt: str) -> str:
+        policy = self._policy(prompt)
+        if policy is None:
+            return await self.adapter.ainvoke(prompt)
+
+        start_time = time.monotonic()
+        delay = policy.hedge_delay(self.endpoint)
+        primary = asyncio.ensure_future(self.adapter.ainvoke(prompt))
+        primary.add_done_callback(self._observe_primary(policy, start_time))
+        tasks = {primary: "primary"}
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done and policy.try_spend():
+                llm_logger.info(f"[{self.role}] 主请求超过 {delay:.2f}s 未返回，发出对冲请求")
+                tasks[asyncio.ensure_future(self.secondary.ainvoke(prompt))] = "hedge"
+
+        result, winner, last_error = "", None, None
+        pending = set(tasks)
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        value = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    result = value
+                    if not _is_error_result(value):
+                        winner = tasks[task]
+                        break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        policy.record_call(time.monotonic() - start_time, hedge_won=winner == "hedge")
+        if last_error is not None and not result:
+            raise last_error
+        return result
+
+class LLMAdapterPool:
+    """
+    LLM 适配器复用池。
+    按配置元组 (interface_format, base_url, model, temperature, max_tokens, timeout, api_key)
+    缓存适配器实例，使同一配置的多次调用共享底层 HTTP 客户端（保持 keep-alive 连接），
+    并避免重复执行 ConnectionManager 的超时探测。
+    适配器实例本身是无状态的，可在多线程间共享；空闲超过 idle_ttl 的实例会被淘汰。
+    """
+    def __init__(self, max_size: int = 32, idle_ttl: float = 900.0):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, list]" = OrderedDict()  # key -> [adapter, last_used]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key: Tuple, factory: Callable[[], BaseLLMAdapter]) -> BaseLLMAdapter:
+        """命中则返回已有实例，否则调用 factory 创建并登记。"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = now
+                self._entries.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+
+        # 构造可能包含网络探测，放在锁外执行，避免阻塞其它配置的获取
+        adapter = factory()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # 并发创建时以先登记的实例为准
+                entry[1] = now
+                return entry[0]
+            self._entries[key] = [adapter, now]
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return adapter
+
+    def _evict_idle(self, now: float):
+        """淘汰空闲超时的实例（调用方需持有锁）"""
+        expired = [k for k, (_, last_used) in self._entries.items() if now - last_used > self.idle_ttl]
+        for k in expired:
+            del self._entries[k]
+        self.evictions += len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# 全局适配器复用池
+_adapter_pool = LLMAdapterPool()
+
+def get_llm_adapter_pool() -> LLMAdapterPool:
+    """获取全局 LLM 适配器复用池"""
+    return _adapter_pool
+
+
 def create_llm_adapter(
+    interface_format: str,
+    base_url: str,
+    model_name: str,
+    api_key: str,
+    temperature: float,
+    max_tokens: int,
+    timeout: int,
+    use_pool: bool = True,
+    role: str = ""
+) -> BaseLLMAdapter:
+    """
+    工厂函数：根据 interface_format 返回不同的适配器实例（外层包装 ManagedLLMAdapter 以接入限流、熔断等治理）。
+    默认从全局复用池中获取共享实例；use_pool=False 时总是新建。
+    role 为流水线角色（draft / finalize / summarize）；该角色在 config.json 的 failover_configs 中
+    配置了候选时，返回在这些端点间自动故障转移的 FailoverLLMAdapter；
+    该角色开启了 hedging 时再包装一层 HedgedLLMAdapter。
+    """
+    primary = _create_managed_llm_adapter(interface_format, base_url, model_name, api_key, temperature, max_tokens, timeout, use_pool)
+    chain = get_failover_chain(role) if role and NETWORK_MANAGER_AVAILABLE else []
+    if not chain:
+        return _maybe_hedge(primary, primary, role, base_url, model_name)
+
+    candidates = [(model_name, primary)]
+    seen = {(base_url, model_name, api_key)}
+    for conf in chain:
+        identity = (conf.get("base_url", ""), conf.get("model_name", ""), conf.get("api_key", ""))
+        if identity in seen:
+            continue
+        seen.add(identity)
+        try:
+            adapter = _create_managed_llm_adapter(
+                conf.get("interface_format", "OpenAI"), identity[0], identity[1], identity[2],
+                temperature, max_tokens, timeout, use_pool
+            )
+        except Exception as e:
+            logging.warning(f"故障转移候选 {conf.get('config_name')} 创建失败: {e}")
+            continue
+        candidates.append((conf.get("config_name", identity[1]), adapter))
+    if len(candidates) == 1:
+        return _maybe_hedge(primary, primary, role, base_url, model_name)
+    return _maybe_hedge(FailoverLLMAdapter(candidates, role=role), candidates[1][1], role, base_url, model_name)
+
+
+def _maybe_hedge(adapter: BaseLLMAdapter, secondary: BaseLLMAdapter, role: str, base_url: str, model_name: str) -> BaseLLMAdapter:
+    """角色开启了对冲请求时包装 HedgedLLMAdapter，对冲请求优先发往故障转移链中的下一个端点"""
+    if not role or not NETWORK_MANAGER_AVAILABLE:
+        return adapter
+    policy = get_hedge_policy()
+    if not policy.enabled or role not in policy.roles:
+        return adapter
+    return HedgedLLMAdapter(adapter, secondary, role, endpoint=f"{base_url}|{model_name}")
+
+
+def _create_managed_llm_adapter(
+    interface_format: str,
+    base_url: str,
+    model_name: str,
+    api_key: str,
+    temperature: float,
+    max_tokens: int,
+    timeout: int,
+    use_pool: bool = True
+) -> BaseLLMAdapter:
+    """构造（或从复用池获取）单个端点的适配器，外层包装 ManagedLLMAdapter"""
+    def factory() -> BaseLLMAdapter:
+        adapter = _build_llm_adapter(interface_format, base_url, model_name, api_key, temperature, max_tokens, timeout)
+        return ManagedLLMAdapter(adapter, base_url, api_key, model_name, temperature)
+
+    if not use_pool:
+        return factory()
+
+    key = (interface_format.strip().lower(), base_url, model_name, temperature, max_tokens, timeout, api_key)
+    return _adapter_pool.get_or_create(key, factory)
+
+
+def _build_llm_adapter(
     interface_format: str,
     base_url: str,
     model_name: str,
@@ -632,7 +1399,7 @@ def create_llm_adapter(
     timeout: int
 ) -> BaseLLMAdapter:
     """
-    工厂函数：根据 interface_format 返回不同的适配器实例。
+    根据 interface_format 构造新的适配器实例。
     """
     fmt = interface_format.strip().lower()
     if fmt == "deepseek":
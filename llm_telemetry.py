@@ -0,0 +1,299 @@
+# llm_telemetry.py
+# -*- coding: utf-8 -*-
+"""
+LLM / Embedding 调用遥测
+- 每次适配器调用生成一条结构化记录：阶段、模型、端点、输入/输出 token（优先使用服务商 usage 字段，
+  没有时按本地估算）、耗时、内部重试次数与结果
+- 记录写入按大小轮转的 JSONL 文件（默认 logs/llm_telemetry.jsonl，环境变量 LLM_TELEMETRY_FILE 可覆盖，
+  LLM_TELEMETRY_ENABLED=false 关闭文件输出）
+- 进程内聚合器按阶段、按模型给出 p50/p95 延迟与 token 合计，可导出 Prometheus 文本格式或 CSV
+"""
+
+import os
+import io
+import csv
+import json
+import math
+import time
+import logging
+import threading
+import contextvars
+import logging.handlers
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple
+
+from retry_policy import current_stage, track_retries
+from network_manager import estimate_tokens
+
+TELEMETRY_FILE = os.path.join("logs", "llm_telemetry.jsonl")
+TELEMETRY_MAX_BYTES = 10 * 1024 * 1024
+TELEMETRY_BACKUP_COUNT = 5
+LATENCY_WINDOW = 1000          # 每个分组保留的最近延迟样本数
+
+_active_record: contextvars.ContextVar = contextvars.ContextVar("llm_telemetry_record", default=None)
+
+
+def _percentile(sorted_samples: List[float], q: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def report_usage(response: Any):
+    """
+    适配器拿到服务商响应后调用，把其中的 token 用量记到当前调用的遥测记录上。
+    支持 langchain 消息（usage_metadata）、OpenAI SDK 响应（usage）和原始 JSON（{"usage": {...}}）。
+    """
+    record = _active_record.get()
+    if record is None or response is None:
+        return
+    prompt_tokens = completion_tokens = None
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if isinstance(usage_metadata, dict) and usage_metadata:
+        prompt_tokens = usage_metadata.get("input_tokens")
+        completion_tokens = usage_metadata.get("output_tokens")
+    else:
+        usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+        if isinstance(usage, dict):
+            prompt_tokens = usage.get("prompt_tokens")
+            completion_tokens = usage.get("completion_tokens")
+        elif usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+    if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+        record["prompt_tokens"] = prompt_tokens
+        record["completion_tokens"] = completion_tokens
+        record["usage_source"] = "provider"
+
+
+class TelemetryAggregator:
+    """按 (类型, 阶段, 模型) 分组的进程内聚合"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def add(self, record: Dict[str, Any]):
+        key = (record["kind"], record["stage"], record["model"])
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = {
+                    "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "retries": 0, "latency_total": 0.0, "latencies": deque(maxlen=self.window)
+                }
+                self._groups[key] = group
+            group["calls"] += 1
+            group["errors"] += 0 if record["outcome"] == "ok" else 1
+            group["prompt_tokens"] += record["prompt_tokens"]
+            group["completion_tokens"] += record["completion_tokens"]
+            group["retries"] += record["retries"]
+            group["latency_total"] += record["latency"]
+            group["latencies"].append(record["latency"])
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+
+    @staticmethod
+    def _summarize(groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+        latencies = sorted(x for g in groups for x in g["latencies"])
+        return {
+            "calls": sum(g["calls"] for g in groups),
+            "errors": sum(g["errors"] for g in groups),
+            "prompt_tokens": sum(g["prompt_tokens"] for g in groups),
+            "completion_tokens": sum(g["completion_tokens"] for g in groups),
+            "retries": sum(g["retries"] for g in groups),
+            "latency_total": round(sum(g["latency_total"] for g in groups), 4),
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+        }
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """每个 (类型, 阶段, 模型) 分组一行"""
+        with self._lock:
+            items = [(key, dict(group, latencies=list(group["latencies"]))) for key, group in self._groups.items()]
+        rows = []
+        for (kind, stage, model), group in sorted(items):
+            rows.append(dict(kind=kind, stage=stage, model=model, **self._summarize([group])))
+        return rows
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """按阶段、按模型汇总的调用数、错误数、token 合计与 p50/p95 延迟"""
+        with self._lock:
+            items = [(key, dict(group, latencies=list(group["latencies"]))) for key, group in self._groups.items()]
+        by_stage: Dict[str, List[Dict[str, Any]]] = {}
+        by_model: Dict[str, List[Dict[str, Any]]] = {}
+        for (kind, stage, model), group in items:
+            by_stage.setdefault(stage, []).append(group)
+            by_model.setdefault(model, []).append(group)
+        return {
+            "by_stage": {stage: self._summarize(groups) for stage, groups in sorted(by_stage.items())},
+            "by_model": {model: self._summarize(groups) for model, groups in sorted(by_model.items())},
+        }
+
+    def export_prometheus(self, prefix: str = "novel_llm") -> str:
+        """Prometheus 文本格式（调用数、错误数、token、重试为 counter，延迟为 summary）"""
+        rows = self.rows()
+        lines = []
+
+        def label(row, extra: str = "") -> str:
+            pairs = [f'{k}="{_escape_label(str(row[k]))}"' for k in ("kind", "stage", "model")]
+            if extra:
+                pairs.append(extra)
+            return "{" + ",".join(pairs) + "}"
+
+        counters = [
+            ("calls_total", "calls", "适配器调用次数"),
+            ("errors_total", "errors", "失败的调用次数"),
+            ("prompt_tokens_total", "prompt_tokens", "输入 token 数"),
+            ("completion_tokens_total", "completion_tokens", "输出 token 数"),
+            ("retries_total", "retries", "调用内部的重试次数"),
+        ]
+        for name, field, help_text in counters:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for row in rows:
+                lines.append(f"{prefix}_{name}{label(row)} {row[field]}")
+
+        name = f"{prefix}_latency_seconds"
+        lines.append(f"# HELP {name} 调用耗时（秒）")
+        lines.append(f"# TYPE {name} summary")
+        for row in rows:
+            for quantile, field in (("0.5", "p50"), ("0.95", "p95")):
+                if row[field] is not None:
+                    quantile_label = 'quantile="%s"' % quantile
+                    lines.append(f"{name}{label(row, quantile_label)} {row[field]:.6f}")
+            lines.append(f"{name}_sum{label(row)} {row['latency_total']:.6f}")
+            lines.append(f"{name}_count{label(row)} {row['calls']}")
+        return "\n".join(lines) + "\n"
+
+    def export_csv(self, path: Optional[str] = None) -> str:
+        """CSV 导出；指定 path 时同时写入文件"""
+        fields = ["kind", "stage", "model", "calls", "errors", "prompt_tokens", "completion_tokens",
+                  "retries", "latency_total", "p50", "p95"]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator="\n")
+        writer.writeheader()
+        for row in self.rows():
+            writer.writerow({k: row[k] for k in fields})
+        text = buffer.getvalue()
+        if path:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+        return text
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class LLMTelemetry:
+    """遥测入口：生成记录、写入 JSONL 并交给聚合器"""
+
+    def __init__(self, filepath: Optional[str] = None, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.environ.get("LLM_TELEMETRY_ENABLED", "true").lower() == "true"
+        self.filepath = filepath or os.environ.get("LLM_TELEMETRY_FILE") or TELEMETRY_FILE
+        self.file_enabled = enabled
+        self.aggregator = TelemetryAggregator()
+        self._logger: Optional[logging.Logger] = None
+        self._logger_lock = threading.Lock()
+
+    def _file_logger(self) -> Optional[logging.Logger]:
+        if not self.file_enabled:
+            return None
+        if self._logger is None:
+            with self._logger_lock:
+                if self._logger is None:
+                    try:
+                        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+                        handler = logging.handlers.RotatingFileHandler(
+                            self.filepath, maxBytes=TELEMETRY_MAX_BYTES,
+                            backupCount=TELEMETRY_BACKUP_COUNT, encoding="utf-8"
+                        )
+                    except OSError as e:
+                        logging.warning(f"遥测文件无法打开，已关闭文件输出: {e}")
+                        self.file_enabled = False
+                        return None
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    logger = logging.getLogger(f"llm_telemetry.{id(self)}")
+                    logger.propagate = False
+                    logger.setLevel(logging.INFO)
+                    logger.addHandler(handler)
+                    self._logger = logger
+        return self._logger
+
+    def emit(self, record: Dict[str, Any]):
+        self.aggregator.add(record)
+        logger = self._file_logger()
+        if logger is not None:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+    def start_record(self, kind: str, model: str, endpoint: str = "") -> Dict[str, Any]:
+        """开始一条记录；阶段取自 retry_policy.current_stage()"""
+        return {
+            "ts": round(time.time(), 3),
+            "kind": kind,
+            "stage": current_stage() or "unknown",
+            "model": model or "",
+            "endpoint": endpoint,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "usage_source": "estimate",
+            "latency": 0.0,
+            "retries": 0,
+            "outcome": "ok",
+            "error": "",
+            "_start": time.monotonic(),
+        }
+
+    def finish_record(self, record: Dict[str, Any], prompt: str = "", output: Any = None):
+        """补全耗时与 token 估算后输出记录"""
+        record["latency"] = round(time.monotonic() - record.pop("_start"), 4)
+        if record["prompt_tokens"] is None:
+            record["prompt_tokens"] = estimate_tokens(prompt)
+        if record["completion_tokens"] is None:
+            record["completion_tokens"] = estimate_tokens(output) if isinstance(output, str) else 0
+        self.emit(record)
+
+    @contextmanager
+    def track(self, kind: str, model: str, endpoint: str = "", prompt: str = ""):
+        """
+        记录一次调用。用法：
+            with telemetry.track("llm", model, endpoint, prompt) as record:
+                result = adapter.invoke(prompt)
+                record["output"] = result      # 用于估算输出 token（不会写入文件）
+        块内抛出异常时记为 error；调用方也可以把 outcome 改为 empty / error。
+        块内适配器调用 report_usage() 时使用服务商返回的 token 用量。
+        """
+        record = self.start_record(kind, model, endpoint)
+        token = _active_record.set(record)
+        with track_retries() as retries:
+            try:
+                yield record
+            except BaseException as e:
+                record["outcome"] = "error"
+                record["error"] = f"{type(e).__name__}: {str(e)[:200]}"
+                raise
+            finally:
+                _active_record.reset(token)
+                record["retries"] = retries["count"]
+                self.finish_record(record, prompt, record.pop("output", None))
+
+
+_telemetry: Optional[LLMTelemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> LLMTelemetry:
+    """获取全局遥测实例"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = LLMTelemetry()
+    return _telemetry
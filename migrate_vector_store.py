@@ -0,0 +1,45 @@
+# migrate_vector_store.py
+# -*- coding: utf-8 -*-
+"""
+向量库格式迁移工具：在 Chroma 与内置 NumPy 内存映射后端之间转换已有向量库
+直接复制已有的向量、文本与元数据，不重新请求 Embedding；原目录保留为 vectorstore.<原后端>.bak。
+
+用法：
+    python migrate_vector_store.py --filepath 小说保存目录 --to numpy
+    python migrate_vector_store.py --filepath 小说保存目录 --to chroma
+"""
+
+import os
+import sys
+import argparse
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from novel_generator.vector_backends import VECTOR_BACKENDS, detect_vector_backend
+from novel_generator.vectorstore_utils import get_vectorstore_dir, migrate_vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量库格式迁移")
+    parser.add_argument("--filepath", required=True, help="小说保存目录（其下的 vectorstore 文件夹）")
+    parser.add_argument("--to", choices=VECTOR_BACKENDS, default="numpy", help="目标后端")
+    args = parser.parse_args()
+
+    store_dir = get_vectorstore_dir(args.filepath)
+    source = detect_vector_backend(store_dir)
+    if source is None:
+        print(f"❌ 未在 {store_dir} 找到向量库")
+        return 1
+    if not migrate_vector_store(args.filepath, args.to):
+        print("❌ 迁移失败，原向量库未改动，详见 app.log")
+        return 1
+    if source == args.to:
+        print(f"向量库已是 {args.to} 格式，无需迁移")
+    else:
+        print(f"✅ 已从 {source} 迁移到 {args.to}，原目录保留为 {store_dir}.{source}.bak")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+# mock_llm_server.py
+# -*- coding: utf-8 -*-
+"""
+离线 OpenAI 兼容模拟服务 - 用于基准测试与联调，不消耗真实 token
+支持的接口：
+- POST /v1/chat/completions   （普通与 stream=true 的 SSE 流式输出）
+- POST /v1/embeddings         （OpenAI / ML Studio / SiliconFlow 格式）
+- POST /api/embeddings        （Ollama 旧接口，单条 prompt）
+- POST /api/embed             （Ollama 批量接口，input 可为列表）
+- GET  /v1/models
+- GET  /stats                 （服务端计数：请求数、收发字节、注入的错误数）
+可配置首字延迟、输出速度、错误率与回复长度；相同的请求总是得到相同的输出。
+
+用法：
+    python mock_llm_server.py --port 8765 --latency 0.2 --tokens-per-second 200 --error-rate 0.05
+然后把配置中的 base_url 指向 http://127.0.0.1:8765/v1 。
+"""
+
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from typing import Dict, Any, List, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from embedding_adapters import BaseEmbeddingAdapter
+except ImportError:  # 单独运行模拟服务时不需要 langchain 等依赖
+    BaseEmbeddingAdapter = object
+
+DEFAULT_SETTINGS = {
+    'latency': 0.05,             # 每个请求的基础延迟（秒），流式请求即首字延迟
+    'latency_jitter': 0.0,       # 延迟的随机抖动幅度（秒）
+    'tokens_per_second': 0,      # 输出速度，0 表示不限速
+    'error_rate': 0.0,           # 随机返回 error_status 的比例
+    'error_status': 503,
+    'reply_chars': 600,          # 正文类回复的长度（字符）
+    'embedding_dim': 64,
+    'seed': 42,
+}
+
+_FILLER = (
+    "夜色沉沉，城中的灯火一盏盏熄灭。林远站在钟楼下，回想着白日里那封没有署名的信。"
+    "信中只有一句话：旧案的真相就藏在北山的废弃实验室里。他知道，一旦踏出这一步，便再无回头路。"
+    "风从巷口吹来，带着潮湿的泥土气味。远处传来脚步声，他握紧了口袋里的钥匙。"
+)
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+
+
+def _filler_text(prompt: str, length: int) -> str:
+    """按提示词确定的起点截取填充正文，保证相同请求得到相同输出"""
+    start = _digest(prompt) % len(_FILLER)
+    text = (_FILLER[start:] + _FILLER) * (length // len(_FILLER) + 2)
+    return text[:length]
+
+
+def _blueprint_text(prompt: str) -> str:
+    """章节目录提示词：按 第n章到第m 或 设计N章 生成符合 chapter_directory_parser 格式的目录"""
+    match = re.search(r"第(\d+)章到第(\d+)", prompt)
+    if match:
+        start, end = int(match.group(1)), int(match.group(2))
+    else:
+        match = re.search(r"设计(\d+)章", prompt)
+        start, end = 1, int(match.group(1)) if match else 3
+    chapters = []
+    for n in range(start, end + 1):
+        chapters.append(
+            f"第{n}章 - 模拟章节{n}\n"
+            f"本章定位：事件\n"
+            f"核心作用：推进\n"
+            f"悬念密度：渐进\n"
+            f"伏笔操作：埋设(线索{n})\n"
+            f"认知颠覆：★☆☆☆☆\n"
+            f"本章简述：第{n}章的模拟简述"
+        )
+    return "\n\n".join(chapters)
+
+
+def canned_reply(prompt: str, reply_chars: int) -> str:
+    """根据提示词类型返回能被生成流水线正确解析的确定性回复"""
+    if "节奏分布" in prompt:
+        return _blueprint_text(prompt)
+    if "检索关键词" in prompt:
+        return "北山·实验室\n旧案·信件\n钟楼·钥匙"
+    if "当前章节摘要" in prompt:
+        return "当前章节摘要: " + _filler_text(prompt, min(reply_chars, 200))
+    return _filler_text(prompt, reply_chars)
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """字符二元组哈希得到的归一化向量：内容相近的文本向量也相近"""
+    vector = [0.0] * dim
+    grams = [text[i:i + 2] for i in range(max(1, len(text) - 1))]
+    for gram in grams:
+        h = _digest(gram)
+        vector[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class MockEmbeddingAdapter(BaseEmbeddingAdapter):
+    """
+    进程内 Embedding 适配器（测试用）：向量由 fake_embedding 计算，不经过网络。
+    calls 记录请求次数，texts / queries 记录请求过的文档与查询；available=False 时返回空结果，模拟接口不可用。
+    """
+    interface_format = "mock"
+
+    def __init__(self, model_name: str = "mock-embedding", dim: int = 16, available: bool = True):
+        self.model_name = model_name
+        self.dim = dim
+        self.available = available
+        self.calls = 0
+        self.texts: List[str] = []
+        self.queries: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts.extend(texts)
+        return [fake_embedding(t, self.dim) for t in texts] if self.available else []
+
+    def embed_query(self, query: str) -> List[float]:
+        self.calls += 1
+        self.queries.append(query)
+        return fake_embedding(query, self.dim) if self.available else []
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def mock(self) -> "MockLLMServer":
+        return self.server.mock
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        self.mock._count("bytes_in", len(body))
+        try:
+            return json.loads(body.decode("utf-8")) if body else {}
+        except ValueError:
+            return {}
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.mock._count("bytes_out", len(body))
+
+    def _inject_failure(self) -> bool:
+        """按配置的错误率返回服务端错误"""
+        if self.mock.should_fail():
+            self.mock._count("errors_injected")
+            self._send_json(self.mock.settings['error_status'], {
+                "error": {"message": "mock server injected error", "type": "server_error"}
+            })
+            return True
+        return False
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        self.mock._count_request(path)
+        if path == "/stats":
+            self._send_json(200, self.mock.get_stats())
+        elif path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {path}"}})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        self.mock._count_request(path)
+        payload = self._read_json()
+        self.mock.sleep_latency()
+        if self._inject_failure():
+            return
+        if path.endswith("/chat/completions"):
+            self._chat_completions(payload)
+        elif path.endswith("/api/embed"):
+            inputs = payload.get("input", "")
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            dim = self.mock.settings['embedding_dim']
+            self._send_json(200, {
+                "model": payload.get("model", "mock-embedding"),
+                "embeddings": [fake_embedding(str(text), dim) for text in inputs]
+            })
+        elif path.endswith("/api/embeddings"):
+            dim = self.mock.settings['embedding_dim']
+            self._send_json(200, {"embedding": fake_embedding(str(payload.get("prompt", "")), dim)})
+        elif path.endswith("/embeddings"):
+            self._embeddings(payload)
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {path}"}})
+
+    def _chat_completions(self, payload: Dict[str, Any]):
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages if isinstance(m, dict))
+        model = payload.get("model", "mock-model")
+        reply = canned_reply(prompt, self.mock.settings['reply_chars'])
+        usage = {
+            "prompt_tokens": _estimate_tokens(prompt),
+            "completion_tokens": _estimate_tokens(reply),
+            "total_tokens": _estimate_tokens(prompt) + _estimate_tokens(reply)
+        }
+        created = int(time.time())
+        if not payload.get("stream"):
+            self.mock._sleep_output(len(reply))
+            self._send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        step = 20
+        try:
+            for i in range(0, len(reply), step):
+                piece = reply[i:i + step]
+                self.mock._sleep_output(len(piece))
+                chunk = {
+                    "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                }
+                self._write_event(json.dumps(chunk, ensure_ascii=False))
+            final = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            self._write_event(json.dumps(final, ensure_ascii=False))
+            self._write_event("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前关闭连接（例如用户中止生成）
+            self.mock._count("streams_aborted")
+
+    def _write_event(self, data: str):
+        body = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(body)
+        self.wfile.flush()
+        self.mock._count("bytes_out", len(body))
+
+    def _embeddings(self, payload: Dict[str, Any]):
+        inputs = payload.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = self.mock.settings['embedding_dim']
+        self._send_json(200, {
+            "object": "list",
+            "model": payload.get("model", "mock-embedding"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(str(text), dim)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": sum(_estimate_tokens(str(t)) for t in inputs), "total_tokens": 0}
+        })
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class MockLLMServer:
+    """
+    在后台线程中运行的模拟服务。
+        with MockLLMServer(latency=0.1) as server:
+            adapter = create_llm_adapter("OpenAI", server.base_url, ...)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **settings):
+        unknown = set(settings) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError(f"未知的模拟服务配置: {', '.join(sorted(unknown))}")
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self._random = random.Random(self.settings['seed'])
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {}
+        self.reset_stats()
+        self._server = _Server((host, port), _MockHandler)
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_port
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def ollama_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def configure(self, **settings):
+        """运行中调整延迟、错误率等配置"""
+        with self._lock:
+            self.settings.update(settings)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.settings['error_rate']
+
+    def sleep_latency(self):
+        with self._lock:
+            jitter = self.settings['latency_jitter']
+            delay = self.settings['latency'] + (self._random.uniform(-jitter, jitter) if jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _sleep_output(self, chars: int):
+        tps = self.settings['tokens_per_second']
+        if tps:
+            time.sleep(_estimate_tokens("x" * chars) / tps)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
+    def _count_request(self, path: str):
+        with self._lock:
+            self._stats['requests'] += 1
+            by_path = self._stats['requests_by_path']
+            by_path[path] = by_path.get(path, 0) + 1
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'requests': 0, 'requests_by_path': {}, 'bytes_in': 0, 'bytes_out': 0,
+                           'errors_injected': 0, 'streams_aborted': 0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['requests_by_path'] = dict(self._stats['requests_by_path'])
+            return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 OpenAI 兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=DEFAULT_SETTINGS['latency'])
+    parser.add_argument("--latency-jitter", type=float, default=DEFAULT_SETTINGS['latency_jitter'])
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_SETTINGS['tokens_per_second'])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_SETTINGS['error_rate'])
+    parser.add_argument("--reply-chars", type=int, default=DEFAULT_SETTINGS['reply_chars'])
+    parser.add_argument("--embedding-dim", type=int, default=DEFAULT_SETTINGS['embedding_dim'])
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port,
+        latency=args.latency, latency_jitter=args.latency_jitter, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, reply_chars=args.reply_chars, embedding_dim=args.embedding_dim
+    )
+    print(f"模拟服务已启动: http://{args.host}:{server.port}/v1 （Ctrl+C 退出）")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,23 @@
 """
 
 import os
+import json
+import math
 import time
+import asyncio
+import threading
+import weakref
+import atexit
 import requests
 import logging
-from typing import Optional, Dict, Any, Callable
+from typing import Optional, Dict, Any, Callable, List
+from collections import deque
 from urllib.parse import urlparse
 import socket
 from contextlib import contextmanager
 
+from retry_policy import RetryPolicy, DeadlineExceededError, current_deadline, configure_retry_policy
+
 # 导入高级日志系统
 try:
     from advanced_logger import main_logger, log_network_request, log_network_response
@@ -39,11 +48,725 @@ class NetworkConfig:
     }
 
 
+    # 端点延迟模型
+    LATENCY_FILE = os.path.join("config", "network_latency.json")
+    LATENCY_EWMA_ALPHA = 0.2          # EWMA 平滑系数
+    LATENCY_SAMPLE_WINDOW = 50        # 计算 p95 使用的最近样本数
+    LATENCY_STALE_SECONDS = 3600      # 超过该时间没有新样本视为过期
+    LATENCY_SAVE_INTERVAL = 30        # 持久化最小间隔（秒）
+    LATENCY_REFRESH_INTERVAL = 60     # 同一主机两次后台探测的最小间隔（秒）
+    LATENCY_TIMEOUT_FACTOR = 2.0      # 超时 = p95 × 系数
+    MIN_TIMEOUT = 30
+    MAX_TIMEOUT = 600
+    UNKNOWN_TIMEOUT = 120             # 没有任何测量数据时使用的超时
+
+
 class NetworkError(Exception):
     """网络连接错误"""
     pass
 
 
+# 线程本地 HTTP 会话：每个线程、每种代理策略各一个，复用连接且无需加锁
+_thread_sessions = threading.local()
+
+_SESSION_METHODS = {
+    requests.get: 'get',
+    requests.post: 'post',
+    requests.put: 'put',
+    requests.delete: 'delete',
+    requests.head: 'head',
+    requests.request: 'request',
+}
+
+def get_http_session(use_proxy: bool = False) -> requests.Session:
+    """
+    获取当前线程的 requests 会话。
+
+    Args:
+        use_proxy: False 时会话忽略环境变量中的代理（trust_env=False）；
+                   True 时按系统/环境变量的代理设置发起请求
+    """
+    key = 'proxy' if use_proxy else 'direct'
+    session = getattr(_thread_sessions, key, None)
+    if session is None:
+        session = requests.Session()
+        session.trust_env = use_proxy
+        setattr(_thread_sessions, key, session)
+    return session
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    """已排序样本的 q 分位数（0~1，最近秩法）"""
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def _host_of(url: str) -> str:
+    """延迟模型按主机聚合，同一主机下的不同路径共享统计"""
+    parsed = urlparse(url)
+    return parsed.netloc or url
+
+
+class LatencyModel:
+    """
+    按主机维护的请求延迟模型
+    - 由真实请求的耗时喂入，维护 EWMA 与最近样本窗口（用于 p95 等分位数）
+    - 后台探测只更新 rtt（网络往返），与请求耗时分开统计
+    - 定期持久化到 config/network_latency.json，跨运行保留
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or NetworkConfig.LATENCY_FILE
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+        self._last_save = 0.0
+        self._dirty = False
+        self.load()
+
+    def _entry(self, host: str) -> Dict[str, Any]:
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = {
+                'ewma': None,
+                'samples': deque(maxlen=NetworkConfig.LATENCY_SAMPLE_WINDOW),
+                'count': 0,
+                'rtt': None,
+                'updated_at': 0.0
+            }
+            self._hosts[host] = entry
+        return entry
+
+    def record(self, url: str, seconds: float):
+        """记录一次真实请求的耗时（秒）"""
+        alpha = NetworkConfig.LATENCY_EWMA_ALPHA
+        with self._lock:
+            entry = self._entry(_host_of(url))
+            entry['ewma'] = seconds if entry['ewma'] is None else alpha * seconds + (1 - alpha) * entry['ewma']
+            entry['samples'].append(seconds)
+            entry['count'] += 1
+            entry['updated_at'] = time.time()
+            self._dirty = True
+        self._maybe_save()
+
+    def record_rtt(self, url: str, seconds: float):
+        """记录后台探测得到的网络往返时间（秒）"""
+        with self._lock:
+            entry = self._entry(_host_of(url))
+            entry['rtt'] = seconds
+            entry['updated_at'] = time.time()
+            self._dirty = True
+        self._maybe_save()
+
+    def percentile(self, url: str, q: float) -> Optional[float]:
+        """最近样本窗口中的 q 分位数（0~1，最近秩法）；没有样本时返回 None"""
+        with self._lock:
+            entry = self._hosts.get(_host_of(url))
+            samples = sorted(entry['samples']) if entry else []
+        if not samples:
+            return None
+        return _percentile(samples, q)
+
+    def get_estimate(self, url: str) -> Optional[Dict[str, Any]]:
+        """返回主机的延迟估计：ewma、p95、rtt、样本数与更新时间"""
+        with self._lock:
+            entry = self._hosts.get(_host_of(url))
+            if entry is None:
+                return None
+            estimate = {
+                'ewma': entry['ewma'],
+                'rtt': entry['rtt'],
+                'count': entry['count'],
+                'updated_at': entry['updated_at']
+            }
+        estimate['p95'] = self.percentile(url, 0.95)
+        return estimate
+
+    def is_stale(self, url: str, max_age: Optional[float] = None) -> bool:
+        max_age = NetworkConfig.LATENCY_STALE_SECONDS if max_age is None else max_age
+        with self._lock:
+            entry = self._hosts.get(_host_of(url))
+            return entry is None or time.time() - entry['updated_at'] > max_age
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            with self._lock:
+                for host, item in data.items():
+                    entry = self._entry(host)
+                    entry['ewma'] = item.get('ewma')
+                    entry['samples'].extend(item.get('samples', []))
+                    entry['count'] = item.get('count', len(entry['samples']))
+                    entry['rtt'] = item.get('rtt')
+                    entry['updated_at'] = item.get('updated_at', 0.0)
+        except Exception as e:
+            logging.warning(f"加载网络延迟模型失败: {e}")
+
+    def save(self):
+        with self._lock:
+            data = {
+                host: {
+                    'ewma': entry['ewma'],
+                    'samples': list(entry['samples']),
+                    'count': entry['count'],
+                    'rtt': entry['rtt'],
+                    'updated_at': entry['updated_at']
+                }
+                for host, entry in self._hosts.items()
+            }
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"保存网络延迟模型失败: {e}")
+
+    def _maybe_save(self):
+        if self._dirty and time.time() - self._last_save >= NetworkConfig.LATENCY_SAVE_INTERVAL:
+            self.save()
+
+
+_latency_model: Optional[LatencyModel] = None
+_latency_model_lock = threading.Lock()
+
+# 后台延迟探测状态
+_latency_refresh_lock = threading.Lock()
+_latency_refresh_inflight: set = set()
+_latency_refresh_attempts: Dict[str, float] = {}
+
+def get_latency_model() -> LatencyModel:
+    """获取全局延迟模型实例（首次调用时从磁盘加载）"""
+    global _latency_model
+    with _latency_model_lock:
+        if _latency_model is None:
+            _latency_model = LatencyModel()
+            atexit.register(_latency_model.save)
+        return _latency_model
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个计，其余字符按 4 个 1 token 计"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '⺀' <= ch <= '鿿' or '豈' <= ch <= '﫿')
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _parse_retry_after(value: Any) -> Optional[float]:
+    """解析 Retry-After 头：秒数或 HTTP 日期"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def get_rate_limit_info(exc: BaseException) -> Optional[Dict[str, Any]]:
+    """
+    判断异常是否为服务商限流（HTTP 429），返回 {'retry_after': 秒数或 None}；否则返回 None。
+    兼容 requests / httpx / openai SDK 的异常对象。
+    """
+    response = getattr(exc, 'response', None)
+    status = getattr(exc, 'status_code', None) or getattr(response, 'status_code', None)
+    if status != 429:
+        return None
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        retry_after = headers.get('retry-after') or headers.get('Retry-After')
+    except Exception:
+        retry_after = None
+    return {'retry_after': _parse_retry_after(retry_after)}
+
+
+class RateLimiter:
+    """
+    单个服务商账号（主机 + api_key）的令牌桶限流器
+    - requests_per_minute: 每分钟请求数（RPM），0 表示不限
+    - tokens_per_minute: 每分钟 token 数（TPM），0 表示不限；调用前按提示词估算预扣，返回后补扣输出
+    - max_concurrency: 最大在途请求数，0 表示不限
+    - 收到 429 + Retry-After 时暂停发放令牌直到指定时间
+    同时支持线程阻塞等待（acquire）与协程等待（aacquire）。
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_concurrency: int = 0, name: str = ""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._stats = {
+            'acquired': 0,
+            'limiter_waits': 0,
+            'limiter_wait_total': 0.0,
+            'limiter_wait_max': 0.0,
+            'provider_throttled': 0,
+            'provider_wait_total': 0.0
+        }
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self.configure(requests_per_minute, tokens_per_minute, max_concurrency)
+
+    def configure(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_concurrency: int = 0):
+        with self._lock:
+            self.requests_per_minute = float(requests_per_minute or 0)
+            self.tokens_per_minute = float(tokens_per_minute or 0)
+            self.max_concurrency = int(max_concurrency or 0)
+            self._request_bucket = self.requests_per_minute
+            self._token_bucket = self.tokens_per_minute
+            self._last_refill = time.monotonic()
+
+    def _refill_locked(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_bucket = min(self.requests_per_minute, self._request_bucket + elapsed * self.requests_per_minute / 60.0)
+        if self.tokens_per_minute:
+            self._token_bucket = min(self.tokens_per_minute, self._token_bucket + elapsed * self.tokens_per_minute / 60.0)
+
+    def _try_acquire(self, tokens: int, take_slot: bool) -> float:
+        """尝试获取许可；成功返回 0，否则返回建议等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if take_slot and self.max_concurrency and self._in_flight >= self.max_concurrency:
+                return self.POLL_INTERVAL
+            if self.requests_per_minute and self._request_bucket < 1:
+                return (1 - self._request_bucket) * 60.0 / self.requests_per_minute
+            # 单次请求超过整个桶容量时，等桶满即可放行，避免永远等待
+            needed = min(tokens, self.tokens_per_minute)
+            if self.tokens_per_minute and self._token_bucket < needed:
+                return (needed - self._token_bucket) * 60.0 / self.tokens_per_minute
+            if self.requests_per_minute:
+                self._request_bucket -= 1
+            if self.tokens_per_minute:
+                self._token_bucket -= tokens
+            if take_slot:
+                self._in_flight += 1
+            self._stats['acquired'] += 1
+            return 0.0
+
+    def _record_wait(self, waited: float):
+        if waited <= 0:
+            return
+        with self._lock:
+            self._stats['limiter_waits'] += 1
+            self._stats['limiter_wait_total'] += waited
+            self._stats['limiter_wait_max'] = max(self._stats['limiter_wait_max'], waited)
+
+    def acquire(self, tokens: int = 0, take_slot: bool = True) -> float:
+        """阻塞直到获得许可，返回等待的秒数。take_slot=True 时占用一个在途名额，需配对 release()"""
+        start = time.monotonic()
+        waited = 0.0
+        while True:
+            delay = self._try_acquire(tokens, take_slot)
+            if delay <= 0:
+                break
+            time.sleep(min(delay, 1.0))
+            waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    async def aacquire(self, tokens: int = 0, take_slot: bool = True) -> float:
+        """acquire 的协程版本，等待期间不阻塞事件循环"""
+        start = time.monotonic()
+        waited = 0.0
+        while True:
+            delay = self._try_acquire(tokens, take_slot)
+            if delay <= 0:
+                break
+            await asyncio.sleep(min(delay, 1.0))
+            waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def consume_tokens(self, tokens: int):
+        """请求完成后补扣输出 token，桶可以暂时为负，后续请求会相应等待"""
+        if tokens and self.tokens_per_minute:
+            with self._lock:
+                self._token_bucket -= tokens
+
+    def pause(self, seconds: float):
+        """服务商返回 429 时调用：在 seconds 秒内不再发放许可"""
+        with self._lock:
+            self._stats['provider_throttled'] += 1
+            self._stats['provider_wait_total'] += seconds
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @contextmanager
+    def limit(self, tokens: int = 0):
+        """占用一个在途名额执行请求"""
+        self.acquire(tokens)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+        stats['limiter_wait_avg'] = stats['limiter_wait_total'] / stats['acquired'] if stats['acquired'] else 0.0
+        return stats
+
+
+# 全局限流器注册表：按 (主机, api_key) 区分，进程内所有适配器共享
+_rate_limiters: Dict[tuple, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+def _rate_limit_key(base_url: str, api_key: str) -> tuple:
+    return (_host_of(base_url or ""), api_key or "")
+
+def configure_rate_limit(
+    base_url: str,
+    api_key: str,
+    requests_per_minute: float = 0,
+    tokens_per_minute: float = 0,
+    max_concurrency: int = 0
+) -> Optional[RateLimiter]:
+    """为服务商账号配置限流；三项均为 0 时取消限流"""
+    key = _rate_limit_key(base_url, api_key)
+    with _rate_limiters_lock:
+        if not (requests_per_minute or tokens_per_minute or max_concurrency):
+            _rate_limiters.pop(key, None)
+            return None
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            masked = f"...{api_key[-4:]}" if api_key else ""
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute, max_concurrency, name=f"{key[0]} {masked}".strip())
+            _rate_limiters[key] = limiter
+        else:
+            limiter.configure(requests_per_minute, tokens_per_minute, max_concurrency)
+        return limiter
+
+def get_rate_limiter(base_url: str, api_key: str) -> Optional[RateLimiter]:
+    """获取服务商账号的限流器；未配置限流时返回 None"""
+    with _rate_limiters_lock:
+        return _rate_limiters.get(_rate_limit_key(base_url, api_key))
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    各限流器的等待统计：
+    limiter_wait_* 为本地限流器造成的等待，provider_* 为服务商 429 造成的等待，
+    二者对比可判断瓶颈在本地限流还是服务商。
+    """
+    with _rate_limiters_lock:
+        limiters = list(_rate_limiters.values())
+    return {limiter.name: limiter.get_stats() for limiter in limiters}
+
+class CircuitOpenError(NetworkError):
+    """端点熔断中，请求被直接拒绝"""
+    # 熔断期间原地重试没有意义，交给故障转移处理
+    retryable = False
+
+
+class CircuitBreaker:
+    """
+    单个端点（主机 + 模型）的熔断器
+    - closed：正常放行；连续失败 failure_threshold 次（超过 slow_call_seconds 的慢调用也算失败）后熔断
+    - open：open_seconds 内直接拒绝请求
+    - half_open：熔断到期后只放行一个探测请求，成功则恢复，失败则重新熔断
+    同时维护该端点成功调用的延迟 EWMA，供故障转移时优先选择低延迟端点。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str = "", failure_threshold: Optional[int] = None,
+                 open_seconds: Optional[float] = None, slow_call_seconds: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or _breaker_settings['failure_threshold']
+        self.open_seconds = open_seconds if open_seconds is not None else _breaker_settings['open_seconds']
+        self.slow_call_seconds = slow_call_seconds if slow_call_seconds is not None else _breaker_settings['slow_call_seconds']
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.latency_ewma: Optional[float] = None
+        self._stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._stats['rejected'] += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # half_open：只放行一个探测请求
+            if self._probe_in_flight:
+                self._stats['rejected'] += 1
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def is_available(self) -> bool:
+        """不占用探测名额地判断端点当前是否可能放行"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self._opened_at >= self.open_seconds
+            return not (self.state == self.HALF_OPEN and self._probe_in_flight)
+
+    def record_success(self, latency: float):
+        if self.slow_call_seconds and latency > self.slow_call_seconds:
+            # 超出延迟 SLO 的调用按失败计
+            self.record_failure()
+            return
+        alpha = NetworkConfig.LATENCY_EWMA_ALPHA
+        with self._lock:
+            self.latency_ewma = latency if self.latency_ewma is None else alpha * latency + (1 - alpha) * self.latency_ewma
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+            self._stats['successes'] += 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats['failures'] += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._stats['opened'] += 1
+                    main_logger.warning(f"端点熔断: {self.name}（连续失败 {self._failures} 次）")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.state
+            stats['latency_ewma'] = self.latency_ewma
+        return stats
+
+
+# 熔断器默认参数，可由 config.json 的 circuit_breaker 覆盖
+_breaker_settings: Dict[str, Any] = {
+    'failure_threshold': 5,
+    'open_seconds': 60.0,
+    'slow_call_seconds': 300.0
+}
+_circuit_breakers: Dict[tuple, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(base_url: str, model_name: str) -> CircuitBreaker:
+    """获取端点（主机 + 模型）的熔断器，进程内共享"""
+    key = (_host_of(base_url or ""), model_name or "")
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(name=f"{key[0]} {key[1]}".strip())
+            _circuit_breakers[key] = breaker
+        return breaker
+
+def get_circuit_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    return {breaker.name: breaker.get_stats() for breaker in breakers}
+
+
+# 按流水线角色（draft / finalize / summarize）配置的故障转移链
+_failover_chains: Dict[str, List[Dict[str, Any]]] = {}
+
+def get_failover_chain(role: str) -> List[Dict[str, Any]]:
+    """返回角色的故障转移候选配置（llm_configs 中的条目，附带 config_name）"""
+    return list(_failover_chains.get(role, []))
+
+
+class HedgePolicy:
+    """
+    对冲请求策略（默认关闭）
+    对指定角色的短提示词：若请求在端点观测 p90 延迟内仍未返回，再发一个重复请求，取先完成者。
+    - 额外请求数不超过 budget_ratio × 符合条件的调用数
+    - 记录实际延迟与"只等主请求"时的延迟，对比 p99 即为对冲带来的改善
+    """
+
+    SAMPLE_WINDOW = 200
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.roles = ["summarize"]
+        self.max_prompt_chars = 6000
+        self.percentile = 0.9
+        self.budget_ratio = 0.1
+        self.min_samples = 10
+        self.min_delay = 0.2
+        self._endpoint_samples: Dict[str, deque] = {}
+        self._observed = deque(maxlen=self.SAMPLE_WINDOW)
+        self._unhedged = deque(maxlen=self.SAMPLE_WINDOW)
+        self._stats = {'calls': 0, 'hedges_fired': 0, 'hedge_wins': 0, 'budget_denied': 0}
+
+    def configure(self, **settings):
+        with self._lock:
+            for key in ('enabled', 'roles', 'max_prompt_chars', 'percentile', 'budget_ratio', 'min_samples', 'min_delay'):
+                if key in settings:
+                    setattr(self, key, settings[key])
+
+    def is_eligible(self, role: str, prompt: str) -> bool:
+        return bool(self.enabled and role in self.roles and len(prompt) <= self.max_prompt_chars)
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """端点观测分位数延迟；样本不足时返回 None，表示不对冲"""
+        with self._lock:
+            samples = sorted(self._endpoint_samples.get(endpoint, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, _percentile(samples, self.percentile))
+
+    def observe(self, endpoint: str, seconds: float):
+        """记录主请求自身的完成耗时（无论是否被对冲请求抢先）"""
+        with self._lock:
+            samples = self._endpoint_samples.get(endpoint)
+            if samples is None:
+                samples = deque(maxlen=self.SAMPLE_WINDOW)
+                self._endpoint_samples[endpoint] = samples
+            samples.append(seconds)
+            self._unhedged.append(seconds)
+
+    def try_spend(self) -> bool:
+        """申请一次对冲预算"""
+        with self._lock:
+            if self._stats['hedges_fired'] + 1 > self.budget_ratio * max(self._stats['calls'], 1):
+                self._stats['budget_denied'] += 1
+                return False
+            self._stats['hedges_fired'] += 1
+            return True
+
+    def record_call(self, seconds: float, hedge_won: bool = False):
+        """记录一次符合条件的调用的实际耗时"""
+        with self._lock:
+            self._stats['calls'] += 1
+            if hedge_won:
+                self._stats['hedge_wins'] += 1
+            self._observed.append(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            observed = sorted(self._observed)
+            unhedged = sorted(self._unhedged)
+        stats['p50'] = _percentile(observed, 0.5) if observed else None
+        stats['p99'] = _percentile(observed, 0.99) if observed else None
+        stats['unhedged_p99'] = _percentile(unhedged, 0.99) if unhedged else None
+        if stats['p99'] is not None and stats['unhedged_p99'] is not None:
+            stats['p99_saved'] = stats['unhedged_p99'] - stats['p99']
+        else:
+            stats['p99_saved'] = None
+        return stats
+
+
+_hedge_policy = HedgePolicy()
+
+def get_hedge_policy() -> HedgePolicy:
+    """获取全局对冲请求策略"""
+    return _hedge_policy
+
+
+# Embedding 批量设置：batch_size 为单次请求的文本数，max_workers 为并发请求数（批次之间或逐条接口的扇出）
+DEFAULT_EMBEDDING_BATCHING = {"batch_size": 32, "max_workers": 4}
+_embedding_batching: Dict[str, int] = dict(DEFAULT_EMBEDDING_BATCHING)
+
+
+def configure_embedding_batching(settings: Optional[Dict[str, Any]]):
+    """应用 config.json 中的 embedding_batching 配置，未给出的项保留当前值"""
+    for key in DEFAULT_EMBEDDING_BATCHING:
+        value = (settings or {}).get(key)
+        if value is None:
+            continue
+        try:
+            _embedding_batching[key] = max(1, int(value))
+        except (TypeError, ValueError):
+            logging.warning(f"embedding_batching.{key} 无效: {value}")
+
+
+def get_embedding_batching() -> Dict[str, int]:
+    """获取 Embedding 批量设置"""
+    return dict(_embedding_batching)
+
+
+def apply_network_config(config: Dict[str, Any]):
+    """
+    根据 config.json 配置进程级网络治理。
+    llm_configs 中每个配置可包含：
+        "rate_limit": {"requests_per_minute": 60, "tokens_per_minute": 100000, "max_concurrency": 4}
+    同一主机 + api_key 的多个配置共享一个限流器。
+    顶层可选：
+        "circuit_breaker": {"failure_threshold": 5, "open_seconds": 60, "slow_call_seconds": 300}
+        "failover_configs": {"draft": ["配置A", "配置B"], "finalize": [...], "summarize": [...]}
+        "hedging": {"enabled": true, "roles": ["summarize"], "max_prompt_chars": 6000,
+                    "percentile": 0.9, "budget_ratio": 0.1, "min_samples": 10}
+        "retry_policy": {"stage_deadlines": {"draft": 1200, "finalize": 900, ...}}
+        "embedding_batching": {"batch_size": 32, "max_workers": 4}
+    """
+    for name, llm_conf in (config or {}).get("llm_configs", {}).items():
+        if not isinstance(llm_conf, dict) or "rate_limit" not in llm_conf:
+            continue
+        rate_limit = llm_conf.get("rate_limit") or {}
+        try:
+            configure_rate_limit(
+                llm_conf.get("base_url", ""),
+                llm_conf.get("api_key", ""),
+                requests_per_minute=rate_limit.get("requests_per_minute", 0),
+                tokens_per_minute=rate_limit.get("tokens_per_minute", 0),
+                max_concurrency=rate_limit.get("max_concurrency", 0)
+            )
+        except Exception as e:
+            logging.warning(f"LLM配置 {name} 的限流参数无效: {e}")
+
+    # 熔断参数
+    breaker_conf = (config or {}).get("circuit_breaker") or {}
+    for key in _breaker_settings:
+        if key in breaker_conf:
+            _breaker_settings[key] = breaker_conf[key]
+
+    # 故障转移链：角色 -> 有序的 llm_configs 名称列表
+    llm_configs = (config or {}).get("llm_configs", {})
+    chains = {}
+    for role, names in ((config or {}).get("failover_configs") or {}).items():
+        chain = []
+        for name in names or []:
+            if name in llm_configs:
+                chain.append(dict(llm_configs[name], config_name=name))
+            else:
+                logging.warning(f"故障转移配置 {role} 引用了不存在的LLM配置: {name}")
+        if chain:
+            chains[role] = chain
+    _failover_chains.clear()
+    _failover_chains.update(chains)
+
+    # 重试与阶段截止时间
+    configure_retry_policy((config or {}).get("retry_policy"))
+
+    # 对冲请求
+    hedging_conf = (config or {}).get("hedging")
+    if hedging_conf:
+        _hedge_policy.configure(**hedging_conf)
+
+    # Embedding 批量请求
+    configure_embedding_batching((config or {}).get("embedding_batching"))
+
+
 class ConnectionManager:
     """连接管理器 - BMAD方法的核心组件"""
 
@@ -66,33 +789,15 @@ class ConnectionManager:
     def proxy_context(self, use_proxy: bool = False):
         """
         代理上下文管理器 - BMAD的Adapt模式
+        代理策略挂在 HTTP 会话上而不是进程级的 os.environ，并发请求互不干扰。
 
         Args:
-            use_proxy: 是否使用代理，默认False（清除代理）
-        """
-        # 保存当前代理设置
-        current_proxies = {}
+            use_proxy: 是否使用代理，默认False（不读取环境变量中的代理）
 
-        try:
-            if not use_proxy:
-                # 清除代理设置
-                for proxy_var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']:
-                    current_proxies[proxy_var] = os.environ.pop(proxy_var, None)
-
-                if ADVANCED_LOGGING:
-                    log_network_request("ProxyContext", "已清除代理设置")
-
-            yield
-
-        finally:
-            # 恢复代理设置
-            if not use_proxy:
-                for var, value in current_proxies.items():
-                    if value:
-                        os.environ[var] = value
-
-                if ADVANCED_LOGGING:
-                    log_network_response("ProxyContext", "已恢复代理设置")
+        Yields:
+            requests.Session: 当前线程按该策略配置好的会话
+        """
+        yield get_http_session(use_proxy=use_proxy)
 
     def test_connection(self, url: str, timeout: Optional[int] = None) -> bool:
         """
@@ -108,8 +813,8 @@ class ConnectionManager:
         timeout = timeout or self.timeout
 
         try:
-            with self.proxy_context(use_proxy=False):
-                response = requests.get(url, timeout=timeout)
+            with self.proxy_context(use_proxy=False) as session:
+                response = session.get(url, timeout=timeout)
                 success = response.status_code in [200, 401, 403]  # 这些状态码表示连接成功
 
                 if ADVANCED_LOGGING:
@@ -151,8 +856,8 @@ class ConnectionManager:
         try:
             start_time = time.time()
 
-            with self.proxy_context(use_proxy=False):
-                response = requests.get(health_url, timeout=10)
+            with self.proxy_context(use_proxy=False) as session:
+                response = session.get(health_url, timeout=10)
 
                 result['connected'] = True
                 result['status_code'] = response.status_code
@@ -177,6 +882,8 @@ class ConnectionManager:
         request_func: Callable,
         *args,
         use_proxy: bool = False,
+        endpoint: Optional[str] = None,
+        limiter: Optional[RateLimiter] = None,
         **kwargs
     ) -> Any:
         """
@@ -186,6 +893,8 @@ class ConnectionManager:
             request_func: 请求函数
             *args: 函数参数
             use_proxy: 是否使用代理
+            endpoint: 请求的端点URL；提供时成功请求的耗时会计入延迟模型
+            limiter: 服务商限流器；重试前等待请求令牌，遇到 429 时按 Retry-After 暂停
             **kwargs: 函数关键字参数
 
         Returns:
@@ -194,19 +903,45 @@ class ConnectionManager:
         Raises:
             NetworkError: 所有重试失败后抛出
         """
+        policy = RetryPolicy("http", max_attempts=self.max_retries, base_delay=self.retry_delay)
         last_exception = None
+        attempt = 0
 
-        for attempt in range(self.max_retries):
+        while True:
+            attempt += 1
+            if limiter is not None and attempt > 1:
+                # 在途名额由调用方持有，重试只需要再领一个请求令牌
+                limiter.acquire(take_slot=False)
             try:
-                with self.proxy_context(use_proxy=use_proxy):
-                    result = request_func(*args, **kwargs)
+                policy.begin_attempt(attempt)
+            except DeadlineExceededError as e:
+                error = NetworkError(f"网络请求未完成，阶段截止时间已到: {last_exception or e}")
+                error.retryable = False
+                raise error from (last_exception or e)
+            try:
+                deadline = current_deadline()
+                session_method = _SESSION_METHODS.get(request_func)
+                if deadline is not None and (session_method or 'timeout' in kwargs):
+                    # 单次请求的超时不超过阶段剩余时间（只处理明确接受 timeout 参数的请求函数）
+                    kwargs['timeout'] = deadline.clamp_timeout(kwargs.get('timeout'))
+                with self.proxy_context(use_proxy=use_proxy) as session:
+                    # requests 模块级函数改走按策略配置的会话，避免读取进程级代理环境变量
+                    func = getattr(session, session_method) if session_method else request_func
+                    start_time = time.time()
+                    result = func(*args, **kwargs)
+                    if isinstance(result, requests.Response) and result.status_code == 429:
+                        # 限流响应不算成功，交给下面的 429 处理逻辑
+                        raise requests.HTTPError(f"429 Too Many Requests: {result.text[:200]}", response=result)
+                    if endpoint:
+                        self.record_latency(endpoint, time.time() - start_time)
 
                     if ADVANCED_LOGGING:
                         log_network_response(
                             "RequestWithRetry",
-                            f"请求成功 - 尝试次数: {attempt + 1}"
+                            f"请求成功 - 尝试次数: {attempt}"
                         )
 
+                    policy.record_success()
                     return result
 
             except Exception as e:
@@ -215,16 +950,27 @@ class ConnectionManager:
                 if ADVANCED_LOGGING:
                     log_network_request(
                         "RequestWithRetry",
-                        f"请求失败 - 尝试次数: {attempt + 1}/{self.max_retries}, 错误: {str(e)}"
+                        f"请求失败 - 尝试次数: {attempt}/{self.max_retries}, 错误: {str(e)}"
                     )
 
-                # 如果不是最后一次尝试，等待后重试
-                if attempt < self.max_retries - 1:
-                    delay = self.retry_delay * (2 ** attempt)  # 指数退避
-                    time.sleep(delay)
-
-        # 所有重试都失败了
-        raise NetworkError(f"网络请求失败，已重试{self.max_retries}次: {str(last_exception)}")
+                retry_after = None
+                rate_limited = get_rate_limit_info(e)
+                if rate_limited is not None:
+                    # 服务商限流：优先遵循 Retry-After
+                    retry_after = rate_limited['retry_after']
+                delay = policy.next_delay(attempt, e, delay=retry_after)
+                if delay is None:
+                    break
+                if rate_limited is not None and limiter is not None:
+                    # 共享限流器整体暂停，同一账号的其他请求一起退让；下次尝试前的 acquire 会等到暂停结束
+                    limiter.pause(delay)
+                    continue
+                time.sleep(delay)
+
+        # 本层已经重试过（或错误不可重试），外层不应再对同一错误重试
+        error = NetworkError(f"网络请求失败，共尝试{attempt}次: {str(last_exception)}")
+        error.retryable = False
+        raise error from last_exception
 
     def diagnose_connection_issues(self) -> Dict[str, Any]:
         """
@@ -278,9 +1024,14 @@ class ConnectionManager:
 
         return diagnosis
 
+    def record_latency(self, base_url: str, seconds: float):
+        """记录一次真实请求的耗时，供 get_best_timeout 使用"""
+        get_latency_model().record(base_url, seconds)
+
     def get_best_timeout(self, base_url: str) -> int:
         """
         根据网络状况动态调整超时时间 - BMAD的Adapt模式
+        由延迟模型推导，不在调用路径上做探测；模型过期时在后台刷新。
 
         Args:
             base_url: API基础URL
@@ -288,15 +1039,19 @@ class ConnectionManager:
         Returns:
             int: 推荐的超时时间
         """
-        try:
-            start_time = time.time()
-
-            with self.proxy_context(use_proxy=False):
-                requests.get(base_url, timeout=5)
-
-            response_time = time.time() - start_time
-
-            # 根据响应时间动态调整超时
+        model = get_latency_model()
+        if model.is_stale(base_url):
+            self._schedule_latency_refresh(base_url)
+
+        estimate = model.get_estimate(base_url)
+        if estimate and estimate['p95'] is not None:
+            # 有真实请求数据：按 p95 推导
+            timeout = math.ceil(estimate['p95'] * NetworkConfig.LATENCY_TIMEOUT_FACTOR)
+            return max(NetworkConfig.MIN_TIMEOUT, min(NetworkConfig.MAX_TIMEOUT, timeout))
+
+        if estimate and estimate['rtt'] is not None:
+            # 只有探测数据：根据响应时间动态调整超时
+            response_time = estimate['rtt']
             if response_time < 1:
                 return 30  # 快速网络，使用标准超时
             elif response_time < 3:
@@ -304,8 +1059,32 @@ class ConnectionManager:
             else:
                 return 120  # 慢速网络，使用长超时
 
-        except:
-            return 120  # 无法检测，使用长超时
+        return NetworkConfig.UNKNOWN_TIMEOUT  # 尚无测量数据，使用长超时
+
+    def _schedule_latency_refresh(self, base_url: str):
+        """在后台线程探测端点往返时间；同一主机同时只有一个探测，且失败后一段时间内不再重试"""
+        host = _host_of(base_url)
+        now = time.time()
+        with _latency_refresh_lock:
+            if host in _latency_refresh_inflight:
+                return
+            if now - _latency_refresh_attempts.get(host, 0.0) < NetworkConfig.LATENCY_REFRESH_INTERVAL:
+                return
+            _latency_refresh_inflight.add(host)
+            _latency_refresh_attempts[host] = now
+
+        def _probe():
+            try:
+                start_time = time.time()
+                get_http_session(use_proxy=False).get(base_url, timeout=5)
+                get_latency_model().record_rtt(base_url, time.time() - start_time)
+            except Exception as e:
+                logging.debug(f"后台延迟探测失败: {base_url} - {e}")
+            finally:
+                with _latency_refresh_lock:
+                    _latency_refresh_inflight.discard(host)
+
+        threading.Thread(target=_probe, name=f"latency-probe-{host}", daemon=True).start()
 
 
 # 全局连接管理器实例
@@ -319,6 +1098,31 @@ def get_connection_manager(config: Optional[Dict[str, Any]] = None) -> Connectio
     return _connection_manager
 
 
+# 异步 HTTP 客户端：连接池与事件循环绑定，按事件循环各共享一个实例
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+def get_async_http_client():
+    """
+    获取当前事件循环共享的 httpx.AsyncClient。
+    同一事件循环内的所有异步适配器复用同一连接池，可同时承载大量在途请求。
+    与 proxy_context 的默认策略一致，不读取环境变量中的代理设置。
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(NetworkConfig.DEFAULT_TIMEOUT, connect=10.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                trust_env=False
+            )
+            _async_clients[loop] = client
+    return client
+
+
 def test_network_connection() -> bool:
     """快速测试网络连接"""
     manager = get_connection_manager()
@@ -1,13 +1,15 @@
 #novel_generator/__init__.py
-from .architecture import Novel_architecture_generate
+from .architecture import Novel_architecture_generate, Novel_architecture_generate_async
 from .blueprint import Chapter_blueprint_generate
 from .chapter import (
     get_last_n_chapters_text,
     summarize_recent_chapters,
     get_filtered_knowledge_context,
     build_chapter_prompt,
+    build_chapter_prompt_async,
     generate_chapter_draft
 )
-from .finalization import finalize_chapter, enrich_chapter_text
+from .finalization import finalize_chapter, finalize_chapter_async, enrich_chapter_text
 from .knowledge import import_knowledge_file
-from .vectorstore_utils import clear_vector_store
\ No newline at end of file
+from .vectorstore_utils import clear_vector_store
+from .project_sync import sync_vector_store, start_vector_store_sync
\ No newline at end of file
@@ -5,10 +5,15 @@
 """
 import os
 import json
+import asyncio
 import logging
+import threading
 import traceback
-from novel_generator.common import invoke_with_cleaning
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from novel_generator.common import invoke_with_cleaning, ainvoke_with_cleaning
 from llm_adapters import create_llm_adapter
+from retry_policy import stage_deadline
 from prompt_definitions import (
     core_seed_prompt,
     character_dynamics_prompt,
@@ -23,7 +28,7 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
-from utils import clear_file_content, save_string_to_txt
+from utils import clear_file_content, save_string_to_txt, atomic_write_text
 
 def load_partial_architecture_data(filepath: str) -> dict:
     """
@@ -41,17 +46,221 @@ def load_partial_architecture_data(filepath: str) -> dict:
         logging.warning(f"Failed to load partial_architecture.json: {e}")
         return {}
 
+_partial_save_lock = threading.Lock()
+
 def save_partial_architecture_data(filepath: str, data: dict):
     """
     将阶段性数据写入 partial_architecture.json。
+    并发完成的步骤会串行写入，且每次都是原子替换，中断时文件始终是某次完整的快照。
     """
     partial_file = os.path.join(filepath, "partial_architecture.json")
     try:
-        with open(partial_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with _partial_save_lock:
+            content = json.dumps(dict(data), ensure_ascii=False, indent=2)
+            if not atomic_write_text(content, partial_file):
+                logging.warning("Failed to save partial_architecture.json")
     except Exception as e:
         logging.warning(f"Failed to save partial_architecture.json: {e}")
 
+def _save_initial_character_state(filepath: str, character_state_init: str):
+    character_state_file = os.path.join(filepath, "character_state.txt")
+    clear_file_content(character_state_file)
+    save_string_to_txt(character_state_init, character_state_file)
+
+# 架构生成步骤表：按 deps 组成依赖图，依赖已满足的步骤并发执行（Step2 与 Step3 只依赖核心种子）；
+# 已存在于 partial_architecture.json 中的步骤会被跳过。prompt 接收 (partial_data, params)，params 为 topic/genre/number_of_chapters/word_number/user_guidance。
+ARCHITECTURE_STEPS = [
+    {
+        "key": "core_seed_result",
+        "deps": [],
+        "start_log": "Step1: Generating core_seed_prompt (核心种子) ...",
+        "skip_log": "Step1 already done. Skipping...",
+        "fail_log": "core_seed_prompt generation failed and returned empty.",
+        "prompt": lambda data, p: core_seed_prompt.format(
+            topic=p["topic"],
+            genre=p["genre"],
+            number_of_chapters=p["number_of_chapters"],
+            word_number=p["word_number"],
+            user_guidance=p["user_guidance"]  # 修复：添加内容指导
+        ),
+    },
+    {
+        "key": "character_dynamics_result",
+        "deps": ["core_seed_result"],
+        "start_log": "Step2: Generating character_dynamics_prompt ...",
+        "skip_log": "Step2 already done. Skipping...",
+        "fail_log": "character_dynamics_prompt generation failed.",
+        "prompt": lambda data, p: character_dynamics_prompt.format(
+            core_seed=data["core_seed_result"].strip(),
+            user_guidance=p["user_guidance"]
+        ),
+    },
+    {
+        # 生成初始角色状态
+        "key": "character_state_result",
+        "deps": ["character_dynamics_result"],
+        "start_log": "Generating initial character state from character dynamics ...",
+        "done_log": "Initial character state created and saved.",
+        "fail_log": "create_character_state_prompt generation failed.",
+        "prompt": lambda data, p: create_character_state_prompt.format(
+            character_dynamics=data["character_dynamics_result"].strip()
+        ),
+        "on_done": _save_initial_character_state,
+    },
+    {
+        "key": "world_building_result",
+        "deps": ["core_seed_result"],
+        "start_log": "Step3: Generating world_building_prompt ...",
+        "skip_log": "Step3 already done. Skipping...",
+        "fail_log": "world_building_prompt generation failed.",
+        "prompt": lambda data, p: world_building_prompt.format(
+            core_seed=data["core_seed_result"].strip(),
+            user_guidance=p["user_guidance"]  # 修复：添加用户指导
+        ),
+    },
+    {
+        "key": "plot_arch_result",
+        "deps": ["core_seed_result", "character_dynamics_result", "world_building_result"],
+        "start_log": "Step4: Generating plot_architecture_prompt ...",
+        "skip_log": "Step4 already done. Skipping...",
+        "fail_log": "plot_architecture_prompt generation failed.",
+        "prompt": lambda data, p: plot_architecture_prompt.format(
+            core_seed=data["core_seed_result"].strip(),
+            character_dynamics=data["character_dynamics_result"].strip(),
+            world_building=data["world_building_result"].strip(),
+            user_guidance=p["user_guidance"]  # 修复：添加用户指导
+        ),
+    },
+]
+
+def _record_architecture_step(filepath: str, partial_data: dict, step: dict, result: str) -> bool:
+    """
+    记录单个步骤的结果并保存阶段性数据。
+    结果为空时同样保存已有数据，返回 False 以终止本次生成。
+    """
+    if not result.strip():
+        logging.warning(step["fail_log"])
+        save_partial_architecture_data(filepath, partial_data)
+        return False
+    partial_data[step["key"]] = result
+    if step.get("on_done"):
+        step["on_done"](filepath, result)
+    save_partial_architecture_data(filepath, partial_data)
+    if step.get("done_log"):
+        logging.info(step["done_log"])
+    return True
+
+def _ready_architecture_steps(partial_data: dict, pending: list) -> list:
+    """依赖均已完成、可以开始的步骤（保持步骤表中的顺序）"""
+    return [step for step in pending if all(dep in partial_data for dep in step["deps"])]
+
+def _skip_completed_steps(partial_data: dict) -> list:
+    """记录已完成步骤的跳过日志，返回待执行的步骤"""
+    pending = []
+    for step in ARCHITECTURE_STEPS:
+        if step["key"] in partial_data:
+            if step.get("skip_log"):
+                logging.info(step["skip_log"])
+        else:
+            pending.append(step)
+    return pending
+
+def _run_architecture_steps(filepath: str, partial_data: dict, params: dict, llm_adapter) -> bool:
+    """
+    按依赖图在线程中并发执行剩余步骤；结果在调度线程中依次记录并保存。
+    某一步失败后不再启动新步骤，但已在执行的步骤会完成并保存，便于下次续传。
+    全部完成返回 True；有步骤抛出异常时在其余步骤结束后重新抛出。
+    """
+    pending = _skip_completed_steps(partial_data)
+    running = {}
+    failed = False
+    first_error = None
+    with ThreadPoolExecutor(max_workers=len(ARCHITECTURE_STEPS), thread_name_prefix="architecture") as executor:
+        while True:
+            if not failed:
+                for step in _ready_architecture_steps(partial_data, pending):
+                    pending.remove(step)
+                    logging.info(step["start_log"])
+                    prompt = step["prompt"](partial_data, params)
+                    # 在当前上下文的副本中运行，阶段截止时间与遥测阶段随之传递
+                    future = executor.submit(contextvars.copy_context().run, invoke_with_cleaning, llm_adapter, prompt)
+                    running[future] = step
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.warning(f"{step['fail_log']} {e}")
+                    first_error = first_error or e
+                    failed = True
+                    continue
+                if not _record_architecture_step(filepath, partial_data, step, result):
+                    failed = True
+    if first_error is not None:
+        raise first_error
+    return not failed and not pending
+
+async def _arun_architecture_steps(filepath: str, partial_data: dict, params: dict, llm_adapter) -> bool:
+    """_run_architecture_steps 的异步版本"""
+    pending = _skip_completed_steps(partial_data)
+    running = {}
+    failed = False
+    first_error = None
+    while True:
+        if not failed:
+            for step in _ready_architecture_steps(partial_data, pending):
+                pending.remove(step)
+                logging.info(step["start_log"])
+                prompt = step["prompt"](partial_data, params)
+                task = asyncio.ensure_future(ainvoke_with_cleaning(llm_adapter, prompt))
+                running[task] = step
+        if not running:
+            break
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            step = running.pop(task)
+            try:
+                result = task.result()
+            except Exception as e:
+                logging.warning(f"{step['fail_log']} {e}")
+                first_error = first_error or e
+                failed = True
+                continue
+            if not _record_architecture_step(filepath, partial_data, step, result):
+                failed = True
+    if first_error is not None:
+        raise first_error
+    return not failed and not pending
+
+def _finish_architecture(filepath: str, partial_data: dict, params: dict):
+    """所有步骤完成后输出 Novel_architecture.txt 并删除 partial_architecture.json"""
+    final_content = (
+        "#=== 0) 小说设定 ===\n"
+        f"主题：{params['topic']},类型：{params['genre']},篇幅：约{params['number_of_chapters']}章（每章{params['word_number']}字）\n\n"
+        "#=== 1) 核心种子 ===\n"
+        f"{partial_data['core_seed_result']}\n\n"
+        "#=== 2) 角色动力学 ===\n"
+        f"{partial_data['character_dynamics_result']}\n\n"
+        "#=== 3) 世界观 ===\n"
+        f"{partial_data['world_building_result']}\n\n"
+        "#=== 4) 三幕式情节架构 ===\n"
+        f"{partial_data['plot_arch_result']}\n"
+    )
+
+    arch_file = os.path.join(filepath, "Novel_architecture.txt")
+    clear_file_content(arch_file)
+    save_string_to_txt(final_content, arch_file)
+    logging.info("Novel_architecture.txt has been generated successfully.")
+
+    partial_arch_file = os.path.join(filepath, "partial_architecture.json")
+    if os.path.exists(partial_arch_file):
+        os.remove(partial_arch_file)
+        logging.info("partial_architecture.json removed (all steps completed).")
+
+@stage_deadline("architecture")
 def Novel_architecture_generate(
     interface_format: str,
     api_key: str,
@@ -68,11 +277,11 @@ def Novel_architecture_generate(
     timeout: int = 600
 ) -> None:
     """
-    依次调用:
+    按依赖关系调用:
       1. core_seed_prompt
-      2. character_dynamics_prompt
-      3. world_building_prompt
-      4. plot_architecture_prompt
+      2. character_dynamics_prompt    （依赖 1，与 3 并发）
+      3. world_building_prompt        （依赖 1，与 2 并发）
+      4. plot_architecture_prompt     （依赖 1、2、3，与初始角色状态并发）
     若在中间任何一步报错且重试多次失败，则将已经生成的内容写入 partial_architecture.json 并退出；
     下次调用时可从该步骤继续。
     最终输出 Novel_architecture.txt
@@ -92,117 +301,58 @@ def Novel_architecture_generate(
         max_tokens=max_tokens,
         timeout=timeout
     )
-    # Step1: 核心种子
-    if "core_seed_result" not in partial_data:
-        logging.info("Step1: Generating core_seed_prompt (核心种子) ...")
-        prompt_core = core_seed_prompt.format(
-            topic=topic,
-            genre=genre,
-            number_of_chapters=number_of_chapters,
-            word_number=word_number,
-            user_guidance=user_guidance  # 修复：添加内容指导
-        )
-        core_seed_result = invoke_with_cleaning(llm_adapter, prompt_core)
-        if not core_seed_result.strip():
-            logging.warning("core_seed_prompt generation failed and returned empty.")
-            save_partial_architecture_data(filepath, partial_data)
-            return
-        partial_data["core_seed_result"] = core_seed_result
-        save_partial_architecture_data(filepath, partial_data)
-    else:
-        logging.info("Step1 already done. Skipping...")
-    # Step2: 角色动力学
-    if "character_dynamics_result" not in partial_data:
-        logging.info("Step2: Generating character_dynamics_prompt ...")
-        prompt_character = character_dynamics_prompt.format(
-            core_seed=partial_data["core_seed_result"].strip(),
-            user_guidance=user_guidance
-        )
-        character_dynamics_result = invoke_with_cleaning(llm_adapter, prompt_character)
-        if not character_dynamics_result.strip():
-            logging.warning("character_dynamics_prompt generation failed.")
-            save_partial_architecture_data(filepath, partial_data)
-            return
-        partial_data["character_dynamics_result"] = character_dynamics_result
-        save_partial_architecture_data(filepath, partial_data)
-    else:
-        logging.info("Step2 already done. Skipping...")
-    # 生成初始角色状态
-    if "character_dynamics_result" in partial_data and "character_state_result" not in partial_data:
-        logging.info("Generating initial character state from character dynamics ...")
-        prompt_char_state_init = create_character_state_prompt.format(
-            character_dynamics=partial_data["character_dynamics_result"].strip()
-        )
-        character_state_init = invoke_with_cleaning(llm_adapter, prompt_char_state_init)
-        if not character_state_init.strip():
-            logging.warning("create_character_state_prompt generation failed.")
-            save_partial_architecture_data(filepath, partial_data)
-            return
-        partial_data["character_state_result"] = character_state_init
-        character_state_file = os.path.join(filepath, "character_state.txt")
-        clear_file_content(character_state_file)
-        save_string_to_txt(character_state_init, character_state_file)
-        save_partial_architecture_data(filepath, partial_data)
-        logging.info("Initial character state created and saved.")
-    # Step3: 世界观
-    if "world_building_result" not in partial_data:
-        logging.info("Step3: Generating world_building_prompt ...")
-        prompt_world = world_building_prompt.format(
-            core_seed=partial_data["core_seed_result"].strip(),
-            user_guidance=user_guidance  # 修复：添加用户指导
-        )
-        world_building_result = invoke_with_cleaning(llm_adapter, prompt_world)
-        if not world_building_result.strip():
-            logging.warning("world_building_prompt generation failed.")
-            save_partial_architecture_data(filepath, partial_data)
-            return
-        partial_data["world_building_result"] = world_building_result
-        save_partial_architecture_data(filepath, partial_data)
-    else:
-        logging.info("Step3 already done. Skipping...")
-    # Step4: 三幕式情节
-    if "plot_arch_result" not in partial_data:
-        logging.info("Step4: Generating plot_architecture_prompt ...")
-        prompt_plot = plot_architecture_prompt.format(
-            core_seed=partial_data["core_seed_result"].strip(),
-            character_dynamics=partial_data["character_dynamics_result"].strip(),
-            world_building=partial_data["world_building_result"].strip(),
-            user_guidance=user_guidance  # 修复：添加用户指导
-        )
-        plot_arch_result = invoke_with_cleaning(llm_adapter, prompt_plot)
-        if not plot_arch_result.strip():
-            logging.warning("plot_architecture_prompt generation failed.")
-            save_partial_architecture_data(filepath, partial_data)
-            return
-        partial_data["plot_arch_result"] = plot_arch_result
-        save_partial_architecture_data(filepath, partial_data)
-    else:
-        logging.info("Step4 already done. Skipping...")
+    params = {
+        "topic": topic,
+        "genre": genre,
+        "number_of_chapters": number_of_chapters,
+        "word_number": word_number,
+        "user_guidance": user_guidance
+    }
 
-    core_seed_result = partial_data["core_seed_result"]
-    character_dynamics_result = partial_data["character_dynamics_result"]
-    world_building_result = partial_data["world_building_result"]
-    plot_arch_result = partial_data["plot_arch_result"]
+    if not _run_architecture_steps(filepath, partial_data, params, llm_adapter):
+        return
 
-    final_content = (
-        "#=== 0) 小说设定 ===\n"
-        f"主题：{topic},类型：{genre},篇幅：约{number_of_chapters}章（每章{word_number}字）\n\n"
-        "#=== 1) 核心种子 ===\n"
-        f"{core_seed_result}\n\n"
-        "#=== 2) 角色动力学 ===\n"
-        f"{character_dynamics_result}\n\n"
-        "#=== 3) 世界观 ===\n"
-        f"{world_building_result}\n\n"
-        "#=== 4) 三幕式情节架构 ===\n"
-        f"{plot_arch_result}\n"
+    _finish_architecture(filepath, partial_data, params)
+
+@stage_deadline("architecture")
+async def Novel_architecture_generate_async(
+    interface_format: str,
+    api_key: str,
+    base_url: str,
+    llm_model: str,
+    topic: str,
+    genre: str,
+    number_of_chapters: int,
+    word_number: int,
+    filepath: str,
+    user_guidance: str = "",
+    temperature: float = 0.7,
+    max_tokens: int = 2048,
+    timeout: int = 600
+) -> None:
+    """
+    Novel_architecture_generate 的异步版本，步骤、断点续传与产出文件与同步版本一致。
+    """
+    os.makedirs(filepath, exist_ok=True)
+    partial_data = load_partial_architecture_data(filepath)
+    llm_adapter = create_llm_adapter(
+        interface_format=interface_format,
+        base_url=base_url,
+        model_name=llm_model,
+        api_key=api_key,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout
     )
+    params = {
+        "topic": topic,
+        "genre": genre,
+        "number_of_chapters": number_of_chapters,
+        "word_number": word_number,
+        "user_guidance": user_guidance
+    }
 
-    arch_file = os.path.join(filepath, "Novel_architecture.txt")
-    clear_file_content(arch_file)
-    save_string_to_txt(final_content, arch_file)
-    logging.info("Novel_architecture.txt has been generated successfully.")
+    if not await _arun_architecture_steps(filepath, partial_data, params, llm_adapter):
+        return
 
-    partial_arch_file = os.path.join(filepath, "partial_architecture.json")
-    if os.path.exists(partial_arch_file):
-        os.remove(partial_arch_file)
-        logging.info("partial_architecture.json removed (all steps completed).")
+    _finish_architecture(filepath, partial_data, params)
@@ -8,6 +8,7 @@ import re
 import logging
 from novel_generator.common import invoke_with_cleaning
 from llm_adapters import create_llm_adapter
+from retry_policy import stage_deadline
 from prompt_definitions import chapter_blueprint_prompt, chunked_chapter_blueprint_prompt
 from utils import read_file, clear_file_content, save_string_to_txt
 logging.basicConfig(
@@ -47,6 +48,7 @@ def limit_chapter_blueprint(blueprint_text: str, limit_chapters: int = 100) -> s
     selected = chapters[-limit_chapters:]
     return "\n\n".join(selected).strip()
 
+@stage_deadline("blueprint")
 def Chapter_blueprint_generate(
     interface_format: str,
     api_key: str,
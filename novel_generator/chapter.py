@@ -5,9 +5,11 @@
 """
 import os
 import json
+import asyncio
 import logging
 import re  # 添加re模块导入
 from llm_adapters import create_llm_adapter
+from retry_policy import stage_deadline
 from prompt_definitions import (
     first_chapter_draft_prompt, 
     next_chapter_draft_prompt, 
@@ -16,12 +18,10 @@ from prompt_definitions import (
     knowledge_search_prompt
 )
 from chapter_directory_parser import get_chapter_info_from_blueprint
-from novel_generator.common import invoke_with_cleaning
+from novel_generator.common import invoke_with_cleaning, ainvoke_with_cleaning, invoke_stream_with_cleaning
+from novel_generator.llm_cache import get_llm_cache
 from utils import read_file, clear_file_content, save_string_to_txt
-from novel_generator.vectorstore_utils import (
-    get_relevant_context_from_vector_store,
-    load_vector_store  # 添加导入
-)
+from novel_generator.vectorstore_utils import get_relevant_contexts_batch, build_recency_filter
 logging.basicConfig(
     filename='app.log',      # 日志文件名
     filemode='a',            # 追加模式（'w' 会覆盖）
@@ -45,6 +45,56 @@ def get_last_n_chapters_text(chapters_dir: str, current_chapter_num: int, n: int
             texts.append("")
     return texts
 
+def _build_summary_prompt(
+    chapters_text_list: list,
+    novel_number: int,
+    chapter_info: dict,
+    next_chapter_info: dict
+) -> str:
+    """组装前文摘要提示词；前文为空时返回空字符串"""
+    combined_text = "\n".join(chapters_text_list).strip()
+    if not combined_text:
+        return ""
+
+    # 限制组合文本长度
+    max_combined_length = 4000
+    if len(combined_text) > max_combined_length:
+        combined_text = combined_text[-max_combined_length:]
+
+    # 确保所有参数都有默认值
+    chapter_info = chapter_info or {}
+    next_chapter_info = next_chapter_info or {}
+
+    return summarize_recent_chapters_prompt.format(
+        combined_text=combined_text,
+        novel_number=novel_number,
+        chapter_title=chapter_info.get("chapter_title", "未命名"),
+        chapter_role=chapter_info.get("chapter_role", "常规章节"),
+        chapter_purpose=chapter_info.get("chapter_purpose", "内容推进"),
+        suspense_level=chapter_info.get("suspense_level", "中等"),
+        foreshadowing=chapter_info.get("foreshadowing", "无"),
+        plot_twist_level=chapter_info.get("plot_twist_level", "★☆☆☆☆"),
+        chapter_summary=chapter_info.get("chapter_summary", ""),
+        next_chapter_number=novel_number + 1,
+        next_chapter_title=next_chapter_info.get("chapter_title", "（未命名）"),
+        next_chapter_role=next_chapter_info.get("chapter_role", "过渡章节"),
+        next_chapter_purpose=next_chapter_info.get("chapter_purpose", "承上启下"),
+        next_chapter_summary=next_chapter_info.get("chapter_summary", "衔接过渡内容"),
+        next_chapter_suspense_level=next_chapter_info.get("suspense_level", "中等"),
+        next_chapter_foreshadowing=next_chapter_info.get("foreshadowing", "无特殊伏笔"),
+        next_chapter_plot_twist_level=next_chapter_info.get("plot_twist_level", "★☆☆☆☆")
+    )
+
+def _finish_summary(response_text: str) -> str:
+    """从摘要响应中提取并截断摘要"""
+    summary = extract_summary_from_response(response_text)
+
+    if not summary:
+        logging.warning("Failed to extract summary, using full response")
+        return response_text[:2000]  # 限制长度
+
+    return summary[:2000]  # 限制摘要长度
+
 def summarize_recent_chapters(
     interface_format: str,
     api_key: str,
@@ -56,22 +106,18 @@ def summarize_recent_chapters(
     novel_number: int,            # 新增参数
     chapter_info: dict,           # 新增参数
     next_chapter_info: dict,      # 新增参数
-    timeout: int = 600
+    timeout: int = 600,
+    cache=None
 ) -> str:  # 修改返回值类型为 str，不再是 tuple
     """
     根据前三章内容生成当前章节的精准摘要。
     如果解析失败，则返回空字符串。
     """
     try:
-        combined_text = "\n".join(chapters_text_list).strip()
-        if not combined_text:
+        prompt = _build_summary_prompt(chapters_text_list, novel_number, chapter_info, next_chapter_info)
+        if not prompt:
             return ""
-            
-        # 限制组合文本长度
-        max_combined_length = 4000
-        if len(combined_text) > max_combined_length:
-            combined_text = combined_text[-max_combined_length:]
-            
+
         llm_adapter = create_llm_adapter(
             interface_format=interface_format,
             base_url=base_url,
@@ -79,42 +125,51 @@ def summarize_recent_chapters(
             api_key=api_key,
             temperature=temperature,
             max_tokens=max_tokens,
-            timeout=timeout
+            timeout=timeout,
+            role="summarize"
         )
-        
-        # 确保所有参数都有默认值
-        chapter_info = chapter_info or {}
-        next_chapter_info = next_chapter_info or {}
-        
-        prompt = summarize_recent_chapters_prompt.format(
-            combined_text=combined_text,
-            novel_number=novel_number,
-            chapter_title=chapter_info.get("chapter_title", "未命名"),
-            chapter_role=chapter_info.get("chapter_role", "常规章节"),
-            chapter_purpose=chapter_info.get("chapter_purpose", "内容推进"),
-            suspense_level=chapter_info.get("suspense_level", "中等"),
-            foreshadowing=chapter_info.get("foreshadowing", "无"),
-            plot_twist_level=chapter_info.get("plot_twist_level", "★☆☆☆☆"),
-            chapter_summary=chapter_info.get("chapter_summary", ""),
-            next_chapter_number=novel_number + 1,
-            next_chapter_title=next_chapter_info.get("chapter_title", "（未命名）"),
-            next_chapter_role=next_chapter_info.get("chapter_role", "过渡章节"),
-            next_chapter_purpose=next_chapter_info.get("chapter_purpose", "承上启下"),
-            next_chapter_summary=next_chapter_info.get("chapter_summary", "衔接过渡内容"),
-            next_chapter_suspense_level=next_chapter_info.get("suspense_level", "中等"),
-            next_chapter_foreshadowing=next_chapter_info.get("foreshadowing", "无特殊伏笔"),
-            next_chapter_plot_twist_level=next_chapter_info.get("plot_twist_level", "★☆☆☆☆")
+
+        response_text = invoke_with_cleaning(llm_adapter, prompt, cache=cache)
+        return _finish_summary(response_text)
+
+    except Exception as e:
+        logging.error(f"Error in summarize_recent_chapters: {str(e)}")
+        return ""
+
+async def summarize_recent_chapters_async(
+    interface_format: str,
+    api_key: str,
+    base_url: str,
+    model_name: str,
+    temperature: float,
+    max_tokens: int,
+    chapters_text_list: list,
+    novel_number: int,
+    chapter_info: dict,
+    next_chapter_info: dict,
+    timeout: int = 600,
+    cache=None
+) -> str:
+    """summarize_recent_chapters 的异步版本"""
+    try:
+        prompt = _build_summary_prompt(chapters_text_list, novel_number, chapter_info, next_chapter_info)
+        if not prompt:
+            return ""
+
+        llm_adapter = create_llm_adapter(
+            interface_format=interface_format,
+            base_url=base_url,
+            model_name=model_name,
+            api_key=api_key,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            role="summarize"
         )
-        
-        response_text = invoke_with_cleaning(llm_adapter, prompt)
-        summary = extract_summary_from_response(response_text)
-        
-        if not summary:
-            logging.warning("Failed to extract summary, using full response")
-            return response_text[:2000]  # 限制长度
-            
-        return summary[:2000]  # 限制摘要长度
-        
+
+        response_text = await ainvoke_with_cleaning(llm_adapter, prompt, cache=cache)
+        return _finish_summary(response_text)
+
     except Exception as e:
         logging.error(f"Error in summarize_recent_chapters: {str(e)}")
         return ""
@@ -219,6 +274,32 @@ def apply_knowledge_rules(contexts: list, chapter_num: int) -> list:
             processed.append(f"[外部知识] {text}")
     return processed
 
+def _build_knowledge_filter_prompt(chapter_info: dict, retrieved_texts: list) -> str:
+    """对检索结果应用知识库规则并组装过滤提示词"""
+    processed_texts = apply_knowledge_rules(retrieved_texts, chapter_info.get('chapter_number', 0))
+
+    # 限制检索文本长度并格式化
+    formatted_texts = []
+    max_text_length = 600
+    for i, text in enumerate(processed_texts, 1):
+        if len(text) > max_text_length:
+            text = text[:max_text_length] + "..."
+        formatted_texts.append(f"[预处理结果{i}]\n{text}")
+
+    # 使用格式化函数处理章节信息
+    formatted_chapter_info = (
+        f"当前章节定位：{chapter_info.get('chapter_role', '')}\n"
+        f"核心目标：{chapter_info.get('chapter_purpose', '')}\n"
+        f"关键要素：{chapter_info.get('characters_involved', '')} | "
+        f"{chapter_info.get('key_items', '')} | "
+        f"{chapter_info.get('scene_location', '')}"
+    )
+
+    return knowledge_filter_prompt.format(
+        chapter_info=formatted_chapter_info,
+        retrieved_texts="\n\n".join(formatted_texts) if formatted_texts else "（无检索结果）"
+    )
+
 def get_filtered_knowledge_context(
     api_key: str,
     base_url: str,
@@ -229,14 +310,15 @@ def get_filtered_knowledge_context(
     chapter_info: dict,
     retrieved_texts: list,
     max_tokens: int = 2048,
-    timeout: int = 600
+    timeout: int = 600,
+    cache=None
 ) -> str:
     """优化后的知识过滤处理"""
     if not retrieved_texts:
         return "（无相关知识库内容）"
 
     try:
-        processed_texts = apply_knowledge_rules(retrieved_texts, chapter_info.get('chapter_number', 0))
+        prompt = _build_knowledge_filter_prompt(chapter_info, retrieved_texts)
         llm_adapter = create_llm_adapter(
             interface_format=interface_format,
             base_url=base_url,
@@ -244,38 +326,203 @@ def get_filtered_knowledge_context(
             api_key=api_key,
             temperature=0.3,
             max_tokens=max_tokens,
-            timeout=timeout
-        )
-        
-        # 限制检索文本长度并格式化
-        formatted_texts = []
-        max_text_length = 600
-        for i, text in enumerate(processed_texts, 1):
-            if len(text) > max_text_length:
-                text = text[:max_text_length] + "..."
-            formatted_texts.append(f"[预处理结果{i}]\n{text}")
-
-        # 使用格式化函数处理章节信息
-        formatted_chapter_info = (
-            f"当前章节定位：{chapter_info.get('chapter_role', '')}\n"
-            f"核心目标：{chapter_info.get('chapter_purpose', '')}\n"
-            f"关键要素：{chapter_info.get('characters_involved', '')} | "
-            f"{chapter_info.get('key_items', '')} | "
-            f"{chapter_info.get('scene_location', '')}"
+            timeout=timeout,
+            role="summarize"
         )
 
-        prompt = knowledge_filter_prompt.format(
-            chapter_info=formatted_chapter_info,
-            retrieved_texts="\n\n".join(formatted_texts) if formatted_texts else "（无检索结果）"
+        filtered_content = invoke_with_cleaning(llm_adapter, prompt, cache=cache)
+        return filtered_content if filtered_content else "（知识内容过滤失败）"
+
+    except Exception as e:
+        logging.error(f"Error in knowledge filtering: {str(e)}")
+        return "（内容过滤过程出错）"
+
+async def get_filtered_knowledge_context_async(
+    api_key: str,
+    base_url: str,
+    model_name: str,
+    interface_format: str,
+    embedding_adapter,
+    filepath: str,
+    chapter_info: dict,
+    retrieved_texts: list,
+    max_tokens: int = 2048,
+    timeout: int = 600,
+    cache=None
+) -> str:
+    """get_filtered_knowledge_context 的异步版本"""
+    if not retrieved_texts:
+        return "（无相关知识库内容）"
+
+    try:
+        prompt = _build_knowledge_filter_prompt(chapter_info, retrieved_texts)
+        llm_adapter = create_llm_adapter(
+            interface_format=interface_format,
+            base_url=base_url,
+            model_name=model_name,
+            api_key=api_key,
+            temperature=0.3,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            role="summarize"
         )
-        
-        filtered_content = invoke_with_cleaning(llm_adapter, prompt)
+
+        filtered_content = await ainvoke_with_cleaning(llm_adapter, prompt, cache=cache)
         return filtered_content if filtered_content else "（知识内容过滤失败）"
-        
+
     except Exception as e:
         logging.error(f"Error in knowledge filtering: {str(e)}")
         return "（内容过滤过程出错）"
 
+def _load_chapter_prompt_context(filepath: str, novel_number: int) -> dict:
+    """读取构造章节提示词所需的基础文件与本章/下一章蓝图信息"""
+    arch_file = os.path.join(filepath, "Novel_architecture.txt")
+    directory_file = os.path.join(filepath, "Novel_directory.txt")
+    global_summary_file = os.path.join(filepath, "global_summary.txt")
+    character_state_file = os.path.join(filepath, "character_state.txt")
+    blueprint_text = read_file(directory_file)
+
+    # 创建章节目录
+    chapters_dir = os.path.join(filepath, "chapters")
+    os.makedirs(chapters_dir, exist_ok=True)
+
+    return {
+        "novel_architecture_text": read_file(arch_file),
+        "global_summary_text": read_file(global_summary_file),
+        "character_state_text": read_file(character_state_file),
+        "chapter_info": get_chapter_info_from_blueprint(blueprint_text, novel_number),
+        "next_chapter_info": get_chapter_info_from_blueprint(blueprint_text, novel_number + 1),
+        "chapters_dir": chapters_dir
+    }
+
+def _format_first_chapter_prompt(context: dict, novel_number: int, word_number: int, params: dict) -> str:
+    """第一章特殊处理：不依赖前文与知识库"""
+    chapter_info = context["chapter_info"]
+    return first_chapter_draft_prompt.format(
+        novel_number=novel_number,
+        word_number=word_number,
+        chapter_title=chapter_info["chapter_title"],
+        chapter_role=chapter_info["chapter_role"],
+        chapter_purpose=chapter_info["chapter_purpose"],
+        suspense_level=chapter_info["suspense_level"],
+        foreshadowing=chapter_info["foreshadowing"],
+        plot_twist_level=chapter_info["plot_twist_level"],
+        chapter_summary=chapter_info["chapter_summary"],
+        characters_involved=params["characters_involved"],
+        key_items=params["key_items"],
+        scene_location=params["scene_location"],
+        time_constraint=params["time_constraint"],
+        user_guidance=params["user_guidance"],
+        novel_setting=context["novel_architecture_text"]
+    )
+
+def _get_previous_excerpt(recent_texts: list) -> str:
+    """获取前一章结尾"""
+    for text in reversed(recent_texts):
+        if text.strip():
+            return text[-800:] if len(text) > 800 else text
+    return ""
+
+def _build_knowledge_search_prompt(novel_number: int, chapter_info: dict, params: dict, short_summary: str) -> str:
+    """组装知识库检索关键词提示词"""
+    return knowledge_search_prompt.format(
+        chapter_number=novel_number,
+        chapter_title=chapter_info["chapter_title"],
+        characters_involved=params["characters_involved"],
+        key_items=params["key_items"],
+        scene_location=params["scene_location"],
+        chapter_role=chapter_info["chapter_role"],
+        chapter_purpose=chapter_info["chapter_purpose"],
+        foreshadowing=chapter_info["foreshadowing"],
+        short_summary=short_summary,
+        user_guidance=params["user_guidance"],
+        time_constraint=params["time_constraint"]
+    )
+
+def _retrieve_keyword_contexts(embedding_adapter, filepath: str, keyword_groups: list, retrieval_k: int,
+                               novel_number: int = 0) -> list:
+    """
+    按关键词组执行一次批量向量检索，并按检索意图打上分类标签。
+    给出 novel_number 时近章片段在检索阶段即被排除（见 build_recency_filter），不占用 top-k 名额。
+    """
+    all_contexts = []
+    group_hits = get_relevant_contexts_batch(
+        embedding_adapter, keyword_groups, filepath, k=retrieval_k,
+        where=build_recency_filter(novel_number)
+    )
+    for group, hits in zip(keyword_groups, group_hits):
+        if not hits:
+            continue
+        context = "\n".join(hit["content"] for hit in hits)[:2000]
+        if any(kw in group.lower() for kw in ["技法", "手法", "模板"]):
+            all_contexts.append(f"[TECHNIQUE] {context}")
+        elif any(kw in group.lower() for kw in ["设定", "技术", "世界观"]):
+            all_contexts.append(f"[SETTING] {context}")
+        else:
+            all_contexts.append(f"[GENERAL] {context}")
+    return all_contexts
+
+def _build_filter_chapter_info(novel_number: int, chapter_info: dict, params: dict) -> dict:
+    """组装知识过滤所需的章节信息"""
+    return {
+        "chapter_number": novel_number,
+        "chapter_title": chapter_info["chapter_title"],
+        "chapter_role": chapter_info["chapter_role"],
+        "chapter_purpose": chapter_info["chapter_purpose"],
+        "characters_involved": params["characters_involved"],
+        "key_items": params["key_items"],
+        "scene_location": params["scene_location"],
+        "foreshadowing": chapter_info["foreshadowing"],  # 修复拼写错误
+        "suspense_level": chapter_info["suspense_level"],
+        "plot_twist_level": chapter_info["plot_twist_level"],
+        "chapter_summary": chapter_info["chapter_summary"],
+        "time_constraint": params["time_constraint"]
+    }
+
+def _format_next_chapter_prompt(
+    context: dict,
+    novel_number: int,
+    word_number: int,
+    params: dict,
+    short_summary: str,
+    previous_excerpt: str,
+    filtered_context: str
+) -> str:
+    """组装第二章及以后的最终提示词"""
+    chapter_info = context["chapter_info"]
+    next_chapter_info = context["next_chapter_info"]
+    user_guidance = params["user_guidance"]
+    return next_chapter_draft_prompt.format(
+        user_guidance=user_guidance if user_guidance else "无特殊指导",
+        global_summary=context["global_summary_text"],
+        previous_chapter_excerpt=previous_excerpt,
+        character_state=context["character_state_text"],
+        short_summary=short_summary,
+        novel_number=novel_number,
+        chapter_title=chapter_info["chapter_title"],
+        chapter_role=chapter_info["chapter_role"],
+        chapter_purpose=chapter_info["chapter_purpose"],
+        suspense_level=chapter_info["suspense_level"],
+        foreshadowing=chapter_info["foreshadowing"],
+        plot_twist_level=chapter_info["plot_twist_level"],
+        chapter_summary=chapter_info["chapter_summary"],
+        word_number=word_number,
+        characters_involved=params["characters_involved"],
+        key_items=params["key_items"],
+        scene_location=params["scene_location"],
+        time_constraint=params["time_constraint"],
+        next_chapter_number=novel_number + 1,
+        next_chapter_title=next_chapter_info.get("chapter_title", "（未命名）"),
+        next_chapter_role=next_chapter_info.get("chapter_role", "过渡章节"),
+        next_chapter_purpose=next_chapter_info.get("chapter_purpose", "承上启下"),
+        next_chapter_suspense_level=next_chapter_info.get("suspense_level", "中等"),
+        next_chapter_foreshadowing=next_chapter_info.get("foreshadowing", "无特殊伏笔"),
+        next_chapter_plot_twist_level=next_chapter_info.get("plot_twist_level", "★☆☆☆☆"),
+        next_chapter_summary=next_chapter_info.get("chapter_summary", "衔接过渡内容"),
+        filtered_context=filtered_context
+    )
+
+@stage_deadline("prompt")
 def build_chapter_prompt(
     api_key: str,
     base_url: str,
@@ -305,64 +552,26 @@ def build_chapter_prompt(
     2. 新增内容重复检测机制
     3. 集成提示词应用规则
     """
-    # 读取基础文件
-    arch_file = os.path.join(filepath, "Novel_architecture.txt")
-    novel_architecture_text = read_file(arch_file)
-    directory_file = os.path.join(filepath, "Novel_directory.txt")
-    blueprint_text = read_file(directory_file)
-    global_summary_file = os.path.join(filepath, "global_summary.txt")
-    global_summary_text = read_file(global_summary_file)
-    character_state_file = os.path.join(filepath, "character_state.txt")
-    character_state_text = read_file(character_state_file)
-    
-    # 获取章节信息
-    chapter_info = get_chapter_info_from_blueprint(blueprint_text, novel_number)
-    chapter_title = chapter_info["chapter_title"]
-    chapter_role = chapter_info["chapter_role"]
-    chapter_purpose = chapter_info["chapter_purpose"]
-    suspense_level = chapter_info["suspense_level"]
-    foreshadowing = chapter_info["foreshadowing"]
-    plot_twist_level = chapter_info["plot_twist_level"]
-    chapter_summary = chapter_info["chapter_summary"]
-
-    # 获取下一章节信息
-    next_chapter_number = novel_number + 1
-    next_chapter_info = get_chapter_info_from_blueprint(blueprint_text, next_chapter_number)
-    next_chapter_title = next_chapter_info.get("chapter_title", "（未命名）")
-    next_chapter_role = next_chapter_info.get("chapter_role", "过渡章节")
-    next_chapter_purpose = next_chapter_info.get("chapter_purpose", "承上启下")
-    next_chapter_suspense = next_chapter_info.get("suspense_level", "中等")
-    next_chapter_foreshadow = next_chapter_info.get("foreshadowing", "无特殊伏笔")
-    next_chapter_twist = next_chapter_info.get("plot_twist_level", "★☆☆☆☆")
-    next_chapter_summary = next_chapter_info.get("chapter_summary", "衔接过渡内容")
-
-    # 创建章节目录
-    chapters_dir = os.path.join(filepath, "chapters")
-    os.makedirs(chapters_dir, exist_ok=True)
+    # 读取基础文件并获取章节信息
+    context = _load_chapter_prompt_context(filepath, novel_number)
+    # 摘要、检索关键词、知识过滤等中间步骤可命中 LLM 响应缓存（需开启 LLM_CACHE_ENABLED）
+    cache = get_llm_cache(filepath)
+    chapter_info = context["chapter_info"]
+    params = {
+        "user_guidance": user_guidance,
+        "characters_involved": characters_involved,
+        "key_items": key_items,
+        "scene_location": scene_location,
+        "time_constraint": time_constraint
+    }
 
     # 第一章特殊处理
     if novel_number == 1:
-        return first_chapter_draft_prompt.format(
-            novel_number=novel_number,
-            word_number=word_number,
-            chapter_title=chapter_title,
-            chapter_role=chapter_role,
-            chapter_purpose=chapter_purpose,
-            suspense_level=suspense_level,
-            foreshadowing=foreshadowing,
-            plot_twist_level=plot_twist_level,
-            chapter_summary=chapter_summary,
-            characters_involved=characters_involved,
-            key_items=key_items,
-            scene_location=scene_location,
-            time_constraint=time_constraint,
-            user_guidance=user_guidance,
-            novel_setting=novel_architecture_text
-        )
+        return _format_first_chapter_prompt(context, novel_number, word_number, params)
 
     # 获取前文内容和摘要
-    recent_texts = get_last_n_chapters_text(chapters_dir, novel_number, n=3)
-    
+    recent_texts = get_last_n_chapters_text(context["chapters_dir"], novel_number, n=3)
+
     try:
         logging.info("Attempting to generate summary")
         short_summary = summarize_recent_chapters(
@@ -375,20 +584,16 @@ def build_chapter_prompt(
             chapters_text_list=recent_texts,
             novel_number=novel_number,
             chapter_info=chapter_info,
-            next_chapter_info=next_chapter_info,
-            timeout=timeout
+            next_chapter_info=context["next_chapter_info"],
+            timeout=timeout,
+            cache=cache
         )
         logging.info("Summary generated successfully")
     except Exception as e:
         logging.error(f"Error in summarize_recent_chapters: {str(e)}")
         short_summary = "（摘要生成失败）"
 
-    # 获取前一章结尾
-    previous_excerpt = ""
-    for text in reversed(recent_texts):
-        if text.strip():
-            previous_excerpt = text[-800:] if len(text) > 800 else text
-            break
+    previous_excerpt = _get_previous_excerpt(recent_texts)
 
     # 知识库检索和处理
     try:
@@ -400,28 +605,15 @@ def build_chapter_prompt(
             api_key=api_key,
             temperature=0.3,
             max_tokens=max_tokens,
-            timeout=timeout
-        )
-        
-        search_prompt = knowledge_search_prompt.format(
-            chapter_number=novel_number,
-            chapter_title=chapter_title,
-            characters_involved=characters_involved,
-            key_items=key_items,
-            scene_location=scene_location,
-            chapter_role=chapter_role,
-            chapter_purpose=chapter_purpose,
-            foreshadowing=foreshadowing,
-            short_summary=short_summary,
-            user_guidance=user_guidance,
-            time_constraint=time_constraint
+            timeout=timeout,
+            role="summarize"
         )
-        
-        search_response = invoke_with_cleaning(llm_adapter, search_prompt)
+
+        search_prompt = _build_knowledge_search_prompt(novel_number, chapter_info, params, short_summary)
+        search_response = invoke_with_cleaning(llm_adapter, search_prompt, cache=cache)
         keyword_groups = parse_search_keywords(search_response)
 
         # 执行向量检索
-        all_contexts = []
         from embedding_adapters import create_embedding_adapter
         embedding_adapter = create_embedding_adapter(
             embedding_interface_format,
@@ -429,46 +621,14 @@ def build_chapter_prompt(
             embedding_url,
             embedding_model_name
         )
-        
-        store = load_vector_store(embedding_adapter, filepath)
-        if store:
-            collection_size = store._collection.count()
-            actual_k = min(embedding_retrieval_k, max(1, collection_size))
-            
-            for group in keyword_groups:
-                context = get_relevant_context_from_vector_store(
-                    embedding_adapter=embedding_adapter,
-                    query=group,
-                    filepath=filepath,
-                    k=actual_k
-                )
-                if context:
-                    if any(kw in group.lower() for kw in ["技法", "手法", "模板"]):
-                        all_contexts.append(f"[TECHNIQUE] {context}")
-                    elif any(kw in group.lower() for kw in ["设定", "技术", "世界观"]):
-                        all_contexts.append(f"[SETTING] {context}")
-                    else:
-                        all_contexts.append(f"[GENERAL] {context}")
+        all_contexts = _retrieve_keyword_contexts(
+            embedding_adapter, filepath, keyword_groups, embedding_retrieval_k, novel_number
+        )
 
         # 应用内容规则
         processed_contexts = apply_content_rules(all_contexts, novel_number)
-        
+
         # 执行知识过滤
-        chapter_info_for_filter = {
-            "chapter_number": novel_number,
-            "chapter_title": chapter_title,
-            "chapter_role": chapter_role,
-            "chapter_purpose": chapter_purpose,
-            "characters_involved": characters_involved,
-            "key_items": key_items,
-            "scene_location": scene_location,
-            "foreshadowing": foreshadowing,  # 修复拼写错误
-            "suspense_level": suspense_level,
-            "plot_twist_level": plot_twist_level,
-            "chapter_summary": chapter_summary,
-            "time_constraint": time_constraint
-        }
-        
         filtered_context = get_filtered_knowledge_context(
             api_key=api_key,
             base_url=base_url,
@@ -476,45 +636,145 @@ def build_chapter_prompt(
             interface_format=interface_format,
             embedding_adapter=embedding_adapter,
             filepath=filepath,
-            chapter_info=chapter_info_for_filter,
+            chapter_info=_build_filter_chapter_info(novel_number, chapter_info, params),
             retrieved_texts=processed_contexts,
             max_tokens=max_tokens,
-            timeout=timeout
+            timeout=timeout,
+            cache=cache
         )
-        
+
     except Exception as e:
         logging.error(f"知识处理流程异常：{str(e)}")
         filtered_context = "（知识库处理失败）"
 
+    if cache is not None:
+        logging.info(f"LLM cache stats: {cache.get_stats()}")
+
     # 返回最终提示词
-    return next_chapter_draft_prompt.format(
-        user_guidance=user_guidance if user_guidance else "无特殊指导",
-        global_summary=global_summary_text,
-        previous_chapter_excerpt=previous_excerpt,
-        character_state=character_state_text,
-        short_summary=short_summary,
-        novel_number=novel_number,
-        chapter_title=chapter_title,
-        chapter_role=chapter_role,
-        chapter_purpose=chapter_purpose,
-        suspense_level=suspense_level,
-        foreshadowing=foreshadowing,
-        plot_twist_level=plot_twist_level,
-        chapter_summary=chapter_summary,
-        word_number=word_number,
-        characters_involved=characters_involved,
-        key_items=key_items,
-        scene_location=scene_location,
-        time_constraint=time_constraint,
-        next_chapter_number=next_chapter_number,
-        next_chapter_title=next_chapter_title,
-        next_chapter_role=next_chapter_role,
-        next_chapter_purpose=next_chapter_purpose,
-        next_chapter_suspense_level=next_chapter_suspense,
-        next_chapter_foreshadowing=next_chapter_foreshadow,
-        next_chapter_plot_twist_level=next_chapter_twist,
-        next_chapter_summary=next_chapter_summary,
-        filtered_context=filtered_context
+    return _format_next_chapter_prompt(
+        context, novel_number, word_number, params,
+        short_summary, previous_excerpt, filtered_context
+    )
+
+@stage_deadline("prompt")
+async def build_chapter_prompt_async(
+    api_key: str,
+    base_url: str,
+    model_name: str,
+    filepath: str,
+    novel_number: int,
+    word_number: int,
+    temperature: float,
+    user_guidance: str,
+    characters_involved: str,
+    key_items: str,
+    scene_location: str,
+    time_constraint: str,
+    embedding_api_key: str,
+    embedding_url: str,
+    embedding_interface_format: str,
+    embedding_model_name: str,
+    embedding_retrieval_k: int = 2,
+    interface_format: str = "openai",
+    max_tokens: int = 2048,
+    timeout: int = 600
+) -> str:
+    """
+    build_chapter_prompt 的异步版本，流程与同步版本一致。
+    LLM 调用走适配器的 ainvoke；文件读取与向量库检索在默认线程池中执行，不阻塞事件循环。
+    """
+    context = await asyncio.to_thread(_load_chapter_prompt_context, filepath, novel_number)
+    cache = get_llm_cache(filepath)
+    chapter_info = context["chapter_info"]
+    params = {
+        "user_guidance": user_guidance,
+        "characters_involved": characters_involved,
+        "key_items": key_items,
+        "scene_location": scene_location,
+        "time_constraint": time_constraint
+    }
+
+    if novel_number == 1:
+        return _format_first_chapter_prompt(context, novel_number, word_number, params)
+
+    recent_texts = await asyncio.to_thread(get_last_n_chapters_text, context["chapters_dir"], novel_number, 3)
+
+    try:
+        logging.info("Attempting to generate summary")
+        short_summary = await summarize_recent_chapters_async(
+            interface_format=interface_format,
+            api_key=api_key,
+            base_url=base_url,
+            model_name=model_name,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            chapters_text_list=recent_texts,
+            novel_number=novel_number,
+            chapter_info=chapter_info,
+            next_chapter_info=context["next_chapter_info"],
+            timeout=timeout,
+            cache=cache
+        )
+        logging.info("Summary generated successfully")
+    except Exception as e:
+        logging.error(f"Error in summarize_recent_chapters: {str(e)}")
+        short_summary = "（摘要生成失败）"
+
+    previous_excerpt = _get_previous_excerpt(recent_texts)
+
+    try:
+        llm_adapter = create_llm_adapter(
+            interface_format=interface_format,
+            base_url=base_url,
+            model_name=model_name,
+            api_key=api_key,
+            temperature=0.3,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            role="summarize"
+        )
+
+        search_prompt = _build_knowledge_search_prompt(novel_number, chapter_info, params, short_summary)
+        search_response = await ainvoke_with_cleaning(llm_adapter, search_prompt, cache=cache)
+        keyword_groups = parse_search_keywords(search_response)
+
+        from embedding_adapters import create_embedding_adapter
+        embedding_adapter = create_embedding_adapter(
+            embedding_interface_format,
+            embedding_api_key,
+            embedding_url,
+            embedding_model_name
+        )
+        all_contexts = await asyncio.to_thread(
+            _retrieve_keyword_contexts, embedding_adapter, filepath, keyword_groups, embedding_retrieval_k, novel_number
+        )
+
+        processed_contexts = apply_content_rules(all_contexts, novel_number)
+
+        filtered_context = await get_filtered_knowledge_context_async(
+            api_key=api_key,
+            base_url=base_url,
+            model_name=model_name,
+            interface_format=interface_format,
+            embedding_adapter=embedding_adapter,
+            filepath=filepath,
+            chapter_info=_build_filter_chapter_info(novel_number, chapter_info, params),
+            retrieved_texts=processed_contexts,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            cache=cache
+        )
+
+    except Exception as e:
+        logging.error(f"知识处理流程异常：{str(e)}")
+        filtered_context = "（知识库处理失败）"
+
+    if cache is not None:
+        logging.info(f"LLM cache stats: {cache.get_stats()}")
+
+    return _format_next_chapter_prompt(
+        context, novel_number, word_number, params,
+        short_summary, previous_excerpt, filtered_context
     )
 
 def generate_chapter_draft(
@@ -538,10 +798,14 @@ def generate_chapter_draft(
     interface_format: str = "openai",
     max_tokens: int = 2048,
     timeout: int = 600,
-    custom_prompt_text: str = None
+    custom_prompt_text: str = None,
+    on_chunk=None,
+    stop_event=None
 ) -> str:
     """
-    生成章节草稿，支持自定义提示词
+    生成章节草稿，支持自定义提示词。
+    传入 on_chunk 时以流式方式生成，每收到一个文本片段即回调 on_chunk(piece)；
+    stop_event 被置位时中止生成，已生成的部分作为返回值但不写入章节文件。
     """
     if custom_prompt_text is None:
         prompt_text = build_chapter_prompt(
@@ -569,9 +833,6 @@ def generate_chapter_draft(
     else:
         prompt_text = custom_prompt_text
 
-    chapters_dir = os.path.join(filepath, "chapters")
-    os.makedirs(chapters_dir, exist_ok=True)
-
     llm_adapter = create_llm_adapter(
         interface_format=interface_format,
         base_url=base_url,
@@ -579,10 +840,31 @@ def generate_chapter_draft(
         api_key=api_key,
         temperature=temperature,
         max_tokens=max_tokens,
-        timeout=timeout
+        timeout=timeout,
+        role="draft"
     )
+    return _write_chapter_draft(llm_adapter, prompt_text, filepath, novel_number, on_chunk, stop_event)
+
+@stage_deadline("draft")
+def _write_chapter_draft(llm_adapter, prompt_text: str, filepath: str, novel_number: int,
+                         on_chunk=None, stop_event=None) -> str:
+    """
+    调用 LLM 生成草稿并写入章节文件。"draft" 阶段截止时间只覆盖这一步，
+    提示词构建（含摘要与检索）由 build_chapter_prompt 的 "prompt" 阶段单独计时。
+    """
+    chapters_dir = os.path.join(filepath, "chapters")
+    os.makedirs(chapters_dir, exist_ok=True)
 
-    chapter_content = invoke_with_cleaning(llm_adapter, prompt_text)
+    # 正文草稿每次都需要重新生成，不使用 LLM 响应缓存
+    if on_chunk is not None or stop_event is not None:
+        chapter_content = invoke_stream_with_cleaning(
+            llm_adapter, prompt_text, on_chunk=on_chunk, stop_event=stop_event
+        )
+        if stop_event is not None and stop_event.is_set():
+            logging.info(f"[Draft] Chapter {novel_number} draft aborted after {len(chapter_content)} chars, not saved.")
+            return chapter_content
+    else:
+        chapter_content = invoke_with_cleaning(llm_adapter, prompt_text)
     if not chapter_content.strip():
         logging.warning("Generated chapter draft is empty.")
     chapter_file = os.path.join(chapters_dir, f"chapter_{novel_number}.txt")
@@ -3,12 +3,17 @@
 """
 通用重试、清洗、日志工具
 """
+import asyncio
 import logging
 import re
 import time
 import traceback
 import os
 
+from novel_generator.llm_cache import LLMResponseCache
+from llm_adapters import _is_error_result
+from retry_policy import RetryPolicy
+
 # 检查是否启用详细日志模式
 SHOW_DETAILED_LOGS = os.environ.get('SHOW_DETAILED_LOGS', 'false').lower() == 'true'
 
@@ -22,27 +27,25 @@ logging.basicConfig(
 )
 
 
-def call_with_retry(func, max_retries=3, sleep_time=2, fallback_return=None, **kwargs):
+def call_with_retry(func, max_retries=3, sleep_time=2, fallback_return=None, retry_layer="call_with_retry", **kwargs):
     """
     通用的重试机制封装。
     :param func: 要执行的函数
     :param max_retries: 最大重试次数
     :param sleep_time: 重试前的等待秒数
     :param fallback_return: 如果多次重试仍失败时的返回值
+    :param retry_layer: 重试统计中使用的层名称
     :param kwargs: 传给func的命名参数
     :return: func的结果，若失败则返回 fallback_return
+    不可重试的错误立即放弃；重试等待不会超过当前阶段的剩余时间。
     """
-    for attempt in range(1, max_retries + 1):
-        try:
-            return func(**kwargs)
-        except Exception as e:
-            logging.warning(f"[call_with_retry] Attempt {attempt} failed with error: {e}")
-            traceback.print_exc()
-            if attempt < max_retries:
-                time.sleep(sleep_time)
-            else:
-                logging.error("Max retries reached, returning fallback_return.")
-                return fallback_return
+    policy = RetryPolicy(retry_layer, max_attempts=max_retries, base_delay=sleep_time, backoff=1.0)
+    try:
+        return policy.call(func, **kwargs)
+    except Exception as e:
+        logging.error(f"[{retry_layer}] 重试结束仍失败，返回 fallback_return: {e}")
+        traceback.print_exc()
+        return fallback_return
 
 def remove_think_tags(text: str) -> str:
     """移除 <think>...</think> 包裹的内容"""
@@ -56,8 +59,30 @@ def debug_log(prompt: str, response_content: str):
         f"\n[######################################### Response #########################################]\n{response_content}\n"
     )
 
-def invoke_with_cleaning(llm_adapter, prompt: str, max_retries: int = 3) -> str:
-    """调用 LLM 并清理返回结果"""
+def _cache_key_for(llm_adapter, prompt: str) -> str:
+    # create_llm_adapter 返回的包装上保存着配置的模型、温度与地址，内部适配器不一定设置这些属性
+    return LLMResponseCache.make_key(
+        getattr(llm_adapter, "model_name", ""),
+        getattr(llm_adapter, "temperature", None),
+        prompt,
+        getattr(llm_adapter, "base_url", "")
+    )
+
+
+def invoke_with_cleaning(llm_adapter, prompt: str, max_retries: int = 3, cache=None) -> str:
+    """
+    调用 LLM 并清理返回结果
+    :param cache: 可选的 LLMResponseCache；命中时直接返回缓存结果，不调用模型。
+                  章节正文草稿等需要每次重新生成的调用不应传入。
+    不可重试的错误（认证失败、熔断中等）立即抛出；重试不会超过当前阶段的截止时间。
+    """
+    cache_key = _cache_key_for(llm_adapter, prompt) if cache is not None else None
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached:
+            print("LLM 缓存命中，跳过调用...")
+            return cached
+
     # 根据环境变量决定是否显示详细日志
     if SHOW_DETAILED_LOGS:
         print("\n" + "="*50)
@@ -68,10 +93,13 @@ def invoke_with_cleaning(llm_adapter, prompt: str, max_retries: int = 3) -> str:
     else:
         print("发送到 LLM 的提示词...")
     
+    policy = RetryPolicy("llm_invoke", max_attempts=max_retries, base_delay=0)
     result = ""
-    retry_count = 0
-    
-    while retry_count < max_retries:
+    attempt = 0
+
+    while True:
+        attempt += 1
+        policy.begin_attempt(attempt)
         try:
             result = llm_adapter.invoke(prompt)
             # 根据环境变量决定是否显示详细日志
@@ -88,16 +116,140 @@ def invoke_with_cleaning(llm_adapter, prompt: str, max_retries: int = 3) -> str:
             result = result.replace("```", "").strip()
             # 如果结果不为空，直接返回
             if result:
+                policy.record_success()
+                # 适配器以 "[网络错误]…" 等字符串代替异常返回失败，这类结果不能写入缓存
+                if cache_key is not None and not _is_error_result(result):
+                    cache.set(cache_key, result, getattr(llm_adapter, "model_name", ""))
                 return result
             # 如果结果为空，记录并继续重试
-            print(f"收到空响应 ({retry_count + 1}/{max_retries})")
-            retry_count += 1
+            print(f"收到空响应 ({attempt}/{max_retries})")
+            delay = policy.next_delay(attempt)
+            if delay is None:
+                # 重试次数或阶段时间用完，返回空字符串而不是继续循环
+                return result
         except Exception as e:
-            print(f"调用失败 ({retry_count + 1}/{max_retries}): {str(e)}")
-            retry_count += 1
-            if retry_count >= max_retries:
-                raise e
-    
-    # 如果所有重试都失败，返回空字符串而不是继续循环
-    return result
+            print(f"调用失败 ({attempt}/{max_retries}): {str(e)}")
+            delay = policy.next_delay(attempt, e)
+            if delay is None:
+                raise
+        if delay > 0:
+            time.sleep(delay)
+
+
+async def ainvoke_with_cleaning(llm_adapter, prompt: str, max_retries: int = 3, cache=None) -> str:
+    """invoke_with_cleaning 的异步版本；适配器没有 ainvoke 时在线程池中执行同步 invoke"""
+    cache_key = _cache_key_for(llm_adapter, prompt) if cache is not None else None
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached:
+            print("LLM 缓存命中，跳过调用...")
+            return cached
+
+    if SHOW_DETAILED_LOGS:
+        print("\n" + "="*50)
+        print("发送到 LLM 的提示词:")
+        print("-"*50)
+        print(prompt)
+        print("="*50 + "\n")
+    else:
+        print("发送到 LLM 的提示词...")
+
+    policy = RetryPolicy("llm_invoke", max_attempts=max_retries, base_delay=0)
+    result = ""
+    attempt = 0
+
+    while True:
+        attempt += 1
+        policy.begin_attempt(attempt)
+        try:
+            if hasattr(llm_adapter, "ainvoke"):
+                result = await llm_adapter.ainvoke(prompt)
+            else:
+                result = await asyncio.to_thread(llm_adapter.invoke, prompt)
+            if SHOW_DETAILED_LOGS:
+                print("\n" + "="*50)
+                print("LLM 返回的内容:")
+                print("-"*50)
+                print(result)
+                print("="*50 + "\n")
+            else:
+                print("LLM 返回的内容...")
+
+            result = (result or "").replace("```", "").strip()
+            if result:
+                policy.record_success()
+                # 适配器以 "[网络错误]…" 等字符串代替异常返回失败，这类结果不能写入缓存
+                if cache_key is not None and not _is_error_result(result):
+                    cache.set(cache_key, result, getattr(llm_adapter, "model_name", ""))
+                return result
+            print(f"收到空响应 ({attempt}/{max_retries})")
+            delay = policy.next_delay(attempt)
+            if delay is None:
+                return result
+        except Exception as e:
+            print(f"调用失败 ({attempt}/{max_retries}): {str(e)}")
+            delay = policy.next_delay(attempt, e)
+            if delay is None:
+                raise
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def invoke_stream_with_cleaning(llm_adapter, prompt: str, on_chunk=None, stop_event=None, max_retries: int = 3) -> str:
+    """
+    流式调用 LLM：每收到一个文本片段即回调 on_chunk(piece)，结束后返回清理后的完整结果。
+    stop_event 被置位时立即停止接收（关闭底层连接，不再为剩余 token 付费），返回已生成的部分。
+    尚未收到任何片段时的失败或空响应按 invoke_with_cleaning 的方式重试。
+    """
+    if SHOW_DETAILED_LOGS:
+        print("\n" + "="*50)
+        print("发送到 LLM 的提示词（流式）:")
+        print("-"*50)
+        print(prompt)
+        print("="*50 + "\n")
+    else:
+        print("发送到 LLM 的提示词（流式）...")
+
+    stream_fn = getattr(llm_adapter, "invoke_stream", None)
+    policy = RetryPolicy("llm_invoke", max_attempts=max_retries, base_delay=0)
+    result = ""
+    attempt = 0
+
+    while True:
+        attempt += 1
+        policy.begin_attempt(attempt)
+        parts = []
+        stream = stream_fn(prompt) if stream_fn else iter([llm_adapter.invoke(prompt)])
+        try:
+            for piece in stream:
+                parts.append(piece)
+                if on_chunk:
+                    on_chunk(piece)
+                if stop_event is not None and stop_event.is_set():
+                    print("流式生成已被中止")
+                    break
+        except Exception as e:
+            if parts:
+                raise
+            print(f"调用失败 ({attempt}/{max_retries}): {str(e)}")
+            delay = policy.next_delay(attempt, e)
+            if delay is None:
+                raise
+            if delay > 0:
+                time.sleep(delay)
+            continue
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
 
+        result = "".join(parts).replace("```", "").strip()
+        if result or (stop_event is not None and stop_event.is_set()):
+            policy.record_success()
+            return result
+        print(f"收到空响应 ({attempt}/{max_retries})")
+        delay = policy.next_delay(attempt)
+        if delay is None:
+            return result
+        if delay > 0:
+            time.sleep(delay)
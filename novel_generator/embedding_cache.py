@@ -0,0 +1,165 @@
+# novel_generator/embedding_cache.py
+# -*- coding: utf-8 -*-
+"""
+Embedding 向量持久化缓存
+- 键为 (embedding 接口格式, 模型名, sha1(文本))，向量以 float32 存放在项目目录下的 .cache/embedding_cache.sqlite
+- 条目数上限 + 最近最少使用淘汰
+- 缓存目录不在 vectorstore 中，清空向量库后重建可直接使用已缓存的向量
+- 通过环境变量 EMBEDDING_CACHE_ENABLED=false 关闭，默认开启（同一模型对同一文本的向量是确定的）
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 50000
+# SQLite 单条语句的参数个数有限，批量查询按此大小分组
+_QUERY_CHUNK = 500
+
+
+def embedding_cache_enabled() -> bool:
+    """是否开启 Embedding 缓存（环境变量 EMBEDDING_CACHE_ENABLED）"""
+    return os.environ.get('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """基于 SQLite 的 Embedding 向量缓存，线程安全"""
+
+    def __init__(self, db_path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "interface_format TEXT, model TEXT, text_hash TEXT, dim INTEGER, vector BLOB, last_access REAL, "
+            "PRIMARY KEY (interface_format, model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_access ON embedding_cache(last_access)")
+        self._conn.commit()
+
+    def get_many(self, interface_format: str, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """按顺序返回每条文本的缓存向量，未命中的位置为 None"""
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), _QUERY_CHUNK):
+                chunk = unique[i:i + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache "
+                    f"WHERE interface_format = ? AND model = ? AND text_hash IN ({placeholders})",
+                    (interface_format, model, *chunk)
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_access = ? "
+                    "WHERE interface_format = ? AND model = ? AND text_hash = ?",
+                    [(now, interface_format, model, h) for h in found]
+                )
+                self._conn.commit()
+            result = [found.get(h) for h in hashes]
+            hits = sum(1 for v in result if v is not None)
+            self._hits += hits
+            self._misses += len(result) - hits
+        return result
+
+    def get(self, interface_format: str, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(interface_format, model, [text])[0]
+
+    def set_many(self, interface_format: str, model: str, items: List[Tuple[str, List[float]]]):
+        """写入 (文本, 向量)；空向量不缓存"""
+        now = time.time()
+        rows = []
+        for text, vector in items:
+            if not vector:
+                continue
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((interface_format, model, text_hash(text), int(array.shape[0]), array.tobytes(), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache "
+                "(interface_format, model, text_hash, dim, vector, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def set(self, interface_format: str, model: str, text: str, vector: List[float]):
+        self.set_many(interface_format, model, [(text, vector)])
+
+    def _evict_locked(self):
+        """超过条目上限时淘汰最久未访问的条目（调用方需持有锁）"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE rowid IN "
+                "(SELECT rowid FROM embedding_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+            total = self._hits + self._misses
+            return {
+                'size': size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / total if total else 0.0
+            }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(filepath: str) -> Optional[EmbeddingCache]:
+    """
+    获取项目目录对应的 Embedding 缓存；关闭缓存或未指定目录时返回 None。
+    """
+    if not filepath or not embedding_cache_enabled():
+        return None
+    db_path = os.path.abspath(os.path.join(filepath, ".cache", "embedding_cache.sqlite"))
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            try:
+                cache = EmbeddingCache(db_path)
+            except Exception as e:
+                logging.warning(f"Embedding缓存初始化失败，已跳过缓存: {e}")
+                return None
+            _caches[db_path] = cache
+        return cache
@@ -4,12 +4,18 @@
 定稿章节和扩写章节（finalize_chapter、enrich_chapter_text）
 """
 import os
+import time
+import asyncio
 import logging
-from llm_adapters import create_llm_adapter
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, Awaitable
+from llm_adapters import create_llm_adapter, _is_error_result
+from retry_policy import stage_deadline
 from embedding_adapters import create_embedding_adapter
 from prompt_definitions import summary_prompt, update_character_state_prompt
-from novel_generator.common import invoke_with_cleaning
-from utils import read_file, clear_file_content, save_string_to_txt
+from novel_generator.common import invoke_with_cleaning, ainvoke_with_cleaning
+from utils import read_file, save_string_to_txt
 from novel_generator.vectorstore_utils import update_vector_store
 logging.basicConfig(
     filename='app.log',      # 日志文件名
@@ -18,32 +24,45 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
-def finalize_chapter(
+# 定稿的三个子步骤互不依赖：各自只读取章节正文和自己的旧文件
+FINALIZE_STEPS = ("summary", "character_state", "vector_store")
+
+def _timed_call(func: Callable[[], Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        return {"result": func(), "error": None, "seconds": time.perf_counter() - start}
+    except Exception as e:
+        return {"result": None, "error": e, "seconds": time.perf_counter() - start}
+
+async def _atimed_call(coro: Awaitable) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        return {"result": await coro, "error": None, "seconds": time.perf_counter() - start}
+    except Exception as e:
+        return {"result": None, "error": e, "seconds": time.perf_counter() - start}
+
+def _prepare_finalize(
     novel_number: int,
-    word_number: int,
+    filepath: str,
     api_key: str,
     base_url: str,
     model_name: str,
     temperature: float,
-    filepath: str,
     embedding_api_key: str,
     embedding_url: str,
     embedding_interface_format: str,
     embedding_model_name: str,
     interface_format: str,
     max_tokens: int,
-    timeout: int = 600
-):
-    """
-    对指定章节做最终处理：更新前文摘要、更新角色状态、插入向量库等。
-    默认无需再做扩写操作，若有需要可在外部调用 enrich_chapter_text 处理后再定稿。
-    """
+    timeout: int
+) -> Optional[Dict[str, Any]]:
+    """读取章节与旧文件，构造两个提示词和适配器；章节为空时返回 None"""
     chapters_dir = os.path.join(filepath, "chapters")
     chapter_file = os.path.join(chapters_dir, f"chapter_{novel_number}.txt")
     chapter_text = read_file(chapter_file).strip()
     if not chapter_text:
         logging.warning(f"Chapter {novel_number} is empty, cannot finalize.")
-        return
+        return None
 
     global_summary_file = os.path.join(filepath, "global_summary.txt")
     old_global_summary = read_file(global_summary_file)
@@ -57,43 +76,160 @@ def finalize_chapter(
         api_key=api_key,
         temperature=temperature,
         max_tokens=max_tokens,
-        timeout=timeout
+        timeout=timeout,
+        role="finalize"
     )
-
-    prompt_summary = summary_prompt.format(
-        chapter_text=chapter_text,
-        global_summary=old_global_summary
+    embedding_adapter = create_embedding_adapter(
+        embedding_interface_format,
+        embedding_api_key,
+        embedding_url,
+        embedding_model_name
     )
-    new_global_summary = invoke_with_cleaning(llm_adapter, prompt_summary)
-    if not new_global_summary.strip():
-        new_global_summary = old_global_summary
+    return {
+        "chapter_text": chapter_text,
+        "llm_adapter": llm_adapter,
+        "embedding_adapter": embedding_adapter,
+        "files": {
+            "summary": (global_summary_file, old_global_summary),
+            "character_state": (character_state_file, old_character_state),
+        },
+        "prompts": {
+            "summary": summary_prompt.format(
+                chapter_text=chapter_text,
+                global_summary=old_global_summary
+            ),
+            "character_state": update_character_state_prompt.format(
+                chapter_text=chapter_text,
+                old_state=old_character_state
+            ),
+        },
+    }
+
+def _apply_finalize_outcomes(novel_number: int, context: Dict[str, Any], outcomes: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    """
+    写回成功的子步骤结果（原子替换，失败或空结果时保留旧文件），记录各子步骤耗时。
+    适配器以 "[API错误]…" 等字符串返回的失败与异常同样处理；
+    任一子步骤失败时，在写完其余结果后重新抛出第一个异常。
+    """
+    for name, (path, old_content) in context["files"].items():
+        outcome = outcomes[name]
+        new_content = outcome["result"]
+        if outcome["error"] is None and (new_content or "").strip() and _is_error_result(new_content.strip()):
+            outcome["error"] = RuntimeError(new_content.strip()[:200])
+        if outcome["error"] is None and new_content and new_content.strip() and new_content != old_content:
+            save_string_to_txt(new_content, path)
+        elif outcome["error"] is None and not (new_content or "").strip():
+            logging.warning(f"Chapter {novel_number} finalize step '{name}' returned empty result, keeping old file.")
 
-    prompt_char_state = update_character_state_prompt.format(
-        chapter_text=chapter_text,
-        old_state=old_character_state
+    timings = {name: round(outcomes[name]["seconds"], 4) for name in FINALIZE_STEPS}
+    logging.info(
+        f"Chapter {novel_number} finalize steps: "
+        + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items())
     )
-    new_char_state = invoke_with_cleaning(llm_adapter, prompt_char_state)
-    if not new_char_state.strip():
-        new_char_state = old_character_state
+    errors = [(name, outcomes[name]["error"]) for name in FINALIZE_STEPS if outcomes[name]["error"] is not None]
+    for name, error in errors:
+        logging.error(f"Chapter {novel_number} finalize step '{name}' failed: {error}")
+    if errors:
+        raise errors[0][1]
+    logging.info(f"Chapter {novel_number} has been finalized.")
+    return timings
 
-    clear_file_content(global_summary_file)
-    save_string_to_txt(new_global_summary, global_summary_file)
-    clear_file_content(character_state_file)
-    save_string_to_txt(new_char_state, character_state_file)
+@stage_deadline("finalize")
+def finalize_chapter(
+    novel_number: int,
+    word_number: int,
+    api_key: str,
+    base_url: str,
+    model_name: str,
+    temperature: float,
+    filepath: str,
+    embedding_api_key: str,
+    embedding_url: str,
+    embedding_interface_format: str,
+    embedding_model_name: str,
+    interface_format: str,
+    max_tokens: int,
+    timeout: int = 600
+) -> Optional[Dict[str, float]]:
+    """
+    对指定章节做最终处理：更新前文摘要、更新角色状态、插入向量库等。
+    三个子步骤互不依赖，在线程中并发执行（LLM 调用仍受共享限流器约束），总耗时约为最慢的一步；
+    返回各子步骤耗时（秒）。
+    默认无需再做扩写操作，若有需要可在外部调用 enrich_chapter_text 处理后再定稿。
+    """
+    context = _prepare_finalize(
+        novel_number, filepath, api_key, base_url, model_name, temperature,
+        embedding_api_key, embedding_url, embedding_interface_format, embedding_model_name,
+        interface_format, max_tokens, timeout
+    )
+    if context is None:
+        return None
 
-    update_vector_store(
-        embedding_adapter=create_embedding_adapter(
-            embedding_interface_format,
-            embedding_api_key,
-            embedding_url,
-            embedding_model_name
+    llm_adapter = context["llm_adapter"]
+    steps = {
+        "summary": lambda: invoke_with_cleaning(llm_adapter, context["prompts"]["summary"]),
+        "character_state": lambda: invoke_with_cleaning(llm_adapter, context["prompts"]["character_state"]),
+        "vector_store": lambda: update_vector_store(
+            embedding_adapter=context["embedding_adapter"],
+            new_chapter=context["chapter_text"],
+            filepath=filepath,
+            chapter_number=novel_number
         ),
-        new_chapter=chapter_text,
-        filepath=filepath
+    }
+    # 每个子步骤在当前上下文的副本中运行，阶段截止时间与遥测阶段随之传递
+    with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="finalize") as executor:
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, _timed_call, func)
+            for name, func in steps.items()
+        }
+        outcomes = {name: future.result() for name, future in futures.items()}
+    return _apply_finalize_outcomes(novel_number, context, outcomes)
+
+@stage_deadline("finalize")
+async def finalize_chapter_async(
+    novel_number: int,
+    word_number: int,
+    api_key: str,
+    base_url: str,
+    model_name: str,
+    temperature: float,
+    filepath: str,
+    embedding_api_key: str,
+    embedding_url: str,
+    embedding_interface_format: str,
+    embedding_model_name: str,
+    interface_format: str,
+    max_tokens: int,
+    timeout: int = 600
+) -> Optional[Dict[str, float]]:
+    """
+    finalize_chapter 的异步版本。
+    两次 LLM 调用与向量库更新（在默认线程池中执行）并发进行，返回各子步骤耗时（秒）。
+    """
+    context = _prepare_finalize(
+        novel_number, filepath, api_key, base_url, model_name, temperature,
+        embedding_api_key, embedding_url, embedding_interface_format, embedding_model_name,
+        interface_format, max_tokens, timeout
     )
+    if context is None:
+        return None
 
-    logging.info(f"Chapter {novel_number} has been finalized.")
+    llm_adapter = context["llm_adapter"]
+    results = await asyncio.gather(
+        _atimed_call(ainvoke_with_cleaning(llm_adapter, context["prompts"]["summary"])),
+        _atimed_call(ainvoke_with_cleaning(llm_adapter, context["prompts"]["character_state"])),
+        _atimed_call(asyncio.to_thread(
+            update_vector_store,
+            embedding_adapter=context["embedding_adapter"],
+            new_chapter=context["chapter_text"],
+            filepath=filepath,
+            chapter_number=novel_number
+        )),
+    )
+    outcomes = dict(zip(FINALIZE_STEPS, results))
+    return _apply_finalize_outcomes(novel_number, context, outcomes)
 
+@stage_deadline("enrich")
 def enrich_chapter_text(
     chapter_text: str,
     word_number: int,
@@ -115,7 +251,8 @@ def enrich_chapter_text(
         api_key=api_key,
         temperature=temperature,
         max_tokens=max_tokens,
-        timeout=timeout
+        timeout=timeout,
+        role="finalize"
     )
     prompt = f"""以下章节文本较短，请在保持剧情连贯的前提下进行扩写，使其更充实，接近 {word_number} 字左右，仅给出最终文本，不要解释任何内容。：
 原内容：
@@ -7,10 +7,12 @@ import os
 import logging
 import re
 import traceback
-import nltk
 import warnings
 from utils import read_file
-from novel_generator.vectorstore_utils import load_vector_store, init_vector_store
+from novel_generator.vectorstore_utils import (
+    load_vector_store, init_vector_store, build_segment_metadata, SOURCE_KNOWLEDGE
+)
+from novel_generator.text_splitter import split_text_segments
 from langchain.docstore.document import Document
 
 # 禁用特定的Torch警告
@@ -23,54 +25,9 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
-def advanced_split_content(content: str, similarity_threshold: float = 0.7, max_length: int = 500) -> list:
-    """使用基本分段策略"""
-    # 确保下载了NLTK所需的数据包
-    try:
-        nltk.data.find('tokenizers/punkt_tab')
-    except LookupError:
-        print("正在下载NLTK punkt_tab数据包...")
-        try:
-            nltk.download('punkt_tab', quiet=True)
-        except Exception as e:
-            print(f"下载punkt_tab数据包失败: {e}")
-            # 如果下载失败，尝试使用默认的punkt tokenizer
-            pass
-    
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        print("正在下载NLTK punkt数据包...")
-        try:
-            nltk.download('punkt', quiet=True)
-        except Exception as e:
-            print(f"下载punkt数据包失败: {e}")
-            # 如果下载失败，抛出异常
-            raise e
-    
-    sentences = nltk.sent_tokenize(content)
-    if not sentences:
-        return []
-
-    final_segments = []
-    current_segment = []
-    current_length = 0
-    
-    for sentence in sentences:
-        sentence_length = len(sentence)
-        if current_length + sentence_length > max_length:
-            if current_segment:
-                final_segments.append(" ".join(current_segment))
-            current_segment = [sentence]
-            current_length = sentence_length
-        else:
-            current_segment.append(sentence)
-            current_length += sentence_length
-    
-    if current_segment:
-        final_segments.append(" ".join(current_segment))
-    
-    return final_segments
+def advanced_split_content(content: str, similarity_threshold: float = 0.7, max_length: int = 500, overlap: int = 0) -> list:
+    """使用基本分段策略：按中文句子边界切分后装入不超过 max_length 的片段"""
+    return split_text_segments(content, max_length=max_length, overlap=overlap)
 
 def import_knowledge_file(
     embedding_api_key: str,
@@ -89,6 +46,7 @@ def import_knowledge_file(
         logging.warning("知识库文件内容为空。")
         return
     paragraphs = advanced_split_content(content)
+    metadatas = build_segment_metadata(paragraphs, SOURCE_KNOWLEDGE)
     from embedding_adapters import create_embedding_adapter
     embedding_adapter = create_embedding_adapter(
         embedding_interface_format,
@@ -99,14 +57,14 @@ def import_knowledge_file(
     store = load_vector_store(embedding_adapter, filepath)
     if not store:
         logging.info("Vector store does not exist or load failed. Initializing a new one for knowledge import...")
-        store = init_vector_store(embedding_adapter, paragraphs, filepath)
+        store = init_vector_store(embedding_adapter, paragraphs, filepath, metadatas)
         if store:
             logging.info("知识库文件已成功导入至向量库(新初始化)。")
         else:
             logging.warning("知识库导入失败，跳过。")
     else:
         try:
-            docs = [Document(page_content=str(p)) for p in paragraphs]
+            docs = [Document(page_content=str(p), metadata=m) for p, m in zip(paragraphs, metadatas)]
             store.add_documents(docs)
             logging.info("知识库文件已成功导入至向量库(追加模式)。")
         except Exception as e:
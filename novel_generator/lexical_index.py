@@ -0,0 +1,169 @@
+# novel_generator/lexical_index.py
+# -*- coding: utf-8 -*-
+"""
+中文字符二元组倒排索引与 BM25 检索
+- 分词：连续汉字切成相邻二字组（单个汉字保留为一元），英文/数字按整词小写；人名、地名、物品名可精确命中
+- 索引持久化在向量库目录下的 lexical_index.sqlite，随向量库的每次写入增量更新，
+  与向量检索相互独立，Embedding 接口变慢或不可用时仍能在毫秒级返回结果
+- 通过环境变量 HYBRID_RETRIEVAL_ENABLED=false 关闭混合检索，默认开启
+"""
+import os
+import re
+import json
+import math
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from typing import Optional, Dict, Any, List, Iterable
+
+LEXICAL_INDEX_FILE = "lexical_index.sqlite"
+BM25_K1 = 1.5
+BM25_B = 0.75
+# SQLite 单条语句的参数个数有限，批量查询按此大小分组
+_QUERY_CHUNK = 500
+
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+
+def hybrid_retrieval_enabled() -> bool:
+    """是否在向量检索之外融合 BM25 检索（环境变量 HYBRID_RETRIEVAL_ENABLED）"""
+    return os.environ.get('HYBRID_RETRIEVAL_ENABLED', 'true').lower() == 'true'
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切成检索词：汉字二元组 + 英文/数字整词"""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(str(text).lower()):
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class LexicalIndex:
+    """基于 SQLite 的倒排索引，线程安全；片段的长度与元数据常驻内存用于打分与过滤"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER, content TEXT, metadata TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT, doc_id TEXT, tf INTEGER, "
+            "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+        self._conn.commit()
+        self._lengths: Dict[str, int] = {}
+        self._metadatas: Dict[str, Dict[str, Any]] = {}
+        for doc_id, length, metadata in self._conn.execute("SELECT doc_id, length, metadata FROM docs"):
+            self._lengths[doc_id] = length
+            self._metadatas[doc_id] = json.loads(metadata) if metadata else {}
+        self._total_length = sum(self._lengths.values())
+
+    def _delete_locked(self, ids: List[str]):
+        for i in range(0, len(ids), _QUERY_CHUNK):
+            chunk = ids[i:i + _QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", chunk)
+            self._conn.execute(f"DELETE FROM docs WHERE doc_id IN ({placeholders})", chunk)
+        for doc_id in ids:
+            self._total_length -= self._lengths.pop(doc_id, 0)
+            self._metadatas.pop(doc_id, None)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        """写入片段；已存在的 id 会被覆盖"""
+        metadatas = metadatas or [{} for _ in ids]
+        doc_rows = []
+        posting_rows = []
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            doc_rows.append((doc_id, length, text, json.dumps(metadata or {}, ensure_ascii=False)))
+            posting_rows.extend((term, doc_id, tf) for term, tf in counts.items())
+        with self._lock:
+            self._delete_locked(list(ids))
+            self._conn.executemany("INSERT INTO docs (doc_id, length, content, metadata) VALUES (?, ?, ?, ?)", doc_rows)
+            self._conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", posting_rows)
+            self._conn.commit()
+            for doc_id, length, _, _ in doc_rows:
+                self._lengths[doc_id] = length
+                self._total_length += length
+            for doc_id, metadata in zip(ids, metadatas):
+                self._metadatas[doc_id] = dict(metadata or {})
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            self._delete_locked(list(ids))
+            self._conn.commit()
+
+    def rebuild(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        """清空后按给定片段重建（用于补建旧向量库的索引）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+            self._lengths.clear()
+            self._metadatas.clear()
+            self._total_length = 0
+        self.add(ids, texts, metadatas)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._lengths)
+
+    def search(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """BM25 检索，返回至多 k 条 {"id", "content", "metadata", "score"}，按 score 从高到低"""
+        from .vector_backends import match_where
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        with self._lock:
+            total = len(self._lengths)
+            if not total:
+                return []
+            average_length = self._total_length / total or 1.0
+            postings: Dict[str, List[tuple]] = {}
+            for i in range(0, len(terms), _QUERY_CHUNK):
+                chunk = terms[i:i + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for term, doc_id, tf in self._conn.execute(
+                    f"SELECT term, doc_id, tf FROM postings WHERE term IN ({placeholders})", chunk
+                ):
+                    postings.setdefault(term, []).append((doc_id, tf))
+
+            scores: Dict[str, float] = {}
+            for term, entries in postings.items():
+                df = len(entries)
+                idf = math.log(1.0 + (total - df + 0.5) / (df + 0.5))
+                for doc_id, tf in entries:
+                    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+            if where:
+                scores = {d: s for d, s in scores.items() if match_where(self._metadatas.get(d), where)}
+            top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            contents = dict(self._conn.execute(
+                f"SELECT doc_id, content FROM docs WHERE doc_id IN ({placeholders})", [d for d, _ in top]
+            ).fetchall())
+        return [
+            {"id": doc_id, "content": contents.get(doc_id, ""),
+             "metadata": dict(self._metadatas.get(doc_id) or {}), "score": score}
+            for doc_id, score in top
+        ]
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                logging.debug(f"Close lexical index failed: {e}")
@@ -0,0 +1,139 @@
+# novel_generator/llm_cache.py
+# -*- coding: utf-8 -*-
+"""
+LLM 响应持久化缓存（按内容寻址）
+- 键为 sha256(model, temperature, prompt)，存放在项目目录下的 .cache/llm_cache.sqlite
+- 条目数上限 + 最近最少使用淘汰，超过 TTL 的条目视为未命中
+- 通过环境变量 LLM_CACHE_ENABLED=true 开启，默认关闭
+"""
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def llm_cache_enabled() -> bool:
+    """是否开启 LLM 响应缓存（环境变量 LLM_CACHE_ENABLED）"""
+    return os.environ.get('LLM_CACHE_ENABLED', 'false').lower() == 'true'
+
+
+class LLMResponseCache:
+    """基于 SQLite 的 LLM 响应缓存，线程安全"""
+
+    def __init__(self, db_path: str, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+            "created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, temperature: Any, prompt: str, base_url: str = "") -> str:
+        raw = json.dumps([model_name or "", temperature, base_url or "", prompt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            response, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._hits += 1
+            return response
+
+    def set(self, key: str, response: str, model_name: str = ""):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now)
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        """超过条目上限时淘汰最久未访问的条目（调用方需持有锁）"""
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            total = self._hits + self._misses
+            return {
+                'size': size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': self._hits / total if total else 0.0
+            }
+
+
+_caches: Dict[str, LLMResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(filepath: str) -> Optional[LLMResponseCache]:
+    """
+    获取项目目录对应的 LLM 响应缓存；未开启缓存或未指定目录时返回 None。
+    """
+    if not filepath or not llm_cache_enabled():
+        return None
+    db_path = os.path.abspath(os.path.join(filepath, ".cache", "llm_cache.sqlite"))
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            try:
+                cache = LLMResponseCache(db_path)
+            except Exception as e:
+                logging.warning(f"LLM响应缓存初始化失败，已跳过缓存: {e}")
+                return None
+            _caches[db_path] = cache
+        return cache
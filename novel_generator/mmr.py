@@ -0,0 +1,80 @@
+# novel_generator/mmr.py
+# -*- coding: utf-8 -*-
+"""
+最大边际相关（MMR）重排：从 k × 扩展倍数 个候选中选出相关且彼此不重复的 k 条
+- 候选两两相似度一次矩阵乘算出，贪心选择时每步只做向量化的 max 更新
+- lambda_mult 越大越偏向相关度，1 表示不做去重（直接按相关度取前 k）
+- 环境变量 MMR_LAMBDA（默认 0.7）与 MMR_FETCH_FACTOR（默认 4）调整默认值
+"""
+import os
+import logging
+from typing import List
+
+import numpy as np
+
+DEFAULT_MMR_LAMBDA = 0.7
+DEFAULT_MMR_FETCH_FACTOR = 4
+
+
+def get_mmr_lambda() -> float:
+    """默认的 MMR lambda（0~1）"""
+    try:
+        value = float(os.environ.get('MMR_LAMBDA', DEFAULT_MMR_LAMBDA))
+    except ValueError:
+        logging.warning("MMR_LAMBDA 不是数字，使用默认值")
+        return DEFAULT_MMR_LAMBDA
+    return min(1.0, max(0.0, value))
+
+
+def get_mmr_fetch_factor() -> int:
+    """MMR 候选数相对 k 的倍数"""
+    try:
+        return max(1, int(os.environ.get('MMR_FETCH_FACTOR', DEFAULT_MMR_FETCH_FACTOR)))
+    except ValueError:
+        logging.warning("MMR_FETCH_FACTOR 不是整数，使用默认值")
+        return DEFAULT_MMR_FETCH_FACTOR
+
+
+def mmr_select(candidate_vectors, k: int, lambda_mult: float = DEFAULT_MMR_LAMBDA,
+               query_vector=None, relevance=None) -> List[int]:
+    """
+    按 MMR 选出至多 k 个候选，返回其下标（按选中顺序）。
+    :param candidate_vectors: (候选数, 维度) 的向量
+    :param query_vector: 查询向量；未给出 relevance 时以其与候选的余弦相似度作为相关度
+    :param relevance: 每个候选的相关度（如混合检索的融合分数），会先归一化到 0~1
+    """
+    vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    count = len(vectors)
+    if count == 0 or k <= 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+    if relevance is not None:
+        scores = np.asarray(relevance, dtype=np.float32)
+        span = float(scores.max() - scores.min())
+        scores = (scores - scores.min()) / span if span > 0 else np.ones(count, dtype=np.float32)
+    elif query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = vectors @ (query / (np.linalg.norm(query) or 1.0))
+    else:
+        raise ValueError("mmr_select 需要 query_vector 或 relevance")
+
+    k = min(k, count)
+    if lambda_mult >= 1.0:
+        return [int(i) for i in np.argsort(-scores, kind="stable")[:k]]
+
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(scores))]
+    available = np.ones(count, dtype=bool)
+    available[selected[0]] = False
+    # 每个候选与已选集合的最大相似度，每选一个只需与其所在列取 max
+    redundancy = similarity[:, selected[0]].copy()
+    while len(selected) < k:
+        marginal = lambda_mult * scores - (1.0 - lambda_mult) * redundancy
+        marginal[~available] = -np.inf
+        chosen = int(np.argmax(marginal))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(redundancy, similarity[:, chosen], out=redundancy)
+    return selected
@@ -0,0 +1,227 @@
+# novel_generator/project_sync.py
+# -*- coding: utf-8 -*-
+"""
+项目文件与向量库的增量同步
+- 清单（向量库目录下的 sync_manifest.json）记录每个已索引文件的路径、大小、修改时间、内容哈希与索引时间
+- 同步时扫描 chapters/chapter_*.txt 与 knowledge/*.txt，与清单比对：
+  大小与修改时间都未变的文件直接跳过（不读取内容），变化的文件再比对内容哈希
+- 新增或内容变化的文件按片段 upsert（未变化的片段不重新请求 Embedding），已删除文件的片段从向量库删除
+- start_vector_store_sync 在后台线程中执行同步并回调进度；同一项目同时只运行一个同步
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Callable
+
+from utils import read_file, atomic_write_text
+from .vectorstore_utils import (
+    get_vectorstore_dir, open_or_create_vector_store, split_text_for_vectorstore, build_segment_metadata,
+    build_scope_filter, upsert_segments, SOURCE_CHAPTER, SOURCE_KNOWLEDGE, SYNC_MANIFEST_FILE
+)
+
+CHAPTERS_DIR = "chapters"
+KNOWLEDGE_DIR = "knowledge"
+# 每处理这么多个文件写一次清单；中断后重新同步时，已写入向量库但未记入清单的文件只需比对片段 id，不会重复计算 Embedding
+MANIFEST_SAVE_INTERVAL = 20
+
+_CHAPTER_FILE_PATTERN = re.compile(r"^chapter_(\d+)\.txt$")
+
+_sync_locks: Dict[str, threading.Lock] = {}
+_sync_locks_guard = threading.Lock()
+
+
+def get_manifest_path(filepath: str) -> str:
+    return os.path.join(get_vectorstore_dir(filepath), SYNC_MANIFEST_FILE)
+
+
+def load_manifest(filepath: str) -> Dict[str, Dict[str, Any]]:
+    """读取清单：相对路径 → 条目；不存在或损坏时返回空字典（下次同步按全部新增处理）"""
+    try:
+        with open(get_manifest_path(filepath), "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Read sync manifest failed, treating all files as new: {e}")
+        return {}
+
+
+def save_manifest(filepath: str, files: Dict[str, Dict[str, Any]]) -> bool:
+    os.makedirs(get_vectorstore_dir(filepath), exist_ok=True)
+    content = json.dumps({"version": 1, "files": files}, ensure_ascii=False, indent=2)
+    return atomic_write_text(content, get_manifest_path(filepath))
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_project_files(filepath: str) -> Dict[str, Dict[str, Any]]:
+    """扫描项目中需要索引的文件：相对路径 → {"path", "kind", "chapter_number", "size", "mtime_ns"}"""
+    found = {}
+    for folder, kind in ((CHAPTERS_DIR, SOURCE_CHAPTER), (KNOWLEDGE_DIR, SOURCE_KNOWLEDGE)):
+        directory = os.path.join(filepath, folder)
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if not entry.is_file():
+                continue
+            chapter_number = 0
+            if kind == SOURCE_CHAPTER:
+                match = _CHAPTER_FILE_PATTERN.match(entry.name)
+                if not match:
+                    continue
+                chapter_number = int(match.group(1))
+            elif not entry.name.lower().endswith(".txt"):
+                continue
+            stat = entry.stat()
+            rel_path = f"{folder}/{entry.name}"
+            found[rel_path] = {"path": rel_path, "kind": kind, "chapter_number": chapter_number,
+                               "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return found
+
+
+def diff_manifest(filepath: str, manifest: Dict[str, Dict[str, Any]],
+                  scanned: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    比对清单与当前文件，返回 {"added", "changed", "removed", "unchanged"} 相对路径列表（按章节号/路径排序）。
+    大小或修改时间变化但内容哈希相同的文件算作 unchanged，并在 scanned 中带上已计算的哈希。
+    """
+    plan: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for rel_path, entry in scanned.items():
+        old = manifest.get(rel_path)
+        if old and old.get("size") == entry["size"] and old.get("mtime_ns") == entry["mtime_ns"]:
+            entry["content_hash"] = old.get("content_hash", "")
+            plan["unchanged"].append(rel_path)
+            continue
+        entry["content_hash"] = _hash_file(os.path.join(filepath, rel_path))
+        if old is None:
+            plan["added"].append(rel_path)
+        elif old.get("content_hash") != entry["content_hash"]:
+            plan["changed"].append(rel_path)
+        else:
+            plan["unchanged"].append(rel_path)
+    plan["removed"] = [rel_path for rel_path in manifest if rel_path not in scanned]
+
+    def order(rel_path):
+        entry = scanned.get(rel_path) or manifest.get(rel_path) or {}
+        return entry.get("kind") != SOURCE_CHAPTER, entry.get("chapter_number", 0), rel_path
+    for paths in plan.values():
+        paths.sort(key=order)
+    return plan
+
+
+def _project_lock(filepath: str) -> threading.Lock:
+    key = os.path.abspath(filepath)
+    with _sync_locks_guard:
+        return _sync_locks.setdefault(key, threading.Lock())
+
+
+def _index_file(store, filepath: str, entry: Dict[str, Any], removed: bool) -> Dict[str, int]:
+    """把一个文件的当前内容写入向量库（removed 时删除其全部片段）"""
+    rel_path = entry["path"]
+    if entry["kind"] == SOURCE_CHAPTER:
+        scope = build_scope_filter(chapter_number=entry["chapter_number"])
+    else:
+        scope = build_scope_filter(source_file=rel_path)
+    segments = [] if removed else split_text_for_vectorstore(read_file(os.path.join(filepath, rel_path)))
+    if entry["kind"] == SOURCE_CHAPTER:
+        metadatas = build_segment_metadata(segments, SOURCE_CHAPTER, entry["chapter_number"])
+    else:
+        metadatas = build_segment_metadata(segments, SOURCE_KNOWLEDGE, source_file=rel_path)
+    return upsert_segments(store, segments, metadatas, scope)
+
+
+def sync_vector_store(embedding_adapter, filepath: str,
+                      progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                      cancel_event: Optional[threading.Event] = None) -> Optional[Dict[str, int]]:
+    """
+    按清单增量同步项目文件与向量库，返回统计：
+    {"added", "changed", "removed", "unchanged", "failed"}（文件数）与 {"embedded", "reused", "segments_removed"}（片段数）。
+    progress_callback(已处理数, 需处理总数, 相对路径) 在每个文件处理后调用；cancel_event 被设置时在下一个文件前停止。
+    同一项目已有同步在运行时直接返回 None。
+    """
+    lock = _project_lock(filepath)
+    if not lock.acquire(blocking=False):
+        logging.warning(f"Vector store sync already running for {filepath}.")
+        return None
+    try:
+        started = time.perf_counter()
+        manifest = load_manifest(filepath)
+        scanned = scan_project_files(filepath)
+        plan = diff_manifest(filepath, manifest, scanned)
+        result = {name: len(paths) for name, paths in plan.items()}
+        result.update({"failed": 0, "embedded": 0, "reused": 0, "segments_removed": 0})
+        # 只是修改时间变化、内容未变的文件直接更新清单
+        touched = [p for p in plan["unchanged"] if manifest[p].get("mtime_ns") != scanned[p]["mtime_ns"]]
+        for rel_path in touched:
+            manifest[rel_path] = dict(manifest[rel_path], size=scanned[rel_path]["size"],
+                                      mtime_ns=scanned[rel_path]["mtime_ns"])
+
+        tasks = [(p, True) for p in plan["removed"]] + [(p, False) for p in plan["added"] + plan["changed"]]
+        if not tasks:
+            if touched:
+                save_manifest(filepath, manifest)
+            logging.info(f"Vector store is in sync with {len(scanned)} project files.")
+            return result
+
+        store = open_or_create_vector_store(embedding_adapter, filepath)
+        try:
+            for done, (rel_path, removed) in enumerate(tasks, 1):
+                if cancel_event is not None and cancel_event.is_set():
+                    logging.info(f"Vector store sync cancelled after {done - 1}/{len(tasks)} files.")
+                    break
+                entry = manifest[rel_path] if removed else scanned[rel_path]
+                try:
+                    stats = _index_file(store, filepath, entry, removed)
+                    result["embedded"] += stats["embedded"]
+                    result["reused"] += stats["reused"]
+                    result["segments_removed"] += stats["removed"]
+                    if removed:
+                        manifest.pop(rel_path)
+                    else:
+                        manifest[rel_path] = dict(entry, indexed_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+                except Exception as e:
+                    result["failed"] += 1
+                    logging.warning(f"Sync {rel_path} to vector store failed: {e}")
+                if done % MANIFEST_SAVE_INTERVAL == 0:
+                    save_manifest(filepath, manifest)
+                if progress_callback:
+                    progress_callback(done, len(tasks), rel_path)
+        finally:
+            save_manifest(filepath, manifest)
+        logging.info(
+            f"Vector store sync finished in {time.perf_counter() - started:.2f}s: "
+            + ", ".join(f"{name}={value}" for name, value in result.items())
+        )
+        return result
+    finally:
+        lock.release()
+
+
+def start_vector_store_sync(embedding_adapter, filepath: str,
+                            progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                            done_callback: Optional[Callable[[Optional[Dict[str, int]]], None]] = None,
+                            cancel_event: Optional[threading.Event] = None) -> threading.Thread:
+    """在后台线程中执行 sync_vector_store；结束后以统计结果调用 done_callback（出错或已有同步在运行时为 None）"""
+    def task():
+        result = None
+        try:
+            result = sync_vector_store(embedding_adapter, filepath, progress_callback, cancel_event)
+        except Exception as e:
+            logging.error(f"向量库同步失败: {e}")
+        finally:
+            if done_callback:
+                done_callback(result)
+
+    thread = threading.Thread(target=task, daemon=True, name="vector-store-sync")
+    thread.start()
+    return thread
@@ -0,0 +1,102 @@
+# novel_generator/text_splitter.py
+# -*- coding: utf-8 -*-
+"""
+面向中文小说的流式分句与分段（纯 Python，无需下载 NLTK 数据）
+- iter_sentences：在 。！？!?；… 及换行处断句，句末的引号/括号（」』”’）》】）归入当前句；
+  英文句号 . 仅在其后为空白时断句，避免拆开小数与缩写
+- iter_segments：把句子依次装入不超过 max_length 的片段，超长的单句按长度硬切；
+  overlap 大于 0 时，新片段以上一片段末尾不超过 overlap 字的整句开头
+两者都是生成器，片段是原文切片（保留原有空白与标点），不会把整章读成一个“句子”
+"""
+from typing import Iterator, List, Tuple
+
+SENTENCE_TERMINATORS = set("。！？!?；;…")
+CLOSING_PUNCTUATION = set("」』”’\"'）)》】]")
+DEFAULT_MAX_LENGTH = 500
+
+
+def _iter_sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """按句子边界给出 (start, end) 区间，区间首尾的空白已去掉，空句被跳过"""
+    length = len(text)
+    start = 0
+    i = 0
+    while i < length:
+        ch = text[i]
+        end = None
+        if ch == "\n":
+            end = i
+            i += 1
+        elif ch in SENTENCE_TERMINATORS or (ch == "." and (i + 1 >= length or text[i + 1].isspace())):
+            i += 1
+            # 连续的终止符（！？、……）与紧随其后的右引号、右括号属于同一句
+            while i < length and (text[i] in SENTENCE_TERMINATORS or text[i] in CLOSING_PUNCTUATION):
+                i += 1
+            end = i
+        else:
+            i += 1
+            continue
+        while start < end and text[start].isspace():
+            start += 1
+        stop = end
+        while stop > start and text[stop - 1].isspace():
+            stop -= 1
+        if stop > start:
+            yield start, stop
+        start = i
+    while start < length and text[start].isspace():
+        start += 1
+    stop = length
+    while stop > start and text[stop - 1].isspace():
+        stop -= 1
+    if stop > start:
+        yield start, stop
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """逐句产出文本中的句子"""
+    for start, end in _iter_sentence_spans(text):
+        yield text[start:end]
+
+
+def iter_segments(text: str, max_length: int = DEFAULT_MAX_LENGTH, overlap: int = 0) -> Iterator[str]:
+    """
+    把文本切成长度不超过 max_length 的片段，尽量在句子边界处切分。
+    :param overlap: 相邻片段之间重复的最大字数（按整句回溯，0 表示不重叠，需小于 max_length）
+    """
+    if max_length <= 0:
+        raise ValueError("max_length 必须大于 0")
+    overlap = max(0, min(overlap, max_length - 1))
+    spans: List[Tuple[int, int]] = []   # 当前片段包含的句子区间
+
+    def flush() -> str:
+        return text[spans[0][0]:spans[-1][1]]
+
+    for start, end in _iter_sentence_spans(text):
+        # 单句超长：先输出已有片段，再按长度硬切
+        if end - start > max_length:
+            if spans:
+                yield flush()
+                spans = []
+            for piece_start in range(start, end, max_length):
+                piece = text[piece_start:min(piece_start + max_length, end)].strip()
+                if piece:
+                    yield piece
+            continue
+        if spans and end - spans[0][0] > max_length:
+            yield flush()
+            # 回溯上一片段末尾的整句作为重叠部分
+            kept: List[Tuple[int, int]] = []
+            if overlap:
+                for span in reversed(spans):
+                    if end - span[0] > max_length or spans[-1][1] - span[0] > overlap:
+                        break
+                    kept.insert(0, span)
+            spans = kept
+        spans.append((start, end))
+    if spans:
+        yield flush()
+
+
+def split_text_segments(text: str, max_length: int = DEFAULT_MAX_LENGTH, overlap: int = 0) -> List[str]:
+    """iter_segments 的列表形式"""
+    return list(iter_segments(text, max_length, overlap))
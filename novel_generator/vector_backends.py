@@ -0,0 +1,566 @@
+# novel_generator/vector_backends.py
+# -*- coding: utf-8 -*-
+"""
+向量库后端
+- VectorStore：vectorstore_utils 使用的统一接口（写入、删除、按向量批量检索、元数据过滤、计数、读取片段）
+  两个后端的写入均为 upsert：id 已存在时覆盖原片段
+- NumpyVectorStore：内置后端。归一化后的向量存放在内存映射的 vectors.npy（float32 或 float16），
+  片段文本与元数据存放在 segments.jsonl，条目数等信息在 index.json；检索为 NumPy 向量化的余弦 top-k。
+  删除片段时先把压缩后的两个文件写到 .tmp，再在 index.json 中记下 compacting 标记后替换，中断后打开时补完替换
+- ChromaVectorStore：原 langchain_chroma 实现，仅在使用时导入 chromadb
+两种后端写入时都会同步更新同目录下的字符二元组倒排索引（见 lexical_index），供 BM25 检索使用。
+where 条件使用 Chroma 的写法（$eq/$ne/$lt/$lte/$gt/$gte/$in/$nin 与 $and/$or），两个后端行为一致。
+检索结果的 distance 越小越相关：NumPy 后端为余弦距离（1 - cos），Chroma 后端为其默认的平方 L2 距离。
+"""
+import os
+import sys
+import json
+import uuid
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from .lexical_index import LexicalIndex, LEXICAL_INDEX_FILE, hybrid_retrieval_enabled
+
+BACKEND_NUMPY = "numpy"
+BACKEND_CHROMA = "chroma"
+VECTOR_BACKENDS = (BACKEND_NUMPY, BACKEND_CHROMA)
+
+NUMPY_INDEX_FILE = "index.json"
+NUMPY_VECTORS_FILE = "vectors.npy"
+NUMPY_SEGMENTS_FILE = "segments.jsonl"
+CHROMA_DB_FILE = "chroma.sqlite3"
+CHROMA_COLLECTION = "novel_collection"
+
+# vectors.npy 按容量预留行数，写满后按倍数扩容，避免每次追加都重写整个文件
+_INITIAL_CAPACITY = 256
+
+
+def get_default_vector_backend() -> str:
+    """新建向量库使用的后端（环境变量 VECTOR_STORE_BACKEND：numpy / chroma，默认 numpy）"""
+    backend = os.environ.get('VECTOR_STORE_BACKEND', BACKEND_NUMPY).lower()
+    if backend not in VECTOR_BACKENDS:
+        logging.warning(f"未知的向量库后端 {backend}，改用 {BACKEND_NUMPY}")
+        return BACKEND_NUMPY
+    return backend
+
+
+def get_vector_dtype() -> str:
+    """NumPy 后端的向量精度（环境变量 VECTOR_STORE_DTYPE：float32 / float16，默认 float32）"""
+    dtype = os.environ.get('VECTOR_STORE_DTYPE', 'float32').lower()
+    return dtype if dtype in ("float32", "float16") else "float32"
+
+
+def detect_vector_backend(store_dir: str) -> Optional[str]:
+    """根据目录中的文件判断已有向量库的后端，目录中没有向量库时返回 None"""
+    if os.path.exists(os.path.join(store_dir, NUMPY_INDEX_FILE)):
+        return BACKEND_NUMPY
+    if os.path.exists(os.path.join(store_dir, CHROMA_DB_FILE)):
+        return BACKEND_CHROMA
+    return None
+
+
+def match_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """按 Chroma 的 where 语法判断一条元数据是否满足条件；缺少字段的元数据不满足任何字段条件"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, c) for c in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(match_where(metadata, c) for c in condition):
+                return False
+            continue
+        if key not in metadata:
+            return False
+        value = metadata[key]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$lt":
+                ok = value < operand
+            elif op == "$lte":
+                ok = value <= operand
+            elif op == "$gt":
+                ok = value > operand
+            elif op == "$gte":
+                ok = value >= operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            else:
+                raise ValueError(f"不支持的 where 运算符: {op}")
+            if not ok:
+                return False
+    return True
+
+
+def _check_vectors(vectors, expected: int) -> List[List[float]]:
+    if not isinstance(vectors, list) or len(vectors) != expected or any(not v for v in vectors):
+        raise ValueError("Embedding 结果为空或数量不符，无法写入向量库")
+    return vectors
+
+
+class VectorStore(ABC):
+    """
+    向量库后端接口。embeddings 为带 embed_documents / embed_query 的 Embedding 包装器。
+    检索结果统一为 {"id", "content", "metadata", "distance"}。
+    """
+    backend_name = ""
+
+    def __init__(self, store_dir: str, embeddings):
+        self.store_dir = store_dir
+        self.embeddings = embeddings
+        self._lexical: Optional[LexicalIndex] = None
+        self._lexical_lock = threading.Lock()
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                  ids: Optional[List[str]] = None) -> List[str]:
+        """计算 Embedding 后写入，返回片段 id"""
+        texts = [str(t) for t in texts]
+        if not texts:
+            return []
+        vectors = _check_vectors(self.embeddings.embed_documents(texts), len(texts))
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        self.add_embeddings(ids, texts, vectors, metadatas)
+        return ids
+
+    def add_documents(self, documents) -> List[str]:
+        """写入 langchain Document 列表"""
+        return self.add_texts(
+            [d.page_content for d in documents],
+            [dict(d.metadata or {}) for d in documents]
+        )
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None):
+        """与 langchain VectorStore 同名方法一致，返回 Document 列表"""
+        from langchain.docstore.document import Document
+        vector = self.embeddings.embed_query(query)
+        if not vector:
+            return []
+        hits = self.query_by_vectors([vector], k, where=filter)[0]
+        return [Document(page_content=hit["content"], metadata=hit["metadata"]) for hit in hits]
+
+    def add_embeddings(self, ids: List[str], texts: List[str], vectors: List[List[float]],
+                       metadatas: List[Dict[str, Any]]):
+        """写入已计算好的向量，并同步更新倒排索引"""
+        self._add_embeddings(ids, texts, vectors, metadatas)
+        if not hybrid_retrieval_enabled():
+            return
+        try:
+            self._lexical_index().add(list(ids), list(texts), list(metadatas))
+        except Exception as e:
+            # 倒排索引写入失败不影响向量写入，下次检索时按片段数不一致补建
+            logging.warning(f"Update lexical index failed: {e}")
+
+    def delete(self, ids: List[str]) -> int:
+        """删除指定 id 的片段（不存在的 id 忽略），同步更新倒排索引，返回实际删除的条数"""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return 0
+        removed = self._delete(ids)
+        if removed and hybrid_retrieval_enabled():
+            try:
+                self._lexical_index().delete(ids)
+            except Exception as e:
+                logging.warning(f"Delete from lexical index failed: {e}")
+        return removed
+
+    def _lexical_index(self) -> LexicalIndex:
+        with self._lexical_lock:
+            if self._lexical is None:
+                self._lexical = LexicalIndex(os.path.join(self.store_dir, LEXICAL_INDEX_FILE))
+            return self._lexical
+
+    def lexical_search(self, queries: List[str], k: int,
+                       where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        BM25 检索，每个查询返回至多 k 条 {"id", "content", "metadata", "score"}。
+        倒排索引的片段数与向量库不一致（旧向量库或上次写入失败）时先从向量库补建。
+        """
+        index = self._lexical_index()
+        if index.count() != self.count():
+            data = self.get_all()
+            index.rebuild(data["ids"], data["documents"], data["metadatas"])
+            logging.info(f"Rebuilt lexical index for {self.store_dir} with {len(data['ids'])} segments.")
+        return [index.search(query, k, where=where) for query in queries]
+
+    @abstractmethod
+    def _add_embeddings(self, ids: List[str], texts: List[str], vectors: List[List[float]],
+                        metadatas: List[Dict[str, Any]]):
+        """后端写入已计算好的向量"""
+
+    @abstractmethod
+    def _delete(self, ids: List[str]) -> int:
+        """后端删除片段，返回实际删除的条数"""
+
+    @abstractmethod
+    def query_by_vectors(self, vectors: List[List[float]], k: int,
+                         where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """每个查询向量返回最相关的至多 k 条，按 distance 从小到大"""
+
+    @abstractmethod
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        """片段数（可按元数据过滤）"""
+
+    @abstractmethod
+    def get_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """读取已存储的向量（用于 MMR 重排），不存在的 id 不出现在结果中"""
+
+    @abstractmethod
+    def get_all(self, include_embeddings: bool = False,
+                where: Optional[Dict[str, Any]] = None) -> Dict[str, list]:
+        """读取全部（或满足 where 的）片段：{"ids", "documents", "metadatas"[, "embeddings"]}"""
+
+    def close(self):
+        """释放后端持有的文件或客户端"""
+        with self._lexical_lock:
+            if self._lexical is not None:
+                self._lexical.close()
+                self._lexical = None
+
+
+class NumpyVectorStore(VectorStore):
+    """内存映射的扁平索引：数千条片段的规模下，全量矩阵乘即可在毫秒级完成检索"""
+    backend_name = BACKEND_NUMPY
+
+    def __init__(self, store_dir: str, embeddings, dtype: Optional[str] = None):
+        super().__init__(store_dir, embeddings)
+        self._lock = threading.RLock()
+        self._index_path = os.path.join(store_dir, NUMPY_INDEX_FILE)
+        self._vectors_path = os.path.join(store_dir, NUMPY_VECTORS_FILE)
+        self._segments_path = os.path.join(store_dir, NUMPY_SEGMENTS_FILE)
+        self._vectors = None
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        # where 条件（序列化后）→ 满足条件的行号；写入新片段时清空
+        self._filter_cache: Dict[str, np.ndarray] = {}
+        self.dtype = dtype or get_vector_dtype()
+        self.dim = 0
+        if os.path.exists(self._index_path):
+            self._load()
+
+    def _load(self):
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("compacting"):
+            # 上次删除片段时在替换文件的过程中中断：.tmp 文件已完整写入，补完替换
+            self._replace_compacted()
+        self.dtype = index["dtype"]
+        self.dim = index["dim"]
+        count = index["count"]
+        # index.json 最后写入，其中的条目数为准；多出的行是中断的写入留下的，丢弃
+        rows = []
+        truncated = False
+        with open(self._segments_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if len(rows) >= count:
+                    truncated = True
+                    break
+                rows.append(json.loads(line))
+        if len(rows) < count:
+            raise ValueError(f"向量库 {self.store_dir} 的片段文件不完整（{len(rows)}/{count}）")
+        if truncated:
+            self._rewrite_segments(rows)
+        self._ids = [row["id"] for row in rows]
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._documents = [row["content"] for row in rows]
+        self._metadatas = [row.get("metadata") or {} for row in rows]
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+        if self._vectors.shape[0] < count or self._vectors.shape[1] != self.dim:
+            raise ValueError(f"向量库 {self.store_dir} 的向量文件与索引不符")
+        if index.get("compacting"):
+            self._write_index()
+
+    def _rewrite_segments(self, rows: List[Dict[str, Any]]):
+        from utils import atomic_write_text
+        content = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        if not atomic_write_text(content, self._segments_path):
+            raise OSError(f"写入向量库片段文件失败: {self._segments_path}")
+
+    def _write_index(self, compacting: bool = False):
+        from utils import atomic_write_text
+        index = {"version": 1, "metric": "cosine", "dtype": self.dtype, "dim": self.dim, "count": len(self._ids)}
+        if compacting:
+            index["compacting"] = True
+        if not atomic_write_text(json.dumps(index), self._index_path):
+            raise OSError(f"写入向量库索引失败: {self._index_path}")
+
+    def _reserve(self, needed: int):
+        """保证 vectors.npy 至少有 needed 行容量，不足时新建更大的文件并替换"""
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(_INITIAL_CAPACITY, capacity * 2, needed)
+        tmp_path = self._vectors_path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(new_capacity, self.dim))
+        count = len(self._ids)
+        if count:
+            grown[:count] = self._vectors[:count]
+        grown.flush()
+        del grown
+        self._vectors = None
+        os.replace(tmp_path, self._vectors_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+    def _replace_compacted(self):
+        for path in (self._segments_path, self._vectors_path):
+            if os.path.exists(path + ".tmp"):
+                os.replace(path + ".tmp", path)
+
+    def _add_embeddings(self, ids, texts, vectors, metadatas):
+        matrix = np.asarray(_check_vectors(vectors, len(texts)), dtype=np.float32)
+        with self._lock:
+            # 先校验再删除：维度不符（如更换了 Embedding 模型）时不能丢掉已有片段
+            if matrix.ndim != 2 or (self.dim and matrix.shape[1] != self.dim):
+                raise ValueError(f"向量维度 {matrix.shape[-1]} 与向量库维度 {self.dim} 不一致")
+            # 与 Chroma 的 upsert 一致：已存在的 id 先删除再追加
+            self._delete([doc_id for doc_id in ids if doc_id in self._row_of])
+            if not self.dim:
+                self.dim = int(matrix.shape[1])
+                os.makedirs(self.store_dir, exist_ok=True)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+            start = len(self._ids)
+            self._reserve(start + len(texts))
+            self._vectors[start:start + len(texts)] = matrix.astype(self.dtype)
+            self._vectors.flush()
+            with open(self._segments_path, "a" if start else "w", encoding="utf-8") as f:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"id": doc_id, "content": text, "metadata": metadata or {}},
+                                       ensure_ascii=False) + "\n")
+            self._row_of.update((doc_id, start + offset) for offset, doc_id in enumerate(ids))
+            self._ids.extend(ids)
+            self._documents.extend(texts)
+            self._metadatas.extend(dict(m or {}) for m in metadatas)
+            self._filter_cache.clear()
+            self._write_index()
+
+    def _delete(self, ids):
+        with self._lock:
+            dropped = {self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of}
+            if not dropped:
+                return 0
+            keep = [row for row in range(len(self._ids)) if row not in dropped]
+            rows = [{"id": self._ids[row], "content": self._documents[row], "metadata": self._metadatas[row]}
+                    for row in keep]
+
+            from utils import atomic_write_text
+            content = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+            if not atomic_write_text(content, self._segments_path + ".tmp"):
+                raise OSError(f"写入向量库片段文件失败: {self._segments_path}.tmp")
+            capacity = max(_INITIAL_CAPACITY, len(keep))
+            compacted = np.lib.format.open_memmap(self._vectors_path + ".tmp", mode="w+",
+                                                  dtype=self.dtype, shape=(capacity, self.dim))
+            if keep:
+                compacted[:len(keep)] = self._vectors[keep]
+            compacted.flush()
+            del compacted
+
+            self._ids = [row["id"] for row in rows]
+            self._documents = [row["content"] for row in rows]
+            self._metadatas = [row["metadata"] for row in rows]
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._filter_cache.clear()
+            self._write_index(compacting=True)
+            self._vectors = None
+            self._replace_compacted()
+            self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+            self._write_index()
+            return len(dropped)
+
+    def _candidate_rows(self, where) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        cache_key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        rows = self._filter_cache.get(cache_key)
+        if rows is None:
+            rows = np.fromiter(
+                (i for i, metadata in enumerate(self._metadatas) if match_where(metadata, where)), dtype=np.int64
+            )
+            self._filter_cache[cache_key] = rows
+        return rows
+
+    def query_by_vectors(self, vectors, k, where=None):
+        with self._lock:
+            count = len(self._ids)
+            results: List[List[Dict[str, Any]]] = [[] for _ in vectors]
+            if not count or k <= 0 or not vectors:
+                return results
+            queries = np.asarray(vectors, dtype=np.float32)
+            if queries.shape[1] != self.dim:
+                raise ValueError(f"查询向量维度 {queries.shape[1]} 与向量库维度 {self.dim} 不一致")
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms == 0, 1.0, norms)
+
+            rows = self._candidate_rows(where)
+            if rows is not None and not len(rows):
+                return results
+            matrix = self._vectors[:count] if rows is None else self._vectors[rows]
+            scores = np.asarray(matrix, dtype=np.float32) @ queries.T     # (候选数, 查询数)
+            top = min(k, scores.shape[0])
+            for column in range(scores.shape[1]):
+                column_scores = scores[:, column]
+                best = np.argpartition(-column_scores, top - 1)[:top] if top < len(column_scores) else np.arange(top)
+                best = best[np.argsort(-column_scores[best], kind="stable")]
+                for position in best:
+                    row = int(position if rows is None else rows[position])
+                    results[column].append({
+                        "id": self._ids[row],
+                        "content": self._documents[row],
+                        "metadata": dict(self._metadatas[row]),
+                        "distance": float(1.0 - column_scores[position]),
+                    })
+            return results
+
+    def count(self, where=None):
+        with self._lock:
+            if not where:
+                return len(self._ids)
+            return sum(1 for metadata in self._metadatas if match_where(metadata, where))
+
+    def get_embeddings(self, ids):
+        with self._lock:
+            rows = [(doc_id, self._row_of[doc_id]) for doc_id in ids if doc_id in self._row_of]
+            if not rows:
+                return {}
+            matrix = np.asarray(self._vectors[[row for _, row in rows]], dtype=np.float32)
+            return {doc_id: matrix[i] for i, (doc_id, _) in enumerate(rows)}
+
+    def get_all(self, include_embeddings=False, where=None):
+        with self._lock:
+            rows = self._candidate_rows(where)
+            rows = list(range(len(self._ids))) if rows is None else rows.tolist()
+            data = {"ids": [self._ids[r] for r in rows], "documents": [self._documents[r] for r in rows],
+                    "metadatas": [dict(self._metadatas[r]) for r in rows]}
+            if include_embeddings:
+                data["embeddings"] = [] if not rows else np.asarray(self._vectors[rows], dtype=np.float32).tolist()
+            return data
+
+    def close(self):
+        with self._lock:
+            self._vectors = None
+        super().close()
+
+
+def _release_chroma_system(store_dir: str):
+    """
+    chromadb 在进程内按持久化目录缓存客户端；删除目录前先释放，
+    否则同一进程内重建向量库时会继续写入已删除的数据库文件（attempt to write a readonly database）。
+    """
+    if "chromadb" not in sys.modules:
+        return
+    try:
+        from chromadb.api.client import SharedSystemClient
+        system = SharedSystemClient._identifier_to_system.pop(store_dir, None)
+        if system is not None:
+            system.stop()
+    except Exception as e:
+        logging.debug(f"Release chroma client failed: {e}")
+
+
+class ChromaVectorStore(VectorStore):
+    """基于 langchain_chroma 的后端（与此前的向量库格式相同）"""
+    backend_name = BACKEND_CHROMA
+
+    def __init__(self, store_dir: str, embeddings):
+        super().__init__(store_dir, embeddings)
+        from langchain_chroma import Chroma
+        from chromadb.config import Settings
+        self._store = Chroma(
+            persist_directory=store_dir,
+            embedding_function=embeddings,
+            client_settings=Settings(anonymized_telemetry=False),
+            collection_name=CHROMA_COLLECTION
+        )
+        self._collection = self._store._collection
+
+    def _add_embeddings(self, ids, texts, vectors, metadatas):
+        _check_vectors(vectors, len(texts))
+        self._collection.upsert(
+            ids=list(ids),
+            documents=list(texts),
+            embeddings=vectors,
+            # Chroma 不接受空字典作为元数据
+            metadatas=[m or None for m in metadatas] if any(metadatas) else None
+        )
+
+    def _delete(self, ids):
+        existing = self._collection.get(ids=list(ids), include=[])["ids"]
+        if existing:
+            self._collection.delete(ids=existing)
+        return len(existing)
+
+    def query_by_vectors(self, vectors, k, where=None):
+        results: List[List[Dict[str, Any]]] = [[] for _ in vectors]
+        count = self._collection.count()
+        if not count or k <= 0 or not vectors:
+            return results
+        response = self._collection.query(
+            query_embeddings=vectors,
+            n_results=min(k, count),
+            where=where or None,
+            include=["documents", "metadatas", "distances"]
+        )
+        for row in range(len(vectors)):
+            for doc_id, content, metadata, distance in zip(
+                response["ids"][row], response["documents"][row],
+                response["metadatas"][row], response["distances"][row]
+            ):
+                results[row].append({
+                    "id": doc_id,
+                    "content": content,
+                    "metadata": dict(metadata or {}),
+                    "distance": float(distance),
+                })
+        return results
+
+    def count(self, where=None):
+        if not where:
+            return self._collection.count()
+        return len(self._collection.get(where=where, include=[])["ids"])
+
+    def get_embeddings(self, ids):
+        if not ids:
+            return {}
+        response = self._collection.get(ids=list(ids), include=["embeddings"])
+        return {doc_id: np.asarray(vector, dtype=np.float32)
+                for doc_id, vector in zip(response["ids"], response["embeddings"])}
+
+    def get_all(self, include_embeddings=False, where=None):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        response = self._collection.get(where=where or None, include=include)
+        data = {"ids": list(response["ids"]), "documents": list(response["documents"]),
+                "metadatas": [dict(m or {}) for m in response["metadatas"]]}
+        if include_embeddings:
+            data["embeddings"] = [list(map(float, v)) for v in response["embeddings"]]
+        return data
+
+    def close(self):
+        super().close()
+        _release_chroma_system(self.store_dir)
+
+
+def open_vector_backend(store_dir: str, embeddings, backend: Optional[str] = None) -> VectorStore:
+    """打开（或准备新建）store_dir 下的向量库；backend 为空时按目录内容判断，新目录使用默认后端"""
+    backend = backend or detect_vector_backend(store_dir) or get_default_vector_backend()
+    if backend == BACKEND_CHROMA:
+        return ChromaVectorStore(store_dir, embeddings)
+    if backend == BACKEND_NUMPY:
+        return NumpyVectorStore(store_dir, embeddings)
+    raise ValueError(f"未知的向量库后端: {backend}")
@@ -5,14 +5,15 @@
 """
 import os
 import logging
+import uuid
+import hashlib
+import threading
 import traceback
-import nltk
 import numpy as np
 import re
 import ssl
 import requests
 import warnings
-from langchain_chroma import Chroma
 logging.basicConfig(
     filename='app.log',      # 日志文件名
     filemode='a',            # 追加模式（'w' 会覆盖）
@@ -24,10 +25,25 @@ logging.basicConfig(
 warnings.filterwarnings('ignore', message='.*Torch was not compiled with flash attention.*')
 os.environ["TOKENIZERS_PARALLELISM"] = "false"  # 禁用tokenizer并行警告
 
-from chromadb.config import Settings
-from langchain.docstore.document import Document
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Optional, Dict, Any, List
 from .common import call_with_retry
+from .text_splitter import split_text_segments
+from .embedding_cache import get_embedding_cache
+from .vector_backends import (
+    open_vector_backend, detect_vector_backend, _release_chroma_system, VECTOR_BACKENDS
+)
+from .lexical_index import hybrid_retrieval_enabled
+from .mmr import mmr_select, get_mmr_lambda, get_mmr_fetch_factor
+
+# 导入调用遥测
+try:
+    from llm_telemetry import get_telemetry
+    TELEMETRY_AVAILABLE = True
+except ImportError:
+    TELEMETRY_AVAILABLE = False
+
+# 项目文件同步清单（见 project_sync），随向量库目录一起清空与迁移
+SYNC_MANIFEST_FILE = "sync_manifest.json"
 
 def get_vectorstore_dir(filepath: str) -> str:
     """获取 vectorstore 路径"""
@@ -40,6 +56,8 @@ def clear_vector_store(filepath: str) -> bool:
     if not os.path.exists(store_dir):
         logging.info("No vector store found to clear.")
         return False
+    invalidate_vector_store(filepath)
+    _release_chroma_system(store_dir)
     try:
         shutil.rmtree(store_dir)
         logging.info(f"Vector store directory '{store_dir}' removed.")
@@ -49,43 +67,231 @@ def clear_vector_store(filepath: str) -> bool:
         traceback.print_exc()
         return False
 
-def init_vector_store(embedding_adapter, texts, filepath: str):
+def _embed_with_telemetry(embedding_adapter, method: str, payload):
+    """带重试调用 Embedding 适配器，并记录一条遥测"""
+    func = getattr(embedding_adapter, method)
+    kwargs = {"texts": payload} if method == "embed_documents" else {"query": payload}
+    if not TELEMETRY_AVAILABLE:
+        return call_with_retry(func=func, max_retries=3, retry_layer="embedding", fallback_return=[], **kwargs)
+    text = "".join(payload) if isinstance(payload, list) else payload
+    with get_telemetry().track("embedding", getattr(embedding_adapter, "model_name", ""), prompt=text) as record:
+        result = call_with_retry(func=func, max_retries=3, retry_layer="embedding", fallback_return=[], **kwargs)
+        if not result:
+            record["outcome"] = "empty"
+    return result
+
+def _embedding_identity(embedding_adapter) -> tuple:
+    """(接口格式, 模型名)，作为 Embedding 缓存键的一部分"""
+    interface_format = getattr(embedding_adapter, "interface_format", None) or type(embedding_adapter).__name__
+    return interface_format, getattr(embedding_adapter, "model_name", "") or ""
+
+def _embed_documents_cached(embedding_adapter, texts, cache):
+    """先查 Embedding 缓存，只对未命中的文本（去重后）请求接口，并把非空结果写回缓存"""
+    texts = [str(t) for t in texts]
+    if cache is None:
+        return _embed_with_telemetry(embedding_adapter, "embed_documents", texts)
+    interface_format, model = _embedding_identity(embedding_adapter)
+    vectors = cache.get_many(interface_format, model, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if not missing:
+        return vectors
+    fresh = _embed_with_telemetry(embedding_adapter, "embed_documents", missing)
+    if not isinstance(fresh, list) or len(fresh) != len(missing):
+        if len(missing) == len(texts):
+            return fresh
+        fresh = [[] for _ in missing]
+    cache.set_many(interface_format, model, list(zip(missing, fresh)))
+    computed = dict(zip(missing, fresh))
+    return [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+
+def _embed_query_cached(embedding_adapter, query: str, cache):
+    if cache is None:
+        return _embed_with_telemetry(embedding_adapter, "embed_query", query)
+    interface_format, model = _embedding_identity(embedding_adapter)
+    vector = cache.get(interface_format, model, query)
+    if vector is not None:
+        return vector
+    vector = _embed_with_telemetry(embedding_adapter, "embed_query", query)
+    cache.set(interface_format, model, query, vector)
+    return vector
+
+def _wrap_embedding_adapter(embedding_adapter, filepath: str = ""):
     """
-    在 filepath 下创建/加载一个 Chroma 向量库并插入 texts。
-    如果Embedding失败，则返回 None，不中断任务。
+    把项目的 Embedding 适配器包装成向量库后端使用的 embed_documents / embed_query 接口
+    （与 langchain 的 Embeddings 一致，Chroma 后端可直接使用）。
+    指定 filepath 时经由项目的 Embedding 缓存读写。
+    """
+    cache = get_embedding_cache(filepath)
+
+    class EmbeddingWrapper:
+        def embed_documents(self, texts):
+            return _embed_documents_cached(embedding_adapter, texts, cache)
+        def embed_query(self, query: str):
+            return _embed_query_cached(embedding_adapter, query, cache)
+
+    return EmbeddingWrapper()
+
+# 进程级向量库注册表：按 (向量库目录, 接口格式, 模型名, 端点) 缓存已打开的向量库实例，
+# 检索与插入复用同一个实例；clear_vector_store 或目录被替换（标识文件变化）时失效。
+_store_registry: Dict[tuple, Dict[str, Any]] = {}
+_store_registry_lock = threading.Lock()
+_store_registry_stats = {"opens": 0, "hits": 0, "invalidations": 0}
+
+def _store_key(embedding_adapter, store_dir: str) -> tuple:
+    interface_format, model = _embedding_identity(embedding_adapter)
+    endpoint = getattr(embedding_adapter, "base_url", None) or getattr(embedding_adapter, "url", "") or ""
+    return (os.path.abspath(store_dir), interface_format, model, endpoint)
+
+_STORE_ID_FILE = ".store_id"
+
+def _store_marker(store_dir: str, create: bool = False) -> Optional[str]:
+    """
+    向量库目录中的随机标识文件；目录被删除重建后标识随之改变（inode 可能被复用，不能作为依据）。
+    """
+    marker_file = os.path.join(store_dir, _STORE_ID_FILE)
+    try:
+        with open(marker_file, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        if not create:
+            return None
+    except OSError:
+        return None
+    try:
+        marker = uuid.uuid4().hex
+        with open(marker_file, "w", encoding="utf-8") as f:
+            f.write(marker)
+        return marker
+    except OSError:
+        return None
+
+def _register_store(key: tuple, store_dir: str, store):
+    with _store_registry_lock:
+        _store_registry[key] = {"store": store, "marker": _store_marker(store_dir, create=True)}
+        _store_registry_stats["opens"] += 1
+
+def _lookup_store(key: tuple, store_dir: str):
+    with _store_registry_lock:
+        entry = _store_registry.get(key)
+        if entry is None:
+            return None
+        marker = entry["marker"]
+        if marker is None or marker != _store_marker(store_dir):
+            del _store_registry[key]
+            _store_registry_stats["invalidations"] += 1
+            return None
+        _store_registry_stats["hits"] += 1
+        return entry["store"]
+
+def invalidate_vector_store(filepath: str):
+    """丢弃并关闭注册表中该项目的已打开向量库（所有 Embedding 配置）"""
+    store_dir = os.path.abspath(get_vectorstore_dir(filepath))
+    with _store_registry_lock:
+        for key in [k for k in _store_registry if k[0] == store_dir]:
+            _store_registry.pop(key)["store"].close()
+            _store_registry_stats["invalidations"] += 1
+
+def get_vector_store_registry_stats() -> Dict[str, int]:
+    """注册表统计：opens 为实际打开次数，hits 为复用次数，invalidations 为失效次数"""
+    with _store_registry_lock:
+        return dict(_store_registry_stats, open_stores=len(_store_registry))
+
+# 片段元数据：来源（章节/知识库）、章节号（知识库为 0）、片段序号与内容哈希
+SOURCE_CHAPTER = "chapter"
+SOURCE_KNOWLEDGE = "knowledge"
+# 检索时排除的近章范围：写第 N 章时只引用 chapter_number < N - RECENT_CHAPTER_WINDOW 的章节片段
+RECENT_CHAPTER_WINDOW = 2
+
+def build_segment_metadata(segments, source: str, chapter_number: int = 0,
+                           source_file: str = "") -> List[Dict[str, Any]]:
+    """为一组片段生成与之一一对应的元数据；source_file 为知识库文件相对项目目录的路径（同步时使用）"""
+    metadatas = []
+    for index, segment in enumerate(segments):
+        metadata = {
+            "source": source,
+            "chapter_number": int(chapter_number or 0),
+            "segment_index": index,
+            "content_hash": hashlib.sha1(str(segment).encode("utf-8")).hexdigest(),
+        }
+        if source_file:
+            metadata["source_file"] = source_file
+        metadatas.append(metadata)
+    return metadatas
+
+def build_segment_ids(metadatas: List[Dict[str, Any]]) -> List[str]:
+    """
+    由元数据生成确定性的片段 id：来源-范围-片段序号-内容哈希前 16 位，同一章节重写时可据此判断片段是否变化。
+    范围为章节号；带 source_file 的知识库片段为文件路径哈希，不同文件的片段互不冲突。
     """
-    from langchain.embeddings.base import Embeddings as LCEmbeddings
+    ids = []
+    for m in metadatas:
+        if m.get("source_file"):
+            scope = hashlib.sha1(m["source_file"].encode("utf-8")).hexdigest()[:8]
+        else:
+            scope = int(m["chapter_number"])
+        ids.append(f"{m['source']}-{scope}-{int(m['segment_index'])}-{m['content_hash'][:16]}")
+    return ids
+
+def build_scope_filter(chapter_number: int = 0, source_file: str = "") -> Optional[Dict[str, Any]]:
+    """一章（chapter_number > 0）或一个知识库文件的全部片段对应的 where 条件，两者都未给出时返回 None"""
+    if source_file:
+        return {"$and": [{"source": {"$eq": SOURCE_KNOWLEDGE}}, {"source_file": {"$eq": source_file}}]}
+    if chapter_number and chapter_number > 0:
+        return {"$and": [{"source": {"$eq": SOURCE_CHAPTER}}, {"chapter_number": {"$eq": int(chapter_number)}}]}
+    return None
+
+def build_recency_filter(chapter_number: int, window: int = RECENT_CHAPTER_WINDOW) -> Optional[Dict[str, Any]]:
+    """
+    生成写第 chapter_number 章时使用的 where 条件（Chroma 语法，两种后端通用）：保留知识库片段与 window 章之前的章节片段。
+    chapter_number 未知（<= 0）时返回 None，即不过滤。
+    """
+    if not chapter_number or chapter_number <= 0:
+        return None
+    return {"$or": [
+        {"source": {"$eq": SOURCE_KNOWLEDGE}},
+        {"chapter_number": {"$lt": int(chapter_number) - window}},
+    ]}
+
+# 旧版本写入的片段没有元数据，where 条件会把它们全部排除；检查结果记在向量库实例上，文档数变化时重新检查
+def _has_untagged_documents(store) -> bool:
+    """向量库中是否存在没有 source 元数据的旧片段"""
+    total = store.count()
+    cached = getattr(store, "_legacy_check", None)
+    if cached and cached[0] == total:
+        return cached[1]
+    result = store.count(where={"source": {"$in": [SOURCE_CHAPTER, SOURCE_KNOWLEDGE]}}) < total
+    store._legacy_check = (total, result)
+    return result
+
+def _effective_filter(store, where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """向量库含无元数据的旧片段时放弃 where 条件，退回检索后由内容规则处理"""
+    if where and _has_untagged_documents(store):
+        logging.info("Vector store contains segments without metadata; skipping metadata filter.")
+        return None
+    return where
 
+def open_or_create_vector_store(embedding_adapter, filepath: str):
+    """打开 filepath 下的向量库，不存在时准备一个空的新库（使用默认后端）；实例登记在注册表中复用"""
     store_dir = get_vectorstore_dir(filepath)
     os.makedirs(store_dir, exist_ok=True)
-    documents = [Document(page_content=str(t)) for t in texts]
+    key = _store_key(embedding_adapter, store_dir)
+    store = _lookup_store(key, store_dir)
+    if store is None:
+        store = open_vector_backend(store_dir, _wrap_embedding_adapter(embedding_adapter, filepath))
+        _register_store(key, store_dir, store)
+    return store
 
+def init_vector_store(embedding_adapter, texts, filepath: str, metadatas: Optional[List[Dict[str, Any]]] = None,
+                      ids: Optional[List[str]] = None):
+    """
+    在 filepath 下创建/加载一个向量库并插入 texts。
+    metadatas 与 texts 一一对应（见 build_segment_metadata），不传则不带元数据；ids 不传则随机生成。
+    目录中已有向量库时沿用其后端，新建时使用默认后端（见 vector_backends.get_default_vector_backend）。
+    如果Embedding失败，则返回 None，不中断任务。
+    """
     try:
-        class LCEmbeddingWrapper(LCEmbeddings):
-            def embed_documents(self, texts):
-                return call_with_retry(
-                    func=embedding_adapter.embed_documents,
-                    max_retries=3,
-                    fallback_return=[],
-                    texts=texts
-                )
-            def embed_query(self, query: str):
-                res = call_with_retry(
-                    func=embedding_adapter.embed_query,
-                    max_retries=3,
-                    fallback_return=[],
-                    query=query
-                )
-                return res
-
-        chroma_embedding = LCEmbeddingWrapper()
-        vectorstore = Chroma.from_documents(
-            documents,
-            embedding=chroma_embedding,
-            persist_directory=store_dir,
-            client_settings=Settings(anonymized_telemetry=False),
-            collection_name="novel_collection"
-        )
+        vectorstore = open_or_create_vector_store(embedding_adapter, filepath)
+        vectorstore.add_texts([str(t) for t in texts], metadatas, ids)
         return vectorstore
     except Exception as e:
         logging.warning(f"Init vector store failed: {e}")
@@ -94,45 +300,90 @@ def init_vector_store(embedding_adapter, texts, filepath: str):
 
 def load_vector_store(embedding_adapter, filepath: str):
     """
-    读取已存在的 Chroma 向量库。若不存在则返回 None。
+    读取已存在的向量库（后端按目录内容判断）。若不存在则返回 None。
     如果加载失败（embedding 或IO问题），则返回 None。
+    同一进程内相同目录与 Embedding 配置只打开一次，之后直接复用注册表中的实例。
     """
-    from langchain.embeddings.base import Embeddings as LCEmbeddings
     store_dir = get_vectorstore_dir(filepath)
     if not os.path.exists(store_dir):
         logging.info("Vector store not found. Will return None.")
         return None
 
+    key = _store_key(embedding_adapter, store_dir)
+    store = _lookup_store(key, store_dir)
+    if store is not None:
+        return store
+
+    backend = detect_vector_backend(store_dir)
+    if backend is None:
+        logging.info("Vector store directory holds no data. Will return None.")
+        return None
+
     try:
-        class LCEmbeddingWrapper(LCEmbeddings):
-            def embed_documents(self, texts):
-                return call_with_retry(
-                    func=embedding_adapter.embed_documents,
-                    max_retries=3,
-                    fallback_return=[],
-                    texts=texts
-                )
-            def embed_query(self, query: str):
-                res = call_with_retry(
-                    func=embedding_adapter.embed_query,
-                    max_retries=3,
-                    fallback_return=[],
-                    query=query
-                )
-                return res
-
-        chroma_embedding = LCEmbeddingWrapper()
-        return Chroma(
-            persist_directory=store_dir,
-            embedding_function=chroma_embedding,
-            client_settings=Settings(anonymized_telemetry=False),
-            collection_name="novel_collection"
-        )
+        store = open_vector_backend(store_dir, _wrap_embedding_adapter(embedding_adapter, filepath), backend)
+        _register_store(key, store_dir, store)
+        return store
     except Exception as e:
         logging.warning(f"Failed to load vector store: {e}")
         traceback.print_exc()
         return None
 
+def migrate_vector_store(filepath: str, target_backend: str) -> bool:
+    """
+    把 filepath 下的向量库转换为 target_backend（numpy / chroma）格式。
+    直接复制已有的向量、文本与元数据，不重新请求 Embedding；原目录保留为 vectorstore.<原后端>.bak。
+    """
+    import shutil
+    if target_backend not in VECTOR_BACKENDS:
+        raise ValueError(f"未知的向量库后端: {target_backend}")
+    store_dir = get_vectorstore_dir(filepath)
+    source_backend = detect_vector_backend(store_dir)
+    if source_backend is None:
+        logging.warning(f"No vector store found to migrate in {store_dir}.")
+        return False
+    if source_backend == target_backend:
+        logging.info(f"Vector store is already using the {target_backend} backend.")
+        return True
+
+    invalidate_vector_store(filepath)
+    tmp_dir = store_dir + ".migrating"
+    try:
+        source = open_vector_backend(store_dir, None, source_backend)
+        data = source.get_all(include_embeddings=True)
+        source.close()
+
+        _release_chroma_system(tmp_dir)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        if os.path.exists(os.path.join(store_dir, SYNC_MANIFEST_FILE)):
+            shutil.copy2(os.path.join(store_dir, SYNC_MANIFEST_FILE), os.path.join(tmp_dir, SYNC_MANIFEST_FILE))
+        target = open_vector_backend(tmp_dir, None, target_backend)
+        batch = 1000
+        for start in range(0, len(data["ids"]), batch):
+            end = start + batch
+            target.add_embeddings(
+                data["ids"][start:end], data["documents"][start:end],
+                data["embeddings"][start:end], data["metadatas"][start:end]
+            )
+        migrated = target.count()
+        target.close()
+        if migrated != len(data["ids"]):
+            raise ValueError(f"迁移后片段数不符：{migrated}/{len(data['ids'])}")
+
+        backup_dir = f"{store_dir}.{source_backend}.bak"
+        _release_chroma_system(store_dir)
+        shutil.rmtree(backup_dir, ignore_errors=True)
+        os.replace(store_dir, backup_dir)
+        os.replace(tmp_dir, store_dir)
+        logging.info(f"Migrated {migrated} segments from {source_backend} to {target_backend}; backup at {backup_dir}.")
+        return True
+    except Exception as e:
+        logging.error(f"向量库迁移失败: {e}")
+        traceback.print_exc()
+        _release_chroma_system(tmp_dir)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
 def split_by_length(text: str, max_length: int = 500):
     """按照 max_length 切分文本"""
     segments = []
@@ -144,68 +395,68 @@ def split_by_length(text: str, max_length: int = 500):
         start_idx = end_idx
     return segments
 
-def split_text_for_vectorstore(chapter_text: str, max_length: int = 500, similarity_threshold: float = 0.7):
+def split_text_for_vectorstore(chapter_text: str, max_length: int = 500, similarity_threshold: float = 0.7, overlap: int = 0):
     """
     对新的章节文本进行分段后,再用于存入向量库。
-    使用 embedding 进行文本相似度计算。
+    按中文句子边界（。！？… 及换行）切分后装入不超过 max_length 的片段；
+    similarity_threshold 保留以兼容旧调用，不再使用。
     """
     if not chapter_text.strip():
         return []
-    
-    # 确保下载了NLTK所需的数据包
-    try:
-        nltk.data.find('tokenizers/punkt_tab')
-    except LookupError:
-        print("正在下载NLTK punkt_tab数据包...")
-        try:
-            nltk.download('punkt_tab', quiet=True)
-        except Exception as e:
-            print(f"下载punkt_tab数据包失败: {e}")
-            # 如果下载失败，尝试使用默认的punkt tokenizer
-            pass
-    
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        print("正在下载NLTK punkt数据包...")
-        try:
-            nltk.download('punkt', quiet=True)
-        except Exception as e:
-            print(f"下载punkt数据包失败: {e}")
-            # 如果下载失败，抛出异常
-            raise e
-    
-    sentences = nltk.sent_tokenize(chapter_text)
-    if not sentences:
-        return []
-    
-    # 直接按长度分段,不做相似度合并
-    final_segments = []
-    current_segment = []
-    current_length = 0
-    
-    for sentence in sentences:
-        sentence_length = len(sentence)
-        if current_length + sentence_length > max_length:
-            if current_segment:
-                final_segments.append(" ".join(current_segment))
-            current_segment = [sentence]
-            current_length = sentence_length
-        else:
-            current_segment.append(sentence)
-            current_length += sentence_length
-    
-    if current_segment:
-        final_segments.append(" ".join(current_segment))
-    
-    return final_segments
-
-def update_vector_store(embedding_adapter, new_chapter: str, filepath: str):
+    return split_text_segments(chapter_text, max_length=max_length, overlap=overlap)
+
+def upsert_segments(store, segments: List[str], metadatas: List[Dict[str, Any]],
+                    scope: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    用新片段替换 scope（见 build_scope_filter）范围内的旧片段：
+    - id 不变（序号与内容都相同）的片段保留不动
+    - 内容与旧片段相同、仅序号变化的片段复用已存储的向量，不重新请求 Embedding
+    - 其余片段计算 Embedding 后写入，最后删除范围内不再出现的旧片段（先写后删，检索不会看到空章节）
+    scope 为 None 时不删除任何片段，只按确定性 id 写入。
+    返回 {"unchanged", "reused", "embedded", "removed"} 片段数。
+    """
+    ids = build_segment_ids(metadatas)
+    existing: Dict[str, Dict[str, Any]] = {}
+    if scope:
+        old = store.get_all(where=scope)
+        existing = dict(zip(old["ids"], old["metadatas"]))
+
+    pending = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+    old_by_hash = {m.get("content_hash"): doc_id for doc_id, m in existing.items()}
+    stored = store.get_embeddings([old_by_hash[metadatas[i]["content_hash"]] for i in pending
+                                   if metadatas[i]["content_hash"] in old_by_hash])
+    vectors: Dict[int, Any] = {}
+    for i in pending:
+        vector = stored.get(old_by_hash.get(metadatas[i]["content_hash"], ""))
+        if vector is not None:
+            vectors[i] = np.asarray(vector, dtype=np.float32).tolist()
+    reused = len(vectors)
+
+    to_embed = [i for i in pending if i not in vectors]
+    if to_embed:
+        embedded = store.embeddings.embed_documents([str(segments[i]) for i in to_embed])
+        if not isinstance(embedded, list) or len(embedded) != len(to_embed) or any(not v for v in embedded):
+            raise ValueError("Embedding 结果为空或数量不符，无法写入向量库")
+        vectors.update(zip(to_embed, embedded))
+
+    if pending:
+        store.add_embeddings([ids[i] for i in pending], [str(segments[i]) for i in pending],
+                             [vectors[i] for i in pending], [metadatas[i] for i in pending])
+    keep = set(ids)
+    removed = store.delete([doc_id for doc_id in existing if doc_id not in keep])
+    return {"unchanged": len(ids) - len(pending), "reused": reused, "embedded": len(to_embed), "removed": removed}
+
+def upsert_chapter_segments(store, segments: List[str], chapter_number: int) -> Dict[str, int]:
+    """用一章的新片段替换该章的旧片段（见 upsert_segments）；chapter_number <= 0（章节号未知）时不删除"""
+    metadatas = build_segment_metadata(segments, SOURCE_CHAPTER, chapter_number)
+    return upsert_segments(store, segments, metadatas, build_scope_filter(chapter_number))
+
+def update_vector_store(embedding_adapter, new_chapter: str, filepath: str, chapter_number: int = 0):
     """
-    将最新章节文本插入到向量库中。
+    将最新章节文本写入向量库，每个片段带有来源、章节号、片段序号与内容哈希元数据，id 由这些元数据确定。
+    同一章节重新定稿时替换该章的旧片段，未变化的片段不重新计算 Embedding（见 upsert_chapter_segments）。
     若库不存在则初始化；若初始化/更新失败，则跳过。
     """
-    from utils import read_file, clear_file_content, save_string_to_txt
     splitted_texts = split_text_for_vectorstore(new_chapter)
     if not splitted_texts:
         logging.warning("No valid text to insert into vector store. Skipping.")
@@ -214,7 +465,8 @@ def update_vector_store(embedding_adapter, new_chapter: str, filepath: str):
     store = load_vector_store(embedding_adapter, filepath)
     if not store:
         logging.info("Vector store does not exist or failed to load. Initializing a new one for new chapter...")
-        store = init_vector_store(embedding_adapter, splitted_texts, filepath)
+        metadatas = build_segment_metadata(splitted_texts, SOURCE_CHAPTER, chapter_number)
+        store = init_vector_store(embedding_adapter, splitted_texts, filepath, metadatas, build_segment_ids(metadatas))
         if not store:
             logging.warning("Init vector store failed, skip embedding.")
         else:
@@ -222,16 +474,93 @@ def update_vector_store(embedding_adapter, new_chapter: str, filepath: str):
         return
 
     try:
-        docs = [Document(page_content=str(t)) for t in splitted_texts]
-        store.add_documents(docs)
-        logging.info("Vector store updated with the new chapter splitted segments.")
+        stats = upsert_chapter_segments(store, splitted_texts, chapter_number)
+        logging.info(
+            f"Vector store updated for chapter {chapter_number}: {stats['unchanged']} unchanged, "
+            f"{stats['reused']} reused, {stats['embedded']} embedded, {stats['removed']} removed."
+        )
     except Exception as e:
         logging.warning(f"Failed to update vector store: {e}")
         traceback.print_exc()
 
-def get_relevant_context_from_vector_store(embedding_adapter, query: str, filepath: str, k: int = 2) -> str:
+# 混合检索：向量检索与 BM25 检索各取 max(k * HYBRID_CANDIDATE_FACTOR, HYBRID_MIN_CANDIDATES) 个候选，
+# 按倒数排名融合（RRF）后取前 k
+RRF_K = 60
+HYBRID_CANDIDATE_FACTOR = 2
+HYBRID_MIN_CANDIDATES = 20
+
+def _fuse_rankings(vector_hits: List[Dict[str, Any]], lexical_hits: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """
+    RRF 融合：score = Σ 1 / (RRF_K + 名次)；distance / bm25 为各路检索的原始分数，未命中的一路为 None。
+    分数相同时优先与查询有字面重合（bm25 不为 None）的片段。
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for rank, hit in enumerate(vector_hits, 1):
+        entry = fused.setdefault(hit["id"], dict(hit, bm25=None, score=0.0))
+        entry["score"] += 1.0 / (RRF_K + rank)
+    for rank, hit in enumerate(lexical_hits, 1):
+        entry = fused.setdefault(hit["id"], {
+            "id": hit["id"], "content": hit["content"], "metadata": hit["metadata"],
+            "distance": None, "score": 0.0
+        })
+        entry["bm25"] = hit["score"]
+        entry["score"] += 1.0 / (RRF_K + rank)
+    return sorted(fused.values(), key=lambda hit: (-hit["score"], hit["bm25"] is None))[:k]
+
+def _mmr_rerank(store, hits: List[Dict[str, Any]], k: int, lambda_mult: float) -> List[Dict[str, Any]]:
+    """以 score 为相关度、已存储的向量为相似度，从候选中选出 k 条彼此不重复的片段"""
+    if len(hits) <= k:
+        return hits
+    try:
+        embeddings = store.get_embeddings([hit["id"] for hit in hits])
+    except Exception as e:
+        logging.warning(f"Load stored embeddings for MMR failed: {e}")
+        return hits[:k]
+    hits = [hit for hit in hits if hit["id"] in embeddings]
+    order = mmr_select([embeddings[hit["id"]] for hit in hits], k, lambda_mult,
+                       relevance=[hit["score"] for hit in hits])
+    return [hits[i] for i in order]
+
+def _search_store(store, queries: List[str], vectors: List[List[float]], k: int,
+                  where: Optional[Dict[str, Any]], mmr_lambda: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+    """
+    对每个查询检索至多 k 条，按 score 从高到低（经 MMR 重排时按选中顺序）。
+    仅向量检索时 score = 1 / (1 + distance)；混合检索时为 RRF 融合分数。
+    查询向量为空（Embedding 失败）时该查询只使用 BM25 结果。
+    mmr_lambda（默认见 mmr.get_mmr_lambda）小于 1 时先取 k × MMR_FETCH_FACTOR 个候选，再用 MMR 去掉近似重复的片段。
+    """
+    where = _effective_filter(store, where)
+    mmr_lambda = get_mmr_lambda() if mmr_lambda is None else mmr_lambda
+    pool = k * get_mmr_fetch_factor() if mmr_lambda < 1.0 else k
+    hybrid = hybrid_retrieval_enabled()
+    depth = max(pool * HYBRID_CANDIDATE_FACTOR, HYBRID_MIN_CANDIDATES) if hybrid else pool
+    vector_rows: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    valid = [i for i, v in enumerate(vectors) if v]
+    if valid:
+        for i, hits in zip(valid, store.query_by_vectors([vectors[i] for i in valid], depth, where=where)):
+            vector_rows[i] = hits
+    if len(valid) < len(queries):
+        logging.warning("Embedding of some retrieval queries failed.")
+    if not hybrid:
+        candidates = [[dict(hit, score=1.0 / (1.0 + hit["distance"])) for hit in hits] for hits in vector_rows]
+    else:
+        try:
+            lexical_rows = store.lexical_search(list(queries), depth, where=where)
+        except Exception as e:
+            logging.warning(f"Lexical search failed: {e}")
+            lexical_rows = [[] for _ in queries]
+        candidates = [_fuse_rankings(v, l, pool) for v, l in zip(vector_rows, lexical_rows)]
+    if pool == k:
+        return candidates
+    return [_mmr_rerank(store, hits, k, mmr_lambda) for hits in candidates]
+
+def get_relevant_context_from_vector_store(embedding_adapter, query: str, filepath: str, k: int = 2,
+                                           where: Optional[Dict[str, Any]] = None,
+                                           mmr_lambda: Optional[float] = None) -> str:
     """
     从向量库中检索与 query 最相关的 k 条文本，拼接后返回。
+    默认融合向量检索与 BM25 检索，并用 MMR 去掉近似重复的片段（见 _search_store），人名、地名等专有名词可精确命中。
+    where 为元数据过滤条件（如 build_recency_filter 的结果），在检索时生效；mmr_lambda 为 1 时不做去重。
     如果向量库加载/检索失败，则返回空字符串。
     最终只返回最多2000字符的检索片段。
     """
@@ -241,11 +570,12 @@ def get_relevant_context_from_vector_store(embedding_adapter, query: str, filepa
         return ""
 
     try:
-        docs = store.similarity_search(query, k=k)
-        if not docs:
+        vector = store.embeddings.embed_query(query)
+        hits = _search_store(store, [query], [vector], k, where, mmr_lambda)[0]
+        if not hits:
             logging.info(f"No relevant documents found for query '{query}'. Returning empty context.")
             return ""
-        combined = "\n".join([d.page_content for d in docs])
+        combined = "\n".join([hit["content"] for hit in hits])
         if len(combined) > 2000:
             combined = combined[:2000]
         return combined
@@ -254,6 +584,49 @@ def get_relevant_context_from_vector_store(embedding_adapter, query: str, filepa
         traceback.print_exc()
         return ""
 
+def get_relevant_contexts_batch(embedding_adapter, queries: List[str], filepath: str, k: int = 2,
+                                where: Optional[Dict[str, Any]] = None,
+                                mmr_lambda: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+    """
+    一次检索多个查询：所有查询通过一次 embed_documents 得到向量，再用一次向量查询检索（混合检索时另加 BM25）。
+    返回与 queries 等长的列表，每项为该查询命中的 [{"id", "content", "metadata", "distance", "bm25", "score"}]，
+    按 score 从高到低。where 为元数据过滤条件，随查询下推，返回的每个结果都满足条件；
+    mmr_lambda 控制 MMR 去重（见 _search_store）。
+    同一片段被多个查询命中时只保留在 score 最高的那个查询中。
+    distance 为后端返回的距离（越小越相关），bm25 为 BM25 分数，未被该路检索命中时为 None；
+    score 见 _search_store（0~1，越大越相关）。
+    向量库不存在或检索失败时各查询返回空列表。
+    """
+    results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    if not queries:
+        return results
+    store = load_vector_store(embedding_adapter, filepath)
+    if not store:
+        logging.info("No vector store found or load failed. Returning empty contexts.")
+        return results
+
+    try:
+        vectors = store.embeddings.embed_documents(list(queries))
+        if not isinstance(vectors, list) or len(vectors) != len(queries):
+            vectors = [[] for _ in queries]
+        rows = _search_store(store, list(queries), vectors, k, where, mmr_lambda)
+
+        # 每个片段归属到 score 最高的查询
+        best: Dict[str, tuple] = {}
+        for query_index, hits in enumerate(rows):
+            for hit in hits:
+                if hit["id"] not in best or hit["score"] > best[hit["id"]][1]["score"]:
+                    best[hit["id"]] = (query_index, hit)
+        for query_index, hit in best.values():
+            results[query_index].append(hit)
+        for hits in results:
+            hits.sort(key=lambda hit: -hit["score"])
+        return results
+    except Exception as e:
+        logging.warning(f"Batch similarity search failed: {e}")
+        traceback.print_exc()
+        return [[] for _ in queries]
+
 def _get_sentence_transformer(model_name: str = 'paraphrase-MiniLM-L6-v2'):
     """获取sentence transformer模型，处理SSL问题"""
     try:
@@ -0,0 +1,352 @@
+# retry_policy.py
+# -*- coding: utf-8 -*-
+"""
+统一的重试与截止时间策略
+- classify_error：把异常分为可重试 / 不可重试（认证失败、请求参数错误、熔断中、截止时间已到等）
+- deadline_scope / stage_deadline：为流水线的一个阶段设置截止时间，嵌套时取更早的那个；
+  通过 contextvars 传递，asyncio 任务与 asyncio.to_thread 会自动继承
+- RetryPolicy：各层（LLM 调用、HTTP 请求、多方法回退、向量库 Embedding）共用的重试循环，
+  任何一层的退避等待都不会超过阶段剩余时间，并按层统计尝试次数
+"""
+
+import time
+import asyncio
+import inspect
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable
+
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+# 这些 HTTP 状态码表示服务端暂时不可用或限流，值得重试；其余 4xx 重试也不会成功
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+# 编程错误，重试没有意义
+FATAL_EXCEPTION_TYPES = (TypeError, AttributeError, NameError, ImportError, NotImplementedError, AssertionError)
+
+# 各流水线阶段的截止时间（秒），默认 0 表示不限制；在 config.json 的 retry_policy.stage_deadlines 中按需开启。
+# architecture 与 blueprint 的截止时间覆盖整个阶段的全部分段调用，长篇小说应按分段数留足时间；
+# draft 只覆盖正文生成调用，提示词构建由 prompt 阶段单独计时。
+DEFAULT_STAGE_DEADLINES = {
+    "architecture": 0,
+    "blueprint": 0,
+    "prompt": 0,
+    "draft": 0,
+    "finalize": 0,
+    "enrich": 0,
+}
+
+
+class DeadlineExceededError(TimeoutError):
+    """阶段截止时间已到，不再发起新的尝试"""
+    retryable = False
+
+
+def _status_code_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    判断异常是否值得重试。
+    异常可以通过 retryable 属性显式声明；包装后的异常沿 __cause__ 查找原始原因；
+    HTTP 状态码 408/409/425/429 与 5xx 可重试，其它 4xx 不可重试；
+    超时、连接错误以及无法识别的异常默认可重试。
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        retryable = getattr(error, "retryable", None)
+        if retryable is not None:
+            return RETRYABLE if retryable else FATAL
+        status = _status_code_of(error)
+        if status is not None:
+            if status in RETRYABLE_STATUS_CODES or status >= 500:
+                return RETRYABLE
+            if 400 <= status < 500:
+                return FATAL
+        if isinstance(error, FATAL_EXCEPTION_TYPES):
+            return FATAL
+        error = error.__cause__
+    return RETRYABLE
+
+
+class Deadline:
+    """某个阶段的截止时间（基于 time.monotonic）"""
+
+    def __init__(self, seconds: float, stage: str = ""):
+        self.stage = stage
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp_timeout(self, timeout):
+        """把单次请求的超时限制在剩余时间内；(connect, read) 元组等复杂超时原样返回"""
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, (int, float)):
+            return min(timeout, remaining)
+        return timeout
+
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("retry_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前上下文的截止时间；未设置时返回 None"""
+    return _current_deadline.get()
+
+
+def clamp_timeout(timeout):
+    """按当前截止时间收紧请求超时；没有截止时间时原样返回"""
+    deadline = current_deadline()
+    return deadline.clamp_timeout(timeout) if deadline is not None else timeout
+
+
+def check_deadline():
+    """截止时间已到时抛出 DeadlineExceededError"""
+    deadline = current_deadline()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceededError(f"阶段 {deadline.stage or '未命名'} 已超过截止时间")
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float], stage: str = ""):
+    """
+    在上下文内设置截止时间。嵌套时不会超过外层剩余时间；seconds 为空或非正数时沿用外层。
+    """
+    outer = current_deadline()
+    if not seconds or seconds <= 0:
+        yield outer
+        return
+    deadline = Deadline(seconds, stage)
+    if outer is not None and outer.expires_at <= deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+_stage_deadlines: Dict[str, float] = dict(DEFAULT_STAGE_DEADLINES)
+_current_stage: contextvars.ContextVar = contextvars.ContextVar("retry_stage", default="")
+
+
+def current_stage() -> str:
+    """当前所在的流水线阶段（由 stage_deadline 装饰器设置），未设置时为空字符串"""
+    return _current_stage.get()
+
+
+def configure_retry_policy(settings: Dict[str, Any]):
+    """
+    应用 config.json 中的 retry_policy 配置：
+        "retry_policy": {"stage_deadlines": {"draft": 1200, "finalize": 900, ...}}
+    阶段截止时间设为 0（默认）表示不限制。
+    """
+    for stage, seconds in (settings or {}).get("stage_deadlines", {}).items():
+        _stage_deadlines[stage] = float(seconds)
+
+
+def get_stage_deadline(stage: str) -> Optional[float]:
+    return _stage_deadlines.get(stage)
+
+
+def stage_deadline(stage: str):
+    """
+    装饰器：被装饰的函数（同步或异步）在对应阶段的截止时间内运行，并把阶段名记为 current_stage()。
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_stage.set(stage)
+                try:
+                    with deadline_scope(get_stage_deadline(stage), stage):
+                        return await func(*args, **kwargs)
+                finally:
+                    _current_stage.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_stage.set(stage)
+            try:
+                with deadline_scope(get_stage_deadline(stage), stage):
+                    return func(*args, **kwargs)
+            finally:
+                _current_stage.reset(token)
+        return wrapper
+    return decorator
+
+
+_retry_stats: Dict[str, Dict[str, int]] = {}
+_retry_stats_lock = threading.Lock()
+
+_STAT_KEYS = ("calls", "attempts", "retries", "successes", "fatal", "exhausted", "deadline_exceeded")
+
+
+def _record(layer: str, key: str):
+    with _retry_stats_lock:
+        stats = _retry_stats.get(layer)
+        if stats is None:
+            stats = dict.fromkeys(_STAT_KEYS, 0)
+            _retry_stats[layer] = stats
+        stats[key] += 1
+
+
+_retry_trackers: contextvars.ContextVar = contextvars.ContextVar("retry_trackers", default=())
+
+
+@contextmanager
+def track_retries():
+    """
+    统计上下文内各层发生的重试次数（包括 asyncio.to_thread 等继承了上下文的线程）：
+        with track_retries() as retries:
+            ...
+        retries["count"]
+    """
+    counter = {"count": 0}
+    token = _retry_trackers.set(_retry_trackers.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _retry_trackers.reset(token)
+
+
+def get_retry_stats() -> Dict[str, Dict[str, int]]:
+    """按层统计的调用次数、尝试次数、重试次数以及放弃原因"""
+    with _retry_stats_lock:
+        return {layer: dict(stats) for layer, stats in _retry_stats.items()}
+
+
+def reset_retry_stats():
+    with _retry_stats_lock:
+        _retry_stats.clear()
+
+
+class RetryPolicy:
+    """
+    单层重试策略。
+    调用方可以直接使用 call / acall，也可以在自己的循环中组合
+    begin_attempt → record_success / next_delay，以保留原有的日志与结果处理。
+    """
+
+    def __init__(
+        self,
+        layer: str,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        backoff: float = 2.0,
+        classify: Callable[[BaseException], str] = classify_error
+    ):
+        self.layer = layer
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.classify = classify
+
+    def backoff_delay(self, attempt: int) -> float:
+        """第 attempt 次（从 1 开始）失败后的退避时间"""
+        return min(self.max_delay, self.base_delay * (self.backoff ** (attempt - 1)))
+
+    def begin_attempt(self, attempt: int):
+        """开始第 attempt 次尝试；截止时间已到时抛出 DeadlineExceededError"""
+        if attempt == 1:
+            _record(self.layer, "calls")
+        try:
+            check_deadline()
+        except DeadlineExceededError:
+            _record(self.layer, "deadline_exceeded")
+            raise
+        _record(self.layer, "attempts")
+
+    def record_success(self):
+        _record(self.layer, "successes")
+
+    def next_delay(self, attempt: int, error: Optional[BaseException] = None, delay: Optional[float] = None) -> Optional[float]:
+        """
+        第 attempt 次尝试失败后决定是否重试。
+        error 为空表示结果不可用（如空响应）；delay 可指定等待时间（如 Retry-After）。
+        返回重试前应等待的秒数，不应再重试时返回 None。
+        """
+        if error is not None and self.classify(error) == FATAL:
+            _record(self.layer, "fatal")
+            return None
+        if attempt >= self.max_attempts:
+            _record(self.layer, "exhausted")
+            return None
+        if delay is None:
+            delay = self.backoff_delay(attempt)
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() <= delay:
+            # 等待后已没有时间再尝试
+            _record(self.layer, "deadline_exceeded")
+            return None
+        _record(self.layer, "retries")
+        for counter in _retry_trackers.get():
+            counter["count"] += 1
+        return delay
+
+    def call(self, func: Callable, *args, retry_on_result: Optional[Callable[[Any], bool]] = None, **kwargs) -> Any:
+        """
+        执行 func，失败时按策略重试；retry_on_result(result) 为真时也视为失败。
+        放弃时抛出最后一次的异常；结果不可用时返回最后一次的结果。
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.begin_attempt(attempt)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                logging.warning(f"[{self.layer}] 第 {attempt} 次尝试失败: {e}")
+                delay = self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+            else:
+                if retry_on_result is None or not retry_on_result(result):
+                    self.record_success()
+                    return result
+                delay = self.next_delay(attempt)
+                if delay is None:
+                    return result
+            if delay > 0:
+                time.sleep(delay)
+
+    async def acall(self, func: Callable, *args, retry_on_result: Optional[Callable[[Any], bool]] = None, **kwargs) -> Any:
+        """call 的异步版本，func 为协程函数"""
+        attempt = 0
+        while True:
+            attempt += 1
+            self.begin_attempt(attempt)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                logging.warning(f"[{self.layer}] 第 {attempt} 次尝试失败: {e}")
+                delay = self.next_delay(attempt, e)
+                if delay is None:
+                    raise
+            else:
+                if retry_on_result is None or not retry_on_result(result):
+                    self.record_success()
+                    return result
+                delay = self.next_delay(attempt)
+                if delay is None:
+                    return result
+            if delay > 0:
+                await asyncio.sleep(delay)
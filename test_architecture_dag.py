@@ -0,0 +1,126 @@
+# test_architecture_dag.py
+# -*- coding: utf-8 -*-
+"""
+测试架构生成的依赖图并发执行与 partial_architecture.json 断点续传
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import tempfile
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from novel_generator import architecture
+from utils import read_file
+
+STEP_DELAY = 0.2
+
+# 用各提示词模板中独有的片段识别步骤
+_STEP_MARKERS = [
+    ("plot", "三幕"),
+    ("state", "角色状态文档"),
+    ("world", "世界观："),
+    ("world", "核心冲突"),
+    ("dynamics", "核心角色"),
+    ("seed", "雪花写作法"),
+]
+
+
+class _StepAdapter:
+    """每次调用耗时 STEP_DELAY，按步骤返回固定文本；empty_steps 中的步骤返回空结果"""
+    model_name = "mock-architect"
+
+    def __init__(self, empty_steps=()):
+        self.empty_steps = set(empty_steps)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _step_of(self, prompt: str) -> str:
+        for name, marker in _STEP_MARKERS:
+            if marker in prompt:
+                return name
+        return "unknown"
+
+    def invoke(self, prompt: str) -> str:
+        step = self._step_of(prompt)
+        with self._lock:
+            self.calls.append(step)
+        if step in self.empty_steps:
+            return ""
+        time.sleep(STEP_DELAY)
+        return f"{step} 的结果"
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.invoke, prompt)
+
+
+def _generate(adapter: _StepAdapter, filepath: str, use_async: bool = False) -> float:
+    original = architecture.create_llm_adapter
+    architecture.create_llm_adapter = lambda **kwargs: adapter
+    kwargs = dict(
+        interface_format="OpenAI", api_key="sk", base_url="http://mock/v1", llm_model="m",
+        topic="旧案重启", genre="悬疑", number_of_chapters=3, word_number=800, filepath=filepath
+    )
+    start = time.perf_counter()
+    try:
+        if use_async:
+            asyncio.run(architecture.Novel_architecture_generate_async(**kwargs))
+        else:
+            architecture.Novel_architecture_generate(**kwargs)
+    finally:
+        architecture.create_llm_adapter = original
+    return time.perf_counter() - start
+
+
+def test_independent_steps_run_concurrently():
+    filepath = tempfile.mkdtemp(prefix="arch_")
+    adapter = _StepAdapter()
+    elapsed = _generate(adapter, filepath)
+
+    # 5 次调用按依赖分为 3 层：种子 → (角色, 世界观) → (角色状态, 情节)
+    assert sorted(adapter.calls) == sorted(["seed", "dynamics", "world", "state", "plot"])
+    assert elapsed < STEP_DELAY * 4
+    content = read_file(os.path.join(filepath, "Novel_architecture.txt"))
+    assert "world 的结果" in content and "plot 的结果" in content
+    assert read_file(os.path.join(filepath, "character_state.txt")) == "state 的结果"
+    assert not os.path.exists(os.path.join(filepath, "partial_architecture.json"))
+
+
+def test_async_independent_steps_run_concurrently():
+    filepath = tempfile.mkdtemp(prefix="arch_")
+    adapter = _StepAdapter()
+    elapsed = _generate(adapter, filepath, use_async=True)
+
+    assert len(adapter.calls) == 5
+    assert elapsed < STEP_DELAY * 4
+    assert os.path.exists(os.path.join(filepath, "Novel_architecture.txt"))
+
+
+def test_failure_keeps_concurrent_progress_and_resumes():
+    filepath = tempfile.mkdtemp(prefix="arch_")
+    _generate(_StepAdapter(empty_steps=["world"]), filepath)
+
+    partial_file = os.path.join(filepath, "partial_architecture.json")
+    with open(partial_file, encoding="utf-8") as f:
+        partial = json.load(f)
+    # 世界观失败时，并发中的角色动力学仍然完成并保存；之后不再启动新步骤
+    assert set(partial) == {"core_seed_result", "character_dynamics_result"}
+    assert not os.path.exists(os.path.join(filepath, "Novel_architecture.txt"))
+
+    adapter = _StepAdapter()
+    _generate(adapter, filepath)
+    assert sorted(adapter.calls) == sorted(["world", "state", "plot"])
+    assert os.path.exists(os.path.join(filepath, "Novel_architecture.txt"))
+    assert not os.path.exists(partial_file)
+
+
+if __name__ == "__main__":
+    test_independent_steps_run_concurrently()
+    test_async_independent_steps_run_concurrently()
+    test_failure_keeps_concurrent_progress_and_resumes()
+    print("✅ 所有架构依赖图测试通过")
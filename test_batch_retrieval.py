@@ -0,0 +1,103 @@
+# test_batch_retrieval.py
+# -*- coding: utf-8 -*-
+"""
+测试多关键词组的批量检索：一次 Embedding、一次查询、跨组去重、相关度分数与分类标签
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from embedding_adapters import BaseEmbeddingAdapter
+from mock_llm_server import fake_embedding
+from novel_generator.vectorstore_utils import (
+    init_vector_store, get_relevant_contexts_batch, get_relevant_context_from_vector_store
+)
+from novel_generator.chapter import _retrieve_keyword_contexts
+
+DIM = 32
+TEXTS = [
+    "倒叙手法：先写结局再回到开头，制造悬念。",
+    "世界观设定：港城的钟楼每晚十二点停摆。",
+    "林默在旧港口找到了一封没有署名的信。",
+    "沈青把钥匙藏进了钟楼顶层的木箱。",
+    "雨夜里，车站的灯忽明忽暗。",
+]
+
+
+class _RecordingEmbeddingAdapter(BaseEmbeddingAdapter):
+    interface_format = "mock"
+    model_name = "mock-embedding"
+
+    def __init__(self):
+        self.document_calls = []
+        self.query_calls = []
+
+    def embed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        return [fake_embedding(t, DIM) for t in texts]
+
+    def embed_query(self, query):
+        self.query_calls.append(query)
+        return fake_embedding(query, DIM)
+
+
+def _project(adapter=None) -> str:
+    filepath = tempfile.mkdtemp(prefix="batch_retrieval_")
+    init_vector_store(adapter or _RecordingEmbeddingAdapter(), TEXTS, filepath)
+    return filepath
+
+
+def test_single_embedding_call_for_all_groups():
+    # 注册表复用建库时的实例，检索的 Embedding 调用记录在同一个适配器上
+    adapter = _RecordingEmbeddingAdapter()
+    filepath = _project(adapter)
+    adapter.document_calls.clear()
+    queries = ["倒叙手法", "钟楼设定", "旧港口的信"]
+    results = get_relevant_contexts_batch(adapter, queries, filepath, k=1)
+
+    assert adapter.document_calls == [queries]
+    assert adapter.query_calls == []
+    assert len(results) == 3
+    for query, hits in zip(queries, results):
+        assert len(hits) == 1
+        assert 0.0 <= hits[0]["score"] <= 1.0
+        # 与逐条检索的最相关结果一致
+        assert hits[0]["content"] == get_relevant_context_from_vector_store(adapter, query, filepath, k=1)
+
+
+def test_hits_shared_across_groups_are_deduplicated():
+    filepath = _project()
+    results = get_relevant_contexts_batch(_RecordingEmbeddingAdapter(), ["钟楼", "钟楼钥匙"], filepath, k=3)
+
+    ids = [hit["id"] for hits in results for hit in hits]
+    assert len(ids) == len(set(ids))
+    for hits in results:
+        scores = [hit["score"] for hit in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_missing_store_returns_empty_groups():
+    filepath = tempfile.mkdtemp(prefix="batch_retrieval_")
+    assert get_relevant_contexts_batch(_RecordingEmbeddingAdapter(), ["甲", "乙"], filepath) == [[], []]
+
+
+def test_keyword_contexts_keep_category_tags():
+    filepath = _project()
+    contexts = _retrieve_keyword_contexts(
+        _RecordingEmbeddingAdapter(), filepath, ["倒叙手法", "世界观设定", "旧港口的信"], retrieval_k=1
+    )
+
+    assert [c.split(" ", 1)[0] for c in contexts] == ["[TECHNIQUE]", "[SETTING]", "[GENERAL]"]
+    assert "倒叙" in contexts[0]
+
+
+if __name__ == "__main__":
+    test_single_embedding_call_for_all_groups()
+    test_hits_shared_across_groups_are_deduplicated()
+    test_missing_store_returns_empty_groups()
+    test_keyword_contexts_keep_category_tags()
+    print("✅ 所有批量检索测试通过")
@@ -0,0 +1,169 @@
+# test_chapter_upsert.py
+# -*- coding: utf-8 -*-
+"""
+测试章节级 upsert：重复定稿不增加片段、重写章节后旧片段被替换、未变化的片段不重新请求 Embedding、
+其他章节与知识库片段不受影响、两种后端的删除（含 NumPy 后端压缩中断后的恢复）与倒排索引同步
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import fake_embedding, MockEmbeddingAdapter
+from novel_generator.lexical_index import LexicalIndex, LEXICAL_INDEX_FILE
+from novel_generator.vector_backends import (
+    open_vector_backend, NumpyVectorStore, NUMPY_INDEX_FILE, NUMPY_SEGMENTS_FILE, NUMPY_VECTORS_FILE
+)
+from novel_generator.vectorstore_utils import (
+    init_vector_store, update_vector_store, upsert_chapter_segments, load_vector_store, get_vectorstore_dir,
+    split_text_for_vectorstore, build_segment_metadata, build_segment_ids, SOURCE_KNOWLEDGE
+)
+
+DIM = 16
+
+
+def _chapter(n: int, scenes: int = 40) -> str:
+    return "".join(f"第{n}章第{i}幕：林默沿着旧港口的石阶往下走，潮水拍打着生锈的铁链，远处的灯塔一明一灭。" for i in range(scenes))
+
+
+def _chapter_contents(store, chapter_number: int):
+    data = store.get_all(where={"chapter_number": {"$eq": chapter_number}})
+    return sorted(zip(data["metadatas"], data["documents"]), key=lambda item: item[0]["segment_index"])
+
+
+def _project():
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    return tempfile.mkdtemp(prefix="upsert_")
+
+
+def teardown_function(function):
+    os.environ.pop("EMBEDDING_CACHE_ENABLED", None)
+
+
+def test_segment_ids_are_deterministic():
+    metadatas = build_segment_metadata(["甲", "乙"], "chapter", 37)
+    ids = build_segment_ids(metadatas)
+    assert ids == build_segment_ids(build_segment_metadata(["甲", "乙"], "chapter", 37))
+    assert ids[0].startswith("chapter-37-0-") and ids[1].startswith("chapter-37-1-")
+    changed = build_segment_ids(build_segment_metadata(["甲", "丙"], "chapter", 37))
+    assert changed[0] == ids[0] and changed[1] != ids[1]
+
+
+def test_refinalizing_replaces_chapter_segments():
+    filepath = _project()
+    adapter = MockEmbeddingAdapter()
+    knowledge = ["钟楼设定：沈青是钟楼的守夜人。"]
+    init_vector_store(adapter, knowledge, filepath, build_segment_metadata(knowledge, SOURCE_KNOWLEDGE))
+    for n in (1, 2):
+        update_vector_store(adapter, _chapter(n), filepath, chapter_number=n)
+    store = load_vector_store(adapter, filepath)
+    total = store.count()
+    segments = len(split_text_for_vectorstore(_chapter(2)))
+    assert segments >= 3
+
+    # 原样重新定稿：片段数不变，也不请求 Embedding
+    adapter.texts.clear()
+    update_vector_store(adapter, _chapter(2), filepath, chapter_number=2)
+    assert store.count() == total
+    assert adapter.texts == []
+
+    # 重写第 2 章：只保留新版本
+    rewritten = _chapter(2, scenes=5) + "沈青在灯塔下等了一整夜。"
+    update_vector_store(adapter, rewritten, filepath, chapter_number=2)
+    assert [content for _, content in _chapter_contents(store, 2)] == split_text_for_vectorstore(rewritten)
+    assert len(_chapter_contents(store, 1)) == len(split_text_for_vectorstore(_chapter(1)))
+    assert store.count(where={"source": {"$eq": SOURCE_KNOWLEDGE}}) == 1
+
+    # 倒排索引同步删除了旧片段
+    index = LexicalIndex(os.path.join(get_vectorstore_dir(filepath), LEXICAL_INDEX_FILE))
+    assert index.count() == store.count()
+    assert not [hit for hit in index.search("第2章第11幕", 50) if "第2章第11幕" in hit["content"]]
+    index.close()
+
+
+def test_unchanged_segments_skip_embedding():
+    filepath = _project()
+    adapter = MockEmbeddingAdapter()
+    update_vector_store(adapter, _chapter(5), filepath, chapter_number=5)
+    store = load_vector_store(adapter, filepath)
+    old_segments = split_text_for_vectorstore(_chapter(5))
+
+    # 末尾追加一句：前面的片段 id 不变，只有最后一个片段需要重新计算
+    adapter.texts.clear()
+    appended = _chapter(5) + "潮水退去。"
+    stats = upsert_chapter_segments(store, split_text_for_vectorstore(appended), 5)
+    new_segments = split_text_for_vectorstore(appended)
+    assert len(new_segments) == len(old_segments)   # 追加的句子并入最后一个片段
+    assert stats["unchanged"] == len(new_segments) - 1
+    assert adapter.texts == [new_segments[-1]]
+    assert stats["removed"] == 1
+
+    # 片段顺序调换：内容没变，复用已存储的向量
+    adapter.texts.clear()
+    stats = upsert_chapter_segments(store, list(reversed(new_segments)), 5)
+    assert adapter.texts == []
+    assert stats["reused"] >= len(new_segments) - 1
+    assert store.count() == len(new_segments)
+
+
+def test_backends_delete_and_upsert():
+    for backend in ("numpy", "chroma"):
+        store = open_vector_backend(tempfile.mkdtemp(prefix=f"upsert_{backend}_"), None, backend)
+        texts = [f"片段{i}：雨夜里车站的灯忽明忽暗。" for i in range(6)]
+        store.add_embeddings([f"s{i}" for i in range(6)], texts, [fake_embedding(t, DIM) for t in texts],
+                             [{"chapter_number": i} for i in range(6)])
+        assert store.delete(["s1", "s4", "missing"]) == 2
+        store.add_embeddings(["s0"], ["新的片段0"], [fake_embedding("新的片段0", DIM)], [{"chapter_number": 0}])
+        data = store.get_all()
+        assert sorted(data["ids"]) == ["s0", "s2", "s3", "s5"]
+        assert store.get_all(where={"chapter_number": {"$eq": 0}})["documents"] == ["新的片段0"]
+        hit = store.query_by_vectors([fake_embedding(texts[3], DIM)], 1)[0][0]
+        assert hit["id"] == "s3" and hit["distance"] < 1e-3
+        assert store.lexical_search(["新的片段"], 1)[0][0]["id"] == "s0"
+        store.close()
+
+
+def test_numpy_compaction_resumes_after_interruption():
+    store_dir = tempfile.mkdtemp(prefix="upsert_numpy_")
+    texts = [f"片段{i}" for i in range(10)]
+    store = open_vector_backend(store_dir, None, "numpy")
+    store.add_embeddings([f"s{i}" for i in range(10)], texts, [fake_embedding(t, DIM) for t in texts],
+                         [{} for _ in texts])
+    store.close()
+
+    # 在副本上完成一次删除，把结果作为 .tmp 文件放回，模拟替换文件前中断
+    compacted_dir = store_dir + "_compacted"
+    shutil.copytree(store_dir, compacted_dir)
+    compacted = NumpyVectorStore(compacted_dir, None)
+    compacted.delete(["s0", "s5"])
+    compacted.close()
+    for name in (NUMPY_SEGMENTS_FILE, NUMPY_VECTORS_FILE):
+        shutil.copy(os.path.join(compacted_dir, name), os.path.join(store_dir, name + ".tmp"))
+    with open(os.path.join(compacted_dir, NUMPY_INDEX_FILE), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    index["compacting"] = True
+    with open(os.path.join(store_dir, NUMPY_INDEX_FILE), "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+    reopened = NumpyVectorStore(store_dir, None)
+    assert reopened.count() == 8
+    assert "s0" not in reopened.get_all()["ids"]
+    assert reopened.query_by_vectors([fake_embedding("片段7", DIM)], 1)[0][0]["id"] == "s7"
+    with open(os.path.join(store_dir, NUMPY_INDEX_FILE), "r", encoding="utf-8") as f:
+        assert "compacting" not in json.load(f)
+
+
+if __name__ == "__main__":
+    test_segment_ids_are_deterministic()
+    test_refinalizing_replaces_chapter_segments()
+    teardown_function(None)
+    test_unchanged_segments_skip_embedding()
+    teardown_function(None)
+    test_backends_delete_and_upsert()
+    test_numpy_compaction_resumes_after_interruption()
+    print("✅ 所有章节 upsert 测试通过")
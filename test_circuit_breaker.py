@@ -0,0 +1,141 @@
+# test_circuit_breaker.py
+# -*- coding: utf-8 -*-
+"""
+测试端点熔断与按角色的故障转移
+"""
+
+import os
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from network_manager import CircuitBreaker, CircuitOpenError, apply_network_config, get_failover_chain
+from llm_adapters import BaseLLMAdapter, ManagedLLMAdapter, FailoverLLMAdapter
+
+
+class _ScriptedAdapter(BaseLLMAdapter):
+    """按预设返回结果的适配器；结果为异常实例时抛出"""
+    def __init__(self, model_name, results, delay=0.0):
+        self.model_name = model_name
+        self.results = list(results)
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt: str) -> str:
+        self.calls += 1
+        time.sleep(self.delay)
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_breaker_opens_and_half_opens():
+    """连续失败后熔断，到期后只放行一个探测请求，探测成功即恢复"""
+    breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=0.1, slow_call_seconds=1.0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.15)
+    assert breaker.allow_request()       # 半开探测
+    assert not breaker.allow_request()   # 探测进行中，其余请求拒绝
+    breaker.record_success(0.05)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_success(5.0)          # 超出延迟 SLO 按失败计
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_managed_adapter_fails_fast_when_open():
+    """熔断后包装适配器直接拒绝，不再调用后端"""
+    inner = _ScriptedAdapter("breaker-model", ["[网络错误] 连接失败"])
+    adapter = ManagedLLMAdapter(inner, "https://breaker.example.com/v1", "sk")
+    breaker = adapter.breaker
+    breaker.failure_threshold = 2
+    adapter.invoke("a")
+    adapter.invoke("b")
+    try:
+        adapter.invoke("c")
+        assert False, "熔断状态下应抛出 CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    assert inner.calls == 2
+
+
+def test_stream_error_string_counts_as_failure():
+    """流式调用只产出错误字符串时同样计入熔断器"""
+    inner = _ScriptedAdapter("stream-breaker-model", ["[API错误] 服务不可用"])
+    adapter = ManagedLLMAdapter(inner, "https://stream-breaker.example.com/v1", "sk")
+    adapter.breaker.failure_threshold = 2
+    assert "".join(adapter.invoke_stream("a")).startswith("[API错误]")
+    assert "".join(adapter.invoke_stream("b")).startswith("[API错误]")
+    assert adapter.breaker.state == CircuitBreaker.OPEN
+    try:
+        list(adapter.invoke_stream("c"))
+        assert False, "熔断状态下应抛出 CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    assert inner.calls == 2
+
+
+def test_breaker_is_keyed_by_configured_model():
+    """内部适配器不设置 model_name 时，按配置的模型区分熔断器：同一主机上一个模型熔断不影响其他模型"""
+    class _BareAdapter(BaseLLMAdapter):
+        def invoke(self, prompt: str) -> str:
+            return "[API错误] 模型不可用"
+
+    url = "https://breaker-models.example.com/v1"
+    failing = ManagedLLMAdapter(_BareAdapter(), url, "sk", "deepseek-reasoner", 0.7)
+    other = ManagedLLMAdapter(_ScriptedAdapter("", ["正常"]), url, "sk", "deepseek-chat", 0.7)
+    assert failing.breaker is not other.breaker
+    failing.breaker.failure_threshold = 1
+    failing.invoke("a")
+    assert failing.breaker.state == CircuitBreaker.OPEN
+    assert other.invoke("b") == "正常"
+
+
+def test_failover_skips_failing_and_prefers_fast():
+    """失败端点被跳过；多个健康端点时优先选择延迟更低者"""
+    bad = ManagedLLMAdapter(_ScriptedAdapter("fo-bad", [RuntimeError("boom")]), "https://fo-bad.example.com", "sk")
+    slow = ManagedLLMAdapter(_ScriptedAdapter("fo-slow", ["慢"], delay=0.05), "https://fo-slow.example.com", "sk")
+    fast = ManagedLLMAdapter(_ScriptedAdapter("fo-fast", ["快"]), "https://fo-fast.example.com", "sk")
+    adapter = FailoverLLMAdapter([("bad", bad), ("slow", slow), ("fast", fast)], role="summarize")
+
+    assert adapter.invoke("x") == "慢"   # 尚无延迟数据时按配置顺序，bad 失败后转到 slow
+    fast.invoke("warm up")              # fast 积累延迟数据
+    assert adapter.invoke("x") == "快"
+    assert "".join(adapter.invoke_stream("x")) == "快"
+
+
+def test_failover_chain_from_config():
+    """failover_configs 中的名称解析为对应的 llm_configs 条目"""
+    config = {
+        "llm_configs": {
+            "A": {"base_url": "https://a.example.com/v1", "model_name": "a", "api_key": "k", "interface_format": "OpenAI"},
+            "B": {"base_url": "https://b.example.com/v1", "model_name": "b", "api_key": "k", "interface_format": "OpenAI"}
+        },
+        "failover_configs": {"draft": ["B", "A", "missing"]}
+    }
+    apply_network_config(config)
+    try:
+        chain = get_failover_chain("draft")
+        assert [c["config_name"] for c in chain] == ["B", "A"]
+        assert get_failover_chain("finalize") == []
+    finally:
+        apply_network_config({})
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_half_opens()
+    test_managed_adapter_fails_fast_when_open()
+    test_stream_error_string_counts_as_failure()
+    test_breaker_is_keyed_by_configured_model()
+    test_failover_skips_failing_and_prefers_fast()
+    test_failover_chain_from_config()
+    print("✅ 熔断与故障转移测试通过")
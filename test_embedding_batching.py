@@ -0,0 +1,135 @@
+# test_embedding_batching.py
+# -*- coding: utf-8 -*-
+"""
+测试 Embedding 批量请求：批次切分、结果顺序、旧接口回退、并发上限与失败时的空向量
+"""
+
+import os
+import sys
+import time
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import embedding_adapters
+from embedding_adapters import (
+    OllamaEmbeddingAdapter, SiliconFlowEmbeddingAdapter, GiteeAIEmbeddingAdapter, GeminiEmbeddingAdapter
+)
+from mock_llm_server import MockLLMServer, fake_embedding
+from network_manager import configure_embedding_batching, DEFAULT_EMBEDDING_BATCHING
+
+DIM = 16
+TEXTS = [f"第{i}段知识库文本，内容各不相同{i * 7}" for i in range(70)]
+
+
+def _with_batching(func, **settings):
+    configure_embedding_batching(settings)
+    try:
+        return func()
+    finally:
+        configure_embedding_batching(DEFAULT_EMBEDDING_BATCHING)
+
+
+def _expected(texts):
+    return [fake_embedding(text, DIM) for text in texts]
+
+
+def test_ollama_uses_batch_endpoint_in_order():
+    with MockLLMServer(latency=0, embedding_dim=DIM) as server:
+        adapter = OllamaEmbeddingAdapter("mock-embedding", server.ollama_url)
+        vectors = _with_batching(lambda: adapter.embed_documents(TEXTS), batch_size=32)
+        by_path = server.get_stats()["requests_by_path"]
+
+    assert vectors == _expected(TEXTS)
+    assert by_path.get("/api/embed") == 3
+    assert "/api/embeddings" not in by_path
+
+
+def test_ollama_falls_back_to_single_endpoint():
+    with MockLLMServer(latency=0, embedding_dim=DIM) as server:
+        adapter = OllamaEmbeddingAdapter("mock-embedding", server.ollama_url)
+        adapter._batch_url = lambda: f"{server.ollama_url}/api/embed_missing"
+        vectors = _with_batching(lambda: adapter.embed_documents(TEXTS[:10]), batch_size=4)
+        query = adapter.embed_query(TEXTS[0])
+        by_path = server.get_stats()["requests_by_path"]
+
+    assert vectors == _expected(TEXTS[:10])
+    assert query == _expected(TEXTS[:1])[0]
+    assert adapter._batch_supported is False
+    assert by_path.get("/api/embeddings") == 11
+
+
+def test_openai_style_providers_send_lists():
+    with MockLLMServer(latency=0, embedding_dim=DIM) as server:
+        for adapter in (SiliconFlowEmbeddingAdapter("sk", server.base_url, "mock-embedding"),
+                        GiteeAIEmbeddingAdapter("sk", server.base_url, "mock-embedding")):
+            server.reset_stats()
+            vectors = _with_batching(lambda: adapter.embed_documents(TEXTS), batch_size=25)
+            assert vectors == _expected(TEXTS)
+            assert server.get_stats()["requests"] == 3
+
+
+def test_failures_keep_empty_vector_contract():
+    with MockLLMServer(latency=0, embedding_dim=DIM, error_rate=1.0) as server:
+        for adapter in (OllamaEmbeddingAdapter("mock-embedding", server.ollama_url),
+                        SiliconFlowEmbeddingAdapter("sk", server.base_url, "mock-embedding")):
+            vectors = _with_batching(lambda: adapter.embed_documents(TEXTS[:5]), batch_size=2)
+            assert vectors == [[], [], [], [], []]
+
+
+class _GeminiSession:
+    """模拟 batchEmbedContents 的会话，记录并发请求数"""
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.urls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, json=None, **kwargs):
+        with self._lock:
+            self.urls.append(url)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        session = self
+
+        class _Response:
+            status_code = 200
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                assert all(r["model"] == "models/text-embedding-004" for r in json["requests"])
+                return {"embeddings": [{"values": fake_embedding(r["content"]["parts"][0]["text"], DIM)}
+                                       for r in json["requests"]]}
+        return _Response()
+
+
+def test_gemini_batches_with_bounded_concurrency():
+    session = _GeminiSession()
+    original = embedding_adapters.get_http_session
+    embedding_adapters.get_http_session = lambda use_proxy=False: session
+    try:
+        adapter = GeminiEmbeddingAdapter("key", "text-embedding-004", "https://example.invalid/v1beta/models")
+        vectors = _with_batching(lambda: adapter.embed_documents(TEXTS), batch_size=10, max_workers=2)
+    finally:
+        embedding_adapters.get_http_session = original
+
+    assert vectors == _expected(TEXTS)
+    assert len(session.urls) == 7
+    assert all(url.endswith(":batchEmbedContents?key=key") for url in session.urls)
+    assert session.max_in_flight == 2
+
+
+if __name__ == "__main__":
+    test_ollama_uses_batch_endpoint_in_order()
+    test_ollama_falls_back_to_single_endpoint()
+    test_openai_style_providers_send_lists()
+    test_failures_keep_empty_vector_contract()
+    test_gemini_batches_with_bounded_concurrency()
+    print("✅ 所有 Embedding 批量测试通过")
@@ -0,0 +1,78 @@
+# test_embedding_cache.py
+# -*- coding: utf-8 -*-
+"""
+测试 Embedding 向量持久化缓存：键的区分、LRU 淘汰、统计，以及清空向量库后从缓存重建无需请求接口
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.embedding_cache import EmbeddingCache, get_embedding_cache
+from novel_generator.vectorstore_utils import (
+    init_vector_store, load_vector_store, clear_vector_store, get_relevant_context_from_vector_store
+)
+
+
+def test_cache_keys_eviction_and_stats():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.sqlite"), max_entries=3)
+        cache.set_many("ollama", "m1", [("甲", [0.5, 0.25]), ("乙", [1.0, 2.0]), ("空", [])])
+
+        assert cache.get_many("ollama", "m1", ["乙", "甲", "丙"]) == [[1.0, 2.0], [0.5, 0.25], None]
+        assert cache.get("ollama", "m2", "甲") is None
+        assert cache.get("openai", "m1", "甲") is None
+
+        # 空向量不缓存；"甲" 刚被访问过，再写入两条后超出上限，淘汰最久未访问的 "乙"
+        cache.get("ollama", "m1", "甲")
+        cache.set_many("ollama", "m1", [("丁", [1.0]), ("戊", [2.0])])
+        assert cache.get("ollama", "m1", "乙") is None
+        assert cache.get("ollama", "m1", "甲") == [0.5, 0.25]
+
+        stats = cache.get_stats()
+        assert stats["size"] == 3
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 4
+        assert stats["misses"] == 4
+        cache.close()
+
+
+def test_rebuild_after_clear_needs_no_embedding_calls():
+    filepath = tempfile.mkdtemp(prefix="embed_cache_")
+    texts = ["林默在旧港口找到了一封信。", "沈青把钥匙藏进了钟楼。", "雨夜里，车站的灯忽明忽暗。", "林默在旧港口找到了一封信。"]
+
+    adapter = MockEmbeddingAdapter()
+    assert init_vector_store(adapter, texts, filepath) is not None
+    # 重复的文本只请求一次
+    assert len(adapter.texts) == 3
+
+    assert clear_vector_store(filepath)
+    rebuilt = MockEmbeddingAdapter()
+    assert init_vector_store(rebuilt, texts, filepath) is not None
+    assert rebuilt.texts == []
+
+    context = get_relevant_context_from_vector_store(rebuilt, "钟楼的钥匙", filepath, k=1)
+    assert "钟楼" in context
+    stats = get_embedding_cache(filepath).get_stats()
+    assert stats["hits"] >= 4
+
+
+def test_cache_is_scoped_by_model():
+    filepath = tempfile.mkdtemp(prefix="embed_cache_")
+    init_vector_store(MockEmbeddingAdapter(), ["第一段。", "第二段。"], filepath)
+    clear_vector_store(filepath)
+
+    other_model = MockEmbeddingAdapter(model_name="other-embedding")
+    init_vector_store(other_model, ["第一段。", "第二段。"], filepath)
+    assert other_model.texts == ["第一段。", "第二段。"]
+
+
+if __name__ == "__main__":
+    test_cache_keys_eviction_and_stats()
+    test_rebuild_after_clear_needs_no_embedding_calls()
+    test_cache_is_scoped_by_model()
+    print("✅ 所有 Embedding 缓存测试通过")
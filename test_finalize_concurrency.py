@@ -0,0 +1,166 @@
+# test_finalize_concurrency.py
+# -*- coding: utf-8 -*-
+"""
+测试定稿子步骤并发执行、失败时保留旧文件以及原子写入
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from novel_generator import finalization
+from utils import atomic_write_text, read_file
+
+STEP_DELAY = 0.3
+
+
+class _SlowAdapter:
+    """按提示词区分摘要 / 角色状态，每次调用耗时 STEP_DELAY"""
+    model_name = "mock-finalize"
+
+    def __init__(self, fail_summary: bool = False, error_state: bool = False):
+        self.fail_summary = fail_summary
+        self.error_state = error_state
+
+    def invoke(self, prompt: str) -> str:
+        time.sleep(STEP_DELAY)
+        if "旧摘要" in prompt:
+            if self.fail_summary:
+                raise ValueError("模拟参数错误")
+            return "新摘要"
+        if self.error_state:
+            return "[API错误] 模拟服务不可用"
+        return "新角色状态"
+
+    async def ainvoke(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.invoke, prompt)
+
+
+def _make_project() -> str:
+    filepath = tempfile.mkdtemp(prefix="finalize_")
+    os.makedirs(os.path.join(filepath, "chapters"))
+    atomic_write_text("第一章正文", os.path.join(filepath, "chapters", "chapter_1.txt"))
+    atomic_write_text("旧摘要", os.path.join(filepath, "global_summary.txt"))
+    atomic_write_text("旧角色状态", os.path.join(filepath, "character_state.txt"))
+    return filepath
+
+
+def _patched(adapter, vector_store, func):
+    originals = (finalization.create_llm_adapter, finalization.create_embedding_adapter, finalization.update_vector_store)
+    finalization.create_llm_adapter = lambda **kwargs: adapter
+    finalization.create_embedding_adapter = lambda *args: object()
+    finalization.update_vector_store = vector_store
+    try:
+        return func()
+    finally:
+        (finalization.create_llm_adapter, finalization.create_embedding_adapter,
+         finalization.update_vector_store) = originals
+
+
+def _slow_vector_store(embedding_adapter, new_chapter, filepath, chapter_number=0):
+    time.sleep(STEP_DELAY)
+
+
+def _failing_vector_store(embedding_adapter, new_chapter, filepath, chapter_number=0):
+    time.sleep(STEP_DELAY / 3)
+    raise LookupError("模拟分句资源缺失")
+
+
+def _kwargs(filepath: str) -> dict:
+    return dict(
+        novel_number=1, word_number=800, api_key="sk", base_url="http://mock/v1", model_name="m",
+        temperature=0.7, filepath=filepath, embedding_api_key="sk", embedding_url="http://mock",
+        embedding_interface_format="Ollama", embedding_model_name="e", interface_format="OpenAI",
+        max_tokens=1024, timeout=60
+    )
+
+
+def test_steps_run_concurrently():
+    filepath = _make_project()
+    start = time.perf_counter()
+    timings = _patched(_SlowAdapter(), _slow_vector_store, lambda: finalization.finalize_chapter(**_kwargs(filepath)))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < STEP_DELAY * 2
+    assert set(timings) == {"summary", "character_state", "vector_store"}
+    assert all(seconds >= STEP_DELAY * 0.9 for seconds in timings.values())
+    assert read_file(os.path.join(filepath, "global_summary.txt")) == "新摘要"
+    assert read_file(os.path.join(filepath, "character_state.txt")) == "新角色状态"
+
+
+def test_async_steps_run_concurrently():
+    filepath = _make_project()
+    start = time.perf_counter()
+    timings = _patched(_SlowAdapter(), _slow_vector_store,
+                       lambda: asyncio.run(finalization.finalize_chapter_async(**_kwargs(filepath))))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < STEP_DELAY * 2
+    assert set(timings) == {"summary", "character_state", "vector_store"}
+    assert read_file(os.path.join(filepath, "character_state.txt")) == "新角色状态"
+
+
+def test_failed_step_keeps_old_file_and_raises():
+    filepath = _make_project()
+    try:
+        _patched(_SlowAdapter(fail_summary=True), _slow_vector_store,
+                 lambda: finalization.finalize_chapter(**_kwargs(filepath)))
+        assert False, "应抛出摘要步骤的异常"
+    except ValueError:
+        pass
+    assert read_file(os.path.join(filepath, "global_summary.txt")) == "旧摘要"
+    assert read_file(os.path.join(filepath, "character_state.txt")) == "新角色状态"
+
+
+def test_error_result_keeps_old_file_and_raises():
+    """适配器返回的错误字符串不能写入角色状态文件"""
+    filepath = _make_project()
+    try:
+        _patched(_SlowAdapter(error_state=True), _slow_vector_store,
+                 lambda: finalization.finalize_chapter(**_kwargs(filepath)))
+        assert False, "应抛出角色状态步骤的错误"
+    except RuntimeError as e:
+        assert str(e).startswith("[API错误]")
+    assert read_file(os.path.join(filepath, "character_state.txt")) == "旧角色状态"
+    assert read_file(os.path.join(filepath, "global_summary.txt")) == "新摘要"
+
+
+def test_vector_store_failure_still_saves_summaries():
+    filepath = _make_project()
+    try:
+        _patched(_SlowAdapter(), _failing_vector_store, lambda: finalization.finalize_chapter(**_kwargs(filepath)))
+        assert False, "应抛出向量库步骤的异常"
+    except LookupError:
+        pass
+    assert read_file(os.path.join(filepath, "global_summary.txt")) == "新摘要"
+    assert read_file(os.path.join(filepath, "character_state.txt")) == "新角色状态"
+
+
+def test_atomic_write_keeps_old_content_on_failure():
+    path = os.path.join(tempfile.mkdtemp(prefix="atomic_"), "state.txt")
+    assert atomic_write_text("旧内容", path)
+
+    original_replace = os.replace
+    os.replace = lambda src, dst: (_ for _ in ()).throw(OSError("模拟替换失败"))
+    try:
+        assert not atomic_write_text("新内容", path)
+    finally:
+        os.replace = original_replace
+
+    assert read_file(path) == "旧内容"
+    assert os.listdir(os.path.dirname(path)) == ["state.txt"]
+
+
+if __name__ == "__main__":
+    test_steps_run_concurrently()
+    test_async_steps_run_concurrently()
+    test_failed_step_keeps_old_file_and_raises()
+    test_error_result_keeps_old_file_and_raises()
+    test_vector_store_failure_still_saves_summaries()
+    test_atomic_write_keeps_old_content_on_failure()
+    print("✅ 所有定稿并发测试通过")
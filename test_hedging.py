@@ -0,0 +1,142 @@
+# test_hedging.py
+# -*- coding: utf-8 -*-
+"""
+测试对冲请求：长尾延迟下的触发、预算上限与 p99 改善
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_adapters
+from llm_adapters import BaseLLMAdapter, HedgedLLMAdapter
+from network_manager import HedgePolicy
+
+
+class _TailAdapter(BaseLLMAdapter):
+    """每 slow_every 次调用中有一次慢请求的模拟端点"""
+    def __init__(self, name: str, fast: float = 0.01, slow: float = 0.5, slow_every: int = 0):
+        self.name = name
+        self.fast = fast
+        self.slow = slow
+        self.slow_every = slow_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next_delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.slow_every and calls % self.slow_every == 0:
+            return self.slow
+        return self.fast
+
+    def invoke(self, prompt: str) -> str:
+        time.sleep(self._next_delay())
+        return self.name
+
+    async def ainvoke(self, prompt: str) -> str:
+        await asyncio.sleep(self._next_delay())
+        return self.name
+
+
+def _with_policy(policy: HedgePolicy, func):
+    original = llm_adapters.get_hedge_policy
+    llm_adapters.get_hedge_policy = lambda: policy
+    try:
+        return func()
+    finally:
+        llm_adapters.get_hedge_policy = original
+
+
+def _warm_up(policy: HedgePolicy, count: int = 10):
+    """预先记录若干次快速的主请求延迟，使 p90 可用"""
+    for _ in range(count):
+        policy.observe("mock|m", 0.01)
+
+
+def _policy(**settings) -> HedgePolicy:
+    policy = HedgePolicy()
+    options = dict(enabled=True, roles=["summarize"], min_samples=10, min_delay=0.02, budget_ratio=0.2)
+    options.update(settings)
+    policy.configure(**options)
+    return policy
+
+
+def test_hedge_cuts_tail_latency():
+    """慢请求超过 p90 后由对冲请求先返回，p99 明显低于未对冲时"""
+    policy = _policy()
+    _warm_up(policy)
+    primary = _TailAdapter("primary", slow_every=10)
+    secondary = _TailAdapter("secondary")
+    adapter = HedgedLLMAdapter(primary, secondary, role="summarize", endpoint="mock|m")
+
+    def run():
+        return [adapter.invoke("短提示词") for _ in range(60)]
+
+    results = _with_policy(policy, run)
+    time.sleep(0.6)  # 等待后台落败的主请求完成，记入未对冲延迟
+    stats = policy.get_stats()
+    assert stats['calls'] == 60
+    assert stats['hedges_fired'] >= 3
+    assert stats['hedge_wins'] >= 3
+    assert "secondary" in results
+    assert stats['p99'] < 0.3
+    assert stats['unhedged_p99'] >= 0.5
+    assert stats['p99_saved'] > 0.2
+
+
+def test_hedge_budget_cap():
+    """额外请求数不超过预算比例"""
+    policy = _policy(budget_ratio=0.1)
+    _warm_up(policy, 200)
+    primary = _TailAdapter("primary", slow=0.1, slow_every=2)
+    adapter = HedgedLLMAdapter(primary, _TailAdapter("secondary"), role="summarize", endpoint="mock|m")
+
+    _with_policy(policy, lambda: [adapter.invoke("短提示词") for _ in range(20)])
+    stats = policy.get_stats()
+    assert stats['hedges_fired'] <= 0.1 * stats['calls']
+    assert stats['budget_denied'] > 0
+
+
+def test_hedge_skips_ineligible_calls():
+    """角色不匹配或提示词过长时直接调用主端点"""
+    policy = _policy(max_prompt_chars=10)
+    primary = _TailAdapter("primary")
+    adapter = HedgedLLMAdapter(primary, _TailAdapter("secondary"), role="draft", endpoint="mock|m")
+    assert _with_policy(policy, lambda: adapter.invoke("x")) == "primary"
+
+    adapter.role = "summarize"
+    assert _with_policy(policy, lambda: adapter.invoke("x" * 100)) == "primary"
+    assert policy.get_stats()['calls'] == 0
+
+
+def test_async_hedge_cancels_loser():
+    """异步对冲时落败的主请求被取消"""
+    policy = _policy()
+    primary = _TailAdapter("primary", slow=5.0)
+    secondary = _TailAdapter("secondary")
+    adapter = HedgedLLMAdapter(primary, secondary, role="summarize", endpoint="mock|m")
+    _warm_up(policy)
+    for _ in range(10):
+        policy.record_call(0.01)
+
+    primary.slow_every = 1
+    start = time.monotonic()
+    result = _with_policy(policy, lambda: asyncio.run(adapter.ainvoke("短提示词")))
+    assert result == "secondary"
+    assert time.monotonic() - start < 1.0
+    assert policy.get_stats()['hedge_wins'] == 1
+
+
+if __name__ == "__main__":
+    test_hedge_cuts_tail_latency()
+    test_hedge_budget_cap()
+    test_hedge_skips_ineligible_calls()
+    test_async_hedge_cancels_loser()
+    print("✅ 对冲请求测试通过")
@@ -0,0 +1,99 @@
+# test_hybrid_retrieval.py
+# -*- coding: utf-8 -*-
+"""
+测试向量 + BM25 混合检索：字符二元组分词、专有名词精确命中、Embedding 不可用时退回 BM25、
+倒排索引随写入增量更新并持久化、旧向量库补建索引、元数据过滤同样作用于 BM25
+"""
+
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.lexical_index import LexicalIndex, tokenize, LEXICAL_INDEX_FILE
+from novel_generator.vectorstore_utils import (
+    init_vector_store, update_vector_store, load_vector_store, get_vectorstore_dir, invalidate_vector_store,
+    get_relevant_context_from_vector_store, get_relevant_contexts_batch, build_segment_metadata,
+    build_recency_filter, SOURCE_KNOWLEDGE
+)
+
+FILLER = [f"第{i}段：雨夜里，车站的灯忽明忽暗，行人匆匆走过旧街。" for i in range(30)]
+
+
+def _project(texts, **kwargs) -> str:
+    filepath = tempfile.mkdtemp(prefix="hybrid_")
+    init_vector_store(MockEmbeddingAdapter(), texts, filepath, **kwargs)
+    return filepath
+
+
+def test_tokenize_character_bigrams():
+    assert tokenize("林默在旧港口") == ["林默", "默在", "在旧", "旧港", "港口"]
+    assert tokenize("沈青，GPS-3 信号") == ["沈青", "gps", "3", "信号"]
+    assert tokenize("钥") == ["钥"]
+
+
+def test_exact_name_is_retrieved():
+    filepath = _project(FILLER + ["沈青把铜钥匙藏进了钟楼顶层的木箱。"])
+    context = get_relevant_context_from_vector_store(MockEmbeddingAdapter(), "沈青 铜钥匙", filepath, k=1)
+    assert "沈青" in context
+
+    hits = get_relevant_contexts_batch(MockEmbeddingAdapter(), ["沈青 铜钥匙", "旧街 行人"], filepath, k=2)
+    top = hits[0][0]
+    assert "沈青" in top["content"]
+    assert top["bm25"] > 0
+    assert 0 < top["score"] <= 1
+
+
+def test_lexical_results_when_embedding_is_down():
+    filepath = _project(FILLER + ["林默在旧港口找到了一封没有署名的信。"])
+    invalidate_vector_store(filepath)
+    down = MockEmbeddingAdapter(available=False)
+
+    assert "旧港口" in get_relevant_context_from_vector_store(down, "旧港口 信", filepath, k=1)
+    hits = get_relevant_contexts_batch(down, ["旧港口 信"], filepath, k=1)[0]
+    assert len(hits) == 1 and hits[0]["distance"] is None
+
+
+def test_index_is_updated_incrementally_and_persisted():
+    filepath = tempfile.mkdtemp(prefix="hybrid_")
+    knowledge = ["钟楼设定：沈青是钟楼的守夜人。"]
+    init_vector_store(MockEmbeddingAdapter(), knowledge, filepath, build_segment_metadata(knowledge, SOURCE_KNOWLEDGE))
+    for n in range(1, 6):
+        update_vector_store(MockEmbeddingAdapter(), f"第{n}章。" + FILLER[n] + ("沈青登上钟楼。" if n == 5 else ""),
+                            filepath, chapter_number=n)
+
+    store = load_vector_store(MockEmbeddingAdapter(), filepath)
+    index = LexicalIndex(os.path.join(get_vectorstore_dir(filepath), LEXICAL_INDEX_FILE))
+    assert index.count() == store.count()
+    assert index.search("沈青", 10)
+    index.close()
+
+    # 写第 6 章时第 4~6 章被排除，BM25 同样遵守过滤条件
+    hits = get_relevant_contexts_batch(MockEmbeddingAdapter(), ["沈青"], filepath, k=10, where=build_recency_filter(6))[0]
+    lexical_ids = [hit for hit in hits if hit["bm25"]]
+    assert [hit["metadata"]["source"] for hit in lexical_ids] == ["knowledge"]
+
+
+def test_legacy_store_index_is_backfilled():
+    os.environ["HYBRID_RETRIEVAL_ENABLED"] = "false"
+    try:
+        filepath = _project(FILLER + ["沈青把铜钥匙藏进了钟楼。"])
+    finally:
+        os.environ.pop("HYBRID_RETRIEVAL_ENABLED")
+    assert "沈青" in get_relevant_context_from_vector_store(MockEmbeddingAdapter(), "沈青 铜钥匙", filepath, k=1)
+
+    index = LexicalIndex(os.path.join(get_vectorstore_dir(filepath), LEXICAL_INDEX_FILE))
+    assert index.count() == 31
+    index.close()
+
+
+if __name__ == "__main__":
+    test_tokenize_character_bigrams()
+    test_exact_name_is_retrieved()
+    test_lexical_results_when_embedding_is_down()
+    test_index_is_updated_incrementally_and_persisted()
+    test_legacy_store_index_is_backfilled()
+    print("✅ 所有混合检索测试通过")
@@ -0,0 +1,75 @@
+# test_llm_adapter_pool.py
+# -*- coding: utf-8 -*-
+"""
+测试LLM适配器复用池
+"""
+
+import os
+import sys
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_adapters import LLMAdapterPool, BaseLLMAdapter
+
+
+class _DummyAdapter(BaseLLMAdapter):
+    def invoke(self, prompt: str) -> str:
+        return prompt
+
+
+def test_pool_reuses_instances():
+    """相同配置返回同一实例，并统计命中/未命中"""
+    pool = LLMAdapterPool()
+    key = ("openai", "https://api.example.com/v1", "model", 0.7, 2048, 600, "sk-test")
+    first = pool.get_or_create(key, _DummyAdapter)
+    second = pool.get_or_create(key, _DummyAdapter)
+    other = pool.get_or_create(key[:-1] + ("sk-other",), _DummyAdapter)
+
+    assert first is second
+    assert other is not first
+    stats = pool.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+
+
+def test_pool_evicts_idle_and_overflow():
+    """空闲超时与容量上限都会淘汰旧实例"""
+    pool = LLMAdapterPool(max_size=2, idle_ttl=0)
+    pool.get_or_create(("a",), _DummyAdapter)
+    pool.get_or_create(("b",), _DummyAdapter)
+    assert pool.get_stats()['size'] == 1  # ("a",) 已因空闲超时被淘汰
+
+    pool = LLMAdapterPool(max_size=2, idle_ttl=3600)
+    for name in ("a", "b", "c"):
+        pool.get_or_create((name,), _DummyAdapter)
+    stats = pool.get_stats()
+    assert stats['size'] == 2
+    assert stats['evictions'] == 1
+
+
+def test_pool_concurrent_access():
+    """并发获取同一配置时只会登记一个实例"""
+    pool = LLMAdapterPool()
+    results = []
+
+    def worker():
+        results.append(pool.get_or_create(("shared",), _DummyAdapter))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len({id(a) for a in results}) == 1
+    assert pool.get_stats()['size'] == 1
+
+
+if __name__ == "__main__":
+    test_pool_reuses_instances()
+    test_pool_evicts_idle_and_overflow()
+    test_pool_concurrent_access()
+    print("✅ LLM适配器复用池测试通过")
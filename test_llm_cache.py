@@ -0,0 +1,179 @@
+# test_llm_cache.py
+# -*- coding: utf-8 -*-
+"""
+测试LLM响应持久化缓存
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_adapters import BaseLLMAdapter, ManagedLLMAdapter, create_llm_adapter
+from novel_generator import llm_cache
+from novel_generator.llm_cache import LLMResponseCache, get_llm_cache
+from novel_generator.common import invoke_with_cleaning, ainvoke_with_cleaning
+
+
+class _CountingAdapter(BaseLLMAdapter):
+    def __init__(self, temperature=0.3):
+        self.model_name = "mock-model"
+        self.temperature = temperature
+        self.calls = 0
+
+    def invoke(self, prompt: str) -> str:
+        self.calls += 1
+        return f"回复:{prompt}"
+
+
+def test_cache_hit_and_stats():
+    """相同 (model, temperature, prompt) 命中缓存，温度不同则不命中"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(os.path.join(tmp, "cache.sqlite"))
+        adapter = _CountingAdapter()
+
+        assert invoke_with_cleaning(adapter, "关键词", cache=cache) == "回复:关键词"
+        assert invoke_with_cleaning(adapter, "关键词", cache=cache) == "回复:关键词"
+        assert adapter.calls == 1
+
+        invoke_with_cleaning(_CountingAdapter(temperature=0.7), "关键词", cache=cache)
+        stats = cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['size'] == 2
+        cache.close()
+
+
+class _FlakyAdapter(_CountingAdapter):
+    """第一次调用返回适配器的错误字符串，之后返回正常结果"""
+    def invoke(self, prompt: str) -> str:
+        self.calls += 1
+        if self.calls == 1:
+            return "[网络错误] 网络连接失败: timeout"
+        return f"回复:{prompt}"
+
+
+def test_error_result_is_not_cached():
+    """适配器返回的错误字符串不写入缓存，下一次相同调用仍请求模型"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(os.path.join(tmp, "cache.sqlite"))
+        adapter = _FlakyAdapter()
+        assert invoke_with_cleaning(adapter, "关键词", cache=cache).startswith("[网络错误]")
+        assert invoke_with_cleaning(adapter, "关键词", cache=cache) == "回复:关键词"
+        assert adapter.calls == 2
+        assert invoke_with_cleaning(adapter, "关键词", cache=cache) == "回复:关键词"
+        assert adapter.calls == 2
+
+        adapter = _FlakyAdapter(temperature=0.9)
+        assert asyncio.run(ainvoke_with_cleaning(adapter, "异步", cache=cache)).startswith("[网络错误]")
+        assert asyncio.run(ainvoke_with_cleaning(adapter, "异步", cache=cache)) == "回复:异步"
+        assert adapter.calls == 2
+        cache.close()
+
+
+class _BareAdapter(BaseLLMAdapter):
+    """不设置 model_name / temperature 的内部适配器（如增强版 DeepSeek 适配器）"""
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt: str) -> str:
+        self.calls += 1
+        return f"回复:{prompt}"
+
+
+def test_cache_key_uses_configured_model_and_temperature():
+    """缓存键取包装上保存的配置：只有模型或温度不同的适配器不共享缓存"""
+    wrapper = create_llm_adapter(interface_format="DeepSeek", base_url="http://127.0.0.1:9/v1",
+                                 model_name="deepseek-chat", api_key="sk", temperature=0.3,
+                                 max_tokens=100, timeout=5, use_pool=False)
+    assert (wrapper.model_name, wrapper.temperature) == ("deepseek-chat", 0.3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(os.path.join(tmp, "cache.sqlite"))
+        inner = _BareAdapter()
+        url = "https://cache-key.example.com/v1"
+        for model_name, temperature in (("deepseek-chat", 0.3), ("deepseek-reasoner", 0.3),
+                                        ("deepseek-chat", 0.7), ("deepseek-chat", 0.3)):
+            adapter = ManagedLLMAdapter(inner, url, "sk", model_name, temperature)
+            assert invoke_with_cleaning(adapter, "关键词", cache=cache) == "回复:关键词"
+        assert inner.calls == 3
+        assert cache.get_stats()['hits'] == 1
+        cache.close()
+
+
+def test_cache_bypass_without_cache():
+    """不传 cache 时每次都调用模型"""
+    adapter = _CountingAdapter()
+    invoke_with_cleaning(adapter, "正文")
+    invoke_with_cleaning(adapter, "正文")
+    assert adapter.calls == 2
+
+
+def test_cache_ttl_and_lru_eviction():
+    """过期条目视为未命中；超出上限时淘汰最久未访问的条目"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(os.path.join(tmp, "ttl.sqlite"), ttl_seconds=0.01)
+        cache.set("k", "v")
+        time.sleep(0.05)
+        assert cache.get("k") is None
+        cache.close()
+
+        cache = LLMResponseCache(os.path.join(tmp, "lru.sqlite"), max_entries=2)
+        cache.set("a", "1")
+        time.sleep(0.01)
+        cache.set("b", "2")
+        time.sleep(0.01)
+        assert cache.get("a") == "1"  # a 最近被访问
+        time.sleep(0.01)
+        cache.set("c", "3")
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get_stats()['evictions'] == 1
+        cache.close()
+
+
+def test_cache_persists_across_instances():
+    """缓存写入磁盘，重新打开后仍可命中"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "persist.sqlite")
+        cache = LLMResponseCache(path)
+        cache.set("k", "v")
+        cache.close()
+        cache = LLMResponseCache(path)
+        assert cache.get("k") == "v"
+        cache.close()
+
+
+def test_get_llm_cache_opt_in():
+    """未设置 LLM_CACHE_ENABLED 时不启用缓存"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old = os.environ.pop('LLM_CACHE_ENABLED', None)
+        try:
+            assert get_llm_cache(tmp) is None
+            os.environ['LLM_CACHE_ENABLED'] = 'true'
+            cache = get_llm_cache(tmp)
+            assert cache is not None
+            assert cache is get_llm_cache(tmp)
+            assert os.path.exists(os.path.join(tmp, ".cache", "llm_cache.sqlite"))
+            cache.close()
+        finally:
+            # 不把已关闭的缓存留在模块级注册表中
+            llm_cache._caches.pop(os.path.abspath(os.path.join(tmp, ".cache", "llm_cache.sqlite")), None)
+            os.environ.pop('LLM_CACHE_ENABLED', None)
+            if old is not None:
+                os.environ['LLM_CACHE_ENABLED'] = old
+
+
+if __name__ == "__main__":
+    test_cache_hit_and_stats()
+    test_error_result_is_not_cached()
+    test_cache_key_uses_configured_model_and_temperature()
+    test_cache_bypass_without_cache()
+    test_cache_ttl_and_lru_eviction()
+    test_cache_persists_across_instances()
+    test_get_llm_cache_opt_in()
+    print("✅ LLM响应缓存测试通过")
@@ -0,0 +1,74 @@
+# test_mmr.py
+# -*- coding: utf-8 -*-
+"""
+测试 MMR 重排：近似重复的候选只保留一条、lambda 调节相关度与多样性、检索结果去重
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.mmr import mmr_select
+from novel_generator.vectorstore_utils import init_vector_store, get_relevant_contexts_batch
+
+DIM = 64
+DUPLICATES = [
+    "沈青把铜钥匙藏进了钟楼顶层的木箱。",
+    "沈青把铜钥匙藏进了钟楼顶层的木盒。",
+    "沈青把铜钥匙藏进了钟楼顶层的旧木箱。",
+]
+OTHERS = [
+    "林默在钟楼下捡到一把铜钥匙，背面刻着沈字。",
+    "沈青每晚在钟楼守夜，铜钟十二点停摆。",
+] + [f"第{i}段：雨夜里，车站的灯忽明忽暗，行人匆匆走过旧街。" for i in range(20)]
+
+
+def _clusters():
+    """三组近似重复的向量，A 组与查询最相关"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(3, DIM))
+    vectors = np.concatenate([center + rng.normal(scale=0.01, size=(4, DIM)) for center in centers])
+    relevance = [0.9, 0.89, 0.88, 0.87, 0.6, 0.59, 0.58, 0.57, 0.5, 0.49, 0.48, 0.47]
+    return vectors, relevance
+
+
+def test_mmr_picks_one_per_cluster():
+    vectors, relevance = _clusters()
+    assert mmr_select(vectors, 3, 0.5, relevance=relevance) == [0, 4, 8]
+    # lambda = 1 只按相关度排序
+    assert mmr_select(vectors, 3, 1.0, relevance=relevance) == [0, 1, 2]
+    assert mmr_select(vectors, 20, 0.5, relevance=relevance)[:3] == [0, 4, 8]
+    assert mmr_select([], 3, 0.5, relevance=[]) == []
+
+
+def test_mmr_uses_query_similarity_without_relevance():
+    vectors, _ = _clusters()
+    query = vectors[5]
+    assert mmr_select(vectors, 2, 0.7, query_vector=query)[0] in (4, 5, 6, 7)
+
+
+def test_retrieval_drops_near_duplicates():
+    filepath = tempfile.mkdtemp(prefix="mmr_")
+    init_vector_store(MockEmbeddingAdapter(dim=DIM), DUPLICATES + OTHERS, filepath)
+    query = ["沈青 铜钥匙 钟楼"]
+
+    plain = get_relevant_contexts_batch(MockEmbeddingAdapter(dim=DIM), query, filepath, k=3, mmr_lambda=1.0)[0]
+    diverse = get_relevant_contexts_batch(MockEmbeddingAdapter(dim=DIM), query, filepath, k=3, mmr_lambda=0.5)[0]
+
+    assert len(plain) == len(diverse) == 3
+    assert sum(hit["content"] in DUPLICATES for hit in plain) >= 2
+    assert sum(hit["content"] in DUPLICATES for hit in diverse) == 1
+    assert diverse[0]["content"] == plain[0]["content"]
+
+
+if __name__ == "__main__":
+    test_mmr_picks_one_per_cluster()
+    test_mmr_uses_query_similarity_without_relevance()
+    test_retrieval_drops_near_duplicates()
+    print("✅ 所有 MMR 测试通过")
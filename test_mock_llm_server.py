@@ -0,0 +1,81 @@
+# test_mock_llm_server.py
+# -*- coding: utf-8 -*-
+"""
+测试离线模拟服务：各接口格式、确定性输出、错误注入与计数
+"""
+
+import os
+import sys
+import json
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from mock_llm_server import MockLLMServer
+from chapter_directory_parser import parse_chapter_blueprint
+
+
+def _chat(server, prompt: str, stream: bool = False):
+    return requests.post(
+        f"{server.base_url}/chat/completions",
+        json={"model": "mock", "messages": [{"role": "user", "content": prompt}], "stream": stream},
+        stream=stream, timeout=10
+    )
+
+
+def test_chat_completions_are_deterministic_and_parseable():
+    """相同提示词得到相同输出；章节目录提示词的回复可被解析"""
+    with MockLLMServer(latency=0) as server:
+        first = _chat(server, "写一段正文").json()
+        second = _chat(server, "写一段正文").json()
+        assert first["choices"][0]["message"]["content"] == second["choices"][0]["message"]["content"]
+        assert first["usage"]["completion_tokens"] > 0
+
+        blueprint = _chat(server, "现在请设计第4章到第6的节奏分布").json()["choices"][0]["message"]["content"]
+        assert [c["chapter_number"] for c in parse_chapter_blueprint(blueprint)] == [4, 5, 6]
+
+
+def test_streaming_matches_non_streaming():
+    """流式输出拼接后与普通输出一致"""
+    with MockLLMServer(latency=0, reply_chars=300) as server:
+        full = _chat(server, "写一段正文").json()["choices"][0]["message"]["content"]
+        pieces = []
+        for line in _chat(server, "写一段正文", stream=True).iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            delta = json.loads(line[len("data: "):])["choices"][0]["delta"]
+            pieces.append(delta.get("content") or "")
+        assert "".join(pieces) == full
+
+
+def test_embedding_shapes():
+    """OpenAI 与 Ollama 两种 Embedding 格式"""
+    with MockLLMServer(latency=0, embedding_dim=16) as server:
+        data = requests.post(f"{server.base_url}/embeddings", json={"input": ["甲", "乙"]}, timeout=10).json()
+        assert [item["index"] for item in data["data"]] == [0, 1]
+        assert len(data["data"][0]["embedding"]) == 16
+
+        ollama = requests.post(f"{server.ollama_url}/api/embeddings", json={"prompt": "甲"}, timeout=10).json()
+        assert ollama["embedding"] == data["data"][0]["embedding"]
+
+
+def test_error_injection_and_stats():
+    """错误率为 1 时全部返回配置的状态码，并计入统计"""
+    with MockLLMServer(latency=0, error_rate=1.0, error_status=500) as server:
+        assert _chat(server, "hi").status_code == 500
+        server.configure(error_rate=0.0)
+        assert _chat(server, "hi").status_code == 200
+        stats = server.get_stats()
+        assert stats["requests"] == 2
+        assert stats["errors_injected"] == 1
+        assert stats["bytes_in"] > 0 and stats["bytes_out"] > 0
+
+
+if __name__ == "__main__":
+    test_chat_completions_are_deterministic_and_parseable()
+    test_streaming_matches_non_streaming()
+    test_embedding_shapes()
+    test_error_injection_and_stats()
+    print("✅ 模拟服务测试通过")
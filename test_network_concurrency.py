@@ -0,0 +1,118 @@
+# test_network_concurrency.py
+# -*- coding: utf-8 -*-
+"""
+并发压力测试：多个线程同时经由网络管理器发请求，
+代理策略只作用于各自的会话，进程级 os.environ 不被修改。
+"""
+
+import os
+import sys
+import json
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from network_manager import ConnectionManager, get_http_session
+
+# 指向不可用地址的代理：若请求读取了环境变量中的代理，就会失败
+_BOGUS_PROXY = "http://127.0.0.1:9"
+_PROXY_VARS = ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy']
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def _start_server():
+    server = _Server(("127.0.0.1", 0), _EchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_concurrent_requests_do_not_touch_environ():
+    """N 个并发请求全部绕过代理成功，期间环境变量始终保持不变"""
+    server = _start_server()
+    url = f"http://127.0.0.1:{server.server_port}/echo"
+    saved = {var: os.environ.get(var) for var in _PROXY_VARS}
+    for var in _PROXY_VARS:
+        os.environ[var] = _BOGUS_PROXY
+    os.environ.pop('NO_PROXY', None)
+    os.environ.pop('no_proxy', None)
+
+    manager = ConnectionManager({'max_retries': 1})
+    corrupted = []
+    stop = threading.Event()
+
+    def watch_environ():
+        while not stop.is_set():
+            for var in _PROXY_VARS:
+                if os.environ.get(var) != _BOGUS_PROXY:
+                    corrupted.append(var)
+
+    def send(i):
+        response = manager.make_request_with_retry(
+            requests.post, url, json={"i": i}, timeout=10, use_proxy=False
+        )
+        return json.loads(response.text)["i"]
+
+    watcher = threading.Thread(target=watch_environ)
+    watcher.start()
+    try:
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(send, range(200)))
+    finally:
+        stop.set()
+        watcher.join()
+        server.shutdown()
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+    assert results == list(range(200))
+    assert not corrupted
+
+
+def test_sessions_are_thread_local():
+    """每个线程、每种代理策略各自持有会话"""
+    sessions = []
+
+    def worker():
+        sessions.append((get_http_session(False), get_http_session(False), get_http_session(True)))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for direct, direct_again, proxied in sessions:
+        assert direct is direct_again
+        assert direct.trust_env is False
+        assert proxied.trust_env is True
+    assert len({id(s[0]) for s in sessions}) == 4
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_do_not_touch_environ()
+    test_sessions_are_thread_local()
+    print("✅ 网络并发压力测试通过")
@@ -0,0 +1,96 @@
+# test_network_latency.py
+# -*- coding: utf-8 -*-
+"""
+测试端点延迟模型与基于模型的超时推导
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import network_manager
+from network_manager import ConnectionManager, LatencyModel, NetworkConfig
+
+
+def _use_model(model):
+    """替换全局延迟模型，返回原实例以便恢复"""
+    old = network_manager._latency_model
+    network_manager._latency_model = model
+    return old
+
+
+def test_ewma_and_percentile():
+    """EWMA 与 p95 按主机聚合"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model = LatencyModel(os.path.join(tmp, "latency.json"))
+        for seconds in [1.0] * 19 + [10.0]:
+            model.record("https://api.example.com/v1", seconds)
+        model.record("https://other.example.com/v1", 5.0)
+
+        estimate = model.get_estimate("https://api.example.com/v1/chat/completions")
+        assert estimate['count'] == 20
+        assert estimate['p95'] == 1.0
+        assert model.percentile("https://api.example.com", 1.0) == 10.0
+        assert 1.0 < estimate['ewma'] < 10.0
+        assert model.get_estimate("https://other.example.com")['p95'] == 5.0
+
+
+def test_model_persists_across_runs():
+    """延迟模型保存后可被新实例加载"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "latency.json")
+        model = LatencyModel(path)
+        model.record("https://api.example.com/v1", 2.0)
+        model.save()
+
+        reloaded = LatencyModel(path)
+        estimate = reloaded.get_estimate("https://api.example.com/v1")
+        assert estimate['count'] == 1
+        assert estimate['p95'] == 2.0
+
+
+def test_best_timeout_from_model_without_probe():
+    """有数据时按 p95 推导超时，调用路径上不做网络探测"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old = _use_model(LatencyModel(os.path.join(tmp, "latency.json")))
+        try:
+            manager = ConnectionManager()
+            for _ in range(10):
+                manager.record_latency("https://api.example.com/v1", 40.0)
+
+            start = time.time()
+            timeout = manager.get_best_timeout("https://api.example.com/v1")
+            assert time.time() - start < 0.5
+            assert timeout == 80
+
+            network_manager._latency_model.record("https://fast.example.com", 0.1)
+            assert manager.get_best_timeout("https://fast.example.com") == NetworkConfig.MIN_TIMEOUT
+        finally:
+            network_manager._latency_model = old
+
+
+def test_unknown_host_returns_immediately():
+    """没有数据的主机立即返回默认超时，探测在后台进行"""
+    with tempfile.TemporaryDirectory() as tmp:
+        old = _use_model(LatencyModel(os.path.join(tmp, "latency.json")))
+        try:
+            manager = ConnectionManager()
+            start = time.time()
+            # 10.255.255.1 不可路由，同步探测会阻塞到超时
+            timeout = manager.get_best_timeout("http://10.255.255.1:9/v1")
+            assert time.time() - start < 0.5
+            assert timeout == NetworkConfig.UNKNOWN_TIMEOUT
+        finally:
+            network_manager._latency_model = old
+
+
+if __name__ == "__main__":
+    test_ewma_and_percentile()
+    test_model_persists_across_runs()
+    test_best_timeout_from_model_without_probe()
+    test_unknown_host_returns_immediately()
+    print("✅ 端点延迟模型测试通过")
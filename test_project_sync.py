@@ -0,0 +1,160 @@
+# test_project_sync.py
+# -*- coding: utf-8 -*-
+"""
+测试项目文件增量同步：首次同步建立清单、无变化时不请求 Embedding、只改修改时间不重新索引、
+修改/新增/删除章节与知识库文件后只处理变化的文件、已定稿章节不重复计算、后台线程与进度回调
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.project_sync import (
+    sync_vector_store, start_vector_store_sync, load_manifest, _project_lock
+)
+from novel_generator.vectorstore_utils import (
+    update_vector_store, load_vector_store, split_text_for_vectorstore, SOURCE_KNOWLEDGE
+)
+
+
+def _chapter(n: int, scenes: int = 30) -> str:
+    return "".join(f"第{n}章第{i}幕：林默沿着旧港口的石阶往下走，潮水拍打着生锈的铁链。" for i in range(scenes))
+
+
+def _write(filepath: str, rel_path: str, content: str):
+    path = os.path.join(filepath, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _project():
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    filepath = tempfile.mkdtemp(prefix="sync_")
+    for n in (1, 2, 3):
+        _write(filepath, f"chapters/chapter_{n}.txt", _chapter(n))
+    _write(filepath, "chapters/notes.txt", "不是章节文件")
+    _write(filepath, "knowledge/world.txt", "钟楼设定：沈青是钟楼的守夜人。\n旧港口在城市东侧。")
+    return filepath
+
+
+def teardown_function(function):
+    os.environ.pop("EMBEDDING_CACHE_ENABLED", None)
+
+
+def _segment_total(*texts) -> int:
+    return sum(len(split_text_for_vectorstore(t)) for t in texts)
+
+
+def test_first_sync_builds_manifest_and_second_is_noop():
+    filepath = _project()
+    adapter = MockEmbeddingAdapter()
+    result = sync_vector_store(adapter, filepath)
+    assert (result["added"], result["changed"], result["removed"], result["failed"]) == (4, 0, 0, 0)
+
+    store = load_vector_store(adapter, filepath)
+    knowledge = "钟楼设定：沈青是钟楼的守夜人。\n旧港口在城市东侧。"
+    assert store.count() == _segment_total(_chapter(1), _chapter(2), _chapter(3), knowledge)
+    assert store.count(where={"source_file": {"$eq": "knowledge/world.txt"}}) == 1
+    manifest = load_manifest(filepath)
+    assert sorted(manifest) == ["chapters/chapter_1.txt", "chapters/chapter_2.txt",
+                                "chapters/chapter_3.txt", "knowledge/world.txt"]
+    entry = manifest["chapters/chapter_2.txt"]
+    assert {"size", "mtime_ns", "content_hash", "indexed_at"} <= set(entry)
+
+    adapter.texts.clear()
+    result = sync_vector_store(adapter, filepath)
+    assert result["unchanged"] == 4 and result["embedded"] == 0
+    assert adapter.texts == []
+
+    # 只改修改时间：按内容哈希判断为未变化，清单记下新的修改时间
+    path = os.path.join(filepath, "chapters", "chapter_1.txt")
+    os.utime(path, ns=(entry["mtime_ns"] + 10 ** 9, entry["mtime_ns"] + 10 ** 9))
+    result = sync_vector_store(adapter, filepath)
+    assert result["unchanged"] == 4 and adapter.texts == []
+    assert load_manifest(filepath)["chapters/chapter_1.txt"]["mtime_ns"] == os.stat(path).st_mtime_ns
+
+
+def test_only_changed_files_are_reindexed():
+    filepath = _project()
+    adapter = MockEmbeddingAdapter()
+    sync_vector_store(adapter, filepath)
+
+    edited = _chapter(2) + "沈青在灯塔下等了一整夜。"
+    _write(filepath, "chapters/chapter_2.txt", edited)
+    os.remove(os.path.join(filepath, "chapters", "chapter_3.txt"))
+    os.remove(os.path.join(filepath, "knowledge", "world.txt"))
+    _write(filepath, "chapters/chapter_4.txt", _chapter(4, scenes=5))
+
+    adapter.texts.clear()
+    result = sync_vector_store(adapter, filepath)
+    assert (result["added"], result["changed"], result["removed"], result["unchanged"]) == (1, 1, 2, 1)
+    # 第 2 章只有最后一个片段变化
+    expected = [split_text_for_vectorstore(edited)[-1]] + split_text_for_vectorstore(_chapter(4, scenes=5))
+    assert sorted(adapter.texts) == sorted(expected)
+
+    store = load_vector_store(adapter, filepath)
+    assert store.count(where={"chapter_number": {"$eq": 3}}) == 0
+    assert store.count(where={"source": {"$eq": SOURCE_KNOWLEDGE}}) == 0
+    assert store.count() == _segment_total(_chapter(1), edited, _chapter(4, scenes=5))
+    assert sorted(load_manifest(filepath)) == ["chapters/chapter_1.txt", "chapters/chapter_2.txt",
+                                               "chapters/chapter_4.txt"]
+
+
+def test_finalized_chapters_are_not_reembedded():
+    filepath = _project()
+    adapter = MockEmbeddingAdapter()
+    for n in (1, 2, 3):
+        update_vector_store(adapter, _chapter(n), filepath, chapter_number=n)
+
+    adapter.texts.clear()
+    result = sync_vector_store(adapter, filepath)
+    assert result["added"] == 4
+    assert adapter.texts == ["钟楼设定：沈青是钟楼的守夜人。\n旧港口在城市东侧。"]
+    assert load_vector_store(adapter, filepath).count() == _segment_total(
+        _chapter(1), _chapter(2), _chapter(3), "钟楼设定：沈青是钟楼的守夜人。\n旧港口在城市东侧。"
+    )
+
+
+def test_background_sync_reports_progress():
+    filepath = _project()
+    progress = []
+    finished = []
+    thread = start_vector_store_sync(
+        MockEmbeddingAdapter(), filepath,
+        progress_callback=lambda done, total, path: progress.append((done, total, path)),
+        done_callback=finished.append
+    )
+    thread.join(timeout=30)
+    assert [done for done, _, _ in progress] == [1, 2, 3, 4]
+    assert all(total == 4 for _, total, _ in progress)
+    assert [path for _, _, path in progress][:3] == ["chapters/chapter_1.txt", "chapters/chapter_2.txt",
+                                                      "chapters/chapter_3.txt"]
+    assert finished[0]["added"] == 4
+
+    # 同一项目已有同步在运行时直接返回
+    with _project_lock(filepath):
+        assert sync_vector_store(MockEmbeddingAdapter(), filepath) is None
+
+    cancel = threading.Event()
+    cancel.set()
+    _write(filepath, "chapters/chapter_9.txt", _chapter(9))
+    assert sync_vector_store(MockEmbeddingAdapter(), filepath, cancel_event=cancel)["added"] == 1
+    assert "chapters/chapter_9.txt" not in load_manifest(filepath)
+
+
+if __name__ == "__main__":
+    test_first_sync_builds_manifest_and_second_is_noop()
+    teardown_function(None)
+    test_only_changed_files_are_reindexed()
+    teardown_function(None)
+    test_finalized_chapters_are_not_reembedded()
+    teardown_function(None)
+    test_background_sync_reports_progress()
+    teardown_function(None)
+    print("✅ 所有项目同步测试通过")
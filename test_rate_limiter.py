@@ -0,0 +1,140 @@
+# test_rate_limiter.py
+# -*- coding: utf-8 -*-
+"""
+测试服务商限流器与并发控制
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from network_manager import (
+    RateLimiter, ConnectionManager, apply_network_config, configure_rate_limit,
+    get_rate_limiter, get_rate_limit_stats
+)
+from llm_adapters import BaseLLMAdapter, ManagedLLMAdapter
+
+
+def test_requests_and_tokens_per_minute():
+    """超过 RPM / TPM 桶容量后按补充速率等待"""
+    limiter = RateLimiter(requests_per_minute=120)
+    for _ in range(120):
+        assert limiter.acquire(take_slot=False) < 0.05
+    assert limiter.acquire(take_slot=False) >= 0.3
+
+    limiter = RateLimiter(tokens_per_minute=600)
+    assert limiter.acquire(tokens=600, take_slot=False) < 0.05
+    assert limiter.acquire(tokens=5, take_slot=False) >= 0.3
+    stats = limiter.get_stats()
+    assert stats['acquired'] == 2
+    assert stats['limiter_waits'] == 1
+
+
+def test_max_concurrency():
+    """在途请求数不超过 max_concurrency"""
+    limiter = RateLimiter(max_concurrency=2)
+    lock = threading.Lock()
+    current = [0, 0]  # 当前在途, 峰值
+
+    def work(_):
+        with limiter.limit():
+            with lock:
+                current[0] += 1
+                current[1] = max(current[1], current[0])
+            time.sleep(0.05)
+            with lock:
+                current[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(work, range(12)))
+    assert current[1] == 2
+    assert limiter.get_stats()['in_flight'] == 0
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        if type(self).calls == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.3")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_retry_after_is_honoured():
+    """429 + Retry-After 时共享限流器暂停，重试在暂停结束后进行"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    try:
+        limiter = RateLimiter(requests_per_minute=600)
+        manager = ConnectionManager({'max_retries': 3, 'retry_delay': 5})
+        start = time.time()
+        response = manager.make_request_with_retry(requests.get, url, timeout=5, limiter=limiter)
+        elapsed = time.time() - start
+    finally:
+        server.shutdown()
+
+    assert response.text == "ok"
+    assert 0.3 <= elapsed < 3  # 遵循 Retry-After，而不是 5 秒的盲目退避
+    stats = limiter.get_stats()
+    assert stats['provider_throttled'] == 1
+    assert stats['provider_wait_total'] == 0.3
+
+
+class _EchoAdapter(BaseLLMAdapter):
+    def invoke(self, prompt: str) -> str:
+        return prompt
+
+
+def test_config_shared_by_adapters():
+    """同一主机 + api_key 的多个配置共享一个限流器，包装后的适配器经过限流"""
+    config = {
+        "llm_configs": {
+            "A": {"base_url": "https://rl.example.com/v1", "api_key": "sk-1234",
+                  "rate_limit": {"requests_per_minute": 600, "max_concurrency": 2}},
+            "B": {"base_url": "https://rl.example.com", "api_key": "sk-1234",
+                  "rate_limit": {"requests_per_minute": 600, "max_concurrency": 2}},
+            "C": {"base_url": "https://other.example.com/v1", "api_key": "sk-1234"}
+        }
+    }
+    apply_network_config(config)
+    try:
+        limiter = get_rate_limiter("https://rl.example.com/v1/chat/completions", "sk-1234")
+        assert limiter is not None
+        assert get_rate_limiter("https://other.example.com/v1", "sk-1234") is None
+
+        adapter = ManagedLLMAdapter(_EchoAdapter(), "https://rl.example.com/v1", "sk-1234")
+        assert adapter.invoke("你好") == "你好"
+        assert "".join(adapter.invoke_stream("流式")) == "流式"
+        assert limiter.get_stats()['acquired'] == 2
+        assert any(name.startswith("rl.example.com") for name in get_rate_limit_stats())
+    finally:
+        configure_rate_limit("https://rl.example.com/v1", "sk-1234")  # 取消限流
+
+
+if __name__ == "__main__":
+    test_requests_and_tokens_per_minute()
+    test_max_concurrency()
+    test_retry_after_is_honoured()
+    test_config_shared_by_adapters()
+    print("✅ 限流器测试通过")
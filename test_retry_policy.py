@@ -0,0 +1,204 @@
+# test_retry_policy.py
+# -*- coding: utf-8 -*-
+"""
+测试统一重试策略：错误分类、阶段截止时间与按层统计
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from retry_policy import (
+    RetryPolicy, DeadlineExceededError, classify_error, deadline_scope, stage_deadline,
+    current_deadline, get_retry_stats, reset_retry_stats, configure_retry_policy, get_stage_deadline,
+    RETRYABLE, FATAL
+)
+from network_manager import ConnectionManager, NetworkError, CircuitOpenError
+from novel_generator.common import invoke_with_cleaning, ainvoke_with_cleaning, call_with_retry
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status}", response=response)
+
+
+class _ScriptedAdapter:
+    """按脚本依次返回结果或抛出异常的适配器"""
+    model_name = "scripted"
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+
+    def invoke(self, prompt: str) -> str:
+        self.calls += 1
+        item = self.script.pop(0) if self.script else ""
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    async def ainvoke(self, prompt: str) -> str:
+        return self.invoke(prompt)
+
+
+def test_classify_error():
+    """按状态码、显式声明与异常链分类"""
+    assert classify_error(_http_error(429)) == RETRYABLE
+    assert classify_error(_http_error(503)) == RETRYABLE
+    assert classify_error(_http_error(401)) == FATAL
+    assert classify_error(requests.ConnectionError("reset")) == RETRYABLE
+    assert classify_error(TypeError("bug")) == FATAL
+    assert classify_error(CircuitOpenError("open")) == FATAL
+    assert classify_error(DeadlineExceededError("late")) == FATAL
+
+    try:
+        try:
+            raise _http_error(403)
+        except requests.HTTPError as e:
+            raise RuntimeError("wrapped") from e
+    except RuntimeError as wrapped:
+        assert classify_error(wrapped) == FATAL
+
+
+def test_fatal_error_not_retried():
+    """不可重试的错误只尝试一次"""
+    reset_retry_stats()
+    adapter = _ScriptedAdapter([_http_error(401), "不会到达"])
+    try:
+        invoke_with_cleaning(adapter, "prompt")
+        assert False, "应当抛出异常"
+    except requests.HTTPError:
+        pass
+    assert adapter.calls == 1
+    stats = get_retry_stats()['llm_invoke']
+    assert stats['attempts'] == 1
+    assert stats['fatal'] == 1
+
+
+def test_retryable_error_then_success():
+    """可重试的错误与空响应都会重试"""
+    reset_retry_stats()
+    adapter = _ScriptedAdapter([requests.ConnectionError("reset"), "", "正文"])
+    assert invoke_with_cleaning(adapter, "prompt") == "正文"
+    stats = get_retry_stats()['llm_invoke']
+    assert stats['attempts'] == 3
+    assert stats['retries'] == 2
+    assert stats['successes'] == 1
+
+    adapter = _ScriptedAdapter([requests.Timeout("slow"), "异步正文"])
+    assert asyncio.run(ainvoke_with_cleaning(adapter, "prompt")) == "异步正文"
+
+
+def test_deadline_bounds_backoff():
+    """退避等待超过剩余时间时立即放弃，而不是睡满退避时间"""
+    reset_retry_stats()
+    policy = RetryPolicy("test", max_attempts=5, base_delay=5.0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        raise requests.ConnectionError("reset")
+
+    start = time.monotonic()
+    with deadline_scope(1.0, "test"):
+        try:
+            policy.call(flaky)
+            assert False, "应当抛出异常"
+        except requests.ConnectionError:
+            pass
+    assert time.monotonic() - start < 0.5
+    assert len(calls) == 1
+    assert get_retry_stats()['test']['deadline_exceeded'] == 1
+
+
+def test_expired_deadline_stops_attempts():
+    """截止时间已到时不再发起新的尝试"""
+    adapter = _ScriptedAdapter(["正文"])
+    with deadline_scope(0.01, "draft"):
+        time.sleep(0.02)
+        try:
+            invoke_with_cleaning(adapter, "prompt")
+            assert False, "应当抛出异常"
+        except DeadlineExceededError:
+            pass
+    assert adapter.calls == 0
+
+
+def test_nested_deadline_and_stage_decorator():
+    """嵌套时取更早的截止时间；装饰器为同步和异步函数设置阶段截止时间"""
+    with deadline_scope(1.0, "outer"):
+        with deadline_scope(60.0, "inner") as inner:
+            assert inner.stage == "outer"
+            assert inner.remaining() <= 1.0
+
+    @stage_deadline("draft")
+    def sync_stage():
+        deadline = current_deadline()
+        return deadline.stage if deadline else None
+
+    @stage_deadline("finalize")
+    async def async_stage():
+        return await asyncio.to_thread(lambda: current_deadline().stage)
+
+    # 默认不限制阶段时间，需要在配置中开启
+    assert get_stage_deadline("blueprint") == 0
+    assert sync_stage() is None
+
+    configure_retry_policy({"stage_deadlines": {"draft": 1200, "finalize": 900}})
+    try:
+        assert sync_stage() == "draft"
+        assert asyncio.run(async_stage()) == "finalize"
+    finally:
+        configure_retry_policy({"stage_deadlines": {"draft": 0, "finalize": 0}})
+    assert current_deadline() is None
+
+
+def test_http_layer_marks_exhausted_errors():
+    """HTTP 层重试用尽后抛出的错误不会被外层再次重试"""
+    reset_retry_stats()
+    manager = ConnectionManager({'max_retries': 2, 'retry_delay': 0})
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise requests.ConnectionError("reset")
+
+    try:
+        manager.make_request_with_retry(failing)
+        assert False, "应当抛出异常"
+    except NetworkError as e:
+        assert classify_error(e) == FATAL
+    assert len(calls) == 2
+    assert get_retry_stats()['http']['exhausted'] == 1
+
+    calls.clear()
+    assert call_with_retry(lambda: manager.make_request_with_retry(failing), max_retries=3, sleep_time=0,
+                           fallback_return="fallback") == "fallback"
+    assert len(calls) == 2
+
+
+def test_http_layer_keeps_custom_request_signature():
+    """截止时间内调用不接受 timeout 参数的自定义请求函数时，不会被注入 timeout"""
+    manager = ConnectionManager({'max_retries': 1})
+    with deadline_scope(30.0, "draft"):
+        assert manager.make_request_with_retry(lambda: "ok") == "ok"
+        assert manager.make_request_with_retry(lambda timeout=None: timeout, timeout=60) <= 30.0
+
+
+if __name__ == "__main__":
+    test_classify_error()
+    test_fatal_error_not_retried()
+    test_retryable_error_then_success()
+    test_deadline_bounds_backoff()
+    test_expired_deadline_stops_attempts()
+    test_nested_deadline_and_stage_decorator()
+    test_http_layer_marks_exhausted_errors()
+    test_http_layer_keeps_custom_request_signature()
+    print("✅ 统一重试策略测试通过")
@@ -0,0 +1,200 @@
+# test_telemetry.py
+# -*- coding: utf-8 -*-
+"""
+测试 LLM 调用遥测：token 来源、阶段归属、重试与错误计数、延迟分位数及导出格式
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import llm_adapters
+from llm_adapters import BaseLLMAdapter, ManagedLLMAdapter
+from llm_telemetry import LLMTelemetry, TelemetryAggregator, report_usage
+from retry_policy import RetryPolicy, stage_deadline
+
+
+class _FakeAdapter(BaseLLMAdapter):
+    """可配置返回值、服务商 usage 与失败次数的模拟适配器"""
+    def __init__(self, model_name: str = "mock-model", reply: str = "这是一段回复", usage=None, failures: int = 0):
+        self.model_name = model_name
+        self.reply = reply
+        self.usage = usage
+        self.failures = failures
+
+    def _call(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("模拟连接失败")
+        if self.usage is not None:
+            report_usage({"usage": self.usage})
+        return self.reply
+
+    def invoke(self, prompt: str) -> str:
+        return RetryPolicy("test_telemetry", max_attempts=3, base_delay=0).call(self._call)
+
+    async def ainvoke(self, prompt: str) -> str:
+        return self.invoke(prompt)
+
+
+def _with_telemetry(func):
+    """使用写入临时文件的独立遥测实例执行 func，返回 (遥测实例, 文件中的记录)"""
+    tmpdir = tempfile.mkdtemp(prefix="telemetry_")
+    telemetry = LLMTelemetry(filepath=os.path.join(tmpdir, "llm_telemetry.jsonl"), enabled=True)
+    original = llm_adapters.get_telemetry
+    llm_adapters.get_telemetry = lambda: telemetry
+    try:
+        func()
+    finally:
+        llm_adapters.get_telemetry = original
+    for handler in telemetry._file_logger().handlers:
+        handler.flush()
+    with open(telemetry.filepath, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return telemetry, records
+
+
+def _managed(adapter: BaseLLMAdapter) -> ManagedLLMAdapter:
+    return ManagedLLMAdapter(adapter, "http://telemetry.test/v1", "sk-test")
+
+
+def test_provider_usage_preferred_over_estimate():
+    with_usage = _managed(_FakeAdapter(usage={"prompt_tokens": 123, "completion_tokens": 45}))
+    without_usage = _managed(_FakeAdapter(model_name="estimate-model"))
+
+    _, records = _with_telemetry(lambda: (with_usage.invoke("你好"), without_usage.invoke("你好")))
+
+    assert records[0]["usage_source"] == "provider"
+    assert records[0]["prompt_tokens"] == 123
+    assert records[0]["completion_tokens"] == 45
+    assert records[1]["usage_source"] == "estimate"
+    assert records[1]["prompt_tokens"] > 0
+    assert records[1]["completion_tokens"] > 0
+    assert records[1]["endpoint"] == "http://telemetry.test/v1"
+
+
+def test_stage_taken_from_stage_deadline():
+    adapter = _managed(_FakeAdapter())
+
+    @stage_deadline("draft")
+    def draft():
+        return adapter.invoke("写一章")
+
+    @stage_deadline("finalize")
+    async def finalize():
+        return await adapter.ainvoke("总结")
+
+    _, records = _with_telemetry(lambda: (draft(), asyncio.run(finalize()), adapter.invoke("无阶段")))
+
+    assert [r["stage"] for r in records] == ["draft", "finalize", "unknown"]
+
+
+def test_retries_and_errors_counted():
+    flaky = _managed(_FakeAdapter(failures=2))
+    broken = _managed(_FakeAdapter(model_name="broken", failures=5))
+    error_string = _managed(_FakeAdapter(model_name="api-error", reply="[API错误] 401"))
+
+    def run():
+        flaky.invoke("p")
+        try:
+            broken.invoke("p")
+        except ConnectionError:
+            pass
+        error_string.invoke("p")
+
+    telemetry, records = _with_telemetry(run)
+
+    assert records[0]["retries"] == 2 and records[0]["outcome"] == "ok"
+    assert records[1]["outcome"] == "error" and "ConnectionError" in records[1]["error"]
+    assert records[2]["outcome"] == "error" and records[2]["error"].startswith("[API错误]")
+    by_model = telemetry.aggregator.summary()["by_model"]
+    assert by_model["mock-model"]["retries"] == 2
+    assert by_model["broken"]["errors"] == 1
+    assert by_model["api-error"]["errors"] == 1
+
+
+def test_stream_records_estimate():
+    class _StreamAdapter(_FakeAdapter):
+        def invoke_stream(self, prompt: str):
+            yield "第一段"
+            yield "第二段"
+
+    adapter = _managed(_StreamAdapter())
+    _, records = _with_telemetry(lambda: list(adapter.invoke_stream("流式")))
+
+    assert len(records) == 1
+    assert records[0]["outcome"] == "ok"
+    assert records[0]["completion_tokens"] > 0
+
+
+def test_records_use_configured_model_name():
+    """内部适配器不设置 model_name 时，按包装上配置的模型名记录（普通与流式调用）"""
+    class _BareAdapter(BaseLLMAdapter):
+        def invoke(self, prompt: str) -> str:
+            return "这是一段回复"
+
+    adapter = ManagedLLMAdapter(_BareAdapter(), "http://telemetry.test/v1", "sk-test", "deepseek-chat", 0.7)
+    telemetry, records = _with_telemetry(lambda: (adapter.invoke("你好"), list(adapter.invoke_stream("流式"))))
+
+    assert [record["model"] for record in records] == ["deepseek-chat", "deepseek-chat"]
+    assert list(telemetry.aggregator.summary()["by_model"]) == ["deepseek-chat"]
+
+
+def _sample_aggregator() -> TelemetryAggregator:
+    aggregator = TelemetryAggregator()
+    for i in range(1, 101):
+        aggregator.add({
+            "kind": "llm", "stage": "draft", "model": "m1", "prompt_tokens": 10, "completion_tokens": 20,
+            "retries": 0, "latency": i / 100, "outcome": "ok" if i % 10 else "error",
+        })
+    aggregator.add({
+        "kind": "embedding", "stage": "finalize", "model": "e1", "prompt_tokens": 5, "completion_tokens": 0,
+        "retries": 1, "latency": 0.2, "outcome": "ok",
+    })
+    return aggregator
+
+
+def test_aggregator_percentiles():
+    summary = _sample_aggregator().summary()
+
+    draft = summary["by_stage"]["draft"]
+    assert draft["calls"] == 100
+    assert draft["errors"] == 10
+    assert draft["prompt_tokens"] == 1000
+    assert draft["p50"] == 0.5
+    assert draft["p95"] == 0.95
+    assert summary["by_model"]["e1"]["retries"] == 1
+
+
+def test_prometheus_and_csv_export():
+    aggregator = _sample_aggregator()
+
+    text = aggregator.export_prometheus()
+    assert '# TYPE novel_llm_calls_total counter' in text
+    assert 'novel_llm_calls_total{kind="llm",stage="draft",model="m1"} 100' in text
+    assert 'novel_llm_latency_seconds{kind="llm",stage="draft",model="m1",quantile="0.95"} 0.950000' in text
+    assert 'novel_llm_latency_seconds_count{kind="embedding",stage="finalize",model="e1"} 1' in text
+
+    path = os.path.join(tempfile.mkdtemp(prefix="telemetry_"), "summary.csv")
+    csv_text = aggregator.export_csv(path)
+    lines = csv_text.strip().splitlines()
+    assert lines[0].startswith("kind,stage,model,calls")
+    assert len(lines) == 3
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == csv_text
+
+
+if __name__ == "__main__":
+    test_provider_usage_preferred_over_estimate()
+    test_stage_taken_from_stage_deadline()
+    test_retries_and_errors_counted()
+    test_stream_records_estimate()
+    test_records_use_configured_model_name()
+    test_aggregator_percentiles()
+    test_prometheus_and_csv_export()
+    print("✅ 所有遥测测试通过")
@@ -0,0 +1,98 @@
+# test_text_splitter.py
+# -*- coding: utf-8 -*-
+"""
+测试中文流式分句/分段：句末标点与引号、换行、小数不拆分、长度上限、超长句硬切、重叠，
+以及向量库与知识库导入两处调用不再依赖 NLTK
+"""
+
+import os
+import sys
+import types
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from novel_generator.text_splitter import iter_sentences, iter_segments, split_text_segments
+
+
+def test_sentence_boundaries():
+    text = "他推开门。“你来了？”她问。\n雨下了一整夜……天亮时停了！价格是3.14元. End of line"
+    assert list(iter_sentences(text)) == [
+        "他推开门。",
+        "“你来了？”",
+        "她问。",
+        "雨下了一整夜……",
+        "天亮时停了！",
+        "价格是3.14元.",
+        "End of line",
+    ]
+    # 空行与首尾空白不产生空句
+    assert list(iter_sentences("\n\n  第一句。  \n\n")) == ["第一句。"]
+    assert list(iter_sentences("")) == []
+
+
+def test_segments_respect_max_length():
+    sentences = [f"第{i}句话写得比较长一些，用来凑够长度。" for i in range(200)]
+    text = "".join(sentences)
+    segments = split_text_segments(text, max_length=100)
+
+    assert all(len(s) <= 100 for s in segments)
+    # 片段都在句末切开，按顺序拼回即为原文
+    assert "".join(segments) == text
+    assert all(s.endswith("。") for s in segments)
+
+
+def test_long_sentence_is_hard_split():
+    text = "短句。" + "长" * 250 + "。结尾。"
+    segments = split_text_segments(text, max_length=100)
+
+    assert segments[0] == "短句。"
+    assert [len(s) for s in segments[1:4]] == [100, 100, 51]
+    assert segments[-1] == "结尾。"
+
+
+def test_overlap_repeats_whole_sentences():
+    sentences = [f"句子{i:02d}。" for i in range(30)]
+    segments = split_text_segments("".join(sentences), max_length=30, overlap=10)
+
+    assert all(len(s) <= 30 for s in segments)
+    for prev, cur in zip(segments, segments[1:]):
+        # 每句 5 字：新片段以上一片段末尾的两整句（10 字）开头
+        assert cur.startswith(prev[-10:])
+    assert segments[1].startswith("句子04。句子05。句子06。")
+    assert split_text_segments("".join(sentences), max_length=30, overlap=0)[1].startswith("句子06。")
+
+
+def test_segments_are_lazy():
+    gen = iter_segments("".join(f"第{i}句。" for i in range(10000)), max_length=20)
+    assert isinstance(gen, types.GeneratorType)
+    assert next(gen) == "第0句。第1句。第2句。第3句。第4句。"
+
+
+def test_call_sites_do_not_need_nltk():
+    from novel_generator.vectorstore_utils import split_text_for_vectorstore
+    from novel_generator.knowledge import advanced_split_content
+
+    # 即使 nltk 不可导入（或缺少 punkt 数据），两处调用都能正常分段
+    saved = sys.modules.get("nltk")
+    sys.modules["nltk"] = None
+    try:
+        text = "林默走进车站。灯忽明忽暗！\n他停下脚步？" * 50
+        assert split_text_for_vectorstore(text, max_length=60) == split_text_segments(text, 60)
+        assert advanced_split_content(text, max_length=60) == split_text_segments(text, 60)
+        assert split_text_for_vectorstore("   ") == []
+    finally:
+        if saved is None:
+            sys.modules.pop("nltk", None)
+        else:
+            sys.modules["nltk"] = saved
+
+
+if __name__ == "__main__":
+    test_sentence_boundaries()
+    test_segments_respect_max_length()
+    test_long_sentence_is_hard_split()
+    test_overlap_repeats_whole_sentences()
+    test_segments_are_lazy()
+    test_call_sites_do_not_need_nltk()
+    print("✅ 所有分句/分段测试通过")
@@ -0,0 +1,154 @@
+# test_vector_backends.py
+# -*- coding: utf-8 -*-
+"""
+测试向量库后端：NumPy 内存映射后端与 Chroma 后端检索结果一致、持久化与扩容、中断写入后的恢复、
+where 条件，以及 Chroma 向量库迁移到 NumPy 后无需重新请求 Embedding
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.vector_backends import (
+    open_vector_backend, detect_vector_backend, match_where, NumpyVectorStore, NUMPY_SEGMENTS_FILE
+)
+from novel_generator.vectorstore_utils import (
+    get_vectorstore_dir, load_vector_store, migrate_vector_store, get_relevant_context_from_vector_store
+)
+
+DIM = 16
+
+
+def _unit_vectors(count: int, seed: int = 0):
+    vectors = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+
+def _fill(store, count: int, start: int = 0):
+    ids = [f"seg-{i}" for i in range(start, start + count)]
+    texts = [f"片段{i}" for i in range(start, start + count)]
+    metadatas = [{"source": "chapter", "chapter_number": i % 10, "segment_index": i} for i in range(start, start + count)]
+    store.add_embeddings(ids, texts, _unit_vectors(count), metadatas)
+
+
+def test_backends_return_same_ranking():
+    queries = _unit_vectors(5, seed=1)
+    where = {"$or": [{"chapter_number": {"$lt": 3}}, {"segment_index": {"$eq": 7}}]}
+    rankings = []
+    for backend in ("numpy", "chroma"):
+        store = open_vector_backend(tempfile.mkdtemp(prefix=f"backend_{backend}_"), None, backend)
+        _fill(store, 60)
+        assert store.count() == 60
+        assert store.count(where) == 19
+        plain = store.query_by_vectors(queries, 4)
+        filtered = store.query_by_vectors(queries, 4, where=where)
+        for hits in plain + filtered:
+            assert [h["distance"] for h in hits] == sorted(h["distance"] for h in hits)
+        for hits in filtered:
+            assert all(match_where(h["metadata"], where) for h in hits)
+        rankings.append([[h["id"] for h in hits] for hits in plain + filtered])
+        store.close()
+    # 向量已归一化时，余弦距离与平方 L2 距离的排序相同
+    assert rankings[0] == rankings[1]
+
+
+def test_numpy_store_persists_grows_and_uses_dtype():
+    store_dir = tempfile.mkdtemp(prefix="backend_numpy_")
+    os.environ["VECTOR_STORE_DTYPE"] = "float16"
+    try:
+        store = open_vector_backend(store_dir, None, "numpy")
+        _fill(store, 200)
+        store.add_embeddings(["extra"], ["额外片段"], _unit_vectors(1, seed=9), [{}])
+        _fill(store, 100, start=200)   # 超过初始容量，触发扩容
+    finally:
+        os.environ.pop("VECTOR_STORE_DTYPE")
+    assert detect_vector_backend(store_dir) == "numpy"
+
+    reopened = NumpyVectorStore(store_dir, None)
+    assert reopened.count() == 301
+    assert reopened.dtype == "float16"
+    assert np.load(os.path.join(store_dir, "vectors.npy"), mmap_mode="r").dtype == np.float16
+    hit = reopened.query_by_vectors(_unit_vectors(1, seed=9), 1)[0][0]
+    assert hit["id"] == "extra" and hit["metadata"] == {}
+    assert hit["distance"] < 1e-3
+
+
+def test_numpy_store_recovers_from_interrupted_append():
+    store_dir = tempfile.mkdtemp(prefix="backend_numpy_")
+    store = open_vector_backend(store_dir, None, "numpy")
+    _fill(store, 10)
+    store.close()
+    # 模拟写入片段后、更新 index.json 之前中断
+    with open(os.path.join(store_dir, NUMPY_SEGMENTS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "half", "content": "未完成的写入", "metadata": {}}, ensure_ascii=False) + "\n")
+
+    reopened = NumpyVectorStore(store_dir, None)
+    assert reopened.count() == 10
+    reopened.add_embeddings(["next"], ["下一段"], _unit_vectors(1, seed=3), [{}])
+    assert NumpyVectorStore(store_dir, None).get_all()["ids"][-2:] == ["seg-9", "next"]
+
+
+def test_numpy_upsert_with_wrong_dimension_keeps_segments():
+    store_dir = tempfile.mkdtemp(prefix="backend_numpy_")
+    store = open_vector_backend(store_dir, None, "numpy")
+    _fill(store, 3)
+    # 更换 Embedding 模型后维度不同：写入失败，已有片段不能被删除
+    for vectors in ([[0.1, 0.2]], [[]]):
+        try:
+            store.add_embeddings(["seg-0"], ["新片段"], vectors, [{}])
+            assert False, "应当抛出异常"
+        except ValueError:
+            pass
+    assert store.get_all()["ids"] == ["seg-0", "seg-1", "seg-2"]
+    assert NumpyVectorStore(store_dir, None).count() == 3
+
+
+def test_where_operators():
+    metadata = {"source": "chapter", "chapter_number": 4}
+    assert match_where(metadata, {"source": "chapter"})
+    assert match_where(metadata, {"chapter_number": {"$gte": 4, "$lte": 4}})
+    assert match_where(metadata, {"$and": [{"source": {"$in": ["chapter"]}}, {"chapter_number": {"$ne": 3}}]})
+    assert not match_where(metadata, {"source": {"$nin": ["chapter"]}})
+    assert not match_where({}, {"chapter_number": {"$lt": 10}})
+
+
+def test_migrate_chroma_store_to_numpy():
+    filepath = tempfile.mkdtemp(prefix="backend_migrate_")
+    store_dir = get_vectorstore_dir(filepath)
+    os.makedirs(store_dir)
+    adapter = MockEmbeddingAdapter()
+    chroma = open_vector_backend(store_dir, None, "chroma")
+    texts = ["林默在旧港口找到了一封信。", "沈青把钥匙藏进了钟楼。", "雨夜里，车站的灯忽明忽暗。"]
+    chroma.add_embeddings(["a", "b", "c"], texts, adapter.embed_documents(texts),
+                          [{"source": "chapter", "chapter_number": 1}, {}, {"source": "knowledge"}])
+    assert load_vector_store(adapter, filepath).backend_name == "chroma"
+
+    adapter.calls = 0
+    assert migrate_vector_store(filepath, "numpy")
+    assert adapter.calls == 0
+    assert detect_vector_backend(store_dir) == "numpy"
+    assert detect_vector_backend(store_dir + ".chroma.bak") == "chroma"
+
+    store = load_vector_store(adapter, filepath)
+    assert store.backend_name == "numpy"
+    data = store.get_all()
+    assert sorted(data["ids"]) == ["a", "b", "c"]
+    assert "钟楼" in get_relevant_context_from_vector_store(adapter, "钟楼的钥匙", filepath, k=1)
+    assert migrate_vector_store(filepath, "numpy")
+
+
+if __name__ == "__main__":
+    test_backends_return_same_ranking()
+    test_numpy_store_persists_grows_and_uses_dtype()
+    test_numpy_store_recovers_from_interrupted_append()
+    test_numpy_upsert_with_wrong_dimension_keeps_segments()
+    test_where_operators()
+    test_migrate_chroma_store_to_numpy()
+    print("✅ 所有向量库后端测试通过")
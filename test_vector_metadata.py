@@ -0,0 +1,100 @@
+# test_vector_metadata.py
+# -*- coding: utf-8 -*-
+"""
+测试向量库片段元数据与检索时的元数据过滤：近章片段在查询阶段被排除，top-k 名额全部可用；
+无元数据的旧向量库退回不过滤
+"""
+
+import os
+import sys
+import hashlib
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.vectorstore_utils import (
+    init_vector_store, load_vector_store, update_vector_store, build_segment_metadata,
+    build_recency_filter, get_relevant_contexts_batch, get_relevant_context_from_vector_store,
+    SOURCE_KNOWLEDGE
+)
+from novel_generator.chapter import _retrieve_keyword_contexts
+
+
+def _chapter_text(n: int) -> str:
+    return "".join(f"第{n}章里钟楼的钟声响了第{i}次。" for i in range(3))
+
+
+def _project_with_chapters(count: int) -> str:
+    filepath = tempfile.mkdtemp(prefix="vector_metadata_")
+    adapter = MockEmbeddingAdapter()
+    knowledge = ["钟楼设定：每晚十二点停摆。"]
+    init_vector_store(adapter, knowledge, filepath, build_segment_metadata(knowledge, SOURCE_KNOWLEDGE))
+    for n in range(1, count + 1):
+        update_vector_store(adapter, _chapter_text(n), filepath, chapter_number=n)
+    return filepath
+
+
+def test_chapter_segments_carry_metadata():
+    filepath = tempfile.mkdtemp(prefix="vector_metadata_")
+    text = "林默走进车站。" * 40 + "\n" + "沈青在钟楼等他。" * 40
+    update_vector_store(MockEmbeddingAdapter(), text, filepath, chapter_number=7)
+
+    stored = load_vector_store(MockEmbeddingAdapter(), filepath).get_all()
+    rows = sorted(zip(stored["metadatas"], stored["documents"]), key=lambda row: row[0]["segment_index"])
+    assert len(rows) > 1
+    for index, (metadata, document) in enumerate(rows):
+        assert metadata["source"] == "chapter"
+        assert metadata["chapter_number"] == 7
+        assert metadata["segment_index"] == index
+        assert metadata["content_hash"] == hashlib.sha1(document.encode("utf-8")).hexdigest()
+
+
+def test_recent_chapters_are_filtered_in_query():
+    filepath = _project_with_chapters(8)
+    hits = get_relevant_contexts_batch(
+        MockEmbeddingAdapter(), ["钟楼的钟声"], filepath, k=5, where=build_recency_filter(8)
+    )[0]
+
+    # 第 6~8 章在检索阶段即被排除，k 个名额都由可用片段填满
+    assert len(hits) == 5
+    for hit in hits:
+        metadata = hit["metadata"]
+        assert metadata["source"] == "knowledge" or metadata["chapter_number"] < 6
+
+    context = get_relevant_context_from_vector_store(
+        MockEmbeddingAdapter(), "钟楼的钟声", filepath, k=20, where=build_recency_filter(8)
+    )
+    for n in (6, 7, 8):
+        assert f"第{n}章" not in context
+    assert "第5章" in context
+
+
+def test_keyword_contexts_exclude_recent_chapters():
+    filepath = _project_with_chapters(4)
+    contexts = _retrieve_keyword_contexts(MockEmbeddingAdapter(), filepath, ["钟楼的钟声"], 10, novel_number=4)
+
+    assert len(contexts) == 1
+    assert "第1章" in contexts[0]
+    assert "第2章" not in contexts[0] and "第3章" not in contexts[0] and "第4章" not in contexts[0]
+    assert build_recency_filter(0) is None
+
+
+def test_legacy_store_without_metadata_is_not_filtered():
+    filepath = tempfile.mkdtemp(prefix="vector_metadata_")
+    init_vector_store(MockEmbeddingAdapter(), [_chapter_text(5), _chapter_text(6)], filepath)
+
+    hits = get_relevant_contexts_batch(
+        MockEmbeddingAdapter(), ["钟楼"], filepath, k=2, where=build_recency_filter(6)
+    )[0]
+    assert len(hits) == 2
+    assert all(hit["metadata"] == {} for hit in hits)
+
+
+if __name__ == "__main__":
+    test_chapter_segments_carry_metadata()
+    test_recent_chapters_are_filtered_in_query()
+    test_keyword_contexts_exclude_recent_chapters()
+    test_legacy_store_without_metadata_is_not_filtered()
+    print("✅ 所有向量元数据测试通过")
@@ -0,0 +1,89 @@
+# test_vector_store_registry.py
+# -*- coding: utf-8 -*-
+"""
+测试进程级向量库注册表：检索复用已打开的实例，清空或目录被替换后失效
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import MockEmbeddingAdapter
+from novel_generator.vectorstore_utils import (
+    init_vector_store, load_vector_store, clear_vector_store,
+    get_relevant_context_from_vector_store, get_vector_store_registry_stats, get_vectorstore_dir,
+    _release_chroma_system
+)
+
+TEXTS = ["林默在旧港口找到了一封信。", "沈青把钥匙藏进了钟楼。", "雨夜里，车站的灯忽明忽暗。"]
+
+
+def _opens() -> int:
+    return get_vector_store_registry_stats()["opens"]
+
+
+def test_retrieval_reuses_open_store():
+    filepath = tempfile.mkdtemp(prefix="registry_")
+    store = init_vector_store(MockEmbeddingAdapter(), TEXTS, filepath)
+    opens = _opens()
+
+    # 每次检索都会新建适配器实例（与 build_chapter_prompt 相同），只要配置一致就复用
+    for query in ["钟楼", "港口", "车站", "信", "钥匙"]:
+        assert get_relevant_context_from_vector_store(MockEmbeddingAdapter(), query, filepath, k=1)
+    assert load_vector_store(MockEmbeddingAdapter(), filepath) is store
+    assert _opens() == opens
+
+    # 不同的 Embedding 模型是不同的向量空间，需要单独打开
+    assert load_vector_store(MockEmbeddingAdapter("other-embedding"), filepath) is not store
+    assert _opens() == opens + 1
+
+
+def test_inserts_visible_through_shared_store():
+    filepath = tempfile.mkdtemp(prefix="registry_")
+    init_vector_store(MockEmbeddingAdapter(), TEXTS[:1], filepath)
+    store = load_vector_store(MockEmbeddingAdapter(), filepath)
+    from langchain.docstore.document import Document
+    store.add_documents([Document(page_content=TEXTS[1])])
+
+    assert "钟楼" in get_relevant_context_from_vector_store(MockEmbeddingAdapter(), "钟楼的钥匙", filepath, k=1)
+    assert load_vector_store(MockEmbeddingAdapter(), filepath).count() == 2
+
+
+def test_clear_invalidates_store():
+    filepath = tempfile.mkdtemp(prefix="registry_")
+    init_vector_store(MockEmbeddingAdapter(), TEXTS, filepath)
+    assert clear_vector_store(filepath)
+    assert load_vector_store(MockEmbeddingAdapter(), filepath) is None
+
+    rebuilt = init_vector_store(MockEmbeddingAdapter(), TEXTS[:1], filepath)
+    assert rebuilt.count() == 1
+    assert load_vector_store(MockEmbeddingAdapter(), filepath) is rebuilt
+
+
+def test_replaced_directory_is_reopened():
+    filepath = tempfile.mkdtemp(prefix="registry_")
+    old = init_vector_store(MockEmbeddingAdapter(), TEXTS, filepath)
+
+    # 目录在注册表之外被删除并由另一套配置重建，原配置的注册项不再对应磁盘上的数据
+    store_dir = get_vectorstore_dir(filepath)
+    _release_chroma_system(store_dir)
+    shutil.rmtree(store_dir)
+    init_vector_store(MockEmbeddingAdapter("other-embedding"), ["新的章节只有一句话。"], filepath)
+    invalidations = get_vector_store_registry_stats()["invalidations"]
+
+    store = load_vector_store(MockEmbeddingAdapter(), filepath)
+    assert store is not old
+    assert store.count() == 1
+    assert get_vector_store_registry_stats()["invalidations"] == invalidations + 1
+
+
+if __name__ == "__main__":
+    test_retrieval_reuses_open_store()
+    test_inserts_visible_through_shared_store()
+    test_clear_invalidates_store()
+    test_replaced_directory_is_reopened()
+    print("✅ 所有向量库注册表测试通过")
@@ -75,6 +75,7 @@ chinese_labels = {
     "consistency_check": "一致性审校",
     "import_knowledge": "导入知识库",
     "clear_vectorstore": "清空向量库",
+    "sync_vectorstore": "同步向量库",
     "show_plot_arcs": "查看剧情要点",
     "role_library": "角色库",
     
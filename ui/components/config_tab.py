@@ -934,6 +934,7 @@ class ConfigTab(ctk.CTkFrame):
             if 'llm_configs' not in current_config:
                 current_config['llm_configs'] = {}
 
+            previous_llm_config = current_config['llm_configs'].get(config_name) or {}
             current_config['llm_configs'][config_name] = {
                 'api_key': self.api_key_entry.get(),
                 'base_url': self.base_url_entry.get(),
@@ -943,6 +944,9 @@ class ConfigTab(ctk.CTkFrame):
                 'timeout': timeout_value,
                 'interface_format': provider
             }
+            # 保留手动配置的限流参数
+            if 'rate_limit' in previous_llm_config:
+                current_config['llm_configs'][config_name]['rate_limit'] = previous_llm_config['rate_limit']
 
             # 更新嵌入配置
             embed_provider = self.embed_provider_var.get()
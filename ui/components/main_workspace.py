@@ -5,6 +5,7 @@
 
 import logging
 import threading
+import time
 import os
 from typing import Dict, Any, Optional, Callable
 import customtkinter as ctk
@@ -59,9 +60,15 @@ class MainWorkspace(ctk.CTkFrame):
         self.generation_state = {
             'current_step': 0,
             'is_generating': False,
-            'generation_thread': None
+            'generation_thread': None,
+            'stop_event': None
         }
 
+        # 流式输出缓冲：工作线程写入，UI线程按固定帧率刷新到编辑器
+        self._stream_lock = threading.Lock()
+        self._stream_buffer = []
+        self._stream_active = False
+
         # 组件引用
         self.main_frame = None
         self.chapter_editor = None
@@ -169,6 +176,7 @@ class MainWorkspace(ctk.CTkFrame):
         # 绑定字数统计
         self.chapter_editor.bind("<KeyRelease>", self._update_word_count)
         self.chapter_editor.bind("<ButtonRelease>", self._update_word_count)
+        self.chapter_editor.bind("<Escape>", lambda event: self.stop_generation())
 
     def _create_log_panel(self, parent):
         """创建日志输出面板"""
@@ -1165,6 +1173,57 @@ class MainWorkspace(ctk.CTkFrame):
         except Exception as e:
             logger.error(f"设置章节内容失败: {e}")
 
+    # 流式输出的刷新帧率（每秒最多重绘次数）
+    STREAM_REFRESH_FPS = 10
+
+    def _begin_stream_to_editor(self):
+        """开始流式输出：清空编辑器并启动固定帧率的刷新循环（可在工作线程调用）"""
+        with self._stream_lock:
+            self._stream_buffer = []
+            self._stream_active = True
+
+        def start():
+            if self.chapter_editor:
+                self.chapter_editor.delete("0.0", "end")
+            self._flush_stream_buffer()
+
+        self.after(0, start)
+
+    def _append_stream_chunk(self, piece: str):
+        """工作线程追加流式片段，只写缓冲，不直接触碰控件"""
+        with self._stream_lock:
+            if self._stream_active:
+                self._stream_buffer.append(piece)
+
+    def _flush_stream_buffer(self):
+        """UI线程：把缓冲中的片段一次性写入编辑器，并按固定帧率安排下一次刷新"""
+        with self._stream_lock:
+            pending = "".join(self._stream_buffer)
+            self._stream_buffer = []
+            active = self._stream_active
+        try:
+            if pending and self.chapter_editor:
+                self.chapter_editor.insert("end", pending)
+                self.chapter_editor.see("end")
+                self._update_word_count()
+        except Exception as e:
+            logger.error(f"刷新流式内容失败: {e}")
+        if active:
+            self.after(int(1000 / self.STREAM_REFRESH_FPS), self._flush_stream_buffer)
+
+    def _end_stream_to_editor(self):
+        """结束流式输出：停止刷新循环，剩余内容由最终结果整体替换"""
+        with self._stream_lock:
+            self._stream_active = False
+            self._stream_buffer = []
+
+    def stop_generation(self):
+        """中止当前的流式章节生成"""
+        stop_event = self.generation_state.get('stop_event')
+        if stop_event is not None and not stop_event.is_set():
+            stop_event.set()
+            self._log("⏹️ 正在中止生成...")
+
     def get_chapter_content(self) -> str:
         """获取章节内容"""
         try:
@@ -1411,33 +1470,55 @@ class MainWorkspace(ctk.CTkFrame):
                         self._log("❌ 请先生成章节目录")
                         return
                     
-                    # 调用真正的生成函数
-                    result = generate_chapter_draft(
-                        api_key=llm_config.get('api_key', ''),
-                        base_url=llm_config.get('base_url', 'https://api.deepseek.com'),
-                        model_name=llm_config.get('model_name', 'deepseek-chat'),
-                        filepath=params.get('filepath', '.'),
-                        novel_number=chapter_num,
-                        word_number=int(params.get('word_number', 3000)),
-                        temperature=llm_config.get('temperature', 0.7),
-                        user_guidance=params.get('guidance', ''),
-                        characters_involved=params.get('characters', ''),
-                        key_items="",
-                        scene_location="",
-                        time_constraint="",
-                        embedding_api_key=embedding_config.get('api_key', ''),
-                        embedding_url=embedding_config.get('base_url', 'https://api.siliconflow.cn/v1'),
-                        embedding_interface_format=embedding_config.get('interface_format', 'SiliconFlow'),
-                        embedding_model_name=embedding_config.get('model_name', 'BAAI/bge-m3'),
-                        embedding_retrieval_k=embedding_config.get('retrieval_k', 4),
-                        interface_format=llm_config.get('interface_format', 'DeepSeek'),
-                        max_tokens=llm_config.get('max_tokens', 2048),
-                        timeout=llm_config.get('timeout', 600)
-                    )
-                    
-                    if result:
+                    # 调用真正的生成函数（流式输出到编辑器，按 Esc 可中止）
+                    stop_event = threading.Event()
+                    self.generation_state['stop_event'] = stop_event
+                    self._begin_stream_to_editor()
+                    self._log("⌨️ 草稿将实时显示在编辑器中，按 Esc 可中止生成")
+                    stream_started = time.time()
+                    first_token_at = []
+
+                    def on_chunk(piece: str):
+                        if not first_token_at:
+                            first_token_at.append(time.time())
+                            self._log(f"⚡ 首个片段到达，用时 {first_token_at[0] - stream_started:.1f} 秒")
+                        self._append_stream_chunk(piece)
+
+                    try:
+                        result = generate_chapter_draft(
+                            api_key=llm_config.get('api_key', ''),
+                            base_url=llm_config.get('base_url', 'https://api.deepseek.com'),
+                            model_name=llm_config.get('model_name', 'deepseek-chat'),
+                            filepath=params.get('filepath', '.'),
+                            novel_number=chapter_num,
+                            word_number=int(params.get('word_number', 3000)),
+                            temperature=llm_config.get('temperature', 0.7),
+                            user_guidance=params.get('guidance', ''),
+                            characters_involved=params.get('characters', ''),
+                            key_items="",
+                            scene_location="",
+                            time_constraint="",
+                            embedding_api_key=embedding_config.get('api_key', ''),
+                            embedding_url=embedding_config.get('base_url', 'https://api.siliconflow.cn/v1'),
+                            embedding_interface_format=embedding_config.get('interface_format', 'SiliconFlow'),
+                            embedding_model_name=embedding_config.get('model_name', 'BAAI/bge-m3'),
+                            embedding_retrieval_k=embedding_config.get('retrieval_k', 4),
+                            interface_format=llm_config.get('interface_format', 'DeepSeek'),
+                            max_tokens=llm_config.get('max_tokens', 2048),
+                            timeout=llm_config.get('timeout', 600),
+                            on_chunk=on_chunk,
+                            stop_event=stop_event
+                            )
+                    finally:
+                        self._end_stream_to_editor()
+                        self.generation_state['stop_event'] = None
+
+                    if stop_event.is_set():
+                        self.after(0, lambda: self.set_chapter_content(result))
+                        self._log(f"⏹️ 已中止第{chapter_num}章生成，保留已生成的 {len(result)} 字（未保存）")
+                    elif result:
                         # 设置章节内容到编辑器
-                        self.set_chapter_content(result)
+                        self.after(0, lambda: self.set_chapter_content(result))
                         self._log(f"✅ 第{chapter_num}章内容生成完成！")
                         self._log(f"📝 字数：{len(result)}字")
                         self._log(f"🔍 [DEBUG] 章节内容生成成功，大小: {len(result)} 字符")
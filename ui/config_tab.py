@@ -954,6 +954,10 @@ def save_config_btn(self):
     if "llm_configs" not in existing_config:
         existing_config["llm_configs"] = {}
     llm_config["config_name"] = llm_config_name
+    # 保留手动配置的限流参数
+    previous_llm_config = existing_config["llm_configs"].get(llm_config_name) or {}
+    if "rate_limit" in previous_llm_config:
+        llm_config.setdefault("rate_limit", previous_llm_config["rate_limit"])
 
     existing_config["llm_configs"][llm_config_name] = llm_config
 
@@ -15,6 +15,7 @@ from novel_generator import (
     finalize_chapter,
     import_knowledge_file,
     clear_vector_store,
+    start_vector_store_sync,
     enrich_chapter_text,
     build_chapter_prompt
 )
@@ -774,6 +775,43 @@ def clear_vectorstore_handler(self):
             else:
                 self.log(f"未能清空向量库，请关闭程序后手动删除 {filepath} 下的 vectorstore 文件夹。")
 
+def sync_vectorstore_handler(self):
+    filepath = self.filepath_var.get().strip()
+    if not filepath:
+        messagebox.showwarning("警告", "请先配置保存文件路径。")
+        return
+
+    from embedding_adapters import create_embedding_adapter
+    emb_url = self.embedding_url_var.get().strip()
+    embedding_adapter = create_embedding_adapter(
+        self.embedding_interface_format_var.get().strip(),
+        self.embedding_api_key_var.get().strip(),
+        emb_url if emb_url else "http://localhost:11434/api",
+        self.embedding_model_name_var.get().strip()
+    )
+
+    def on_progress(done, total, path):
+        self.safe_log(f"同步向量库 {done}/{total}: {path}")
+
+    def on_done(result):
+        if result is None:
+            self.safe_log("向量库同步未完成（已有同步在进行或发生错误），详见 app.log。")
+        else:
+            self.safe_log(
+                f"✅ 向量库同步完成：新增 {result['added']}、修改 {result['changed']}、删除 {result['removed']} 个文件，"
+                f"未变化 {result['unchanged']} 个，失败 {result['failed']} 个；"
+                f"计算 Embedding {result['embedded']} 段，复用 {result['reused']} 段。"
+            )
+        self.enable_button_safe(self.btn_sync_vectorstore)
+
+    self.disable_button_safe(self.btn_sync_vectorstore)
+    self.log("开始同步向量库（chapters/ 与 knowledge/ 目录）...")
+    try:
+        start_vector_store_sync(embedding_adapter, filepath, on_progress, on_done)
+    except Exception as e:
+        self.enable_button_safe(self.btn_sync_vectorstore)
+        messagebox.showerror("错误", f"线程启动失败: {str(e)}")
+
 def show_plot_arcs_ui(self):
     filepath = self.filepath_var.get().strip()
     if not filepath:
@@ -30,6 +30,7 @@ from ui.generation_handlers import (
     do_consistency_check,
     import_knowledge_handler,
     clear_vectorstore_handler,
+    sync_vectorstore_handler,
     show_plot_arcs_ui,
     generate_batch_ui
 )
@@ -92,6 +93,7 @@ class NovelGeneratorGUI:
             do_consistency_check,
             import_knowledge_handler,
             clear_vectorstore_handler,
+            sync_vectorstore_handler,
             show_plot_arcs_ui,
             generate_batch_ui
         )
@@ -103,6 +105,7 @@ class NovelGeneratorGUI:
         self.do_consistency_check = do_consistency_check.__get__(self, self.__class__)
         self.import_knowledge_handler = import_knowledge_handler.__get__(self, self.__class__)
         self.clear_vectorstore_handler = clear_vectorstore_handler.__get__(self, self.__class__)
+        self.sync_vectorstore_handler = sync_vectorstore_handler.__get__(self, self.__class__)
         self.show_plot_arcs_ui = show_plot_arcs_ui.__get__(self, self.__class__)
         self.generate_batch_ui = generate_batch_ui.__get__(self, self.__class__)
 
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import os
 import json
+import tempfile
 
 def read_file(filename: str) -> str:
     """读取文件的全部内容，若文件不存在或异常则返回空字符串。"""
@@ -34,13 +35,33 @@ def clear_file_content(filename: str):
     except IOError as e:
         print(f"[clear_file_content] 无法清空文件 '{filename}' 的内容：{e}")
 
-def save_string_to_txt(content: str, filename: str):
-    """将字符串保存为 txt 文件（覆盖写）。"""
+def atomic_write_text(content: str, filename: str) -> bool:
+    """
+    原子地覆盖写文本文件：先写入同目录下的临时文件，再用 os.replace 替换。
+    中途失败时原文件保持不变。
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    tmp_path = None
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.basename(filename), dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
             file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, filename)
+        return True
     except Exception as e:
-        print(f"[save_string_to_txt] 保存文件时发生错误: {e}")
+        print(f"[atomic_write_text] 写入文件 '{filename}' 时发生错误: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+def save_string_to_txt(content: str, filename: str):
+    """将字符串保存为 txt 文件（覆盖写，原子替换）。"""
+    atomic_write_text(content, filename)
 
 def save_data_to_json(data: dict, file_path: str) -> bool:
     """将数据保存到 JSON 文件。"""